@@ -1,7 +1,24 @@
 """提示词模板管理系统."""
-from typing import Dict, List, Optional, Any
+import logging
+import re
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from app.services.ai.tokenizer import token_counter
+
+logger = logging.getLogger(__name__)
+
+# 模板占位符：{{variable_name}}
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+
+# 输入信息小节随每次请求变化，其余说明部分可以作为稳定前缀被提供商缓存
+INPUT_SECTION_HEADING = "## 输入信息"
+
+# 检索资料的类型标签
+REFERENCE_LABELS = {"inspiration": "灵感", "scene": "场景", "character": "角色"}
+
+# 预算剩余不足该token数时不再裁剪放入资料
+MIN_REFERENCE_TOKENS = 50
 
 
 class PromptCategory(Enum):
@@ -41,6 +58,8 @@ class PromptTemplate:
     version: str = "1.0.0"
     examples: Optional[List[Dict[str, Any]]] = None
     is_active: bool = True
+    # 输出格式示例中留给模型填写的占位符，不是模板变量，作为字面量原样保留
+    output_placeholders: Optional[List[str]] = None
 
 
 # 提示词模板库
@@ -125,7 +144,17 @@ PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {
             TemplateVariable("obstacle_1", "string", False, "强劲阻碍"),
             TemplateVariable("inescapable_1", "string", False, "无法逃避的困境"),
             TemplateVariable("conflict_type_2", "string", False, "第二个冲突类型", default_value="悬疑"),
+            TemplateVariable("routine_element_2", "string", False, "日常元素"),
+            TemplateVariable("abnormal_element_2", "string", False, "反常元素"),
+            TemplateVariable("goal_2", "string", False, "明确目标"),
+            TemplateVariable("obstacle_2", "string", False, "强劲阻碍"),
+            TemplateVariable("inescapable_2", "string", False, "无法逃避的困境"),
             TemplateVariable("conflict_type_3", "string", False, "第三个冲突类型", default_value="现实主义"),
+            TemplateVariable("routine_element_3", "string", False, "日常元素"),
+            TemplateVariable("abnormal_element_3", "string", False, "反常元素"),
+            TemplateVariable("goal_3", "string", False, "明确目标"),
+            TemplateVariable("obstacle_3", "string", False, "强劲阻碍"),
+            TemplateVariable("inescapable_3", "string", False, "无法逃避的困境"),
         ],
     ),
 
@@ -246,6 +275,12 @@ PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {
             TemplateVariable("act3_percent", "number", False, "第三幕百分比", default_value=25),
             TemplateVariable("ultimate_goal", "string", True, "终极目标"),
         ],
+        output_placeholders=[
+            "act1_words", "opening_words", "intro_words", "inciting_words", "act1_climax_words",
+            "act2_words", "midpoint_words", "dark_night_words",
+            "act3_words", "climax_words",
+            "mid_goal_1", "mid_goal_2", "mid_goal_3",
+        ],
     ),
 
     # ========== 角色设计模板 ==========
@@ -523,6 +558,7 @@ PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {
                 default_value="all",
             ),
         ],
+        output_placeholders=["optimized_dialogue"],
     ),
 
     # ========== 质量诊断模板 ==========
@@ -672,12 +708,147 @@ PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {
 }
 
 
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """预编译的提示词模板.
+
+    模板文本在编译时切分为字面量片段和变量槽位（literals比slots多一个），
+    渲染时按顺序拼接，只扫描一遍。
+    """
+
+    template_id: str
+    literals: Tuple[str, ...]
+    slots: Tuple[str, ...]
+    required: Tuple[str, ...]
+    defaults: Dict[str, str]
+    # 模板中出现但既不是变量也不是输出占位符的占位符，作为字面量原样保留
+    unknown_placeholders: Tuple[str, ...] = ()
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        """渲染模板.
+
+        Args:
+            variables: 模板变量
+
+        Returns:
+            填充后的提示词字符串
+        """
+        for name in self.required:
+            if name not in variables:
+                raise ValueError(f"Required variable missing: {name}")
+
+        literals = self.literals
+        defaults = self.defaults
+        parts = [literals[0]]
+        for index, name in enumerate(self.slots, 1):
+            value = variables[name] if name in variables else defaults[name]
+            parts.append(value if isinstance(value, str) else str(value))
+            parts.append(literals[index])
+        return "".join(parts)
+
+
+def split_template_text(text: str) -> Tuple[str, str]:
+    """把模板文本拆分为(静态说明, 输入信息小节).
+
+    静态说明包括角色、任务和输出要求，对所有用户相同；输入信息小节包含
+    本次请求的具体内容。没有输入信息小节的模板整体视为可变部分。
+
+    Args:
+        text: 模板文本
+
+    Returns:
+        (静态说明, 输入信息小节)
+    """
+    start = text.find(INPUT_SECTION_HEADING)
+    if start < 0:
+        return "", text
+
+    end = text.find("\n## ", start + len(INPUT_SECTION_HEADING))
+    if end < 0:
+        return text[:start], text[start:]
+    return text[:start] + text[end + 1:], text[start:end + 1]
+
+
+def compile_template(
+    template: PromptTemplate, strict: bool = False, text: Optional[str] = None
+) -> CompiledTemplate:
+    """编译提示词模板.
+
+    Args:
+        template: 提示词模板
+        strict: 为True时模板中存在未声明的占位符会抛出ValueError，否则记录警告
+        text: 要编译的模板文本，默认为template.template（用于只编译模板的一部分）
+
+    Returns:
+        CompiledTemplate对象
+    """
+    text = template.template if text is None else text
+    declared = {var.name for var in template.variables}
+    output_placeholders = set(template.output_placeholders or ())
+    literals: List[str] = []
+    slots: List[str] = []
+    unknown: List[str] = []
+
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        name = match.group(1)
+        if name not in declared:
+            # 输出占位符和未声明的占位符都留在相邻的字面量中
+            if name not in output_placeholders and name not in unknown:
+                unknown.append(name)
+            continue
+        literals.append(text[position:match.start()])
+        slots.append(name)
+        position = match.end()
+    literals.append(text[position:])
+
+    if unknown:
+        if strict:
+            raise ValueError(
+                f"Unknown placeholders in template {template.id}: {', '.join(unknown)}"
+            )
+        logger.warning("Template %s keeps undeclared placeholders: %s", template.id, unknown)
+
+    return CompiledTemplate(
+        template_id=template.id,
+        literals=tuple(literals),
+        slots=tuple(slots),
+        required=tuple(var.name for var in template.variables if var.required),
+        defaults={var.name: str(var.default_value or "") for var in template.variables},
+        unknown_placeholders=tuple(unknown),
+    )
+
+
 class PromptTemplateManager:
     """提示词模板管理器."""
 
     def __init__(self):
         """初始化模板管理器."""
         self.templates = PROMPT_TEMPLATES
+        # 模板加载时编译一次，填充时不再重复扫描模板文本；
+        # 未声明的占位符多半是拼写错误，加载时直接报错
+        self._compiled: Dict[str, CompiledTemplate] = {
+            template_id: compile_template(template, strict=True)
+            for template_id, template in self.templates.items()
+        }
+        self._compiled_parts: Dict[str, Tuple[CompiledTemplate, CompiledTemplate]] = {}
+
+    def get_compiled_template(self, template_id: str) -> Optional[CompiledTemplate]:
+        """获取编译后的模板.
+
+        Args:
+            template_id: 模板ID
+
+        Returns:
+            CompiledTemplate对象，如果不存在返回None
+        """
+        compiled = self._compiled.get(template_id)
+        if compiled is None:
+            template = self.get_template(template_id)
+            if template is None:
+                return None
+            compiled = self._compiled[template_id] = compile_template(template)
+        return compiled
 
     def get_template(self, template_id: str) -> Optional[PromptTemplate]:
         """获取模板.
@@ -702,30 +873,56 @@ class PromptTemplateManager:
         Returns:
             填充后的提示词字符串
         """
-        template = self.get_template(template_id)
-        if not template:
+        compiled = self.get_compiled_template(template_id)
+        if not compiled:
             raise ValueError(f"Template not found: {template_id}")
 
-        # 验证必需变量
-        for var in template.variables:
-            if var.required and var.name not in variables:
-                raise ValueError(f"Required variable missing: {var.name}")
+        return compiled.render(variables)
+
+    def fill_template_parts(
+        self, template_id: str, variables: Dict[str, Any]
+    ) -> Tuple[str, str]:
+        """填充模板，拆分为稳定前缀和可变后缀.
 
-        # 填充变量
-        result = template.template
-        for var in template.variables:
-            placeholder = f"{{{{{var.name}}}}}"
-            value = variables.get(var.name, var.default_value or "")
-            result = result.replace(placeholder, str(value))
+        前缀是模板的说明部分，相同变量取值下对所有请求完全一致，可以作为
+        提示词缓存的前缀；后缀是输入信息小节。前缀+后缀与fill_template的
+        内容相同，只是输入信息被移到了最后。
 
-        return result
+        Args:
+            template_id: 模板ID
+            variables: 模板变量
 
-    def add_project_context(self, template: str, project: Dict[str, Any]) -> str:
+        Returns:
+            (稳定前缀, 可变后缀)
+        """
+        parts = self._compiled_parts.get(template_id)
+        if parts is None:
+            template = self.get_template(template_id)
+            if not template:
+                raise ValueError(f"Template not found: {template_id}")
+            static_text, input_text = split_template_text(template.template)
+            parts = self._compiled_parts[template_id] = (
+                compile_template(template, text=static_text),
+                compile_template(template, text=input_text),
+            )
+
+        static_part, input_part = parts
+        return static_part.render(variables), input_part.render(variables)
+
+    def add_project_context(
+        self,
+        template: str,
+        project: Dict[str, Any],
+        references: Optional[List[Dict[str, Any]]] = None,
+        max_reference_tokens: Optional[int] = None,
+    ) -> str:
         """添加项目特定上下文.
 
         Args:
             template: 提示词模板
             project: 项目信息
+            references: 检索到的相关资料（按相关度降序），每项含type、title、content
+            max_reference_tokens: 相关资料的token预算，为None时不限制
 
         Returns:
             添加了项目上下文的提示词
@@ -739,8 +936,37 @@ class PromptTemplateManager:
 - 当前阶段：{project.get('status', 'N/A')}
         """.strip()
 
+        reference_text = self._format_references(references or [], max_reference_tokens)
+        if reference_text:
+            context += "\n\n" + reference_text
+
         return template + "\n\n" + context
 
+    def _format_references(
+        self, references: List[Dict[str, Any]], max_tokens: Optional[int]
+    ) -> str:
+        """按相关度依次放入资料，超出预算的跳过；第一条放不下时裁剪后放入."""
+        header = "## 相关资料（按相关度排序，仅供参考，保持与其一致）"
+        remaining = None if max_tokens is None else max_tokens - token_counter.count(header)
+        sections: List[str] = []
+        for reference in references:
+            label = REFERENCE_LABELS.get(reference.get("type"), "资料")
+            section = f"### {label}：{reference.get('title') or label}\n{reference.get('content', '').strip()}"
+            if remaining is not None:
+                # 含与上一节之间的空行
+                tokens = token_counter.count("\n\n" + section)
+                if tokens > remaining:
+                    if sections or remaining < MIN_REFERENCE_TOKENS:
+                        continue
+                    section = token_counter.truncate(section, remaining - token_counter.count("\n\n"))
+                    tokens = token_counter.count("\n\n" + section)
+                remaining -= tokens
+            sections.append(section)
+
+        if not sections:
+            return ""
+        return header + "\n\n" + "\n\n".join(sections)
+
     def get_templates_by_category(
         self, category: PromptCategory
     ) -> List[PromptTemplate]:
@@ -1,12 +1,14 @@
 """API v1 路由."""
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 from app.api.v1.endpoints import (
     projects,
     inspirations,
     characters,
     ai,
     conversations,
+    jobs,
 )
+from app.api.v1.dependencies import identify_user, meter_request
 
 
 api_router = APIRouter()
@@ -15,5 +17,12 @@ api_router = APIRouter()
 api_router.include_router(projects.router, prefix="/projects", tags=["projects"])
 api_router.include_router(inspirations.router, prefix="/inspirations", tags=["inspirations"])
 api_router.include_router(characters.router, prefix="/characters", tags=["characters"])
-api_router.include_router(ai.router, prefix="/ai", tags=["ai"])
-api_router.include_router(conversations.router, prefix="/conversations", tags=["conversations"])
+# AI调用（包括对话中的回复和摘要）按用户计量并执行配额
+api_router.include_router(ai.router, prefix="/ai", tags=["ai"], dependencies=[Depends(meter_request)])
+api_router.include_router(
+    conversations.router,
+    prefix="/conversations",
+    tags=["conversations"],
+    dependencies=[Depends(meter_request)],
+)
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"], dependencies=[Depends(identify_user)])
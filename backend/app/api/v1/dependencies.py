@@ -0,0 +1,44 @@
+"""API共用依赖."""
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Request, status
+from app.core.security import user_id_from_authorization
+from app.services.ai.exceptions import AIQuotaExceededError
+from app.core.context import metered_user
+from app.services.metering import token_meter
+
+
+async def identify_user(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """从Bearer令牌识别用户，并设为本次请求计量的用户.
+
+    Returns:
+        用户ID，没有令牌的匿名请求返回None（不计量）
+    """
+    try:
+        user_id = user_id_from_authorization(authorization)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    metered_user.set(user_id)
+    return user_id
+
+
+def quota_exceeded(error: AIQuotaExceededError) -> HTTPException:
+    """本月配额用完时返回的429错误."""
+    return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(error))
+
+
+async def meter_request(request: Request, user_id: Optional[str] = Depends(identify_user)) -> Optional[str]:
+    """识别用户，并在发起AI调用的请求前检查本月配额.
+
+    POST请求（生成、分析、提交任务）在配额用完时直接返回429，不进入接口
+    逻辑；查询用量、指标等GET请求不受配额限制。
+    """
+    if request.method == "POST":
+        try:
+            await token_meter.check(user_id)
+        except AIQuotaExceededError as e:
+            raise quota_exceeded(e)
+    return user_id
@@ -1,48 +1,156 @@
 """AI相关API端点."""
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import UUID
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.ai import (
+    BatchJobRequest,
+    ChapterGenerationRequest,
     ConversationRequest,
     ConversationResponse,
     GenerateContentRequest,
     OptimizeContentRequest,
+    PipelineRequest,
+    QualityAnalysisRequest,
     QualityAnalysisResponse,
+    RoleFanoutRequest,
+    RoleFanoutResponse,
+    TemplateGenerationRequest,
+    TokenUsageResponse,
 )
 from app.services.ai.ai_manager import ai_manager
+from app.services.ai.exceptions import AIQuotaExceededError
+from app.services.ai.json_stream import StructuredStreamParser, parse_json_lenient
+from app.core.config import settings
+from app.models.entity.project import Project
+from app.services.conversation_store import conversation_store
+from app.services.database import get_db, get_read_db, get_vector_db
+from app.services.embeddings import embedding_index
+from app.services.fanout import role_fanout
+from app.schemas.inspiration import ExpandedInspiration
+from app.schemas.job import JobResponse
+from app.services.job_handlers import run_quality_analysis
+from app.services.jobs import CANCELLED, FAILED, LocalJobContext
+from app.services.pipeline import PIPELINE_PRESETS, PipelineStep, pipeline_runner
+from app.services.prefetch import prefetch_scheduler
+from app.services.metering import token_meter
+from app.api.v1.dependencies import identify_user, quota_exceeded
+from app.services.quality import quality_analyzer
+from app.api.v1.endpoints.jobs import get_owned_job, submit_job
+from app.api.v1.streaming import HEARTBEAT_INTERVAL, SSE_HEADERS, format_sse, sse_response
 from app.ai.roles import get_ai_role
 from app.ai.templates import PromptTemplateManager
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 template_manager = PromptTemplateManager()
 
 
-@router.post("/chat", response_model=ConversationResponse)
-async def ai_chat(request: ConversationRequest):
-    """AI对话接口."""
-    try:
-        # 获取AI角色
-        ai_role_id = request.ai_role or "inspiration_collector"
-        ai_role = get_ai_role(ai_role_id)
+def _get_chat_role(ai_role_id: Optional[str]):
+    """获取对话使用的AI角色，不存在时返回400."""
+    ai_role_id = ai_role_id or "inspiration_collector"
+    ai_role = get_ai_role(ai_role_id)
+
+    if not ai_role:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"AI role '{ai_role_id}' not found",
+        )
+
+    return ai_role_id, ai_role
+
+
+def _get_fanout_timeout(request: RoleFanoutRequest) -> Optional[float]:
+    """校验fan-out的角色列表，返回单角色超时（不超过AI_FANOUT_MAX_TIMEOUT）."""
+    unknown = [role_id for role_id in request.roles if get_ai_role(role_id) is None]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"AI role(s) not found: {', '.join(unknown)}",
+        )
+    if request.timeout is None:
+        return None
+    return min(request.timeout, settings.AI_FANOUT_MAX_TIMEOUT)
+
+
+# "展示而非讲述"的任务说明对所有请求相同，作为可缓存的稳定前缀
+SHOW_NOT_TELL_INSTRUCTIONS = """
+# 任务：将原始文本转换为"展示而非讲述"
+
+## 要求
+1. 不要直接说情绪或状态
+2. 用具体动作、表情、环境细节来展示
+3. 调动五感（视觉、听觉、触觉、嗅觉、味觉）
+4. 每个细节都有目的
+5. 保持原文的核心信息
+
+## 输出
+直接输出优化后的文本，不要解释。
+"""
+
 
-        if not ai_role:
+def _build_show_not_tell_prompt(content: str) -> Tuple[str, str]:
+    """构建"展示而非讲述"优化提示词，返回(稳定前缀, 原始文本)."""
+    return SHOW_NOT_TELL_INSTRUCTIONS, f"## 原始文本\n{content}\n"
+
+
+def _build_dialogue_prompt(request: OptimizeContentRequest) -> Tuple[str, str]:
+    """构建对话优化提示词，返回(稳定前缀, 输入信息)."""
+    context = request.context or {}
+    variables = {
+        "original_dialogue": request.content,
+        "character_info": context.get("character_info", ""),
+        "scene_goal": context.get("scene_goal", ""),
+        "optimization_focus": context.get("optimization_focus", "all"),
+    }
+
+    return template_manager.fill_template_parts("dialogue_optimize", variables)
+
+
+@router.post("/chat", response_model=ConversationResponse)
+async def ai_chat(request: ConversationRequest, db: AsyncSession = Depends(get_db)):
+    """AI对话接口.
+
+    带conversation_id时在已有对话中继续，带project_id时新建对话，
+    两者都没有时为无状态的单轮对话。
+    """
+    # 获取AI角色
+    ai_role_id, ai_role = _get_chat_role(request.ai_role)
+
+    conversation = None
+    if request.conversation_id:
+        conversation = await conversation_store.get(db, request.conversation_id)
+        if conversation is None:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"AI role '{ai_role_id}' not found",
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Conversation not found",
             )
 
-        # 调用AI服务
-        response = await ai_manager.chat(
-            messages=[{"role": "user", "content": request.message}],
-            system_prompt=ai_role.system_prompt,
-            temperature=ai_role.temperature,
-            max_tokens=ai_role.max_tokens,
-        )
+    try:
+        if conversation is None and request.project_id:
+            conversation = await conversation_store.create(db, request.project_id, ai_role=ai_role_id)
+
+        if conversation is None:
+            # 调用AI服务
+            response = await ai_manager.chat(
+                messages=[{"role": "user", "content": request.message}],
+                system_prompt=ai_role.system_prompt,
+                temperature=ai_role.temperature,
+                max_tokens=ai_role.max_tokens,
+            )
+        else:
+            # 按对话历史窗口调用，并保存本轮消息（chat分段提交，新建的对话随用户消息提交）
+            _, _, response = await conversation_store.chat(
+                db, conversation, request.message, ai_role_id, ai_role
+            )
 
         # 返回响应
         return ConversationResponse(
-            conversation_id=None,  # TODO: 创建或获取对话ID
+            conversation_id=conversation.id if conversation is not None else None,
             message={
                 "role": "assistant",
                 "content": response.text,
@@ -52,38 +160,141 @@ async def ai_chat(request: ConversationRequest):
             suggested_actions=response.suggested_actions,
         )
 
+    except LookupError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    except AIQuotaExceededError as e:
+        await db.rollback()
+        raise quota_exceeded(e)
     except Exception as e:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e),
         )
 
 
+@router.post("/chat/fanout", response_model=RoleFanoutResponse)
+async def ai_chat_fanout(request: RoleFanoutRequest):
+    """多个AI角色并行回应同一条消息.
+
+    总耗时约为最慢角色的耗时；超时的角色返回已生成的部分（status=timeout），
+    出错的角色不影响其他角色（status=failed）。
+    """
+    timeout = _get_fanout_timeout(request)
+    return await role_fanout.run(request.roles, request.message, timeout)
+
+
+async def _get_project_or_404(db: AsyncSession, project_id: UUID) -> Project:
+    """获取项目，不存在时返回404."""
+    project = await db.get(Project, project_id)
+    if project is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    return project
+
+
+async def _retrieve_references(
+    vdb: AsyncSession, project_id: UUID, query: str
+) -> List[Dict[str, Any]]:
+    """召回项目内的相关资料，向量库不可用时降级为不带资料."""
+    try:
+        return await embedding_index.retrieve(vdb, project_id, query)
+    except Exception as e:
+        logger.warning("Retrieval failed for project %s, continuing without references: %s", project_id, e)
+        return []
+
+
 @router.post("/generate/inspiration-expansion")
-async def generate_inspiration_expansion(request: GenerateContentRequest):
-    """生成灵感扩展."""
+async def generate_inspiration_expansion(
+    request: GenerateContentRequest,
+    db: AsyncSession = Depends(get_read_db),
+    vdb: AsyncSession = Depends(get_vector_db),
+    user_id: Optional[str] = Depends(identify_user),
+):
+    """生成灵感扩展，并预取最可能的下一步（见suggested_actions）."""
+    project = await _get_project_or_404(db, request.project_id)
+
     try:
         # 填充提示词模板
-        prompt = template_manager.fill_template(
+        prefix, prompt = template_manager.fill_template_parts(
             "inspiration_development",
             request.context,
         )
 
-        # 添加项目上下文
-        # TODO: 从数据库获取项目信息并添加上下文
+        # 添加项目上下文：项目信息+与灵感最相关的已有角色、场景、灵感
+        references = await _retrieve_references(
+            vdb, project.id, str(request.context.get("inspiration_content", ""))
+        )
+        prompt = template_manager.add_project_context(
+            prompt,
+            project.to_dict(),
+            references=references,
+            max_reference_tokens=settings.RETRIEVAL_CONTEXT_TOKENS,
+        )
 
         # 调用AI服务
         response = await ai_manager.complete(
             prompt=prompt,
+            prompt_prefix=prefix,
             response_format="json",
         )
+        suggested_actions = await prefetch_scheduler.observe(
+            user_id, "inspiration_development", request.context, response
+        )
+
+        return {
+            "text": response.text,
+            "structured_data": response.structured_data,
+            "metadata": response.metadata,
+            "suggested_actions": suggested_actions,
+            "references": [
+                {key: reference[key] for key in ("type", "id", "title", "score")}
+                for reference in references
+            ],
+        }
+
+    except AIQuotaExceededError as e:
+        raise quota_exceeded(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        )
+
+
+@router.post("/generate/template")
+async def generate_template(
+    request: TemplateGenerationRequest,
+    user_id: Optional[str] = Depends(identify_user),
+):
+    """按模板生成一步（如suggested_actions中的下一步），已预取时直接返回预取结果."""
+    if request.role_id is not None and get_ai_role(request.role_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"AI role '{request.role_id}' not found",
+        )
+    step = PipelineStep(id="template", template_id=request.template_id, role_id=request.role_id)
+    try:
+        call = pipeline_runner.step_call(step, request.variables)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    try:
+        response = await ai_manager.complete(**call)
+        if call["response_format"] == "json" and response.structured_data is None:
+            response.structured_data = parse_json_lenient(response.text)
+        suggested_actions = await prefetch_scheduler.observe(
+            user_id, request.template_id, request.variables, response
+        )
 
         return {
             "text": response.text,
             "structured_data": response.structured_data,
             "metadata": response.metadata,
+            "suggested_actions": suggested_actions,
         }
 
+    except AIQuotaExceededError as e:
+        raise quota_exceeded(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -110,7 +321,7 @@ async def generate_character_profile(request: GenerateContentRequest):
     """生成角色档案."""
     try:
         # 填充提示词模板
-        prompt = template_manager.fill_template(
+        prefix, prompt = template_manager.fill_template_parts(
             "character_profile",
             request.context,
         )
@@ -118,6 +329,7 @@ async def generate_character_profile(request: GenerateContentRequest):
         # 调用AI服务
         response = await ai_manager.complete(
             prompt=prompt,
+            prompt_prefix=prefix,
             response_format="json",
         )
 
@@ -127,6 +339,8 @@ async def generate_character_profile(request: GenerateContentRequest):
             "metadata": response.metadata,
         }
 
+    except AIQuotaExceededError as e:
+        raise quota_exceeded(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -152,24 +366,9 @@ async def generate_scene_content(request: GenerateContentRequest):
 async def optimize_show_not_tell(request: OptimizeContentRequest):
     """优化：展示而非讲述."""
     try:
-        prompt = f"""
-# 任务：将以下文本转换为"展示而非讲述"
-
-## 原始文本
-{request.content}
-
-## 要求
-1. 不要直接说情绪或状态
-2. 用具体动作、表情、环境细节来展示
-3. 调动五感（视觉、听觉、触觉、嗅觉、味觉）
-4. 每个细节都有目的
-5. 保持原文的核心信息
-
-## 输出
-直接输出优化后的文本，不要解释。
-        """
+        prefix, prompt = _build_show_not_tell_prompt(request.content)
 
-        response = await ai_manager.complete(prompt=prompt)
+        response = await ai_manager.complete(prompt=prompt, prompt_prefix=prefix)
 
         return {
             "original": request.content,
@@ -177,6 +376,8 @@ async def optimize_show_not_tell(request: OptimizeContentRequest):
             "metadata": response.metadata,
         }
 
+    except AIQuotaExceededError as e:
+        raise quota_exceeded(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -189,16 +390,9 @@ async def optimize_dialogue(request: OptimizeContentRequest):
     """优化对话."""
     try:
         # 填充对话优化模板
-        variables = {
-            "original_dialogue": request.content,
-            "character_info": request.context.get("character_info", ""),
-            "scene_goal": request.context.get("scene_goal", ""),
-            "optimization_focus": request.context.get("optimization_focus", "all"),
-        }
-
-        prompt = template_manager.fill_template("dialogue_optimize", variables)
+        prefix, prompt = _build_dialogue_prompt(request)
 
-        response = await ai_manager.complete(prompt=prompt)
+        response = await ai_manager.complete(prompt=prompt, prompt_prefix=prefix)
 
         return {
             "original": request.content,
@@ -206,6 +400,8 @@ async def optimize_dialogue(request: OptimizeContentRequest):
             "metadata": response.metadata,
         }
 
+    except AIQuotaExceededError as e:
+        raise quota_exceeded(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -213,18 +409,268 @@ async def optimize_dialogue(request: OptimizeContentRequest):
         )
 
 
-@router.post("/analyze/quality", response_model=QualityAnalysisResponse)
-async def analyze_quality(request: QualityAnalysisRequest):
-    """质量分析."""
+@router.post(
+    "/generate/chapter-content",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def generate_chapter_content(
+    request: ChapterGenerationRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    """按场景顺序生成整章正文（后台任务），进度和结果通过/jobs接口获取."""
+    return await submit_job("ai.chapter_generation", request.model_dump(mode="json"), idempotency_key, response)
+
+
+@router.post(
+    "/analyze/quality",
+    response_model=Union[QualityAnalysisResponse, JobResponse],
+    responses={202: {"model": JobResponse, "description": "全书诊断已作为后台任务提交"}},
+)
+async def analyze_quality(
+    request: QualityAnalysisRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    """质量分析.
+
+    诊断全书（content_type为full或未指定章节）耗时较长，作为后台任务提交并
+    返回202和任务状态；指定章节的单项诊断在请求内完成，直接返回诊断报告。
+    """
+    if request.project_id is None and request.entity_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="project_id or entity_id is required",
+        )
+
+    params = request.model_dump(mode="json")
+    if request.content_type == "full" or request.entity_id is None:
+        return await submit_job("ai.quality_analysis", params, idempotency_key, response)
+
     try:
-        # TODO: 实现质量分析逻辑
-        # 1. 获取项目或内容
-        # 2. 使用AI质检员角色
-        # 3. 返回诊断报告
-        pass
+        return await run_quality_analysis(params, LocalJobContext())
 
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except AIQuotaExceededError as e:
+        raise quota_exceeded(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e),
         )
+
+
+@router.post("/batch", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_batch(
+    request: BatchJobRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    """提交批量离线生成（后台任务）.
+
+    请求通过提供商的批处理接口执行，通常在数小时内完成，费用低于同步调用且
+    不占用交互请求的限流额度；完成后结果写回章节（quality_report）或角色档案。
+    """
+    return await submit_job("ai.batch", request.model_dump(mode="json"), idempotency_key, response)
+
+
+@router.get("/pipelines/presets")
+async def list_pipeline_presets():
+    """内置的写作流水线定义."""
+    return PIPELINE_PRESETS
+
+
+@router.post("/pipelines", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_pipeline(
+    request: PipelineRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    """提交多步写作流水线（后台任务）.
+
+    使用preset指定内置流水线，或用steps自定义步骤；提交时校验模板、引用和
+    依赖环。无依赖的步骤并行执行，每步完成时发送progress事件。
+    """
+    if request.steps is not None:
+        specs = [step.model_dump() for step in request.steps]
+    elif request.preset in PIPELINE_PRESETS:
+        specs = PIPELINE_PRESETS[request.preset]
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown pipeline preset: {request.preset}" if request.preset else "preset or steps is required",
+        )
+    try:
+        pipeline_runner.build(specs, request.inputs)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return await submit_job("ai.pipeline", {"steps": specs, "inputs": request.inputs}, idempotency_key, response)
+
+
+@router.post("/pipelines/{job_id}/resume", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def resume_pipeline(
+    job_id: str,
+    response: Response,
+    user_id: Optional[str] = Depends(identify_user),
+):
+    """续跑失败或已取消的流水线.
+
+    新任务沿用原任务的run_id，已完成的步骤从检查点恢复，只重新执行失败的
+    步骤及其下游。重复调用返回同一个续跑任务。
+    """
+    job = await get_owned_job(job_id, user_id)
+    if job is None or job["type"] != "ai.pipeline":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Pipeline job not found")
+    if job["status"] not in (FAILED, CANCELLED):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job['status']}")
+
+    params = {**job["params"], "run_id": job["params"].get("run_id") or job["id"]}
+    return await submit_job("ai.pipeline", params, f"resume:{job_id}", response)
+
+
+# ========== 流式（SSE）接口 ==========
+
+
+@router.post("/chat/stream")
+async def ai_chat_stream(request: ConversationRequest, http_request: Request):
+    """AI对话接口（SSE流式）."""
+    ai_role_id, ai_role = _get_chat_role(request.ai_role)
+
+    usage: Dict[str, Any] = {}
+    chunks = ai_manager.stream_chat(
+        messages=[{"role": "user", "content": request.message}],
+        system_prompt=ai_role.system_prompt,
+        temperature=ai_role.temperature,
+        max_tokens=ai_role.max_tokens,
+        usage=usage,
+    )
+
+    return sse_response(
+        http_request,
+        chunks,
+        usage,
+        on_complete=lambda text: {"ai_role": ai_role_id},
+    )
+
+
+@router.post("/chat/fanout/stream")
+async def ai_chat_fanout_stream(request: RoleFanoutRequest, http_request: Request):
+    """多个AI角色并行回应同一条消息（SSE流式）.
+
+    各角色的事件交错到达，都带role字段：role_start → delta（可多次）→
+    role_end（完整文本、状态和用量），全部角色结束后发送done。
+    """
+    timeout = _get_fanout_timeout(request)
+
+    async def stream():
+        yield ": stream-open\n\n"
+        events = role_fanout.stream(request.roles, request.message, timeout, heartbeat=HEARTBEAT_INTERVAL)
+        try:
+            async for event in events:
+                if await http_request.is_disconnected():
+                    return
+                if event is None:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event, event=event["type"])
+        finally:
+            # 关闭时取消仍在生成的角色
+            await events.aclose()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+@router.post("/generate/inspiration-expansion/stream")
+async def generate_inspiration_expansion_stream(
+    request: GenerateContentRequest, http_request: Request
+):
+    """生成灵感扩展（SSE流式）."""
+    try:
+        prefix, prompt = template_manager.fill_template_parts(
+            "inspiration_development",
+            request.context,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    usage: Dict[str, Any] = {}
+    chunks = ai_manager.stream_complete(prompt=prompt, prompt_prefix=prefix, usage=usage)
+
+    return sse_response(
+        http_request,
+        chunks,
+        usage,
+        json_parser=StructuredStreamParser(ExpandedInspiration),
+    )
+
+
+@router.post("/generate/character-profile/stream")
+async def generate_character_profile_stream(
+    request: GenerateContentRequest, http_request: Request
+):
+    """生成角色档案（SSE流式）."""
+    try:
+        prefix, prompt = template_manager.fill_template_parts(
+            "character_profile",
+            request.context,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    usage: Dict[str, Any] = {}
+    chunks = ai_manager.stream_complete(prompt=prompt, prompt_prefix=prefix, usage=usage)
+
+    return sse_response(http_request, chunks, usage, json_parser=StructuredStreamParser())
+
+
+@router.post("/optimize/show-not-tell/stream")
+async def optimize_show_not_tell_stream(
+    request: OptimizeContentRequest, http_request: Request
+):
+    """优化：展示而非讲述（SSE流式）."""
+    prefix, prompt = _build_show_not_tell_prompt(request.content)
+    usage: Dict[str, Any] = {}
+    chunks = ai_manager.stream_complete(prompt=prompt, prompt_prefix=prefix, usage=usage)
+
+    return sse_response(http_request, chunks, usage)
+
+
+@router.post("/optimize/dialogue/stream")
+async def optimize_dialogue_stream(request: OptimizeContentRequest, http_request: Request):
+    """优化对话（SSE流式）."""
+    try:
+        prefix, prompt = _build_dialogue_prompt(request)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    usage: Dict[str, Any] = {}
+    chunks = ai_manager.stream_complete(prompt=prompt, prompt_prefix=prefix, usage=usage)
+
+    return sse_response(http_request, chunks, usage)
+
+
+@router.get("/usage", response_model=TokenUsageResponse)
+async def ai_usage(user_id: Optional[str] = Depends(identify_user)):
+    """当前用户本月的token用量和配额."""
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await token_meter.usage(user_id)
+
+
+@router.get("/metrics")
+async def ai_metrics():
+    """AI服务运行指标（缓存命中率等）."""
+    return {
+        **ai_manager.get_metrics(),
+        "quality_chunk_cache": quality_analyzer.cache.stats(),
+        "fanout": role_fanout.stats(),
+        "pipeline_checkpoints": pipeline_runner.checkpoints.stats(),
+        "prefetch": prefetch_scheduler.get_metrics(),
+    }
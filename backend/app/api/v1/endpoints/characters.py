@@ -1,13 +1,23 @@
 """角色相关API端点."""
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.character import CharacterCreate, CharacterUpdate, CharacterResponse
-from app.services.database import get_db
+from app.schemas.pagination import Page
+from app.models.entity.character import Character
+from app.services.database import get_db, get_read_db
+from app.services.pagination import MAX_PAGE_SIZE, ListProjection, keyset_page
 
 
 router = APIRouter()
 
+# 列表默认字段，不含profile、relationships、arc_data
+CHARACTER_LIST = ListProjection(
+    Character,
+    ("id", "project_id", "name", "role_type", "created_at", "updated_at"),
+)
+
 
 @router.post("/", response_model=CharacterResponse, status_code=status.HTTP_201_CREATED)
 async def create_character(
@@ -20,16 +30,26 @@ async def create_character(
     pass
 
 
-@router.get("/", response_model=List[CharacterResponse])
+@router.get("/", response_model=Page)
 async def list_characters(
-    project_id: str,
-    skip: int = 0,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    project_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，默认只返回轻量字段"),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """获取项目的角色列表."""
-    # TODO: 实现角色列表查询逻辑
-    pass
+    """获取项目的角色列表（按创建时间倒序，游标分页）."""
+    try:
+        return await keyset_page(
+            db,
+            CHARACTER_LIST,
+            Character.project_id == project_id,
+            fields=fields,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/{character_id}", response_model=CharacterResponse)
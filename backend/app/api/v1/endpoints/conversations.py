@@ -1,73 +1,181 @@
 """对话相关API端点."""
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.conversation import (
     ConversationCreate,
     ConversationResponse,
+    ConversationTurnResponse,
     MessageAdd,
+    MessageResponse,
 )
-from app.services.database import get_db
+from app.schemas.pagination import Page
+from app.models.entity.conversation import Conversation
+from app.services.conversation_store import conversation_store
+from app.services.database import get_db, get_read_db
+from app.services.pagination import MAX_PAGE_SIZE, ListProjection, keyset_page
+from app.ai.roles import get_ai_role
+from app.api.v1.dependencies import quota_exceeded
+from app.services.ai.exceptions import AIQuotaExceededError
 
 
 router = APIRouter()
 
+# 对话详情中返回的最近消息条数
+RECENT_MESSAGES_LIMIT = 20
+
+# 列表默认字段，不含messages、context、summary
+CONVERSATION_LIST = ListProjection(
+    Conversation,
+    ("id", "project_id", "user_id", "ai_role", "message_count", "created_at", "updated_at"),
+)
+
+
+def _get_role(ai_role_id: str):
+    """获取AI角色，不存在时返回400."""
+    ai_role = get_ai_role(ai_role_id)
+    if not ai_role:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"AI role '{ai_role_id}' not found",
+        )
+    return ai_role
+
+
+async def _get_conversation_or_404(db: AsyncSession, conversation_id: UUID) -> Conversation:
+    """获取对话，不存在时返回404."""
+    conversation = await conversation_store.get(db, conversation_id)
+    if conversation is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found",
+        )
+    return conversation
+
+
+def _to_response(conversation: Conversation, recent_messages=()) -> ConversationResponse:
+    """构建对话响应（消息关系不会隐式加载，最近消息单独传入）."""
+    return ConversationResponse(
+        id=conversation.id,
+        project_id=conversation.project_id,
+        user_id=conversation.user_id,
+        ai_role=conversation.ai_role,
+        context=conversation.context,
+        summary=conversation.summary,
+        message_count=conversation.message_count or 0,
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
+        recent_messages=[MessageResponse.model_validate(m) for m in recent_messages],
+    )
+
 
 @router.post("/", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
 async def create_conversation(
-    project_id: str,
+    project_id: UUID,
     conversation_data: ConversationCreate,
     db: AsyncSession = Depends(get_db),
 ):
     """创建新对话."""
-    # TODO: 实现对话创建逻辑
-    pass
+    if conversation_data.ai_role:
+        _get_role(conversation_data.ai_role)
+
+    try:
+        conversation = await conversation_store.create(
+            db,
+            project_id,
+            ai_role=conversation_data.ai_role,
+            context=conversation_data.context,
+        )
+    except LookupError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
 
+    await db.commit()
+    await db.refresh(conversation)
+    return _to_response(conversation)
 
-@router.get("/", response_model=List[ConversationResponse])
+
+@router.get("/", response_model=Page)
 async def list_conversations(
-    project_id: str,
-    skip: int = 0,
-    limit: int = 50,
-    db: AsyncSession = Depends(get_db),
+    project_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，默认只返回轻量字段"),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """获取项目的对话列表."""
-    # TODO: 实现对话列表查询逻辑
-    pass
+    """获取项目的对话列表（按创建时间倒序，游标分页）."""
+    try:
+        return await keyset_page(
+            db,
+            CONVERSATION_LIST,
+            Conversation.project_id == project_id,
+            fields=fields,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
-    conversation_id: str,
-    db: AsyncSession = Depends(get_db),
+    conversation_id: UUID,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """获取对话详情."""
-    # TODO: 实现对话查询逻辑
-    pass
+    """获取对话详情（含最近的消息）."""
+    conversation = await _get_conversation_or_404(db, conversation_id)
+    messages = await conversation_store.recent_messages(
+        db, conversation.id, limit=RECENT_MESSAGES_LIMIT
+    )
+    return _to_response(conversation, messages)
 
 
-@router.post("/{conversation_id}/messages")
+@router.post("/{conversation_id}/messages", response_model=ConversationTurnResponse)
 async def add_message(
-    conversation_id: str,
+    conversation_id: UUID,
     message_data: MessageAdd,
     db: AsyncSession = Depends(get_db),
 ):
-    """添加消息到对话."""
-    # TODO: 实现添加消息逻辑
-    # 1. 获取对话
-    # 2. 添加用户消息
-    # 3. 调用AI生成响应
-    # 4. 添加AI消息
-    # 5. 返回AI响应
-    pass
+    """添加消息到对话，按对话历史生成AI回复."""
+    conversation = await _get_conversation_or_404(db, conversation_id)
+    ai_role_id = message_data.ai_role or conversation.ai_role or "inspiration_collector"
+    ai_role = _get_role(ai_role_id)
+
+    try:
+        user_message, assistant_message, response = await conversation_store.chat(
+            db, conversation, message_data.content, ai_role_id, ai_role
+        )
+    except HTTPException:
+        raise
+    except AIQuotaExceededError as e:
+        await db.rollback()
+        raise quota_exceeded(e)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e),
+        )
 
+    return ConversationTurnResponse(
+        conversation_id=conversation.id,
+        user_message=MessageResponse.model_validate(user_message),
+        message=MessageResponse.model_validate(assistant_message),
+        suggested_actions=response.suggested_actions,
+    )
 
-@router.post("/{conversation_id}/switch-role")
+
+@router.post("/{conversation_id}/switch-role", response_model=ConversationResponse)
 async def switch_ai_role(
-    conversation_id: str,
+    conversation_id: UUID,
     new_role: str,
     db: AsyncSession = Depends(get_db),
 ):
     """切换对话的AI角色."""
-    # TODO: 实现切换AI角色逻辑
-    pass
+    _get_role(new_role)
+    conversation = await _get_conversation_or_404(db, conversation_id)
+
+    conversation.ai_role = new_role
+    await db.commit()
+    await db.refresh(conversation)
+    return _to_response(conversation)
@@ -1,6 +1,7 @@
 """灵感相关API端点."""
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.inspiration import (
     InspirationCreate,
@@ -8,11 +9,20 @@ from app.schemas.inspiration import (
     InspirationResponse,
     InspirationDevelopResponse,
 )
-from app.services.database import get_db
+from app.schemas.pagination import Page
+from app.models.entity.inspiration import Inspiration
+from app.services.database import get_db, get_read_db
+from app.services.pagination import MAX_PAGE_SIZE, ListProjection, keyset_page
 
 
 router = APIRouter()
 
+# 列表默认字段，不含metadata
+INSPIRATION_LIST = ListProjection(
+    Inspiration,
+    ("id", "project_id", "content", "category", "tags", "status", "created_at"),
+)
+
 
 @router.post("/", response_model=InspirationResponse, status_code=status.HTTP_201_CREATED)
 async def create_inspiration(
@@ -25,16 +35,26 @@ async def create_inspiration(
     pass
 
 
-@router.get("/", response_model=List[InspirationResponse])
+@router.get("/", response_model=Page)
 async def list_inspirations(
-    project_id: str,
-    skip: int = 0,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    project_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，默认只返回轻量字段"),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """获取项目的灵感列表."""
-    # TODO: 实现灵感列表查询逻辑
-    pass
+    """获取项目的灵感列表（按创建时间倒序，游标分页）."""
+    try:
+        return await keyset_page(
+            db,
+            INSPIRATION_LIST,
+            Inspiration.project_id == project_id,
+            fields=fields,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/{inspiration_id}", response_model=InspirationResponse)
@@ -0,0 +1,144 @@
+"""后台任务API端点."""
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.api.v1.dependencies import identify_user, meter_request
+from app.api.v1.streaming import HEARTBEAT_INTERVAL, SSE_HEADERS, format_sse
+from app.schemas.job import JobCreate, JobResponse
+from app.services import job_handlers  # noqa: F401  注册任务类型
+from app.services.jobs import TERMINAL_STATUSES, JobConflictError, job_queue
+from app.core.context import metered_user
+
+
+router = APIRouter()
+
+
+def job_response(job: Dict[str, Any]) -> JobResponse:
+    """把任务字典转换为响应，附带后续请求的地址."""
+    base = f"{settings.API_V1_PREFIX}/jobs/{job['id']}"
+    return JobResponse(
+        **{key: value for key, value in job.items() if key in JobResponse.model_fields},
+        links={"self": base, "result": f"{base}/result", "events": f"{base}/events", "cancel": f"{base}/cancel"},
+    )
+
+
+async def submit_job(
+    job_type: str,
+    params: Dict[str, Any],
+    idempotency_key: Optional[str],
+    response: Response,
+) -> JobResponse:
+    """提交任务并设置202/200状态码和Location头.
+
+    相同的幂等键重复提交返回已有任务（200），参数不同时返回409。任务执行时
+    的AI用量计入提交任务的用户。
+    """
+    try:
+        job, created = await job_queue.enqueue(
+            job_type, params, idempotency_key=idempotency_key, user_id=metered_user.get()
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except JobConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    result = job_response(job)
+    response.status_code = status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+    response.headers["Location"] = result.links["self"]
+    return result
+
+
+async def get_owned_job(job_id: str, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """获取当前用户提交的任务，不存在、已过期或属于其他用户时返回None."""
+    job = await job_queue.get(job_id)
+    if job is None or job["user_id"] != user_id:
+        return None
+    return job
+
+
+async def _get_job_or_404(job_id: str, user_id: Optional[str]) -> Dict[str, Any]:
+    """获取当前用户的任务，其他用户的任务与不存在的任务同样返回404."""
+    job = await get_owned_job(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.post(
+    "/",
+    response_model=JobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(meter_request)],
+)
+async def create_job(
+    request: JobCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+):
+    """提交后台任务."""
+    return await submit_job(request.type, request.params, idempotency_key, response)
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, user_id: Optional[str] = Depends(identify_user)):
+    """获取任务状态."""
+    return job_response(await _get_job_or_404(job_id, user_id))
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, user_id: Optional[str] = Depends(identify_user)):
+    """获取任务结果.
+
+    任务未结束时返回409，失败或取消时返回任务状态和错误。
+    """
+    job = await _get_job_or_404(job_id, user_id)
+    if job["status"] not in TERMINAL_STATUSES:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job['status']}")
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "error": job["error"],
+        "result": await job_queue.result(job_id),
+    }
+
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(job_id: str, user_id: Optional[str] = Depends(identify_user)):
+    """取消任务；已结束的任务原样返回."""
+    await _get_job_or_404(job_id, user_id)
+    job = await job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job_response(job)
+
+
+@router.get("/{job_id}/events")
+async def job_events(
+    job_id: str,
+    request: Request,
+    last_event_id: Optional[int] = Header(None),
+    user_id: Optional[str] = Depends(identify_user),
+):
+    """任务事件流（SSE）.
+
+    依次推送queued、running、progress（可多次）和最终状态事件，任务结束后关闭。
+    断线重连时浏览器带回Last-Event-ID，只补发之后的事件。
+    """
+    await _get_job_or_404(job_id, user_id)
+
+    async def stream():
+        yield ": stream-open\n\n"
+        events = job_queue.events(job_id, after=last_event_id or 0, heartbeat=HEARTBEAT_INTERVAL)
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    return
+                if event is None:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event, event=event["type"], event_id=event["seq"])
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,6 +1,8 @@
 """项目相关API端点."""
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.schemas.project import (
     ProjectCreate,
@@ -8,12 +10,36 @@ from app.schemas.project import (
     ProjectResponse,
     ProjectOverview,
 )
+from app.schemas.pagination import Page
+from app.schemas.search import EmbeddingIndexStatus, SearchResults
 from app.models.entity.project import Project
-from app.services.database import get_db
+from app.models.entity.project_stats import ProjectStats
+from app.services.database import get_db, get_read_db, get_vector_db
+from app.services.embedding_queue import embedding_queue
+from app.services.embeddings import embedding_index
+from app.services.pagination import MAX_PAGE_SIZE, ListProjection, keyset_page
+from app.services.project_stats import project_stats
+from app.services.search import MAX_PAGE_SIZE as SEARCH_MAX_PAGE_SIZE, search_service
 
 
 router = APIRouter()
 
+# 列表默认字段，不含settings
+PROJECT_LIST = ListProjection(
+    Project,
+    (
+        "id",
+        "user_id",
+        "title",
+        "genre",
+        "status",
+        "target_word_count",
+        "current_word_count",
+        "created_at",
+        "updated_at",
+    ),
+)
+
 
 @router.post("/", response_model=ProjectResponse, status_code=status.HTTP_201_CREATED)
 async def create_project(
@@ -28,15 +54,27 @@ async def create_project(
     pass
 
 
-@router.get("/", response_model=List[ProjectResponse])
+@router.get("/", response_model=Page)
 async def list_projects(
-    skip: int = 0,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    user_id: Optional[UUID] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="逗号分隔的返回字段，默认只返回轻量字段"),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """获取项目列表."""
-    # TODO: 实现项目列表查询逻辑
-    pass
+    """获取项目列表（按创建时间倒序，游标分页）."""
+    criteria = [Project.user_id == user_id] if user_id else []
+    try:
+        return await keyset_page(
+            db,
+            PROJECT_LIST,
+            *criteria,
+            fields=fields,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/{project_id}", response_model=ProjectResponse)
@@ -72,13 +110,74 @@ async def delete_project(
 
 @router.get("/{project_id}/overview", response_model=ProjectOverview)
 async def get_project_overview(
-    project_id: str,
+    project_id: UUID,
     db: AsyncSession = Depends(get_db),
 ):
-    """获取项目概览（含统计信息）."""
-    # TODO: 实现项目概览逻辑
-    # 1. 获取项目基本信息
-    # 2. 统计字数、章节数等
-    # 3. 获取最近活动
-    # 4. 返回概览数据
-    pass
+    """获取项目概览（含统计信息）.
+
+    统计来自按写入增量维护的project_stats，只读取项目和统计两行。
+    """
+    result = await db.execute(
+        select(Project, ProjectStats)
+        .outerjoin(ProjectStats, ProjectStats.project_id == Project.id)
+        .where(Project.id == project_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+
+    project, stats = row
+    if stats is None:
+        # 功能上线前创建的项目没有统计行，首次读取时统计一次
+        stats = await project_stats.get(db, project.id)
+        await db.commit()
+        await db.refresh(project)
+
+    statistics = stats.to_dict()
+    statistics.pop("project_id")
+    if project.target_word_count:
+        statistics["progress"] = round(statistics["word_count"] / project.target_word_count, 4)
+
+    return ProjectOverview(
+        project=ProjectResponse.model_validate(project),
+        statistics=statistics,
+        recent_activity=stats.recent_activity or [],
+    )
+
+
+@router.get("/{project_id}/search", response_model=SearchResults)
+async def search_project(
+    project_id: UUID,
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = Query(None, description="逗号分隔：inspiration,scene,character"),
+    tags: Optional[List[str]] = Query(None, description="只返回包含全部这些标签的灵感"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """项目内全文检索（灵感、场景、角色），按相关度排序."""
+    try:
+        return await search_service.search(
+            db,
+            project_id,
+            q,
+            types=[t.strip() for t in types.split(",") if t.strip()] if types else None,
+            tags=tags,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/{project_id}/embeddings/status", response_model=EmbeddingIndexStatus)
+async def get_embedding_status(
+    project_id: UUID,
+    db: AsyncSession = Depends(get_read_db),
+    vdb: AsyncSession = Depends(get_vector_db),
+):
+    """语义索引状态：待重嵌入的任务和已索引的块数."""
+    return EmbeddingIndexStatus(
+        queue=await embedding_queue.status(db, project_id),
+        chunks=await embedding_index.chunk_counts(vdb, project_id),
+    )
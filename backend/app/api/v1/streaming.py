@@ -0,0 +1,147 @@
+"""Server-Sent Events流式响应工具."""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from app.services.ai.json_stream import StructuredStreamParser
+
+
+# 上游长时间没有输出时发送心跳，防止代理断开空闲连接
+HEARTBEAT_INTERVAL = 15.0
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    # 关闭Nginx的响应缓冲，让片段立即到达客户端
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_sse(data: Any, event: Optional[str] = None, event_id: Optional[Any] = None) -> str:
+    """格式化一条SSE消息.
+
+    Args:
+        data: 消息数据，会被序列化为JSON
+        event: 事件名称
+        event_id: 事件ID，客户端重连时通过Last-Event-ID带回
+
+    Returns:
+        SSE消息文本
+    """
+    message = ""
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    if event:
+        message += f"event: {event}\n"
+    payload = json.dumps(data, ensure_ascii=False)
+    message += "".join(f"data: {line}\n" for line in payload.splitlines())
+    return message + "\n"
+
+
+async def sse_events(
+    request: Request,
+    chunks: AsyncIterator[str],
+    usage: Dict[str, Any],
+    on_complete: Optional[Callable[[str], Dict[str, Any]]] = None,
+    json_parser: Optional[StructuredStreamParser] = None,
+) -> AsyncIterator[str]:
+    """把文本片段流转换为SSE事件流.
+
+    事件顺序：delta（文本片段，可多次）→ result（可选，完整结果的附加数据）
+    → usage（token用量）→ done；出错时发送error事件。指定json_parser时，
+    每当JSON中的字段或列表元素完整，紧随delta之后发送partial事件。
+
+    StreamingResponse在上一条消息写出后才拉取下一条，上游读取速度由客户端
+    的接收速度决定；检测到客户端断开后立即关闭上游流，取消提供商请求。
+
+    Args:
+        request: 当前请求，用于检测客户端断开
+        chunks: 文本片段流
+        usage: 上游在流结束后写入的token用量
+        on_complete: 可选，流结束后根据完整文本生成result事件数据
+        json_parser: 可选，增量解析JSON输出，result中附带解析（或修复）后的数据
+
+    Yields:
+        SSE消息文本
+    """
+    # 立即发送首字节，客户端和代理不必等待第一个token
+    yield ": stream-open\n\n"
+
+    iterator = chunks.__aiter__()
+    parts = []
+    next_chunk = None
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(iterator.__anext__())
+
+            done, _ = await asyncio.wait({next_chunk}, timeout=HEARTBEAT_INTERVAL)
+            if await request.is_disconnected():
+                return
+            if not done:
+                yield ": ping\n\n"
+                continue
+
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                if next_chunk.done():
+                    next_chunk = None
+
+            parts.append(chunk)
+            yield format_sse({"text": chunk}, event="delta")
+            if json_parser is not None:
+                for partial in json_parser.feed(chunk):
+                    yield format_sse(partial, event="partial")
+
+        text = "".join(parts)
+        if on_complete is not None or json_parser is not None:
+            result = on_complete(text) if on_complete is not None else {}
+            if json_parser is not None:
+                result.update(json_parser.finish())
+            yield format_sse(result, event="result")
+        yield format_sse(usage, event="usage")
+        yield format_sse({"length": len(text)}, event="done")
+
+    except Exception as e:
+        yield format_sse({"detail": str(e)}, event="error")
+
+    finally:
+        if next_chunk is not None and not next_chunk.done():
+            next_chunk.cancel()
+            # 等待取消完成，否则上游生成器仍处于运行状态，无法关闭
+            await asyncio.gather(next_chunk, return_exceptions=True)
+        # 关闭上游生成器，取消提供商的流式请求
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def sse_response(
+    request: Request,
+    chunks: AsyncIterator[str],
+    usage: Dict[str, Any],
+    on_complete: Optional[Callable[[str], Dict[str, Any]]] = None,
+    json_parser: Optional[StructuredStreamParser] = None,
+) -> StreamingResponse:
+    """创建SSE流式响应.
+
+    Args:
+        request: 当前请求
+        chunks: 文本片段流
+        usage: 上游在流结束后写入的token用量
+        on_complete: 可选，流结束后根据完整文本生成result事件数据
+        json_parser: 可选，增量解析JSON输出并发送partial事件
+
+    Returns:
+        text/event-stream响应
+    """
+    return StreamingResponse(
+        sse_events(request, chunks, usage, on_complete, json_parser),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
@@ -0,0 +1,178 @@
+"""运维命令.
+
+用法:
+    python -m app.cli rebuild-project-stats [--project-id ID ...]
+    python -m app.cli reindex-search [--type inspiration|scene|character ...]
+    python -m app.cli init-vector-db
+    python -m app.cli reindex-embeddings [--type ...] [--project-id ID] [--force]
+    python -m app.cli embedding-worker
+    python -m app.cli job-worker [--concurrency N]
+    python -m app.cli submit-batch --kind quality_analysis|character_profile --project-id ID
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from uuid import UUID
+
+from app.models.entity import VectorBase
+from app.services.ai.ai_manager import ai_manager
+from app.services.batch import BATCH_KINDS, batch_runner
+from app.services.database import database, vector_database
+from app.services.embedding_worker import embedding_worker
+from app.services.embeddings import SOURCE_TYPES, embedding_index
+from app.services import job_handlers  # noqa: F401  注册任务类型
+from app.services.jobs import create_job_worker, job_queue
+from app.services.metering import token_meter
+from app.services.project_stats import project_stats
+from app.services.pipeline import pipeline_runner
+from app.services.quality import quality_analyzer
+from app.services.search import INDEXED_FIELDS, search_service
+
+
+async def rebuild_project_stats(args: argparse.Namespace) -> int:
+    """按源表重建项目统计."""
+    async with database.session_factory()() as db:
+        count = await project_stats.rebuild(db, args.project_id or None)
+        await db.commit()
+    print(f"rebuilt stats for {count} project(s)")
+    return 0
+
+
+async def reindex_search(args: argparse.Namespace) -> int:
+    """为已有数据生成全文索引."""
+    entities = {entity.__name__.lower(): entity for entity in INDEXED_FIELDS}
+    async with database.session_factory()() as db:
+        for name in args.type or list(entities):
+            count = await search_service.reindex(db, entities[name], batch_size=args.batch_size)
+            print(f"reindexed {count} {name} row(s)")
+    return 0
+
+
+async def init_vector_db(args: argparse.Namespace) -> int:
+    """在向量库中启用pgvector扩展并创建表和索引."""
+    async with vector_database.engine().begin() as conn:
+        await conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS vector")
+        await conn.run_sync(VectorBase.metadata.create_all)
+    print("vector database ready")
+    return 0
+
+
+async def reindex_embeddings(args: argparse.Namespace) -> int:
+    """同步项目内容的向量索引，只嵌入变化的块."""
+    async with database.session_factory(readonly=True)() as db, vector_database.session_factory()() as vdb:
+        for source_type in args.type or SOURCE_TYPES:
+            stats = await embedding_index.reindex(
+                db, vdb, source_type, project_id=args.project_id, batch_size=args.batch_size, force=args.force
+            )
+            print(
+                f"{source_type}: {stats.sources} source(s), {stats.chunks} chunk(s), "
+                f"{stats.embedded} embedded, {stats.reused} reused, {stats.deleted} deleted"
+            )
+    return 0
+
+
+async def run_embedding_worker(args: argparse.Namespace) -> int:
+    """单独运行重嵌入worker，直到被中断."""
+    try:
+        await embedding_worker.run()
+    finally:
+        print(embedding_worker.get_metrics())
+    return 0
+
+
+async def run_job_worker(args: argparse.Namespace) -> int:
+    """运行后台任务worker；收到SIGINT/SIGTERM后停止领取，等待运行中的任务."""
+    worker = create_job_worker(args.concurrency)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stop)
+    await ai_manager.startup()
+    try:
+        await worker.run()
+    finally:
+        await ai_manager.shutdown()
+        await job_queue.close()
+        await quality_analyzer.cache.close()
+        await pipeline_runner.checkpoints.close()
+        await batch_runner.close()
+        await token_meter.close()
+        print(worker.get_metrics())
+    return 0
+
+
+async def submit_batch(args: argparse.Namespace) -> int:
+    """提交批量离线生成任务（供定时任务调用），由job-worker执行."""
+    try:
+        job, _ = await job_queue.enqueue(
+            "ai.batch",
+            {"kind": args.kind, "project_id": str(args.project_id), "content_type": args.content_type},
+        )
+    finally:
+        await job_queue.close()
+    print(f"submitted job {job['id']}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行解析器."""
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="NovelFlow maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-project-stats", help="recount project statistics from source tables")
+    rebuild.add_argument("--project-id", type=UUID, action="append", help="only rebuild this project (repeatable)")
+    rebuild.set_defaults(handler=rebuild_project_stats)
+
+    reindex = commands.add_parser("reindex-search", help="rebuild full-text search vectors")
+    reindex.add_argument(
+        "--type",
+        choices=["inspiration", "scene", "character"],
+        action="append",
+        help="only reindex this entity type (repeatable)",
+    )
+    reindex.add_argument("--batch-size", type=int, default=500)
+    reindex.set_defaults(handler=reindex_search)
+
+    init_vector = commands.add_parser("init-vector-db", help="enable pgvector and create embedding tables")
+    init_vector.set_defaults(handler=init_vector_db)
+
+    embed = commands.add_parser("reindex-embeddings", help="re-chunk project content and embed changed chunks")
+    embed.add_argument("--type", choices=list(SOURCE_TYPES), action="append", help="only this source type (repeatable)")
+    embed.add_argument("--project-id", type=UUID, help="only this project; also drops chunks of deleted sources")
+    embed.add_argument("--batch-size", type=int, default=200, help="sources per batch")
+    embed.add_argument("--force", action="store_true", help="re-embed every chunk, not only changed ones")
+    embed.set_defaults(handler=reindex_embeddings)
+
+    worker = commands.add_parser("embedding-worker", help="process the re-embedding queue until interrupted")
+    worker.set_defaults(handler=run_embedding_worker)
+
+    jobs = commands.add_parser("job-worker", help="run queued background jobs until interrupted")
+    jobs.add_argument("--concurrency", type=int, help="jobs run at once (default JOB_WORKER_CONCURRENCY)")
+    jobs.set_defaults(handler=run_job_worker)
+
+    batch = commands.add_parser("submit-batch", help="queue bulk generation through the provider batch API")
+    batch.add_argument("--kind", choices=list(BATCH_KINDS), required=True)
+    batch.add_argument("--project-id", type=UUID, required=True)
+    batch.add_argument("--content-type", default="full", help="diagnosis scope for quality_analysis")
+    batch.set_defaults(handler=submit_batch)
+
+    return parser
+
+
+async def run(args: argparse.Namespace) -> int:
+    """执行命令并释放数据库连接."""
+    try:
+        return await args.handler(args)
+    finally:
+        await database.dispose()
+        await vector_database.dispose()
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+    args = build_parser().parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
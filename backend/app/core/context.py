@@ -0,0 +1,9 @@
+"""请求上下文变量.
+
+只依赖标准库，AI调用、任务队列等模块可以直接导入而不会引入数据库等依赖。
+"""
+from contextvars import ContextVar
+from typing import Optional
+
+# 当前请求（或后台任务）计量的用户，未设置时不计量
+metered_user: ContextVar[Optional[str]] = ContextVar("metered_user", default=None)
@@ -0,0 +1,52 @@
+"""访问令牌."""
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.core.config import settings
+
+
+def create_access_token(subject: str, expires_minutes: Optional[int] = None) -> str:
+    """签发访问令牌.
+
+    Args:
+        subject: 用户ID
+        expires_minutes: 有效期（分钟），默认ACCESS_TOKEN_EXPIRE_MINUTES
+
+    Returns:
+        JWT字符串
+    """
+    from jose import jwt
+
+    expires = datetime.utcnow() + timedelta(minutes=expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode({"sub": str(subject), "exp": expires}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def user_id_from_authorization(authorization: Optional[str]) -> Optional[str]:
+    """从Authorization头（Bearer令牌）中读取用户ID.
+
+    Returns:
+        用户ID（规范化的UUID字符串），没有Authorization头时返回None
+
+    Raises:
+        ValueError: 令牌格式错误、签名无效、已过期或subject不是UUID
+    """
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise ValueError("Expected a Bearer token")
+
+    from jose import JWTError, jwt
+
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as e:
+        raise ValueError(f"Invalid access token: {e}")
+    if not payload.get("sub"):
+        raise ValueError("Access token has no subject")
+    # 用户ID用作计量、配额和任务归属的键，必须与users.id一致
+    try:
+        return str(uuid.UUID(str(payload["sub"])))
+    except ValueError:
+        raise ValueError("Access token subject is not a user ID")
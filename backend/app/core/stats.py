@@ -0,0 +1,12 @@
+"""统计辅助函数."""
+import math
+from typing import Sequence
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """计算已排序序列的分位数（最近秩法：第ceil(q*n)个值），空序列返回0."""
+    if not sorted_values:
+        return 0.0
+    # 先舍去浮点误差，避免0.07*100=7.000000000000001被取整到下一个秩
+    rank = math.ceil(round(q * len(sorted_values), 9))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
@@ -1,11 +1,44 @@
 """FastAPI主应用."""
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.v1 import api_router
+from app.services.ai.ai_manager import ai_manager
+from app.services.batch import batch_runner
+from app.services.database import database, vector_database
+from app.services.embedding_worker import embedding_worker
+from app.services.jobs import job_queue
+from app.services.metering import token_meter
+from app.services.pipeline import pipeline_runner
+from app.services.prefetch import prefetch_scheduler
+from app.services.quality import quality_analyzer
 import uvicorn
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时打开共享资源，关闭时释放."""
+    await ai_manager.startup()
+    if settings.EMBEDDING_WORKER_ENABLED:
+        embedding_worker.start()
+    token_meter.start()
+    try:
+        yield
+    finally:
+        await embedding_worker.stop()
+        await token_meter.stop()
+        await token_meter.close()
+        await job_queue.close()
+        await quality_analyzer.cache.close()
+        await pipeline_runner.checkpoints.close()
+        await batch_runner.close()
+        await prefetch_scheduler.close()
+        await ai_manager.shutdown()
+        await database.dispose()
+        await vector_database.dispose()
+
+
 def create_app() -> FastAPI:
     """创建FastAPI应用实例."""
     app = FastAPI(
@@ -14,6 +47,7 @@ def create_app() -> FastAPI:
         description="AI-powered novel creation platform",
         docs_url="/api/docs",
         redoc_url="/api/redoc",
+        lifespan=lifespan,
     )
 
     # 配置CORS
@@ -34,6 +68,16 @@ def create_app() -> FastAPI:
         """健康检查端点."""
         return {"status": "healthy", "version": settings.APP_VERSION}
 
+    @app.get("/health/database")
+    async def database_health():
+        """数据库连接池状态（等待连接、占用连接的时间分布）."""
+        return {**database.get_metrics(), "vector": vector_database.get_metrics()}
+
+    @app.get("/health/embeddings")
+    async def embeddings_health():
+        """重嵌入worker状态（批次数、新嵌入/沿用的块数、处理延迟）."""
+        return embedding_worker.get_metrics()
+
     @app.get("/")
     async def root():
         """根路径."""
@@ -1,23 +1,34 @@
 """Entity models."""
-from app.models.entity.base import Base, TimestampMixin
+from app.models.entity.base import Base, TimestampMixin, VectorBase
 from app.models.entity.user import User
 from app.models.entity.user_preferences import UserPreferences
 from app.models.entity.project import Project
+from app.models.entity.project_stats import ProjectStats
 from app.models.entity.inspiration import Inspiration
 from app.models.entity.character import Character
 from app.models.entity.chapter import Chapter
 from app.models.entity.scene import Scene
 from app.models.entity.conversation import Conversation
+from app.models.entity.conversation_message import ConversationMessage
+from app.models.entity.embedding_chunk import EmbeddingChunk
+from app.models.entity.embedding_job import EmbeddingJob
+from app.models.entity.token_usage import TokenUsage
 
 __all__ = [
     "Base",
     "TimestampMixin",
+    "VectorBase",
     "User",
     "UserPreferences",
     "Project",
+    "ProjectStats",
     "Inspiration",
     "Character",
     "Chapter",
     "Scene",
     "Conversation",
+    "ConversationMessage",
+    "EmbeddingChunk",
+    "EmbeddingJob",
+    "TokenUsage",
 ]
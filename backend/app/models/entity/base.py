@@ -5,6 +5,9 @@ from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# Tables stored in the vector database (VECTOR_DB_URL), kept out of Base.metadata
+VectorBase = declarative_base()
+
 
 class TimestampMixin:
     """Mixin for timestamp fields."""
@@ -31,6 +31,7 @@ class Chapter(Base):
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
     )
     blueprint = Column(JSONB)  # Scene blueprint
+    quality_report = Column(JSONB)  # Latest diagnosis written back by batch jobs
 
     # Relationships
     project = relationship("Project", back_populates="chapters")
@@ -52,4 +53,5 @@ class Chapter(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "blueprint": self.blueprint,
+            "quality_report": self.quality_report,
         }
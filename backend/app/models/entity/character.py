@@ -1,9 +1,9 @@
 """Character entity model."""
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, String, ForeignKey, DateTime, Enum, Integer
-from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, ForeignKey, DateTime, Enum, Integer, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 import uuid
 from app.models.entity.base import Base
 
@@ -12,6 +12,11 @@ class Character(Base):
     """Character model."""
 
     __tablename__ = "characters"
+    __table_args__ = (
+        # Keyset pagination on (created_at, id) within a project
+        Index("ix_characters_project_created", "project_id", "created_at", "id"),
+        Index("ix_characters_search", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
@@ -29,6 +34,8 @@ class Character(Base):
     profile = Column(JSONB)  # Complete character profile (7 elements, etc.)
     relationships = Column(JSONB)  # Relationships with other characters
     arc_data = Column(JSONB)  # Character arc data
+    # Full-text index, maintained on write by app.services.search
+    search_vector = deferred(Column(TSVECTOR))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
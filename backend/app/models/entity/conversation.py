@@ -1,7 +1,7 @@
 """Conversation entity model."""
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Column, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 import uuid
@@ -12,13 +12,22 @@ class Conversation(Base):
     """Conversation model for AI interactions."""
 
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Keyset pagination on (created_at, id) within a project
+        Index("ix_conversations_project_created", "project_id", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     ai_role = Column(String(50))  # inspiration_collector, structure_architect, etc.
-    messages = Column(JSONB)  # Array of message objects
+    messages = Column(JSONB)  # Legacy array of message objects, new turns go to conversation_messages
     context = Column(JSONB)  # Conversation context
+    message_count = Column(Integer, nullable=False, default=0)  # Last assigned message seq
+    summary = Column(Text)  # Rolling summary of messages up to summary_until_seq
+    summary_tokens = Column(Integer, nullable=False, default=0)
+    summary_until_seq = Column(Integer, nullable=False, default=0)
+    unsummarized_tokens = Column(Integer, nullable=False, default=0)  # Tokens after summary_until_seq
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
@@ -26,6 +35,14 @@ class Conversation(Base):
 
     # Relationships
     project = relationship("Project", back_populates="conversations")
+    # Never loaded implicitly; history is read through a bounded window query
+    message_rows = relationship(
+        "ConversationMessage",
+        back_populates="conversation",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="noload",
+    )
 
     def to_dict(self) -> dict:
         """Convert to dictionary."""
@@ -36,6 +53,8 @@ class Conversation(Base):
             "ai_role": self.ai_role,
             "messages": self.messages or [],
             "context": self.context,
+            "message_count": self.message_count or 0,
+            "summary": self.summary,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -0,0 +1,52 @@
+"""Conversation message entity model."""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import relationship
+import uuid
+from app.models.entity.base import Base
+
+
+class ConversationMessage(Base):
+    """A single conversation turn, stored as its own row.
+
+    Appending a message is one INSERT instead of rewriting the whole
+    conversation history.
+    """
+
+    __tablename__ = "conversation_messages"
+    __table_args__ = (
+        UniqueConstraint("conversation_id", "seq", name="uq_conversation_messages_seq"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    conversation_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("conversations.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    seq = Column(Integer, nullable=False)  # 1-based position within the conversation
+    role = Column(String(20), nullable=False)  # user, assistant
+    ai_role = Column(String(50))
+    content = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=False, default=0)
+    # "metadata" is reserved on declarative models, map it under another attribute name
+    meta = Column("metadata", JSONB)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    conversation = relationship("Conversation", back_populates="message_rows")
+
+    def to_dict(self) -> dict:
+        """Convert to dictionary."""
+        return {
+            "id": str(self.id),
+            "conversation_id": str(self.conversation_id),
+            "seq": self.seq,
+            "role": self.role,
+            "ai_role": self.ai_role,
+            "content": self.content,
+            "token_count": self.token_count,
+            "metadata": self.meta,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
@@ -0,0 +1,46 @@
+"""Embedding chunk entity model."""
+from datetime import datetime
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import deferred
+import uuid
+from app.core.config import settings
+from app.models.entity.base import VectorBase
+
+
+class EmbeddingChunk(VectorBase):
+    """One embedded chunk of a scene, character or inspiration.
+
+    Lives in the vector database, so project and source ids are plain
+    columns without foreign keys. The embedding column is only read inside
+    SQL (distance ordering) and is deferred on the ORM side. chunk_index is
+    not unique: re-chunking an edited source renumbers reused chunks in place.
+    """
+
+    __tablename__ = "embedding_chunks"
+    __table_args__ = (
+        Index("ix_embedding_chunks_source", "source_type", "source_id"),
+        Index("ix_embedding_chunks_project", "project_id", "source_type"),
+        Index(
+            "ix_embedding_chunks_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    project_id = Column(UUID(as_uuid=True), nullable=False)
+    source_type = Column(String(20), nullable=False)  # inspiration, scene, character
+    source_id = Column(UUID(as_uuid=True), nullable=False)
+    chunk_index = Column(Integer, nullable=False)  # 0-based position within the source
+    title = Column(String(200))  # Source label shown with retrieved context
+    content = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=False)
+    # sha256 of embedder name + embedded text; unchanged chunks keep their vector
+    content_hash = Column(String(64), nullable=False)
+    embedder = Column(String(100), nullable=False)  # Embedder that produced the vector
+    embedding = deferred(Column(Vector(settings.EMBEDDING_DIMENSIONS), nullable=False))
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,30 @@
+"""Embedding job entity model."""
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID
+from app.models.entity.base import Base
+
+
+class EmbeddingJob(Base):
+    """A pending re-embedding of one scene, character or inspiration.
+
+    Written in the same transaction as the edit that caused it. The primary
+    key deduplicates repeated saves of the same source into one job; every
+    save moves enqueued_at forward so bursts of edits are embedded once
+    they settle.
+    """
+
+    __tablename__ = "embedding_jobs"
+    __table_args__ = (
+        Index("ix_embedding_jobs_enqueued", "enqueued_at"),
+        Index("ix_embedding_jobs_project", "project_id"),
+    )
+
+    source_type = Column(String(20), primary_key=True)  # inspiration, scene, character
+    source_id = Column(UUID(as_uuid=True), primary_key=True)
+    project_id = Column(UUID(as_uuid=True))
+    first_enqueued_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Oldest unprocessed edit
+    enqueued_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Latest edit
+    claimed_at = Column(DateTime)  # Set while a worker holds the job
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
@@ -1,9 +1,9 @@
 """Inspiration entity model."""
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Text
-from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Text, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 import uuid
 from app.models.entity.base import Base
 
@@ -12,6 +12,12 @@ class Inspiration(Base):
     """Inspiration model."""
 
     __tablename__ = "inspirations"
+    __table_args__ = (
+        # Keyset pagination on (created_at, id) within a project
+        Index("ix_inspirations_project_created", "project_id", "created_at", "id"),
+        Index("ix_inspirations_search", "search_vector", postgresql_using="gin"),
+        Index("ix_inspirations_tags", "tags", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
@@ -32,7 +38,10 @@ class Inspiration(Base):
         default="raw",
     )
     created_at = Column(DateTime, default=datetime.utcnow)
-    metadata = Column(JSONB)  # Inspiration-related metadata
+    # Inspiration-related metadata; "metadata" is reserved on declarative models
+    meta = Column("metadata", JSONB)
+    # Full-text index, maintained on write by app.services.search
+    search_vector = deferred(Column(TSVECTOR))
 
     # Relationships
     project = relationship("Project", back_populates="inspirations")
@@ -48,5 +57,5 @@ class Inspiration(Base):
             "tags": self.tags or [],
             "status": self.status,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "metadata": self.metadata,
+            "metadata": self.meta,
         }
@@ -1,7 +1,7 @@
 """Project entity model."""
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Text, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 import uuid
@@ -12,6 +12,11 @@ class Project(Base):
     """Project model."""
 
     __tablename__ = "projects"
+    __table_args__ = (
+        # Keyset pagination on (created_at, id)
+        Index("ix_projects_user_created", "user_id", "created_at", "id"),
+        Index("ix_projects_created", "created_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
@@ -34,6 +39,13 @@ class Project(Base):
     characters = relationship("Character", back_populates="project", cascade="all, delete-orphan")
     chapters = relationship("Chapter", back_populates="project", cascade="all, delete-orphan")
     conversations = relationship("Conversation", back_populates="project", cascade="all, delete-orphan")
+    stats = relationship(
+        "ProjectStats",
+        back_populates="project",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
     def to_dict(self) -> dict:
         """Convert to dictionary."""
@@ -0,0 +1,52 @@
+"""Project statistics entity model."""
+from datetime import datetime
+from sqlalchemy import Column, Integer, ForeignKey, DateTime
+from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import relationship
+from app.models.entity.base import Base
+
+
+class ProjectStats(Base):
+    """Materialized per-project counters.
+
+    Maintained incrementally whenever scenes, chapters, characters,
+    inspirations or conversations are written, so the project overview is a
+    single primary-key read. Can be rebuilt from the source tables.
+    """
+
+    __tablename__ = "project_stats"
+
+    project_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("projects.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    word_count = Column(Integer, nullable=False, default=0)  # Sum of scene word counts
+    chapter_count = Column(Integer, nullable=False, default=0)
+    completed_chapter_count = Column(Integer, nullable=False, default=0)
+    scene_count = Column(Integer, nullable=False, default=0)
+    character_count = Column(Integer, nullable=False, default=0)
+    inspiration_count = Column(Integer, nullable=False, default=0)
+    conversation_count = Column(Integer, nullable=False, default=0)
+    recent_activity = Column(JSONB)  # Newest-first, bounded list of activity events
+    last_activity_at = Column(DateTime)
+    rebuilt_at = Column(DateTime)  # Last full recount, None if only maintained incrementally
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    project = relationship("Project", back_populates="stats")
+
+    def to_dict(self) -> dict:
+        """Convert to dictionary."""
+        return {
+            "project_id": str(self.project_id),
+            "word_count": self.word_count or 0,
+            "chapter_count": self.chapter_count or 0,
+            "completed_chapter_count": self.completed_chapter_count or 0,
+            "scene_count": self.scene_count or 0,
+            "character_count": self.character_count or 0,
+            "inspiration_count": self.inspiration_count or 0,
+            "conversation_count": self.conversation_count or 0,
+            "last_activity_at": self.last_activity_at.isoformat() if self.last_activity_at else None,
+            "rebuilt_at": self.rebuilt_at.isoformat() if self.rebuilt_at else None,
+        }
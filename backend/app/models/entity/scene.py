@@ -1,9 +1,9 @@
 """Scene entity model."""
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
-from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 import uuid
 from app.models.entity.base import Base
 
@@ -12,6 +12,9 @@ class Scene(Base):
     """Scene model."""
 
     __tablename__ = "scenes"
+    __table_args__ = (
+        Index("ix_scenes_search", "search_vector", postgresql_using="gin"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     chapter_id = Column(UUID(as_uuid=True), ForeignKey("chapters.id"), nullable=False)
@@ -23,6 +26,8 @@ class Scene(Base):
     location = Column(String(100))
     characters = Column(ARRAY(UUID(as_uuid=True)))  # Characters involved
     mood = Column(String(50))  # Mood/tone of the scene
+    # Full-text index, maintained on write by app.services.search
+    search_vector = deferred(Column(TSVECTOR))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
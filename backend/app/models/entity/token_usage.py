@@ -0,0 +1,28 @@
+"""Token usage entity model."""
+from datetime import datetime
+from sqlalchemy import Column, BigInteger, Integer, String, ForeignKey, DateTime
+from sqlalchemy.dialects.postgresql import UUID
+from app.models.entity.base import Base
+
+
+class TokenUsage(Base):
+    """AI tokens consumed by one user in one calendar month (UTC).
+
+    Live counters are kept in Redis on the request path; this table is
+    written in batches by the metering flusher and seeds the Redis counters
+    when they are missing (new month, Redis restart).
+    """
+
+    __tablename__ = "token_usage"
+
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    period = Column(String(7), primary_key=True)  # YYYY-MM
+    input_tokens = Column(BigInteger, nullable=False, default=0)
+    output_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)  # input + output, checked against the tier quota
+    requests = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,6 +1,6 @@
 """AI related schemas."""
-from typing import Optional, List, Any, Dict
-from pydantic import BaseModel, Field
+from typing import Optional, List, Any, Dict, Union
+from pydantic import BaseModel, Field, field_validator
 from uuid import UUID
 
 
@@ -19,12 +19,14 @@ class ConversationRequest(BaseModel):
 
     ai_role: Optional[str] = None
     message: str
+    conversation_id: Optional[UUID] = None  # Continue a stored conversation
+    project_id: Optional[UUID] = None  # Start a stored conversation in this project
 
 
 class ConversationResponse(BaseModel):
     """Conversation response schema."""
 
-    conversation_id: UUID
+    conversation_id: Optional[UUID] = None  # None for stateless chats
     message: AIMessage
     suggested_actions: Optional[List[Dict[str, Any]]] = None
 
@@ -48,6 +50,77 @@ class AIResponse(BaseModel):
     metadata: Dict[str, Any]
 
 
+class RoleFanoutRequest(BaseModel):
+    """Send one message to several AI roles at once."""
+
+    roles: List[str] = Field(..., min_length=1)
+    message: str
+    timeout: Optional[float] = Field(None, gt=0)  # seconds per role, capped by AI_FANOUT_MAX_TIMEOUT
+
+    @field_validator("roles")
+    @classmethod
+    def unique_roles(cls, value: List[str]) -> List[str]:
+        if len(set(value)) != len(value):
+            raise ValueError("roles must not repeat")
+        return value
+
+
+class RoleFanoutResult(BaseModel):
+    """One role's reply in a fan-out."""
+
+    role: str
+    status: str  # completed, timeout, failed
+    text: str  # Partial text when the role timed out
+    error: Optional[str] = None
+    usage: Dict[str, Any] = Field(default_factory=dict)
+    elapsed: float  # seconds spent generating, excluding time queued
+
+
+class RoleFanoutResponse(BaseModel):
+    """Replies of every role, in request order."""
+
+    results: List[RoleFanoutResult]
+    elapsed: float
+
+
+class PipelineStepSpec(BaseModel):
+    """One template call in a writing pipeline."""
+
+    id: str = Field(..., min_length=1, max_length=64)
+    template_id: str
+    variables: Dict[str, Any] = Field(default_factory=dict)  # Literal template variables
+    # Variable -> "input.<key>", "<step>" or "<step>.<field path>"; a list is joined in order
+    inputs: Dict[str, Union[str, List[str]]] = Field(default_factory=dict)
+    role_id: Optional[str] = None
+    response_format: Optional[str] = Field(None, pattern="^(text|json)$")  # Default follows the template
+
+
+class PipelineRequest(BaseModel):
+    """Run a preset or custom template DAG as a background job."""
+
+    preset: Optional[str] = None  # e.g. creative_flow
+    steps: Optional[List[PipelineStepSpec]] = None
+    inputs: Dict[str, Any] = Field(default_factory=dict)
+
+
+class TemplateGenerationRequest(BaseModel):
+    """Run one prompt template, e.g. a suggested next step."""
+
+    template_id: str
+    variables: Dict[str, Any] = Field(default_factory=dict)
+    role_id: Optional[str] = None  # Role system prompt and sampling settings
+
+
+class BatchJobRequest(BaseModel):
+    """Bulk offline generation through a provider batch API."""
+
+    kind: str = Field(..., pattern="^(quality_analysis|character_profile)$")
+    project_id: UUID
+    content_type: str = "full"  # Diagnosis scope for quality_analysis
+    character_ids: Optional[List[UUID]] = None  # Only these characters; default all in the project
+    core_conflict: Optional[str] = None  # Defaults to project settings, then the title
+
+
 class GenerateContentRequest(BaseModel):
     """Content generation request."""
 
@@ -57,6 +130,15 @@ class GenerateContentRequest(BaseModel):
     options: Optional[Dict[str, Any]] = None
 
 
+class ChapterGenerationRequest(BaseModel):
+    """Whole-chapter generation request, run as a background job."""
+
+    chapter_id: UUID
+    instructions: Optional[str] = None  # Extra guidance applied to every scene
+    save: bool = False  # Write generated text back to the scenes
+    overwrite: bool = False  # Regenerate scenes that already have content
+
+
 class OptimizeContentRequest(BaseModel):
     """Content optimization request."""
 
@@ -93,6 +175,14 @@ class QualityScore(BaseModel):
     total: int = Field(..., ge=0, le=100)
 
 
+class QualitySection(BaseModel):
+    """Merged quality result for one chapter."""
+
+    location: str
+    scores: QualityScore
+    issue_count: int
+
+
 class QualityAnalysisResponse(BaseModel):
     """Quality analysis response."""
 
@@ -100,3 +190,18 @@ class QualityAnalysisResponse(BaseModel):
     issues: List[QualityIssue]
     suggestions: List[str]
     analyzed_at: str
+    sections: List[QualitySection] = Field(default_factory=list)  # Per-chapter breakdown
+    stats: Dict[str, int] = Field(default_factory=dict)  # chunks, cached, analyzed, failed
+
+
+class TokenUsageResponse(BaseModel):
+    """A user's AI token usage for the current month."""
+
+    period: str  # YYYY-MM (UTC)
+    used: int  # input + output tokens settled this month
+    reserved: int  # Held by streaming calls still in progress
+    input_tokens: int
+    output_tokens: int
+    requests: int
+    limit: Optional[int] = None  # None when the tier is unlimited
+    remaining: Optional[int] = None
@@ -0,0 +1,53 @@
+"""Character schemas."""
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, Field
+from uuid import UUID
+
+
+class CharacterBase(BaseModel):
+    """Base character schema."""
+
+    name: str = Field(..., min_length=1, max_length=100)
+    role_type: Optional[str] = Field(
+        None, pattern="^(protagonist|antagonist|supporting|minor)$"
+    )
+    profile: Optional[dict] = None
+    relationships: Optional[dict] = None
+    arc_data: Optional[dict] = None
+
+
+class CharacterCreate(CharacterBase):
+    """Character creation schema."""
+
+    pass
+
+
+class CharacterUpdate(BaseModel):
+    """Character update schema."""
+
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    role_type: Optional[str] = Field(
+        None, pattern="^(protagonist|antagonist|supporting|minor)$"
+    )
+    profile: Optional[dict] = None
+    relationships: Optional[dict] = None
+    arc_data: Optional[dict] = None
+
+
+class CharacterInDB(CharacterBase):
+    """Character schema as stored in database."""
+
+    id: UUID
+    project_id: UUID
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class CharacterResponse(CharacterInDB):
+    """Character response schema."""
+
+    pass
@@ -0,0 +1,62 @@
+"""Conversation schemas."""
+from datetime import datetime
+from typing import Optional, List, Any, Dict
+from pydantic import BaseModel, Field
+from uuid import UUID
+
+
+class ConversationCreate(BaseModel):
+    """Conversation creation schema."""
+
+    ai_role: Optional[str] = Field(None, max_length=50)
+    context: Optional[dict] = None
+
+
+class MessageAdd(BaseModel):
+    """Schema for adding a user message to a conversation."""
+
+    content: str = Field(..., min_length=1)
+    ai_role: Optional[str] = None  # Overrides the conversation's role for this turn
+
+
+class MessageResponse(BaseModel):
+    """Conversation message response schema."""
+
+    id: UUID
+    seq: int
+    role: str
+    ai_role: Optional[str] = None
+    content: str
+    token_count: int = 0
+    metadata: Optional[Dict[str, Any]] = Field(None, validation_alias="meta")
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ConversationResponse(BaseModel):
+    """Conversation response schema."""
+
+    id: UUID
+    project_id: UUID
+    user_id: UUID
+    ai_role: Optional[str] = None
+    context: Optional[dict] = None
+    summary: Optional[str] = None
+    message_count: int = 0
+    created_at: datetime
+    updated_at: datetime
+    recent_messages: List[MessageResponse] = Field(default_factory=list)
+
+    class Config:
+        from_attributes = True
+
+
+class ConversationTurnResponse(BaseModel):
+    """Result of one conversation turn: the stored user and assistant messages."""
+
+    conversation_id: UUID
+    user_message: MessageResponse
+    message: MessageResponse
+    suggested_actions: Optional[List[Dict[str, Any]]] = None
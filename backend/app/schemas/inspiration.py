@@ -39,6 +39,7 @@ class InspirationInDB(InspirationBase):
     user_id: UUID
     category: str
     status: str
+    metadata: Optional[dict] = Field(None, validation_alias="meta")
     created_at: datetime
 
     class Config:
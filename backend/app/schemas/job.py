@@ -0,0 +1,29 @@
+"""Background job schemas."""
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, Field
+
+
+class JobCreate(BaseModel):
+    """Submit a background job."""
+
+    type: str  # ai.template, ai.quality_analysis, ai.chapter_generation
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class JobResponse(BaseModel):
+    """Background job status."""
+
+    id: str
+    type: str
+    status: str  # queued, running, succeeded, failed, cancelled
+    progress: float  # 0..1
+    message: Optional[str] = None  # Latest progress message
+    error: Optional[str] = None
+    attempts: int
+    cancel_requested: bool = False
+    idempotency_key: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    # Relative URLs for polling, results and the event stream
+    links: Dict[str, str] = Field(default_factory=dict)
@@ -0,0 +1,15 @@
+"""Pagination schemas."""
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+
+class Page(BaseModel):
+    """A keyset-paginated list page.
+
+    Items contain only the requested fields; pass ``next_cursor`` as
+    ``cursor`` to fetch the following page.
+    """
+
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
+    limit: int
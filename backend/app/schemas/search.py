@@ -0,0 +1,41 @@
+"""Search schemas."""
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+from uuid import UUID
+
+
+class SearchHit(BaseModel):
+    """A single ranked search result."""
+
+    type: str  # inspiration, scene, character
+    id: UUID
+    title: Optional[str] = None
+    snippet: str
+    rank: float
+
+    class Config:
+        from_attributes = True
+
+
+class SearchResults(BaseModel):
+    """A page of search results."""
+
+    items: List[SearchHit]
+    next_cursor: Optional[str] = None
+    terms: List[str]  # Index terms the query was split into
+
+
+class EmbeddingQueueStatus(BaseModel):
+    """Pending re-embedding work."""
+
+    queued: int
+    in_progress: int
+    retrying: int
+    oldest_wait_seconds: float
+
+
+class EmbeddingIndexStatus(BaseModel):
+    """Freshness of a project's semantic index."""
+
+    queue: EmbeddingQueueStatus
+    chunks: Dict[str, int]  # Indexed chunks per source type
@@ -1,36 +1,93 @@
 """AI服务管理器."""
-from typing import Optional, Dict, List, Any
-from app.services.ai.anthropic_service import AnthropicService
-from app.services.ai.openai_service import OpenAIService
+import asyncio
+import importlib
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+from app.services.ai.cache import ResponseCache, create_response_cache
+from app.services.ai.coalescing import RequestCoalescer
+from app.services.ai.http_client import close_http_client, open_http_client
+from app.services.ai.exceptions import AIPromptTooLongError
+from app.services.ai.rate_limiter import create_rate_limiter
+from app.services.ai.router import RouteTarget, create_provider_router
+from app.services.ai.tokenizer import token_counter
 from app.core.config import settings
+from app.core.context import metered_user
 from app.schemas.ai import AIResponse
 
+logger = logging.getLogger(__name__)
+
+
+# 提供商注册表：服务模块、服务类、所需的API密钥配置项
+# 服务模块（及其SDK）在首次使用该提供商时才导入
+PROVIDER_REGISTRY: Dict[str, Dict[str, Any]] = {
+    "anthropic": {
+        "module": "app.services.ai.anthropic_service",
+        "class": "AnthropicService",
+        "api_key_setting": "ANTHROPIC_API_KEY",
+        "model_prefixes": ("claude",),
+    },
+    "openai": {
+        "module": "app.services.ai.openai_service",
+        "class": "OpenAIService",
+        "api_key_setting": "OPENAI_API_KEY",
+        "model_prefixes": ("gpt", "o1", "chatgpt"),
+    },
+}
+
 
 class AIServiceManager:
     """AI服务管理器，统一管理不同的AI提供商."""
 
     def __init__(self):
-        """初始化AI服务管理器."""
+        """初始化AI服务管理器.
+
+        不在此处创建任何提供商客户端，服务实例在首次使用时按需创建，
+        因此没有配置API密钥时应用也能正常启动。
+        """
         self.services = {}
-        self._init_services()
+        self.cache = create_response_cache()
+        self.coalescer = RequestCoalescer(enabled=settings.AI_COALESCE_ENABLED)
+        self.router = create_provider_router()
+        self.rate_limiter = create_rate_limiter()
+        self.token_counter = token_counter
+        self._meter = None
+        # 用户发起调用时依次调用listener(user_id, request_key)，如预取器据此取消偏离的预取
+        self.request_listeners: List[Callable[[str, str], None]] = []
 
-    def _init_services(self):
-        """初始化可用的AI服务."""
-        provider = settings.AI_PROVIDER.lower()
+    @property
+    def meter(self):
+        """token计量器，首次使用时才导入（计量模块依赖数据库）."""
+        if self._meter is None:
+            from app.services.metering import token_meter
 
-        if provider in ["anthropic", "both"]:
-            if settings.ANTHROPIC_API_KEY:
-                self.services["anthropic"] = AnthropicService()
+            self._meter = token_meter
+        return self._meter
 
-        if provider in ["openai", "both"]:
-            if settings.OPENAI_API_KEY:
-                self.services["openai"] = OpenAIService()
+    def available_providers(self) -> List[str]:
+        """获取已配置（选中且有API密钥）的提供商.
 
-        if not self.services:
-            raise ValueError("No AI service available. Please configure API keys.")
+        Returns:
+            提供商名称列表
+        """
+        provider = settings.AI_PROVIDER.lower()
+        selected = ["anthropic", "openai"] if provider == "both" else [provider]
+
+        return [
+            name
+            for name in selected
+            if name in PROVIDER_REGISTRY
+            and getattr(settings, PROVIDER_REGISTRY[name]["api_key_setting"])
+        ]
+
+    def _create_service(self, provider: str):
+        """导入提供商模块并创建服务实例."""
+        entry = PROVIDER_REGISTRY[provider]
+        module = importlib.import_module(entry["module"])
+        return getattr(module, entry["class"])()
 
     def get_service(self, provider: Optional[str] = None):
-        """获取AI服务.
+        """获取AI服务，首次使用时创建.
 
         Args:
             provider: 服务提供商（anthropic/openai）
@@ -41,15 +98,37 @@ class AIServiceManager:
         Raises:
             ValueError: 如果服务不可用
         """
+        available = self.available_providers()
+        if not available:
+            raise ValueError("No AI service available. Please configure API keys.")
+
         if not provider:
             # 使用第一个可用的服务
-            provider = next(iter(self.services.keys()))
+            provider = available[0]
 
-        if provider not in self.services:
+        if provider not in available:
             raise ValueError(f"AI service '{provider}' not available")
 
+        if provider not in self.services:
+            self.services[provider] = self._create_service(provider)
+
         return self.services[provider]
 
+    def warm_up(self) -> List[str]:
+        """预先创建所有已配置的服务实例（导入SDK、构建客户端）.
+
+        Returns:
+            成功预热的提供商列表
+        """
+        warmed = []
+        for provider in self.available_providers():
+            try:
+                self.get_service(provider)
+                warmed.append(provider)
+            except Exception as e:
+                logger.warning("AI service warm-up failed for %s: %s", provider, e)
+        return warmed
+
     async def complete(
         self,
         prompt: str,
@@ -59,6 +138,8 @@ class AIServiceManager:
         model: Optional[str] = None,
         provider: Optional[str] = None,
         response_format: Optional[str] = None,
+        use_cache: Optional[bool] = None,
+        prompt_prefix: Optional[str] = None,
     ) -> AIResponse:
         """完成文本生成.
 
@@ -70,20 +151,119 @@ class AIServiceManager:
             model: 模型名称
             provider: 服务提供商
             response_format: 响应格式
+            use_cache: 是否使用响应缓存，None表示只缓存temperature=0的调用，
+                False表示绕过缓存
+            prompt_prefix: 用户提示词的稳定前缀（如模板说明），放在prompt之前并
+                标记为提供商提示词缓存的前缀
 
         Returns:
             AI响应对象
         """
-        service = self.get_service(provider)
-        return await service.complete(
-            prompt=prompt,
+        temperature = temperature if temperature is not None else settings.DEFAULT_TEMPERATURE
+        request_key = self.complete_key(
+            prompt,
             system_prompt=system_prompt,
             temperature=temperature,
             max_tokens=max_tokens,
             model=model,
+            provider=provider,
+            response_format=response_format,
+            prompt_prefix=prompt_prefix,
+        )
+
+        self._notify_request(request_key)
+        use_response_cache = self.cache.should_cache(temperature, use_cache)
+        if use_response_cache:
+            cached = await self.cache.get(request_key)
+            if cached is not None:
+                return cached
+        elif self.cache.enabled:
+            # 预取的结果只使用一次，此时才计入当前用户的用量
+            prefetched = await self.cache.take(self.prefetch_key(request_key))
+            if prefetched is not None:
+                await self.meter.record(metered_user.get(), prefetched.metadata.get("usage"))
+                return prefetched
+
+        async def call() -> AIResponse:
+            response = await self._dispatch(
+                provider,
+                model,
+                lambda service, target_model: self._budgeted_complete(
+                    service,
+                    target_model,
+                    prompt=prompt,
+                    system_prompt=system_prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    response_format=response_format,
+                    prompt_prefix=prompt_prefix,
+                ),
+                estimated_tokens=self._estimate_tokens(
+                    [{"content": prompt_prefix}, {"content": prompt}],
+                    system_prompt,
+                    model,
+                    max_tokens,
+                ),
+            )
+            if use_response_cache:
+                await self.cache.set(request_key, response)
+            return response
+
+        # 缓存命中不计量；其余调用先检查当前用户的配额，结束后按实际用量记账
+        user_id = metered_user.get()
+        await self.meter.check(user_id)
+        response = await self.coalescer.run(request_key, call)
+        await self.meter.record(user_id, response.metadata.get("usage"))
+        return response
+
+    @staticmethod
+    def complete_key(
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        provider: Optional[str] = None,
+        response_format: Optional[str] = None,
+        prompt_prefix: Optional[str] = None,
+    ) -> str:
+        """单轮生成的请求键（缓存、合并和预取共用）.
+
+        按实际生效的参数计算，默认值与显式传入默认值视为同一请求。
+        """
+        return ResponseCache.make_key(
+            kind="complete",
+            provider=provider or "auto",
+            model=model,
+            system_prompt=system_prompt,
+            temperature=temperature if temperature is not None else settings.DEFAULT_TEMPERATURE,
+            max_tokens=max_tokens or settings.DEFAULT_MAX_TOKENS,
             response_format=response_format,
+            prompt_prefix=prompt_prefix,
+            prompt=prompt,
         )
 
+    def _notify_request(self, request_key: str):
+        """通知请求监听者当前用户发起了一次调用（没有计量用户的内部调用不通知）."""
+        user_id = metered_user.get()
+        if user_id is None:
+            return
+        for listener in self.request_listeners:
+            try:
+                listener(user_id, request_key)
+            except Exception as e:
+                logger.warning("Request listener failed: %s", e)
+
+    @staticmethod
+    def prefetch_key(request_key: str) -> str:
+        """预取结果在响应缓存中的键，与普通缓存条目分开."""
+        return ResponseCache.make_key(kind="prefetch", request_key=request_key)
+
+    async def store_prefetched(self, request_key: str, response: AIResponse, ttl: Optional[int] = None):
+        """把预取的生成结果写入响应缓存，下一次相同的complete调用直接返回."""
+        response.metadata["prefetched"] = True
+        await self.cache.set(self.prefetch_key(request_key), response, ttl)
+
     async def chat(
         self,
         messages: List[Dict[str, str]],
@@ -106,14 +286,37 @@ class AIServiceManager:
         Returns:
             AI响应对象
         """
-        service = self.get_service(provider)
-        return await service.chat(
-            messages=messages,
-            system_prompt=system_prompt,
-            temperature=temperature,
-            max_tokens=max_tokens,
+        request_key = ResponseCache.make_key(
+            kind="chat",
+            provider=provider or "auto",
             model=model,
+            system_prompt=system_prompt,
+            temperature=temperature if temperature is not None else settings.DEFAULT_TEMPERATURE,
+            max_tokens=max_tokens or settings.DEFAULT_MAX_TOKENS,
+            messages=messages,
+        )
+        self._notify_request(request_key)
+
+        user_id = metered_user.get()
+        await self.meter.check(user_id)
+        response = await self.coalescer.run(
+            request_key,
+            lambda: self._dispatch(
+                provider,
+                model,
+                lambda service, target_model: self._budgeted_chat(
+                    service,
+                    target_model,
+                    messages=messages,
+                    system_prompt=system_prompt,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                ),
+                estimated_tokens=self._estimate_tokens(messages, system_prompt, model, max_tokens),
+            ),
         )
+        await self.meter.record(user_id, response.metadata.get("usage"))
+        return response
 
     async def stream_complete(
         self,
@@ -123,6 +326,8 @@ class AIServiceManager:
         max_tokens: Optional[int] = None,
         model: Optional[str] = None,
         provider: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        prompt_prefix: Optional[str] = None,
     ):
         """流式完成文本生成.
 
@@ -133,20 +338,452 @@ class AIServiceManager:
             max_tokens: 最大token数
             model: 模型名称
             provider: 服务提供商
+            usage: 可选，流结束后写入token用量及实际使用的提供商和模型
+            prompt_prefix: 用户提示词的稳定前缀，放在prompt之前
+
+        Yields:
+            文本片段
+        """
+        async for chunk in self._stream(
+            request_key=ResponseCache.make_key(
+                kind="stream_complete",
+                provider=provider or "auto",
+                model=model,
+                system_prompt=system_prompt,
+                temperature=temperature if temperature is not None else settings.DEFAULT_TEMPERATURE,
+                max_tokens=max_tokens or settings.DEFAULT_MAX_TOKENS,
+                prompt_prefix=prompt_prefix,
+                prompt=prompt,
+            ),
+            provider=provider,
+            model=model,
+            call=lambda service, target_model, call_usage: self._budgeted_stream(
+                service,
+                target_model,
+                call_usage,
+                prompt=prompt,
+                prompt_prefix=prompt_prefix,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            ),
+            estimated_tokens=self._estimate_tokens(
+                [{"content": prompt_prefix}, {"content": prompt}],
+                system_prompt,
+                model,
+                max_tokens,
+            ),
+            usage=usage,
+        ):
+            yield chunk
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        provider: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+    ):
+        """流式对话模式.
+
+        Args:
+            messages: 消息历史
+            system_prompt: 系统提示词
+            temperature: 温度参数
+            max_tokens: 最大token数
+            model: 模型名称
+            provider: 服务提供商
+            usage: 可选，流结束后写入token用量及实际使用的提供商和模型
 
         Yields:
             文本片段
         """
-        service = self.get_service(provider)
-        async for chunk in service.stream_complete(
+        async for chunk in self._stream(
+            request_key=ResponseCache.make_key(
+                kind="stream_chat",
+                provider=provider or "auto",
+                model=model,
+                system_prompt=system_prompt,
+                temperature=temperature if temperature is not None else settings.DEFAULT_TEMPERATURE,
+                max_tokens=max_tokens or settings.DEFAULT_MAX_TOKENS,
+                messages=messages,
+            ),
+            provider=provider,
+            model=model,
+            call=lambda service, target_model, call_usage: self._budgeted_stream(
+                service,
+                target_model,
+                call_usage,
+                messages=messages,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            ),
+            estimated_tokens=self._estimate_tokens(messages, system_prompt, model, max_tokens),
+            usage=usage,
+        ):
+            yield chunk
+
+    def _estimate_tokens(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str],
+        model: Optional[str],
+        max_tokens: Optional[int],
+    ) -> int:
+        """预估一次调用的token消耗（输入+最大输出），用于出站限流."""
+        return self.token_counter.count_messages(messages, system_prompt, model) + (
+            max_tokens or settings.DEFAULT_MAX_TOKENS
+        )
+
+    async def _budgeted_complete(
+        self,
+        service,
+        model: str,
+        prompt: str,
+        system_prompt: Optional[str],
+        max_tokens: Optional[int],
+        prompt_prefix: Optional[str] = None,
+        **kwargs,
+    ) -> AIResponse:
+        """在目标模型的token预算内调用单轮生成，并在metadata中记录预算."""
+        prompt, budget = self.token_counter.budget_prompt(
+            model, prompt, system_prompt, max_tokens, prompt_prefix
+        )
+        response = await service.complete(
             prompt=prompt,
+            prompt_prefix=prompt_prefix,
             system_prompt=system_prompt,
-            temperature=temperature,
-            max_tokens=max_tokens,
+            max_tokens=budget.max_tokens,
             model=model,
-        ):
+            **kwargs,
+        )
+        response.metadata["tokens"] = budget.as_metadata()
+        return response
+
+    async def _budgeted_chat(
+        self,
+        service,
+        model: str,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str],
+        max_tokens: Optional[int],
+        **kwargs,
+    ) -> AIResponse:
+        """在目标模型的token预算内调用对话，并在metadata中记录预算."""
+        messages, budget = self.token_counter.budget_messages(
+            model, messages, system_prompt, max_tokens
+        )
+        response = await service.chat(
+            messages=messages,
+            system_prompt=system_prompt,
+            max_tokens=budget.max_tokens,
+            model=model,
+            **kwargs,
+        )
+        response.metadata["tokens"] = budget.as_metadata()
+        return response
+
+    async def _budgeted_stream(
+        self,
+        service,
+        model: str,
+        usage: Dict[str, Any],
+        system_prompt: Optional[str],
+        max_tokens: Optional[int],
+        prompt: Optional[str] = None,
+        prompt_prefix: Optional[str] = None,
+        messages: Optional[List[Dict[str, str]]] = None,
+        **kwargs,
+    ):
+        """在目标模型的token预算内发起流式调用，预算写入usage的tokens字段."""
+        if messages is None:
+            prompt, budget = self.token_counter.budget_prompt(
+                model, prompt, system_prompt, max_tokens, prompt_prefix
+            )
+            stream = service.stream_complete(
+                prompt=prompt,
+                prompt_prefix=prompt_prefix,
+                system_prompt=system_prompt,
+                max_tokens=budget.max_tokens,
+                model=model,
+                usage=usage,
+                **kwargs,
+            )
+        else:
+            messages, budget = self.token_counter.budget_messages(
+                model, messages, system_prompt, max_tokens
+            )
+            stream = service.stream_chat(
+                messages=messages,
+                system_prompt=system_prompt,
+                max_tokens=budget.max_tokens,
+                model=model,
+                usage=usage,
+                **kwargs,
+            )
+        usage["tokens"] = budget.as_metadata()
+
+        async for chunk in stream:
             yield chunk
 
+    async def _stream(
+        self,
+        request_key: str,
+        provider: Optional[str],
+        model: Optional[str],
+        call,
+        estimated_tokens: int,
+        usage: Optional[Dict[str, Any]],
+    ):
+        """合并相同的并发流，并按路由策略执行.
+
+        流式调用的输出长度事先未知，先为当前用户预留预估token（超出配额时
+        在发起请求前拒绝），流结束、出错或被客户端中断后按实际用量结算。
+        """
+        if usage is None:
+            usage = {}
+        self._notify_request(request_key)
+        reservation = await self.meter.reserve(metered_user.get(), estimated_tokens)
+        try:
+            async for chunk in self.coalescer.stream(
+                request_key,
+                lambda shared_usage: self._dispatch_stream(
+                    provider, model, call, estimated_tokens, shared_usage
+                ),
+                usage=usage,
+            ):
+                yield chunk
+        finally:
+            await self.meter.settle(reservation, usage)
+
+    def route_targets(
+        self, provider: Optional[str] = None, model: Optional[str] = None
+    ) -> List[RouteTarget]:
+        """获取按健康度排序的候选后端.
+
+        指定provider时只使用该提供商；只指定model时使用能服务该模型的提供商；
+        都不指定时在所有已配置的提供商之间负载均衡。
+
+        Args:
+            provider: 服务提供商
+            model: 模型名称
+
+        Returns:
+            (提供商, 模型)列表，最健康的在前
+        """
+        if provider:
+            names = [provider]
+        else:
+            names = self.available_providers()
+            if model:
+                matched = [
+                    name
+                    for name in names
+                    if model.startswith(PROVIDER_REGISTRY[name]["model_prefixes"])
+                ]
+                names = matched or names[:1]
+
+        targets = []
+        for name in names:
+            service = self.get_service(name)
+            targets.append((name, model or service.default_model))
+        return self.router.rank(targets)
+
+    async def _timed_call(
+        self,
+        target: RouteTarget,
+        call,
+        attempted: List[RouteTarget],
+        estimated_tokens: int,
+    ):
+        """在限流下调用一个后端，并记录每次尝试的延迟和结果."""
+        attempted.append(target)
+        service = self.get_service(target[0])
+
+        async def attempt():
+            # 只统计提供商本身的耗时，不包括限流排队时间
+            started = time.monotonic()
+            try:
+                result = await call(service, target[1])
+            except (asyncio.CancelledError, AIPromptTooLongError):
+                # 调用前就被拒绝的请求不反映后端健康状况
+                raise
+            except Exception:
+                self.router.record(target, time.monotonic() - started, ok=False)
+                raise
+            self.router.record(target, time.monotonic() - started, ok=True)
+            return result
+
+        return await self.rate_limiter.run(target[0], estimated_tokens, attempt)
+
+    async def _hedged_call(
+        self,
+        primary: RouteTarget,
+        backup: RouteTarget,
+        delay: float,
+        call,
+        attempted: List[RouteTarget],
+        estimated_tokens: int,
+    ):
+        """对冲调用：主后端超过p95仍未返回时，向备用后端再发一次，取先成功者."""
+        primary_task = asyncio.create_task(
+            self._timed_call(primary, call, attempted, estimated_tokens)
+        )
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            return primary_task.result()
+
+        self.router.count("hedges")
+        backup_task = asyncio.create_task(
+            self._timed_call(backup, call, attempted, estimated_tokens)
+        )
+        pending = {primary_task, backup_task}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup_task:
+                            self.router.count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _dispatch(
+        self,
+        provider: Optional[str],
+        model: Optional[str],
+        call,
+        estimated_tokens: int = 0,
+    ):
+        """按路由策略调用后端，失败时故障转移到下一个后端.
+
+        Args:
+            provider: 调用方指定的提供商
+            model: 调用方指定的模型
+            call: 接收(服务实例, 模型名)并返回协程的函数
+            estimated_tokens: 预估token消耗，用于出站限流
+
+        Returns:
+            第一个成功后端的结果
+        """
+        targets = self.route_targets(provider, model)
+        attempted: List[RouteTarget] = []
+        last_error: Optional[Exception] = None
+
+        while len(attempted) < len(targets):
+            remaining = [t for t in targets if t not in attempted]
+            primary = remaining[0]
+            backup = remaining[1] if len(remaining) > 1 else None
+            delay = self.router.hedge_delay(primary) if backup else None
+
+            try:
+                if delay is None:
+                    return await self._timed_call(primary, call, attempted, estimated_tokens)
+                return await self._hedged_call(
+                    primary, backup, delay, call, attempted, estimated_tokens
+                )
+            except Exception as e:
+                last_error = e
+                if len(attempted) < len(targets):
+                    self.router.count("failovers")
+                    logger.warning("AI backend %s:%s failed, failing over: %s", *primary, e)
+
+        raise last_error
+
+    async def _dispatch_stream(
+        self,
+        provider: Optional[str],
+        model: Optional[str],
+        call,
+        estimated_tokens: int = 0,
+        usage: Optional[Dict[str, Any]] = None,
+    ):
+        """流式调用的故障转移：只有在尚未输出任何片段时才切换后端.
+
+        Args:
+            provider: 调用方指定的提供商
+            model: 调用方指定的模型
+            call: 接收(服务实例, 模型名, 用量字典)并返回异步生成器的函数
+            estimated_tokens: 预估token消耗，用于出站限流
+            usage: 可选，流结束后写入token用量及实际使用的提供商和模型
+
+        Yields:
+            文本片段
+        """
+        targets = self.route_targets(provider, model)
+        last_error: Optional[Exception] = None
+        if usage is None:
+            usage = {}
+
+        for index, target in enumerate(targets):
+            service = self.get_service(target[0])
+            produced = False
+            usage.clear()
+            try:
+                async for chunk in self.rate_limiter.stream(
+                    target[0],
+                    estimated_tokens,
+                    lambda: call(service, target[1], usage),
+                    usage=usage,
+                ):
+                    produced = True
+                    yield chunk
+            except Exception as e:
+                # 流式调用的总耗时与输出长度相关，只计入成功率
+                if not isinstance(e, AIPromptTooLongError):
+                    self.router.record(target, None, ok=False)
+                if produced:
+                    raise
+                last_error = e
+                if index + 1 < len(targets):
+                    self.router.count("failovers")
+                    logger.warning("AI backend %s:%s failed, failing over: %s", *target, e)
+                continue
+
+            self.router.record(target, None, ok=True)
+            usage.update(provider=target[0], model=target[1])
+            return
+
+        raise last_error
+
+    async def startup(self):
+        """应用启动时打开共享HTTP连接池，按配置预热服务."""
+        await open_http_client()
+        if settings.AI_WARMUP_ON_STARTUP:
+            self.warm_up()
+
+    async def shutdown(self):
+        """应用关闭时释放连接池和缓存连接."""
+        await close_http_client()
+        await self.cache.close()
+        # 服务实例持有已关闭的连接池，下次使用时重新创建
+        self.services.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取AI服务运行指标.
+
+        Returns:
+            各子系统的统计数据
+        """
+        return {
+            "providers": self.available_providers(),
+            "initialized_providers": list(self.services.keys()),
+            "cache": self.cache.stats(),
+            "coalescing": self.coalescer.stats(),
+            "routing": self.router.stats(),
+            "rate_limit": self.rate_limiter.stats(),
+            "metering": self.meter.get_metrics(),
+        }
+
 
 # 全局AI服务管理器实例
 ai_manager = AIServiceManager()
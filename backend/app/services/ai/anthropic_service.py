@@ -1,23 +1,95 @@
 """Anthropic Claude AI服务."""
 import asyncio
 from typing import Dict, List, Optional, Any
-import anthropic
+import httpx
 from app.core.config import settings
+from app.services.ai.batch import ENDED, IN_PROGRESS, BatchItemResult, BatchRequest, BatchStatus
+from app.services.ai.exceptions import wrap_provider_error
+from app.services.ai.json_stream import parse_json_lenient
+from app.services.ai.http_client import create_http_timeout, get_http_client
 from app.schemas.ai import AIResponse
 
 
 class AnthropicService:
     """Anthropic Claude API服务."""
 
-    def __init__(self):
-        """初始化Anthropic服务."""
+    provider_name = "anthropic"
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """初始化Anthropic服务.
+
+        Args:
+            http_client: 共享HTTP客户端，默认使用全局连接池
+        """
         if not settings.ANTHROPIC_API_KEY:
             raise ValueError("ANTHROPIC_API_KEY not configured")
 
-        self.client = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+        # SDK导入较慢，延迟到首次创建服务时
+        import anthropic
+
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            http_client=http_client or get_http_client(),
+            # SDK会按请求覆盖客户端超时，这里显式传入同一配置
+            timeout=create_http_timeout(),
+        )
         self.default_model = settings.DEFAULT_MODEL
         self.default_temperature = settings.DEFAULT_TEMPERATURE
         self.default_max_tokens = settings.DEFAULT_MAX_TOKENS
+        self.prompt_cache_enabled = settings.ANTHROPIC_PROMPT_CACHE_ENABLED
+
+    def _cacheable(self, text: str) -> Any:
+        """把文本包装为带缓存断点的内容块，未启用提示词缓存时原样返回."""
+        if not self.prompt_cache_enabled:
+            return text
+        return [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+
+    def _user_content(self, prompt: str, prompt_prefix: Optional[str]) -> Any:
+        """构建用户消息内容：稳定前缀作为缓存块在前，可变部分在后."""
+        if not prompt_prefix:
+            return prompt
+        if not self.prompt_cache_enabled:
+            return prompt_prefix + "\n" + prompt
+        return self._cacheable(prompt_prefix) + [{"type": "text", "text": prompt}]
+
+    def _history(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """在多轮对话的最后一条消息上设置缓存断点，下一轮可以复用整段历史."""
+        if not self.prompt_cache_enabled or len(messages) < 2:
+            return messages
+
+        last = messages[-1]
+        if not isinstance(last.get("content"), str):
+            return messages
+        return messages[:-1] + [{**last, "content": self._cacheable(last["content"])}]
+
+    def _request_params(
+        self,
+        messages: List[Dict[str, Any]],
+        system_prompt: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        model: Optional[str],
+    ) -> Dict[str, Any]:
+        """构建Messages API请求参数，系统提示词作为缓存前缀."""
+        params = {
+            "model": model or self.default_model,
+            "max_tokens": max_tokens or self.default_max_tokens,
+            "temperature": temperature if temperature is not None else self.default_temperature,
+            "messages": messages,
+        }
+        if system_prompt:
+            params["system"] = self._cacheable(system_prompt)
+        return params
+
+    @staticmethod
+    def _usage(usage: Any) -> Dict[str, int]:
+        """提取token用量，包括提示词缓存的写入和读取token数."""
+        return {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+        }
 
     async def complete(
         self,
@@ -27,6 +99,7 @@ class AnthropicService:
         max_tokens: Optional[int] = None,
         model: Optional[str] = None,
         response_format: Optional[str] = None,  # "text" or "json"
+        prompt_prefix: Optional[str] = None,
     ) -> AIResponse:
         """完成文本生成.
 
@@ -37,21 +110,18 @@ class AnthropicService:
             max_tokens: 最大token数
             model: 模型名称
             response_format: 响应格式
+            prompt_prefix: 用户提示词的稳定前缀（如模板说明），作为缓存块放在prompt之前
 
         Returns:
             AI响应对象
         """
         try:
             # 构建消息
-            messages = [{"role": "user", "content": prompt}]
+            messages = [{"role": "user", "content": self._user_content(prompt, prompt_prefix)}]
 
             # 调用Claude API
             response = await self.client.messages.create(
-                model=model or self.default_model,
-                max_tokens=max_tokens or self.default_max_tokens,
-                temperature=temperature or self.default_temperature,
-                system=system_prompt,
-                messages=messages,
+                **self._request_params(messages, system_prompt, temperature, max_tokens, model)
             )
 
             # 提取响应文本
@@ -60,12 +130,8 @@ class AnthropicService:
             # 如果要求JSON格式，尝试解析
             structured_data = None
             if response_format == "json":
-                try:
-                    import json
-
-                    structured_data = json.loads(text)
-                except json.JSONDecodeError:
-                    pass  # 如果不是有效JSON，保持为文本
+                # 容忍说明文字和被截断的尾部，无法修复时保持为文本
+                structured_data = parse_json_lenient(text)
 
             return AIResponse(
                 text=text,
@@ -74,15 +140,12 @@ class AnthropicService:
                 metadata={
                     "model": model or self.default_model,
                     "provider": "anthropic",
-                    "usage": {
-                        "input_tokens": response.usage.input_tokens,
-                        "output_tokens": response.usage.output_tokens,
-                    },
+                    "usage": self._usage(response.usage),
                 },
             )
 
         except Exception as e:
-            raise Exception(f"Anthropic API error: {str(e)}")
+            raise wrap_provider_error("Anthropic API error", "anthropic", e)
 
     async def chat(
         self,
@@ -107,11 +170,9 @@ class AnthropicService:
         try:
             # 调用Claude API
             response = await self.client.messages.create(
-                model=model or self.default_model,
-                max_tokens=max_tokens or self.default_max_tokens,
-                temperature=temperature or self.default_temperature,
-                system=system_prompt,
-                messages=messages,
+                **self._request_params(
+                    self._history(messages), system_prompt, temperature, max_tokens, model
+                )
             )
 
             # 提取响应文本
@@ -124,15 +185,12 @@ class AnthropicService:
                 metadata={
                     "model": model or self.default_model,
                     "provider": "anthropic",
-                    "usage": {
-                        "input_tokens": response.usage.input_tokens,
-                        "output_tokens": response.usage.output_tokens,
-                    },
+                    "usage": self._usage(response.usage),
                 },
             )
 
         except Exception as e:
-            raise Exception(f"Anthropic API error: {str(e)}")
+            raise wrap_provider_error("Anthropic API error", "anthropic", e)
 
     async def stream_complete(
         self,
@@ -141,6 +199,8 @@ class AnthropicService:
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         model: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        prompt_prefix: Optional[str] = None,
     ):
         """流式完成文本生成.
 
@@ -150,22 +210,141 @@ class AnthropicService:
             temperature: 温度参数
             max_tokens: 最大token数
             model: 模型名称
+            usage: 可选，流结束后写入token用量
+            prompt_prefix: 用户提示词的稳定前缀，作为缓存块放在prompt之前
 
         Yields:
             文本片段
         """
-        try:
-            messages = [{"role": "user", "content": prompt}]
+        async for text in self.stream_chat(
+            messages=[{"role": "user", "content": self._user_content(prompt, prompt_prefix)}],
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=model,
+            usage=usage,
+        ):
+            yield text
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+    ):
+        """流式对话模式.
 
+        Args:
+            messages: 消息历史
+            system_prompt: 系统提示词
+            temperature: 温度参数
+            max_tokens: 最大token数
+            model: 模型名称
+            usage: 可选，流结束后写入token用量
+
+        Yields:
+            文本片段
+        """
+        try:
             async with self.client.messages.stream(
-                model=model or self.default_model,
-                max_tokens=max_tokens or self.default_max_tokens,
-                temperature=temperature or self.default_temperature,
-                system=system_prompt,
-                messages=messages,
+                **self._request_params(
+                    self._history(messages), system_prompt, temperature, max_tokens, model
+                )
             ) as stream:
                 async for text in stream.text_stream:
                     yield text
 
+                if usage is not None:
+                    final_message = await stream.get_final_message()
+                    usage.update(self._usage(final_message.usage))
+
+        except Exception as e:
+            raise wrap_provider_error("Anthropic streaming error", "anthropic", e)
+
+    # ========== 批处理（Message Batches API） ==========
+
+    def batch_line(self, request: BatchRequest, model: Optional[str] = None) -> Dict[str, Any]:
+        """构建一个批处理请求，参数与同步调用相同（含提示词缓存断点）."""
+        return {
+            "custom_id": request.custom_id,
+            "params": self._request_params(
+                [{"role": "user", "content": self._user_content(request.prompt, request.prompt_prefix)}],
+                request.system_prompt,
+                request.temperature,
+                request.max_tokens,
+                model,
+            ),
+        }
+
+    @staticmethod
+    def _batch_status(batch: Any) -> BatchStatus:
+        """把MessageBatch转换为统一的批次进度."""
+        counts = batch.request_counts
+        return BatchStatus(
+            id=batch.id,
+            status=ENDED if batch.processing_status == "ended" else IN_PROGRESS,
+            succeeded=counts.succeeded,
+            failed=counts.errored + counts.canceled + counts.expired,
+            pending=counts.processing,
+        )
+
+    async def create_batch(self, lines: List[Dict[str, Any]]) -> BatchStatus:
+        """提交批次.
+
+        Args:
+            lines: batch_line构建的请求
+
+        Returns:
+            批次进度
+        """
+        try:
+            batch = await self.client.messages.batches.create(requests=lines)
+        except Exception as e:
+            raise wrap_provider_error("Anthropic batch error", "anthropic", e)
+        return self._batch_status(batch)
+
+    async def get_batch(self, batch_id: str) -> BatchStatus:
+        """查询批次进度."""
+        try:
+            batch = await self.client.messages.batches.retrieve(batch_id)
+        except Exception as e:
+            raise wrap_provider_error("Anthropic batch error", "anthropic", e)
+        return self._batch_status(batch)
+
+    async def batch_results(self, batch_id: str) -> List[BatchItemResult]:
+        """读取已结束批次的结果."""
+        results = []
+        try:
+            async for item in await self.client.messages.batches.results(batch_id):
+                if item.result.type != "succeeded":
+                    # errored时为ErrorResponse，取其中的错误信息；canceled、expired没有详情
+                    error = getattr(getattr(item.result, "error", None), "error", None)
+                    message = getattr(error, "message", None) or item.result.type
+                    results.append(BatchItemResult(item.custom_id, error=message))
+                    continue
+                message = item.result.message
+                response = AIResponse(
+                    text=message.content[0].text if message.content else "",
+                    structured_data=None,
+                    suggested_actions=None,
+                    metadata={
+                        "model": message.model,
+                        "provider": "anthropic",
+                        "usage": self._usage(message.usage),
+                        "batch_id": batch_id,
+                    },
+                )
+                results.append(BatchItemResult(item.custom_id, response=response))
+        except Exception as e:
+            raise wrap_provider_error("Anthropic batch error", "anthropic", e)
+        return results
+
+    async def cancel_batch(self, batch_id: str):
+        """取消批次，已完成的请求仍计费."""
+        try:
+            await self.client.messages.batches.cancel(batch_id)
         except Exception as e:
-            raise Exception(f"Anthropic streaming error: {str(e)}")
+            raise wrap_provider_error("Anthropic batch error", "anthropic", e)
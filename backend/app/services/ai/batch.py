@@ -0,0 +1,147 @@
+"""提供商批处理（Batch API）的公共类型和本地替身.
+
+批处理请求异步执行（最长24小时），费用约为同步调用的一半，且不占用同步
+调用的限流额度，适合夜间批量任务。各提供商服务实现相同的接口：
+- batch_line(request, model)：构建一行JSONL请求
+- create_batch(lines)：提交批次
+- get_batch(batch_id)：查询进度
+- batch_results(batch_id)：读取结果
+- cancel_batch(batch_id)：取消批次
+"""
+import asyncio
+import json
+import logging
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.core.context import metered_user
+from app.schemas.ai import AIResponse
+
+logger = logging.getLogger(__name__)
+
+
+IN_PROGRESS = "in_progress"
+ENDED = "ended"
+
+
+@dataclass
+class BatchRequest:
+    """批次中的一个请求（与提供商无关）."""
+
+    custom_id: str
+    prompt: str
+    prompt_prefix: Optional[str] = None
+    system_prompt: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    response_format: Optional[str] = None
+
+
+@dataclass
+class BatchStatus:
+    """批次进度."""
+
+    id: str
+    status: str  # in_progress, ended
+    succeeded: int = 0
+    failed: int = 0  # 出错、取消或过期
+    pending: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class BatchItemResult:
+    """批次中一个请求的结果，成功时response不为空."""
+
+    custom_id: str
+    response: Optional[AIResponse] = None
+    error: Optional[str] = None
+
+
+def to_jsonl(lines: List[Dict[str, Any]]) -> bytes:
+    """把请求行序列化为JSONL."""
+    return "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+
+
+BatchResponder = Callable[[BatchRequest], Awaitable[AIResponse]]
+
+
+class LocalBatchService:
+    """进程内的批处理替身，用于开发和测试.
+
+    批次在当前进程的后台任务中逐个执行请求，默认通过ai_manager的同步调用
+    路径（没有折扣，也会占用限流额度）；测试时传入responder替代提供商。
+    批次只存在于内存中，进程重启后丢失。
+    """
+
+    provider_name = "local"
+    default_model = None
+
+    def __init__(self, responder: Optional[BatchResponder] = None):
+        """初始化本地批处理.
+
+        Args:
+            responder: 处理单个请求的函数，默认调用ai_manager.complete
+        """
+        self.responder = responder or self._complete
+        self._batches: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    async def _complete(request: BatchRequest) -> AIResponse:
+        from app.services.ai.ai_manager import ai_manager
+
+        params = asdict(request)
+        params.pop("custom_id")
+        return await ai_manager.complete(use_cache=False, **params)
+
+    def batch_line(self, request: BatchRequest, model: Optional[str] = None) -> Dict[str, Any]:
+        return {"custom_id": request.custom_id, "params": asdict(request)}
+
+    async def create_batch(self, lines: List[Dict[str, Any]]) -> BatchStatus:
+        batch_id = f"local_{uuid.uuid4().hex}"
+        batch = {"lines": lines, "results": []}
+        batch["task"] = asyncio.create_task(self._process(batch))
+        self._batches[batch_id] = batch
+        return self._status(batch_id)
+
+    async def _process(self, batch: Dict[str, Any]):
+        # 批次用量由BatchRunner按结果统一记账，逐个调用时不再重复计量
+        metered_user.set(None)
+        for line in batch["lines"]:
+            request = BatchRequest(**line["params"])
+            try:
+                response = await self.responder(request)
+            except Exception as e:
+                batch["results"].append(BatchItemResult(request.custom_id, error=str(e)))
+            else:
+                batch["results"].append(BatchItemResult(request.custom_id, response=response))
+
+    def _batch(self, batch_id: str) -> Dict[str, Any]:
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            raise ValueError(f"Local batch {batch_id} not found (lost on restart?)")
+        return batch
+
+    def _status(self, batch_id: str) -> BatchStatus:
+        batch = self._batch(batch_id)
+        results = batch["results"]
+        failed = sum(1 for result in results if result.response is None)
+        return BatchStatus(
+            id=batch_id,
+            status=ENDED if batch["task"].done() else IN_PROGRESS,
+            succeeded=len(results) - failed,
+            failed=failed,
+            pending=len(batch["lines"]) - len(results),
+        )
+
+    async def get_batch(self, batch_id: str) -> BatchStatus:
+        return self._status(batch_id)
+
+    async def batch_results(self, batch_id: str) -> List[BatchItemResult]:
+        return list(self._batch(batch_id)["results"])
+
+    async def cancel_batch(self, batch_id: str):
+        self._batch(batch_id)["task"].cancel()
@@ -0,0 +1,300 @@
+"""AI响应缓存（进程内LRU + Redis两级缓存）."""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.schemas.ai import AIResponse
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """带TTL的进程内LRU缓存."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        """初始化LRU缓存.
+
+        Args:
+            max_entries: 最大条目数，超出后淘汰最久未使用的条目
+            ttl: 条目存活时间（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取条目，过期条目视为未命中并删除."""
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None):
+        """写入条目，超出容量时淘汰最久未使用的条目."""
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: str) -> Optional[str]:
+        """取出并删除条目，过期条目视为未命中."""
+        item = self._data.pop(key, None)
+        if item is None or item[0] <= time.monotonic():
+            return None
+        return item[1]
+
+    def clear(self):
+        """清空缓存."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResponseCache:
+    """AI响应缓存.
+
+    以请求参数的内容哈希作为键，先查进程内LRU，再查Redis。
+    Redis不可用时自动降级为仅进程内缓存。
+    """
+
+    # Redis连接失败后的重试冷却时间（秒）
+    REDIS_RETRY_INTERVAL = 30
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_entries: int = 1024,
+        ttl: int = 3600,
+        redis_url: Optional[str] = None,
+        key_prefix: str = "novelflow:ai:cache:",
+    ):
+        """初始化响应缓存.
+
+        Args:
+            enabled: 是否启用缓存
+            max_entries: 进程内缓存最大条目数
+            ttl: 缓存存活时间（秒）
+            redis_url: Redis连接地址，为空则只使用进程内缓存
+            key_prefix: Redis键前缀
+        """
+        self.enabled = enabled
+        self.ttl = ttl
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+
+        self._redis = None
+        self._redis_retry_at = 0.0
+        self._closing: Set[asyncio.Task] = set()  # 正在关闭的旧客户端，持有引用防止任务被回收
+        self._stats = {
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "bypassed": 0,
+            "redis_errors": 0,
+        }
+
+    @staticmethod
+    def make_key(**parts: Any) -> str:
+        """根据请求参数生成内容寻址的缓存键.
+
+        Args:
+            parts: 参与缓存键计算的请求参数
+
+        Returns:
+            SHA-256十六进制摘要
+        """
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def should_cache(self, temperature: float, use_cache: Optional[bool]) -> bool:
+        """判断本次请求是否使用缓存.
+
+        Args:
+            temperature: 实际使用的温度参数
+            use_cache: 调用方的缓存开关，None表示按默认策略
+
+        Returns:
+            是否读写缓存
+        """
+        if not self.enabled:
+            return False
+        if use_cache is not None:
+            if not use_cache:
+                self._stats["bypassed"] += 1
+            return use_cache
+        # 默认只缓存确定性（temperature=0）的调用
+        return temperature == 0
+
+    async def get(self, key: str) -> Optional[AIResponse]:
+        """读取缓存.
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            命中时返回AI响应对象，否则返回None
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            self._stats["memory_hits"] += 1
+            return self._load(value, "memory")
+
+        redis = await self._get_redis()
+        if redis is not None:
+            try:
+                value = await redis.get(self.key_prefix + key)
+            except Exception as e:
+                self._on_redis_error(e)
+                value = None
+
+            if value is not None:
+                if isinstance(value, bytes):
+                    value = value.decode("utf-8")
+                self._stats["redis_hits"] += 1
+                # 回填进程内缓存
+                self.memory.set(key, value)
+                return self._load(value, "redis")
+
+        self._stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, response: AIResponse, ttl: Optional[int] = None):
+        """写入缓存.
+
+        Args:
+            key: 缓存键
+            response: AI响应对象
+            ttl: 存活时间（秒），默认使用缓存配置
+        """
+        value = response.model_dump_json()
+        self.memory.set(key, value, ttl)
+        self._stats["writes"] += 1
+
+        redis = await self._get_redis()
+        if redis is not None:
+            try:
+                await redis.set(self.key_prefix + key, value, ex=ttl or self.ttl)
+            except Exception as e:
+                self._on_redis_error(e)
+
+    async def take(self, key: str) -> Optional[AIResponse]:
+        """读取并删除条目，用于只应使用一次的结果（如预取的生成结果）.
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            命中时返回AI响应对象，否则返回None
+        """
+        value = self.memory.pop(key)
+        tier = "memory"
+        redis = await self._get_redis()
+        if redis is not None:
+            try:
+                # 其他进程写入的条目只在Redis中；两层都要删除
+                stored = await redis.getdel(self.key_prefix + key)
+            except Exception as e:
+                self._on_redis_error(e)
+                stored = None
+            if value is None and stored is not None:
+                value = stored.decode("utf-8") if isinstance(stored, bytes) else stored
+                tier = "redis"
+
+        if value is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats[f"{tier}_hits"] += 1
+        return self._load(value, tier)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存命中统计."""
+        hits = self._stats["memory_hits"] + self._stats["redis_hits"]
+        lookups = hits + self._stats["misses"]
+        return {
+            **self._stats,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+        }
+
+    async def close(self):
+        """关闭Redis连接."""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def _load(self, value: str, tier: str) -> AIResponse:
+        """反序列化缓存值并标记命中层级."""
+        response = AIResponse.model_validate_json(value)
+        response.metadata["cache"] = tier
+        return response
+
+    async def _get_redis(self):
+        """延迟创建Redis客户端，失败后在冷却期内跳过Redis层."""
+        if not self.redis_url:
+            return None
+        if self._redis is not None:
+            return self._redis
+        if time.monotonic() < self._redis_retry_at:
+            return None
+
+        client = None
+        try:
+            import redis.asyncio as aioredis
+
+            client = aioredis.from_url(self.redis_url)
+            await client.ping()
+            self._redis = client
+        except Exception as e:
+            self._on_redis_error(e, client)
+
+        return self._redis
+
+    @staticmethod
+    async def _close_client(client):
+        try:
+            await client.close()
+        except Exception as e:
+            logger.debug("AI response cache: error closing Redis client: %s", e)
+
+    def _on_redis_error(self, error: Exception, client=None):
+        """记录Redis错误并进入冷却期，关闭出错的客户端（默认为当前客户端）的连接池."""
+        self._stats["redis_errors"] += 1
+        client = client or self._redis
+        self._redis = None
+        if client is not None:
+            task = asyncio.get_running_loop().create_task(self._close_client(client))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        self._redis_retry_at = time.monotonic() + self.REDIS_RETRY_INTERVAL
+        logger.warning("AI response cache: Redis unavailable (%s)", error)
+
+
+def create_response_cache() -> ResponseCache:
+    """根据应用配置创建响应缓存."""
+    return ResponseCache(
+        enabled=settings.AI_CACHE_ENABLED,
+        max_entries=settings.AI_CACHE_MAX_ENTRIES,
+        ttl=settings.AI_CACHE_TTL,
+        redis_url=settings.REDIS_URL if settings.AI_CACHE_REDIS_ENABLED else None,
+        key_prefix=settings.AI_CACHE_KEY_PREFIX,
+    )
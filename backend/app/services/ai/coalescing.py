@@ -0,0 +1,206 @@
+"""并发相同AI请求的合并（single-flight）."""
+import asyncio
+import copy
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+class _StreamFanout:
+    """把一个上游流广播给多个订阅者.
+
+    上游片段全部缓存在内存中，后加入的订阅者会先回放已产生的片段，
+    因此每个订阅者都能拿到完整的输出。
+    """
+
+    def __init__(self, source: AsyncIterator[str], usage: Dict[str, Any]):
+        self.chunks: List[str] = []
+        self.usage = usage
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.started_at = time.monotonic()
+        self._source = source
+        self._changed = asyncio.Condition()
+        self._task = asyncio.create_task(self._pump())
+
+    async def _pump(self):
+        """消费上游流并通知订阅者."""
+        try:
+            async for chunk in self._source:
+                async with self._changed:
+                    self.chunks.append(chunk)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """订阅广播流."""
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(
+                        lambda: position < len(self.chunks) or self.done
+                    )
+                    pending = self.chunks[position:]
+                    finished = self.done
+
+                for chunk in pending:
+                    yield chunk
+                position += len(pending)
+
+                if finished and position >= len(self.chunks):
+                    break
+
+            if self.error is not None and not isinstance(self.error, asyncio.CancelledError):
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            # 所有订阅者都离开时取消上游请求
+            if self.subscribers == 0 and not self._task.done():
+                self._task.cancel()
+
+
+class RequestCoalescer:
+    """请求合并器.
+
+    同一时刻键相同的请求只向提供商发起一次调用，其余调用方共享同一个
+    in-flight future（流式请求则共享同一个广播）。
+    """
+
+    def __init__(self, enabled: bool = True):
+        """初始化请求合并器.
+
+        Args:
+            enabled: 是否启用合并
+        """
+        self.enabled = enabled
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._started: Dict[str, float] = {}
+        self._waiters: Dict[str, int] = {}
+        self._streams: Dict[str, _StreamFanout] = {}
+        self._stats = {
+            "calls": 0,
+            "coalesced": 0,
+            "stream_calls": 0,
+            "stream_coalesced": 0,
+            "saved_input_tokens": 0,
+            "saved_output_tokens": 0,
+            "saved_seconds": 0.0,
+        }
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行或加入一个in-flight调用.
+
+        Args:
+            key: 请求键
+            factory: 真正发起调用的协程工厂
+
+        Returns:
+            调用结果，加入已有调用的调用方拿到的是结果的深拷贝
+        """
+        if not self.enabled:
+            return await factory()
+
+        task = self._inflight.get(key)
+        follower = task is not None
+        if follower:
+            self._stats["coalesced"] += 1
+        else:
+            self._stats["calls"] += 1
+            task = asyncio.create_task(factory())
+            self._inflight[key] = task
+            self._started[key] = time.monotonic()
+            task.add_done_callback(lambda t: self._forget(key, t))
+
+        started_at = self._started.get(key, time.monotonic())
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # 最后一个等待者离开时才取消上游调用
+            if self._waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            if key in self._waiters:
+                self._waiters[key] -= 1
+                if self._waiters[key] <= 0:
+                    del self._waiters[key]
+
+        if not follower:
+            return result
+
+        # 被合并的调用节省了一次完整的上游调用耗时
+        self._record_saving(result, time.monotonic() - started_at)
+        return copy.deepcopy(result)
+
+    async def stream(
+        self,
+        key: str,
+        factory: Callable[[Dict[str, Any]], AsyncIterator[str]],
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """执行或加入一个in-flight流式调用.
+
+        Args:
+            key: 请求键
+            factory: 创建上游异步生成器的工厂，参数为上游写入token用量的字典
+            usage: 可选，流结束后写入上游的token用量
+
+        Yields:
+            文本片段
+        """
+        if not self.enabled:
+            async for chunk in factory(usage if usage is not None else {}):
+                yield chunk
+            return
+
+        fanout = self._streams.get(key)
+        if fanout is not None and not fanout.done:
+            self._stats["stream_coalesced"] += 1
+            follower = True
+        else:
+            follower = False
+            self._stats["stream_calls"] += 1
+            shared_usage: Dict[str, Any] = {}
+            fanout = _StreamFanout(factory(shared_usage), shared_usage)
+            self._streams[key] = fanout
+
+        try:
+            async for chunk in fanout.subscribe():
+                yield chunk
+            if usage is not None:
+                usage.update(fanout.usage)
+        finally:
+            if follower and fanout.done:
+                self._stats["saved_seconds"] += time.monotonic() - fanout.started_at
+            if self._streams.get(key) is fanout and (fanout.done or fanout.subscribers == 0):
+                del self._streams[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """获取合并统计."""
+        return {
+            **self._stats,
+            "saved_seconds": round(self._stats["saved_seconds"], 3),
+            "inflight": len(self._inflight),
+            "inflight_streams": len(self._streams),
+        }
+
+    def _forget(self, key: str, task: asyncio.Task):
+        """调用结束后移除in-flight记录."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._started.pop(key, None)
+
+    def _record_saving(self, result: Any, upstream_seconds: float):
+        """记录被合并调用节省的token和上游调用耗时."""
+        self._stats["saved_seconds"] += upstream_seconds
+        usage = getattr(result, "metadata", {}).get("usage") or {}
+        self._stats["saved_input_tokens"] += usage.get("input_tokens", 0)
+        self._stats["saved_output_tokens"] += usage.get("output_tokens", 0)
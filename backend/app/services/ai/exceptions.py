@@ -0,0 +1,110 @@
+"""AI服务异常."""
+from typing import Optional
+
+
+class AIServiceError(Exception):
+    """AI提供商调用失败."""
+
+    def __init__(
+        self,
+        message: str,
+        provider: Optional[str] = None,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ):
+        """初始化异常.
+
+        Args:
+            message: 错误信息
+            provider: 服务提供商
+            status_code: 提供商返回的HTTP状态码
+            retry_after: 提供商建议的重试等待时间（秒）
+        """
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AIRateLimitError(AIServiceError):
+    """提供商限流（HTTP 429）或过载（HTTP 529）."""
+
+
+class AIPromptTooLongError(AIServiceError):
+    """提示词超出模型上下文窗口，在发起请求前被拒绝."""
+
+    def __init__(self, message: str, input_tokens: int = 0, context_window: int = 0):
+        """初始化异常.
+
+        Args:
+            message: 错误信息
+            input_tokens: 输入token数
+            context_window: 模型上下文窗口
+        """
+        super().__init__(message)
+        self.input_tokens = input_tokens
+        self.context_window = context_window
+
+
+class AIQuotaExceededError(AIServiceError):
+    """用户本月的token配额已用完，在发起请求前被拒绝."""
+
+    def __init__(self, message: str, used: int = 0, limit: int = 0):
+        """初始化异常.
+
+        Args:
+            message: 错误信息
+            used: 本月已用和已预留的token数
+            limit: 本月配额
+        """
+        super().__init__(message, status_code=429)
+        self.used = used
+        self.limit = limit
+
+
+def _parse_retry_after(error: Exception) -> Optional[float]:
+    """从SDK异常的响应头中读取Retry-After（秒）."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            # HTTP日期格式的Retry-After按未提供处理，由退避策略决定等待时间
+            return None
+    return None
+
+
+def wrap_provider_error(prefix: str, provider: str, error: Exception) -> AIServiceError:
+    """把SDK异常转换为AI服务异常，保留状态码和Retry-After.
+
+    Args:
+        prefix: 错误信息前缀，如"Anthropic API error"
+        provider: 服务提供商
+        error: SDK抛出的原始异常
+
+    Returns:
+        AIServiceError，限流类错误返回AIRateLimitError
+    """
+    if isinstance(error, AIServiceError):
+        return error
+
+    status_code = getattr(error, "status_code", None)
+    error_class = AIRateLimitError if status_code in (429, 529) else AIServiceError
+    return error_class(
+        f"{prefix}: {str(error)}",
+        provider=provider,
+        status_code=status_code,
+        retry_after=_parse_retry_after(error),
+    )
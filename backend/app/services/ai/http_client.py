@@ -0,0 +1,60 @@
+"""AI提供商共享的HTTP连接池."""
+from typing import Optional
+import httpx
+from app.core.config import settings
+
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def create_http_timeout() -> httpx.Timeout:
+    """按配置创建超时设置."""
+    return httpx.Timeout(
+        connect=settings.AI_HTTP_CONNECT_TIMEOUT,
+        read=settings.AI_HTTP_READ_TIMEOUT,
+        write=settings.AI_HTTP_WRITE_TIMEOUT,
+        pool=settings.AI_HTTP_POOL_TIMEOUT,
+    )
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """按配置创建HTTP客户端.
+
+    Returns:
+        配置了连接池、keep-alive、HTTP/2和超时的httpx.AsyncClient
+    """
+    return httpx.AsyncClient(
+        http2=settings.AI_HTTP_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=create_http_timeout(),
+        follow_redirects=True,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享HTTP客户端，不存在或已关闭时创建.
+
+    Returns:
+        共享的httpx.AsyncClient
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+
+async def open_http_client() -> httpx.AsyncClient:
+    """应用启动时打开共享HTTP客户端."""
+    return get_http_client()
+
+
+async def close_http_client():
+    """应用关闭时释放连接池中的所有连接."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
@@ -0,0 +1,320 @@
+"""流式JSON增量解析.
+
+模型按片段输出JSON时，逐字符扫描已收到的文本，跟踪容器嵌套、字符串和
+键值边界；每当浅层（默认两层以内）的字段或数组元素完整时立即解析并返回，
+客户端无需等待整个响应结束即可逐步渲染。流结束时若JSON尾部残缺（输出被
+截断、缺少右括号等），按扫描状态补全而不是重新请求模型。
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+
+PathItem = Union[str, int]
+
+_CLOSERS = {"{": "}", "[": "]"}
+_WHITESPACE = " \t\r\n"
+
+
+class _Frame:
+    """扫描中的一个JSON容器."""
+
+    __slots__ = ("kind", "key", "index", "expecting_key", "value_start")
+
+    def __init__(self, kind: str):
+        self.kind = kind  # "{" 或 "["
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expecting_key = kind == "{"
+        self.value_start: Optional[int] = None
+
+
+class IncrementalJSONParser:
+    """增量JSON解析器.
+
+    feed()每次接收一个文本片段，返回本次新完成的(路径, 值)列表。
+    JSON之前的说明文字、Markdown代码块标记会被跳过，根值结束后的内容被忽略。
+    """
+
+    def __init__(self, max_depth: int = 2):
+        """初始化解析器.
+
+        Args:
+            max_depth: 报告完成事件的最大路径深度，1表示只报告顶层字段
+        """
+        self.max_depth = max_depth
+        self.buffer = ""
+        self.done = False
+        self._pos = 0
+        self._root_start: Optional[int] = None
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # 最近一个可以直接补全为合法JSON的位置，以及此时需要追加的右括号
+        self._safe_end: Optional[int] = None
+        self._safe_closers = ""
+
+    def feed(self, chunk: str) -> List[Tuple[List[PathItem], Any]]:
+        """输入一个文本片段.
+
+        Args:
+            chunk: 文本片段
+
+        Returns:
+            本次新完成的(路径, 值)列表，路径由字段名和数组下标组成
+        """
+        self.buffer += chunk
+        completed: List[Tuple[List[PathItem], Any]] = []
+        buffer = self.buffer
+
+        while self._pos < len(buffer) and not self.done:
+            pos = self._pos
+            char = buffer[pos]
+            self._pos += 1
+
+            if self._root_start is None:
+                if char in _CLOSERS:
+                    self._root_start = pos
+                    self._open(char, pos)
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._close_string(pos, completed)
+                continue
+
+            frame = self._stack[-1]
+            if char in _WHITESPACE:
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+                if not frame.expecting_key and frame.value_start is None:
+                    frame.value_start = pos
+            elif char in _CLOSERS:
+                if frame.value_start is None:
+                    frame.value_start = pos
+                self._open(char, pos)
+            elif char in "}]":
+                self._finish_primitive(frame, pos, completed)
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                    self._mark_safe(pos + 1)
+                else:
+                    self._complete_value(self._stack[-1], pos + 1, completed)
+            elif char == ":":
+                frame.expecting_key = False
+            elif char == ",":
+                self._finish_primitive(frame, pos, completed)
+                if frame.kind == "{":
+                    frame.expecting_key = True
+                    frame.key = None
+                else:
+                    frame.index += 1
+            elif frame.value_start is None:
+                # 数字、true/false/null的起始字符
+                frame.value_start = pos
+
+        return completed
+
+    def result(self) -> Optional[Any]:
+        """解析当前完整文本，失败时返回None."""
+        if self._root_start is None:
+            return None
+        try:
+            value, _ = json.JSONDecoder().raw_decode(self.buffer, self._root_start)
+            return value
+        except json.JSONDecodeError:
+            return None
+
+    def repair(self) -> Optional[Any]:
+        """补全残缺的JSON尾部并解析.
+
+        先尝试闭合未结束的字符串值和所有容器；不行则回退到最近一个完整值
+        之后的位置再闭合。
+
+        Returns:
+            修复后的值，无法修复时返回None
+        """
+        value = self.result()
+        if value is not None or self._root_start is None:
+            return value
+
+        candidates = []
+        if self._stack and self._stack[-1].value_start is not None:
+            # 末尾是未结束的字符串或数字等值，保留已输出的部分直接闭合
+            closers = "".join(_CLOSERS[f.kind] for f in reversed(self._stack))
+            tail = self.buffer[self._root_start:]
+            if self._in_string:
+                if self._escape:
+                    tail = tail[:-1]
+                tail += '"'
+            else:
+                tail = tail.rstrip()
+            candidates.append(tail + closers)
+        if self._safe_end is not None:
+            candidates.append(self.buffer[self._root_start:self._safe_end] + self._safe_closers)
+
+        for candidate in candidates:
+            try:
+                return json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+        return None
+
+    def _open(self, char: str, pos: int):
+        self._stack.append(_Frame(char))
+        self._mark_safe(pos + 1)
+
+    def _mark_safe(self, end: int):
+        self._safe_end = end
+        self._safe_closers = "".join(_CLOSERS[f.kind] for f in reversed(self._stack))
+
+    def _close_string(self, pos: int, completed: List[Tuple[List[PathItem], Any]]):
+        frame = self._stack[-1]
+        if frame.kind == "{" and frame.expecting_key:
+            frame.key = json.loads(self.buffer[self._string_start:pos + 1])
+        else:
+            self._complete_value(frame, pos + 1, completed)
+
+    def _finish_primitive(self, frame: _Frame, end: int, completed: List[Tuple[List[PathItem], Any]]):
+        """在逗号或右括号处结束一个数字/布尔/null值."""
+        if frame.value_start is not None:
+            self._complete_value(frame, end, completed)
+
+    def _complete_value(self, frame: _Frame, end: int, completed: List[Tuple[List[PathItem], Any]]):
+        """frame中当前的值在end处结束."""
+        start = frame.value_start
+        frame.value_start = None
+        if start is None:
+            return
+        self._mark_safe(end)
+
+        depth = len(self._stack)
+        if depth > self.max_depth:
+            return
+
+        try:
+            value = json.loads(self.buffer[start:end])
+        except json.JSONDecodeError:
+            return
+
+        completed.append(([self._slot(f) for f in self._stack], value))
+
+    @staticmethod
+    def _slot(frame: _Frame) -> PathItem:
+        return frame.key if frame.kind == "{" else frame.index
+
+
+def parse_json_lenient(text: str) -> Optional[Any]:
+    """解析模型返回的JSON文本，容忍前后说明文字和残缺的尾部.
+
+    Args:
+        text: 模型输出
+
+    Returns:
+        解析结果，无法解析时返回None
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    parser = IncrementalJSONParser(max_depth=0)
+    parser.feed(text)
+    return parser.repair()
+
+
+class StructuredStreamParser:
+    """按Pydantic模型校验的流式结构化解析器.
+
+    顶层字段和列表字段中的元素完整时，用对应字段的类型校验后作为部分结果
+    返回，例如ExpandedInspiration中每个ConflictOption。
+    """
+
+    def __init__(self, model: Optional[Type[BaseModel]] = None, max_depth: int = 2):
+        """初始化解析器.
+
+        Args:
+            model: 用于校验的Pydantic模型，None表示不校验
+            max_depth: 报告部分结果的最大路径深度
+        """
+        self.model = model
+        self.parser = IncrementalJSONParser(max_depth=max_depth)
+        self._adapters: Dict[Tuple[PathItem, ...], Optional[TypeAdapter]] = {}
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """输入一个文本片段.
+
+        Args:
+            chunk: 文本片段
+
+        Returns:
+            新完成的部分结果，每项包含path、value和valid（未校验时为None）
+        """
+        events = []
+        for path, value in self.parser.feed(chunk):
+            event: Dict[str, Any] = {"path": path, "value": value, "valid": None}
+            adapter = self._adapter_for(path)
+            if adapter is not None:
+                try:
+                    validated = adapter.validate_python(value)
+                    event["value"] = adapter.dump_python(validated, mode="json")
+                    event["valid"] = True
+                except ValidationError as e:
+                    event["valid"] = False
+                    event["errors"] = e.errors(include_url=False, include_input=False)
+            events.append(event)
+        return events
+
+    def finish(self) -> Dict[str, Any]:
+        """流结束后返回完整结果.
+
+        Returns:
+            structured_data（解析或修复后的数据）、repaired（是否经过修复）、
+            valid（是否通过模型校验，未指定模型时为None）
+        """
+        data = self.parser.result()
+        repaired = False
+        if data is None:
+            data = self.parser.repair()
+            repaired = data is not None
+
+        result: Dict[str, Any] = {"structured_data": data, "repaired": repaired, "valid": None}
+        if self.model is not None and data is not None:
+            try:
+                self.model.model_validate(data)
+                result["valid"] = True
+            except ValidationError as e:
+                result["valid"] = False
+                result["errors"] = e.errors(include_url=False, include_input=False)
+        return result
+
+    def _adapter_for(self, path: List[PathItem]) -> Optional[TypeAdapter]:
+        """根据路径找到模型中对应的字段类型."""
+        if self.model is None or not path or not isinstance(path[0], str):
+            return None
+
+        key = tuple(path)
+        if key in self._adapters:
+            return self._adapters[key]
+
+        adapter = None
+        field = self.model.model_fields.get(path[0])
+        if field is not None:
+            annotation = field.annotation
+            if len(path) == 1:
+                adapter = TypeAdapter(annotation)
+            elif len(path) == 2 and isinstance(path[1], int) and get_origin(annotation) in (list, List):
+                adapter = TypeAdapter(get_args(annotation)[0])
+
+        self._adapters[key] = adapter
+        return adapter
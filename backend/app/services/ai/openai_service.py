@@ -1,19 +1,48 @@
 """OpenAI GPT服务."""
+import json
 from typing import Dict, List, Optional, Any
-from openai import AsyncOpenAI
+import httpx
 from app.core.config import settings
+from app.services.ai.batch import ENDED, IN_PROGRESS, BatchItemResult, BatchRequest, BatchStatus, to_jsonl
+from app.services.ai.exceptions import wrap_provider_error
+from app.services.ai.json_stream import parse_json_lenient
+from app.services.ai.tokenizer import token_counter
+from app.services.ai.http_client import create_http_timeout, get_http_client
 from app.schemas.ai import AIResponse
 
 
+def _join_prompt(prompt: str, prompt_prefix: Optional[str]) -> str:
+    """把稳定前缀放在可变内容之前（OpenAI按请求前缀自动缓存）."""
+    return prompt_prefix + "\n" + prompt if prompt_prefix else prompt
+
+
+# 批次结束后不会再变化的状态
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
 class OpenAIService:
     """OpenAI GPT API服务."""
 
-    def __init__(self):
-        """初始化OpenAI服务."""
+    provider_name = "openai"
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """初始化OpenAI服务.
+
+        Args:
+            http_client: 共享HTTP客户端，默认使用全局连接池
+        """
         if not settings.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY not configured")
 
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        # SDK导入较慢，延迟到首次创建服务时
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=http_client or get_http_client(),
+            # SDK会按请求覆盖客户端超时，这里显式传入同一配置
+            timeout=create_http_timeout(),
+        )
         self.default_model = "gpt-4-turbo-preview"
         self.default_temperature = settings.DEFAULT_TEMPERATURE
         self.default_max_tokens = settings.DEFAULT_MAX_TOKENS
@@ -26,6 +55,7 @@ class OpenAIService:
         max_tokens: Optional[int] = None,
         model: Optional[str] = None,
         response_format: Optional[str] = None,  # "text" or "json"
+        prompt_prefix: Optional[str] = None,
     ) -> AIResponse:
         """完成文本生成.
 
@@ -36,6 +66,7 @@ class OpenAIService:
             max_tokens: 最大token数
             model: 模型名称
             response_format: 响应格式
+            prompt_prefix: 用户提示词的稳定前缀，放在prompt之前以命中提供商的前缀缓存
 
         Returns:
             AI响应对象
@@ -45,7 +76,7 @@ class OpenAIService:
             messages = []
             if system_prompt:
                 messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
+            messages.append({"role": "user", "content": _join_prompt(prompt, prompt_prefix)})
 
             # 调用OpenAI API
             response_format_type = {"type": "json_object"} if response_format == "json" else None
@@ -53,7 +84,7 @@ class OpenAIService:
             response = await self.client.chat.completions.create(
                 model=model or self.default_model,
                 messages=messages,
-                temperature=temperature or self.default_temperature,
+                temperature=temperature if temperature is not None else self.default_temperature,
                 max_tokens=max_tokens or self.default_max_tokens,
                 response_format=response_format_type,
             )
@@ -64,12 +95,8 @@ class OpenAIService:
             # 如果要求JSON格式，尝试解析
             structured_data = None
             if response_format == "json":
-                try:
-                    import json
-
-                    structured_data = json.loads(text)
-                except json.JSONDecodeError:
-                    pass
+                # 容忍说明文字和被截断的尾部，无法修复时保持为文本
+                structured_data = parse_json_lenient(text)
 
             return AIResponse(
                 text=text,
@@ -86,7 +113,7 @@ class OpenAIService:
             )
 
         except Exception as e:
-            raise Exception(f"OpenAI API error: {str(e)}")
+            raise wrap_provider_error("OpenAI API error", "openai", e)
 
     async def chat(
         self,
@@ -119,7 +146,7 @@ class OpenAIService:
             response = await self.client.chat.completions.create(
                 model=model or self.default_model,
                 messages=api_messages,
-                temperature=temperature or self.default_temperature,
+                temperature=temperature if temperature is not None else self.default_temperature,
                 max_tokens=max_tokens or self.default_max_tokens,
             )
 
@@ -141,7 +168,7 @@ class OpenAIService:
             )
 
         except Exception as e:
-            raise Exception(f"OpenAI API error: {str(e)}")
+            raise wrap_provider_error("OpenAI API error", "openai", e)
 
     async def stream_complete(
         self,
@@ -150,6 +177,8 @@ class OpenAIService:
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         model: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+        prompt_prefix: Optional[str] = None,
     ):
         """流式完成文本生成.
 
@@ -159,29 +188,195 @@ class OpenAIService:
             temperature: 温度参数
             max_tokens: 最大token数
             model: 模型名称
+            usage: 可选，流结束后写入token用量
+            prompt_prefix: 用户提示词的稳定前缀，放在prompt之前
+
+        Yields:
+            文本片段
+        """
+        async for text in self.stream_chat(
+            messages=[{"role": "user", "content": _join_prompt(prompt, prompt_prefix)}],
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=model,
+            usage=usage,
+        ):
+            yield text
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None,
+    ):
+        """流式对话模式.
+
+        Args:
+            messages: 消息历史
+            system_prompt: 系统提示词
+            temperature: 温度参数
+            max_tokens: 最大token数
+            model: 模型名称
+            usage: 可选，流结束后写入token用量（流式接口不返回用量，按本地计数估算）
 
         Yields:
             文本片段
         """
         try:
             # 构建消息
-            messages = []
+            api_messages = []
             if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
+                api_messages.append({"role": "system", "content": system_prompt})
+            api_messages.extend(messages)
 
             # 调用OpenAI流式API
             stream = await self.client.chat.completions.create(
                 model=model or self.default_model,
-                messages=messages,
-                temperature=temperature or self.default_temperature,
+                messages=api_messages,
+                temperature=temperature if temperature is not None else self.default_temperature,
                 max_tokens=max_tokens or self.default_max_tokens,
                 stream=True,
             )
 
+            output_parts = []
             async for chunk in stream:
-                if chunk.choices[0].delta.content:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    output_parts.append(chunk.choices[0].delta.content)
                     yield chunk.choices[0].delta.content
 
+            if usage is not None:
+                target_model = model or self.default_model
+                usage.update(
+                    input_tokens=token_counter.count_messages(api_messages, model=target_model),
+                    output_tokens=token_counter.count("".join(output_parts), target_model),
+                    estimated=True,
+                )
+
+        except Exception as e:
+            raise wrap_provider_error("OpenAI streaming error", "openai", e)
+
+    # ========== 批处理（Batch API） ==========
+    # 固定版本的SDK还没有batches资源，通过客户端的通用请求方法调用
+
+    def batch_line(self, request: BatchRequest, model: Optional[str] = None) -> Dict[str, Any]:
+        """构建一行Chat Completions批处理请求."""
+        messages = []
+        if request.system_prompt:
+            messages.append({"role": "system", "content": request.system_prompt})
+        messages.append({"role": "user", "content": _join_prompt(request.prompt, request.prompt_prefix)})
+        body = {
+            "model": model or self.default_model,
+            "messages": messages,
+            "temperature": request.temperature if request.temperature is not None else self.default_temperature,
+            "max_tokens": request.max_tokens or self.default_max_tokens,
+        }
+        if request.response_format == "json":
+            body["response_format"] = {"type": "json_object"}
+        return {"custom_id": request.custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}
+
+    @staticmethod
+    def _batch_status(batch: Dict[str, Any]) -> BatchStatus:
+        """把批次对象转换为统一的批次进度."""
+        counts = batch.get("request_counts") or {}
+        total = counts.get("total", 0)
+        succeeded = counts.get("completed", 0)
+        failed = counts.get("failed", 0)
+        ended = batch["status"] in BATCH_FINAL_STATUSES
+        return BatchStatus(
+            id=batch["id"],
+            status=ENDED if ended else IN_PROGRESS,
+            succeeded=succeeded,
+            # 过期或取消时未执行的请求计为失败
+            failed=total - succeeded if ended else failed,
+            pending=0 if ended else max(0, total - succeeded - failed),
+        )
+
+    async def _request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """调用SDK尚未封装的接口，返回原始响应."""
+        request = self.client.post if method == "POST" else self.client.get
+        kwargs = {"body": body} if method == "POST" else {}
+        return await request(path, cast_to=httpx.Response, **kwargs)
+
+    async def create_batch(self, lines: List[Dict[str, Any]]) -> BatchStatus:
+        """上传JSONL输入文件并提交批次.
+
+        Args:
+            lines: batch_line构建的请求
+
+        Returns:
+            批次进度
+        """
+        try:
+            uploaded = await self.client.files.create(file=("batch.jsonl", to_jsonl(lines)), purpose="batch")
+            response = await self._request(
+                "POST",
+                "/batches",
+                {"input_file_id": uploaded.id, "endpoint": "/v1/chat/completions", "completion_window": "24h"},
+            )
+        except Exception as e:
+            raise wrap_provider_error("OpenAI batch error", "openai", e)
+        return self._batch_status(response.json())
+
+    async def get_batch(self, batch_id: str) -> BatchStatus:
+        """查询批次进度."""
+        try:
+            response = await self._request("GET", f"/batches/{batch_id}")
+        except Exception as e:
+            raise wrap_provider_error("OpenAI batch error", "openai", e)
+        return self._batch_status(response.json())
+
+    async def batch_results(self, batch_id: str) -> List[BatchItemResult]:
+        """读取已结束批次的输出文件和错误文件."""
+        results = []
+        try:
+            batch = (await self._request("GET", f"/batches/{batch_id}")).json()
+            for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+                if not file_id:
+                    continue
+                content = await self._request("GET", f"/files/{file_id}/content")
+                for raw in content.text.splitlines():
+                    if raw.strip():
+                        results.append(self._batch_item(json.loads(raw), batch_id))
+        except Exception as e:
+            raise wrap_provider_error("OpenAI batch error", "openai", e)
+        return results
+
+    @staticmethod
+    def _batch_item(line: Dict[str, Any], batch_id: str) -> BatchItemResult:
+        """解析输出文件中的一行."""
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or body.get("error") or {}
+            message = error.get("message") if isinstance(error, dict) else error
+            return BatchItemResult(line["custom_id"], error=str(message or f"HTTP {response.get('status_code')}"))
+
+        usage = body.get("usage") or {}
+        return BatchItemResult(
+            line["custom_id"],
+            response=AIResponse(
+                text=body["choices"][0]["message"].get("content") or "",
+                structured_data=None,
+                suggested_actions=None,
+                metadata={
+                    "model": body.get("model"),
+                    "provider": "openai",
+                    "usage": {
+                        "input_tokens": usage.get("prompt_tokens", 0),
+                        "output_tokens": usage.get("completion_tokens", 0),
+                    },
+                    "batch_id": batch_id,
+                },
+            ),
+        )
+
+    async def cancel_batch(self, batch_id: str):
+        """取消批次，已完成的请求仍计费."""
+        try:
+            await self._request("POST", f"/batches/{batch_id}/cancel")
         except Exception as e:
-            raise Exception(f"OpenAI streaming error: {str(e)}")
+            raise wrap_provider_error("OpenAI batch error", "openai", e)
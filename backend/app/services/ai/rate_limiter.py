@@ -0,0 +1,342 @@
+"""AI提供商出站限流：令牌桶 + 并发控制 + 429退避重试."""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.services.ai.exceptions import AIRateLimitError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """异步令牌桶.
+
+    等待者通过asyncio.Lock按先来后到排队（asyncio.Lock的唤醒顺序是FIFO），
+    大请求不会被源源不断的小请求饿死。
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        """初始化令牌桶.
+
+        Args:
+            capacity: 桶容量（每个周期可用的额度）
+            period: 补满整个桶所需的时间（秒）
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """获取额度，不足时排队等待.
+
+        Args:
+            amount: 需要的额度，超过桶容量时按桶容量计
+
+        Returns:
+            排队等待的时间（秒）
+        """
+        amount = min(amount, self.capacity)
+        started = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+        return time.monotonic() - started
+
+    def adjust(self, delta: float):
+        """按实际用量修正额度，delta为正表示多扣，为负表示退还.
+
+        多扣的部分会让余额变为负数，由后续补充逐步偿还。
+        """
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class ProviderLimiter:
+    """单个提供商的限流器：每分钟请求数、每分钟token数和最大并发数."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int):
+        """初始化提供商限流器.
+
+        Args:
+            requests_per_minute: 每分钟请求数上限，0表示不限制
+            tokens_per_minute: 每分钟token数上限，0表示不限制
+            max_concurrency: 最大并发请求数，0表示不限制
+        """
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.concurrency = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self.in_flight = 0
+        self.queued = 0
+        self.blocked_until = 0.0
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """按请求数和预估token数获取额度，然后占用一个并发槽位.
+
+        Returns:
+            排队等待的时间（秒）
+        """
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            # 提供商返回429后，冷却结束前所有新请求都要等待
+            while time.monotonic() < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - time.monotonic())
+            if self.requests is not None:
+                await self.requests.acquire(1)
+            if self.tokens is not None:
+                await self.tokens.acquire(estimated_tokens)
+            if self.concurrency is not None:
+                await self.concurrency.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        return time.monotonic() - started
+
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """释放并发槽位，并按实际用量结算token额度."""
+        self.in_flight -= 1
+        if self.concurrency is not None:
+            self.concurrency.release()
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def pause(self, seconds: float):
+        """提供商返回429后暂停该提供商的所有新请求."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def _total_tokens(usage: Optional[Dict[str, Any]]) -> Optional[int]:
+    """计算usage中的输入+输出token数，没有用量信息时返回None."""
+    if not usage:
+        return None
+    return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    """从AI响应的usage中读取实际消耗的token数."""
+    return _total_tokens((getattr(result, "metadata", None) or {}).get("usage"))
+
+
+class RateLimiter:
+    """出站请求限流器.
+
+    按提供商限制请求速率、token速率和并发数，调用方公平排队；遇到提供商
+    429时按Retry-After加随机抖动退避重试，而不是直接让HTTP请求失败。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        limits: Optional[Dict[str, Dict[str, int]]] = None,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        """初始化限流器.
+
+        Args:
+            enabled: 是否启用限流
+            limits: 各提供商的限额，键为rpm/tpm/concurrency
+            max_retries: 429最大重试次数
+            backoff_base: 指数退避的基础等待时间（秒）
+            backoff_max: 单次退避的最长等待时间（秒）
+        """
+        self.enabled = enabled
+        self.limits = limits or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._stats = {"throttled": 0, "retries": 0, "gave_up": 0, "queued_seconds": 0.0}
+
+    def get_limiter(self, provider: str) -> ProviderLimiter:
+        """获取提供商的限流器."""
+        if provider not in self._limiters:
+            limits = self.limits.get(provider, {})
+            self._limiters[provider] = ProviderLimiter(
+                requests_per_minute=limits.get("rpm", 0),
+                tokens_per_minute=limits.get("tpm", 0),
+                max_concurrency=limits.get("concurrency", 0),
+            )
+        return self._limiters[provider]
+
+    def backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """计算第attempt次重试前的等待时间.
+
+        有Retry-After时以其为下限再加少量抖动，否则使用带完全抖动的指数退避。
+        """
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after) + random.uniform(0, self.backoff_base)
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(self.backoff_base / 2, ceiling)
+
+    async def _acquire(self, limiter: ProviderLimiter, estimated_tokens: int):
+        waited = await limiter.acquire(estimated_tokens)
+        self._stats["queued_seconds"] += waited
+
+    def _on_rate_limited(
+        self,
+        provider: str,
+        limiter: ProviderLimiter,
+        error: AIRateLimitError,
+        attempt: int,
+    ) -> float:
+        """记录一次429并暂停该提供商，返回重试前的等待时间."""
+        self._stats["throttled"] += 1
+        delay = self.backoff(attempt, error.retry_after)
+        limiter.pause(delay)
+        logger.warning(
+            "AI provider %s rate limited, retry %d/%d in %.1fs",
+            provider,
+            attempt + 1,
+            self.max_retries,
+            delay,
+        )
+        return delay
+
+    async def run(
+        self,
+        provider: str,
+        estimated_tokens: int,
+        factory: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """在限流下执行一次调用，遇到429时退避重试.
+
+        Args:
+            provider: 服务提供商
+            estimated_tokens: 预估的token消耗（输入+最大输出）
+            factory: 发起调用的协程工厂
+
+        Returns:
+            调用结果
+        """
+        if not self.enabled:
+            return await factory()
+
+        limiter = self.get_limiter(provider)
+        attempt = 0
+        while True:
+            await self._acquire(limiter, estimated_tokens)
+            result = None
+            try:
+                result = await factory()
+                return result
+            except AIRateLimitError as e:
+                if attempt >= self.max_retries:
+                    self._stats["gave_up"] += 1
+                    raise
+                self._on_rate_limited(provider, limiter, e, attempt)
+            finally:
+                # 失败的调用没有消耗token，退还预估额度
+                actual = _usage_tokens(result) if result is not None else 0
+                limiter.release(estimated_tokens, actual)
+
+            # 重新获取额度时会等待pause设置的冷却时间
+            attempt += 1
+            self._stats["retries"] += 1
+
+    async def stream(
+        self,
+        provider: str,
+        estimated_tokens: int,
+        factory: Callable[[], AsyncIterator[str]],
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """在限流下执行流式调用，整个流期间占用一个并发槽位.
+
+        只有在尚未输出任何片段时才会对429退避重试。
+
+        Args:
+            provider: 服务提供商
+            estimated_tokens: 预估的token消耗
+            factory: 创建上游异步生成器的工厂
+            usage: 上游写入的token用量，用于结算token额度
+
+        Yields:
+            文本片段
+        """
+        if not self.enabled:
+            async for chunk in factory():
+                yield chunk
+            return
+
+        limiter = self.get_limiter(provider)
+        attempt = 0
+        while True:
+            await self._acquire(limiter, estimated_tokens)
+            produced = False
+            try:
+                async for chunk in factory():
+                    produced = True
+                    yield chunk
+                return
+            except AIRateLimitError as e:
+                if produced or attempt >= self.max_retries:
+                    self._stats["gave_up"] += 1
+                    raise
+                self._on_rate_limited(provider, limiter, e, attempt)
+            finally:
+                # 没有任何输出的失败流退还预估额度
+                actual = _total_tokens(usage) if produced else 0
+                limiter.release(estimated_tokens, actual)
+
+            # 重新获取额度时会等待pause设置的冷却时间
+            attempt += 1
+            self._stats["retries"] += 1
+
+    def utilization(self) -> float:
+        """当前出站负载（0~1）：各提供商并发槽位占用比例的最大值，有请求排队时为1."""
+        load = 0.0
+        for name, limiter in self._limiters.items():
+            if limiter.queued:
+                return 1.0
+            concurrency = self.limits.get(name, {}).get("concurrency", 0)
+            if concurrency > 0:
+                load = max(load, limiter.in_flight / concurrency)
+        return load
+
+    def stats(self) -> Dict[str, Any]:
+        """获取限流统计."""
+        return {
+            **self._stats,
+            "queued_seconds": round(self._stats["queued_seconds"], 3),
+            "providers": {
+                name: {"in_flight": limiter.in_flight, "queued": limiter.queued}
+                for name, limiter in self._limiters.items()
+            },
+        }
+
+
+def create_rate_limiter() -> RateLimiter:
+    """根据应用配置创建限流器."""
+    return RateLimiter(
+        enabled=settings.RATE_LIMIT_ENABLED,
+        limits={
+            "anthropic": {
+                "rpm": settings.ANTHROPIC_REQUESTS_PER_MINUTE,
+                "tpm": settings.ANTHROPIC_TOKENS_PER_MINUTE,
+                "concurrency": settings.AI_MAX_CONCURRENCY,
+            },
+            "openai": {
+                "rpm": settings.OPENAI_REQUESTS_PER_MINUTE,
+                "tpm": settings.OPENAI_TOKENS_PER_MINUTE,
+                "concurrency": settings.AI_MAX_CONCURRENCY,
+            },
+        },
+        max_retries=settings.AI_RATE_LIMIT_MAX_RETRIES,
+        backoff_base=settings.AI_RATE_LIMIT_BACKOFF_BASE,
+        backoff_max=settings.AI_RATE_LIMIT_BACKOFF_MAX,
+    )
@@ -0,0 +1,214 @@
+"""AI提供商路由：延迟感知的负载均衡、熔断与故障转移."""
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.stats import percentile
+
+
+# 路由目标：(提供商, 模型)
+RouteTarget = Tuple[str, str]
+
+
+@dataclass
+class CircuitBreaker:
+    """熔断器.
+
+    连续失败达到阈值后打开，冷却期内拒绝请求；冷却结束进入半开状态，
+    下一次调用成功则关闭，失败则重新打开。
+    """
+
+    failure_threshold: int
+    reset_timeout: float
+    state: str = "closed"  # closed, open, half_open
+    consecutive_failures: int = 0
+    opened_at: float = 0.0
+
+    def allow(self) -> bool:
+        """当前是否允许请求通过."""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                return True
+            return False
+        return True
+
+    def record_success(self):
+        """记录成功调用."""
+        self.consecutive_failures = 0
+        self.state = "closed"
+
+    def record_failure(self):
+        """记录失败调用."""
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class BackendStats:
+    """单个路由目标的滚动统计."""
+
+    window_size: int
+    latencies: Deque[float] = field(default_factory=deque)
+    outcomes: Deque[bool] = field(default_factory=deque)
+
+    def record(self, latency: Optional[float], ok: bool):
+        """记录一次调用结果，latency为None时只计入成功率."""
+        if latency is not None and ok:
+            self.latencies.append(latency)
+            if len(self.latencies) > self.window_size:
+                self.latencies.popleft()
+        self.outcomes.append(ok)
+        if len(self.outcomes) > self.window_size:
+            self.outcomes.popleft()
+
+    @property
+    def samples(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def percentiles(self) -> Tuple[float, float]:
+        """返回(p50, p95)延迟（秒）."""
+        ordered = sorted(self.latencies)
+        return percentile(ordered, 0.5), percentile(ordered, 0.95)
+
+
+class ProviderRouter:
+    """提供商路由策略.
+
+    按(提供商, 模型)维护滚动的p50/p95延迟和错误率，把新请求发给最健康的
+    后端；熔断打开的后端被跳过，除非所有后端都已熔断。
+    """
+
+    # 错误率对路由得分的惩罚系数
+    ERROR_PENALTY = 10.0
+
+    def __init__(
+        self,
+        window_size: int = 200,
+        min_samples: int = 5,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        hedge_enabled: bool = False,
+        hedge_min_samples: int = 20,
+    ):
+        """初始化路由器.
+
+        Args:
+            window_size: 每个后端保留的最近调用数
+            min_samples: 样本数低于此值的后端优先探测
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断冷却时间（秒）
+            hedge_enabled: 是否启用对冲请求
+            hedge_min_samples: 启用对冲所需的最少延迟样本数
+        """
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self._stats: Dict[RouteTarget, BackendStats] = {}
+        self._breakers: Dict[RouteTarget, CircuitBreaker] = {}
+        self._counters = {"failovers": 0, "hedges": 0, "hedge_wins": 0}
+
+    def _get_stats(self, target: RouteTarget) -> BackendStats:
+        if target not in self._stats:
+            self._stats[target] = BackendStats(window_size=self.window_size)
+        return self._stats[target]
+
+    def _get_breaker(self, target: RouteTarget) -> CircuitBreaker:
+        if target not in self._breakers:
+            self._breakers[target] = CircuitBreaker(
+                failure_threshold=self.failure_threshold,
+                reset_timeout=self.reset_timeout,
+            )
+        return self._breakers[target]
+
+    def score(self, target: RouteTarget) -> float:
+        """计算路由得分，越小越健康."""
+        stats = self._get_stats(target)
+        if len(stats.outcomes) < self.min_samples:
+            # 样本不足的后端优先探测，避免流量永远集中在一家
+            return 0.0
+        if not stats.samples:
+            # 窗口内没有成功调用
+            return float("inf")
+        p50, p95 = stats.percentiles()
+        return (p50 + 0.5 * p95) * (1 + self.ERROR_PENALTY * stats.error_rate)
+
+    def rank(self, targets: List[RouteTarget]) -> List[RouteTarget]:
+        """按健康度排序候选后端.
+
+        Args:
+            targets: 候选后端，顺序即平分时的优先级
+
+        Returns:
+            排序后的后端列表，熔断中的后端被排除（全部熔断时保留全部）
+        """
+        allowed = [t for t in targets if self._get_breaker(t).allow()]
+        candidates = allowed or list(targets)
+        return sorted(candidates, key=self.score)
+
+    def hedge_delay(self, target: RouteTarget) -> Optional[float]:
+        """获取对冲等待时间（该后端的p95延迟），不满足对冲条件返回None."""
+        if not self.hedge_enabled:
+            return None
+        stats = self._get_stats(target)
+        if stats.samples < self.hedge_min_samples:
+            return None
+        return stats.percentiles()[1]
+
+    def record(self, target: RouteTarget, latency: Optional[float], ok: bool):
+        """记录一次调用结果.
+
+        Args:
+            target: 路由目标
+            latency: 调用耗时（秒），流式调用传None
+            ok: 是否成功
+        """
+        self._get_stats(target).record(latency, ok)
+        breaker = self._get_breaker(target)
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def count(self, event: str):
+        """累加路由事件计数（failovers/hedges/hedge_wins）."""
+        self._counters[event] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """获取各后端的路由统计."""
+        backends = {}
+        for target, stats in self._stats.items():
+            p50, p95 = stats.percentiles()
+            backends[f"{target[0]}:{target[1]}"] = {
+                "p50_ms": round(p50 * 1000, 1),
+                "p95_ms": round(p95 * 1000, 1),
+                "error_rate": round(stats.error_rate, 4),
+                "samples": stats.samples,
+                "circuit": self._get_breaker(target).state,
+            }
+        return {**self._counters, "backends": backends}
+
+
+def create_provider_router() -> ProviderRouter:
+    """根据应用配置创建路由器."""
+    return ProviderRouter(
+        window_size=settings.AI_ROUTER_WINDOW_SIZE,
+        min_samples=settings.AI_ROUTER_MIN_SAMPLES,
+        failure_threshold=settings.AI_ROUTER_FAILURE_THRESHOLD,
+        reset_timeout=settings.AI_ROUTER_RESET_TIMEOUT,
+        hedge_enabled=settings.AI_ROUTER_HEDGE_ENABLED,
+        hedge_min_samples=settings.AI_ROUTER_HEDGE_MIN_SAMPLES,
+    )
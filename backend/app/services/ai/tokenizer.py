@@ -0,0 +1,381 @@
+"""Token计数与提示词预算.
+
+按模型选择tiktoken编码器并缓存编码器和计数结果，在发起网络请求前算出
+输入token数，把max_tokens限制在模型上下文窗口内，超长的提示词按配置
+拒绝或裁剪。编码器无法加载时（如离线环境无法下载BPE文件）退化为按字符数
+估算，中文约每字一个token，这一估计偏保守。
+"""
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ai.cache import LRUCache
+from app.services.ai.exceptions import AIPromptTooLongError
+
+logger = logging.getLogger(__name__)
+
+
+# 非OpenAI模型（如Claude）没有公开的tiktoken编码，用cl100k_base近似
+DEFAULT_ENCODING = "cl100k_base"
+
+# 模型上下文窗口和单次最大输出token数，按前缀匹配，更具体的前缀在前
+MODEL_LIMITS: Tuple[Tuple[str, int, Optional[int]], ...] = (
+    ("claude-opus-4-5", 200000, 64000),
+    ("claude-opus-4", 200000, 32000),
+    ("claude-sonnet-4", 200000, 64000),
+    ("claude-haiku-4", 200000, 64000),
+    ("claude-3-7", 200000, 64000),
+    ("claude-3-5", 200000, 8192),
+    ("claude-3", 200000, 4096),
+    ("claude-2.1", 200000, 4096),
+    ("claude-2", 100000, 4096),
+    ("claude-instant", 100000, 4096),
+    ("gpt-4.1", 1047576, 32768),
+    ("gpt-4o-2024-05-13", 128000, 4096),
+    ("gpt-4o", 128000, 16384),
+    ("gpt-4-turbo", 128000, 4096),
+    ("gpt-4-1106", 128000, 4096),
+    ("gpt-4-0125", 128000, 4096),
+    ("gpt-4-32k", 32768, None),
+    ("gpt-4", 8192, None),
+    ("gpt-3.5-turbo", 16385, 4096),
+)
+
+# 表中没有的新模型按提供商系列的上下文窗口估计（不限制输出），并记录警告
+MODEL_FAMILY_LIMITS: Tuple[Tuple[str, int], ...] = (
+    ("claude-", 200000),
+    ("gpt-5", 400000),
+    ("gpt-4", 128000),
+)
+
+# 每条消息的格式开销（角色标记、分隔符）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 裁剪提示词时插入的省略标记
+TRUNCATION_MARKER = "\n……（中间内容过长，已省略）……\n"
+
+
+@dataclass
+class PromptBudget:
+    """一次调用的token预算."""
+
+    model: str
+    context_window: Optional[int]  # None：未知模型，未做预算
+    input_tokens: int
+    max_tokens: int
+    original_input_tokens: int
+    trimmed: bool = False
+    # 使用tiktoken精确计数时为True，按字符数估算时为False
+    exact: bool = True
+
+    def as_metadata(self) -> Dict[str, Any]:
+        """转换为响应metadata中的tokens字段."""
+        return {
+            "estimated_input_tokens": self.input_tokens,
+            "max_tokens": self.max_tokens,
+            "context_window": self.context_window,
+            "trimmed": self.trimmed,
+            "original_input_tokens": self.original_input_tokens,
+            "exact": self.exact,
+        }
+
+
+class TokenCounter:
+    """按模型缓存编码器的token计数器."""
+
+    def __init__(
+        self,
+        default_context_window: int = 8192,
+        min_output_tokens: int = 256,
+        overflow: str = "trim",
+        cache_size: int = 2048,
+    ):
+        """初始化计数器.
+
+        Args:
+            default_context_window: 未知模型（也不属于已知系列）的上下文窗口，
+                为0时这类模型的提示词不做预算，原样发送
+            min_output_tokens: 输入之外至少要留给输出的token数
+            overflow: 提示词超出上下文窗口时的处理方式，trim或reject
+            cache_size: 计数结果缓存的条目数
+        """
+        self.default_context_window = default_context_window
+        self.min_output_tokens = min_output_tokens
+        self.overflow = overflow
+        self._encoding_names: Dict[str, str] = {}
+        # 编码器加载失败记为None，避免每次调用都重新下载
+        self._encodings: Dict[str, Any] = {}
+        self._unknown_models: set = set()
+        # 模板前缀、对话历史会被反复计数，缓存计数结果
+        self._counts = LRUCache(max_entries=cache_size, ttl=24 * 3600)
+
+    def encoding_name(self, model: Optional[str]) -> str:
+        """获取模型对应的tiktoken编码名称."""
+        if not model:
+            return DEFAULT_ENCODING
+
+        name = self._encoding_names.get(model)
+        if name is None:
+            name = DEFAULT_ENCODING
+            if not model.startswith("claude"):
+                try:
+                    import tiktoken
+
+                    name = tiktoken.encoding_name_for_model(model)
+                except (ImportError, KeyError):
+                    pass
+            self._encoding_names[model] = name
+        return name
+
+    def get_encoding(self, model: Optional[str]):
+        """获取模型的编码器，无法加载时返回None."""
+        name = self.encoding_name(model)
+        if name not in self._encodings:
+            try:
+                import tiktoken
+
+                self._encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                logger.warning("Tokenizer %s unavailable, counting characters instead: %s", name, e)
+                self._encodings[name] = None
+        return self._encodings[name]
+
+    def count(self, text: Optional[str], model: Optional[str] = None) -> int:
+        """计算文本的token数.
+
+        Args:
+            text: 文本
+            model: 模型名称
+
+        Returns:
+            token数
+        """
+        if not text:
+            return 0
+
+        encoding = self.get_encoding(model)
+        if encoding is None:
+            return len(text)
+
+        # 按摘要缓存，不在进程内长期持有提示词和稿件原文
+        key = f"{encoding.name}:{hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()}"
+        cached = self._counts.get(key)
+        if cached is not None:
+            return cached
+
+        count = len(encoding.encode(text, disallowed_special=()))
+        self._counts.set(key, count)
+        return count
+
+    def count_messages(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> int:
+        """计算对话消息（含系统提示词）的输入token数."""
+        total = sum(
+            self.count(message.get("content"), model) + MESSAGE_OVERHEAD_TOKENS
+            for message in messages
+        )
+        if system_prompt:
+            total += self.count(system_prompt, model) + MESSAGE_OVERHEAD_TOKENS
+        return total
+
+    def limits(self, model: str) -> Tuple[Optional[int], Optional[int]]:
+        """获取模型的(上下文窗口, 最大输出token数).
+
+        未知模型按系列估计上下文窗口；不属于已知系列时使用
+        default_context_window，未配置时返回None（不做预算）。
+        """
+        for prefix, context_window, max_output in MODEL_LIMITS:
+            if model.startswith(prefix):
+                return context_window, max_output
+        for prefix, context_window in MODEL_FAMILY_LIMITS:
+            if model.startswith(prefix):
+                self._warn_unknown(model, f"assuming the {prefix}* context window of {context_window} tokens")
+                return context_window, None
+        if self.default_context_window:
+            self._warn_unknown(model, f"assuming AI_DEFAULT_CONTEXT_WINDOW={self.default_context_window}")
+            return self.default_context_window, None
+        self._warn_unknown(model, "sending prompts without a token budget")
+        return None, None
+
+    def _warn_unknown(self, model: str, action: str):
+        """每个未知模型只警告一次."""
+        if model not in self._unknown_models:
+            self._unknown_models.add(model)
+            logger.warning("No token limits known for model %s, %s", model, action)
+
+    def truncate(self, text: str, max_tokens: int, model: Optional[str] = None) -> str:
+        """保留开头和结尾、省略中间，把文本裁剪到max_tokens以内.
+
+        提示词模板的任务说明在开头、输出格式在结尾，中间通常是上下文材料。
+        """
+        max_tokens = max(0, max_tokens - self.count(TRUNCATION_MARKER, model))
+        head_size = max_tokens // 2
+        tail_size = max_tokens - head_size
+
+        encoding = self.get_encoding(model)
+        if encoding is None:
+            return text[:head_size] + TRUNCATION_MARKER + text[len(text) - tail_size:]
+
+        tokens = encoding.encode(text, disallowed_special=())
+        head = encoding.decode(tokens[:head_size])
+        tail = encoding.decode(tokens[len(tokens) - tail_size:])
+        return head + TRUNCATION_MARKER + tail
+
+    def _plan(self, model: str, max_tokens: Optional[int]) -> Tuple[Optional[int], int]:
+        """计算(上下文窗口, 请求的输出token数)."""
+        context_window, max_output = self.limits(model)
+        requested = max_tokens or settings.DEFAULT_MAX_TOKENS
+        if max_output is not None:
+            requested = min(requested, max_output)
+        return context_window, requested
+
+    def _oversized(self, input_tokens: int, context_window: Optional[int], requested: int) -> bool:
+        """输入是否超长：剩余空间不足以容纳最少的输出（未知模型不判断）."""
+        if context_window is None:
+            return False
+        return context_window - input_tokens < min(requested, self.min_output_tokens)
+
+    def _overflow(self, model: str, input_tokens: int, context_window: int):
+        """输入超长时按配置决定是否拒绝."""
+        if self.overflow == "reject":
+            raise AIPromptTooLongError(
+                f"Prompt too long for {model}: {input_tokens} tokens, "
+                f"context window is {context_window}",
+                input_tokens=input_tokens,
+                context_window=context_window,
+            )
+
+    def _finish(
+        self,
+        model: str,
+        context_window: Optional[int],
+        requested: int,
+        input_tokens: int,
+        original_input_tokens: int,
+    ) -> PromptBudget:
+        """检查裁剪后的输入并把max_tokens限制在剩余空间内."""
+        if self._oversized(input_tokens, context_window, requested):
+            raise AIPromptTooLongError(
+                f"Prompt too long for {model}: {input_tokens} tokens leave no room for output",
+                input_tokens=input_tokens,
+                context_window=context_window,
+            )
+        return PromptBudget(
+            model=model,
+            context_window=context_window,
+            input_tokens=input_tokens,
+            max_tokens=requested if context_window is None else min(requested, context_window - input_tokens),
+            original_input_tokens=original_input_tokens,
+            trimmed=input_tokens != original_input_tokens,
+            exact=self.get_encoding(model) is not None,
+        )
+
+    def budget_prompt(
+        self,
+        model: str,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        prompt_prefix: Optional[str] = None,
+    ) -> Tuple[str, PromptBudget]:
+        """为单轮调用计算预算，必要时裁剪提示词（系统提示词和稳定前缀不裁剪）.
+
+        Args:
+            model: 实际调用的模型
+            prompt: 用户提示词
+            system_prompt: 系统提示词
+            max_tokens: 调用方请求的最大输出token数
+            prompt_prefix: 用户提示词的稳定前缀
+
+        Returns:
+            (可能被裁剪的提示词, 预算)
+
+        Raises:
+            AIPromptTooLongError: 提示词超长且不允许裁剪
+        """
+        prefix_tokens = self.count(prompt_prefix, model)
+        input_tokens = self.count_messages([{"content": prompt}], system_prompt, model) + prefix_tokens
+        original = input_tokens
+        context_window, requested = self._plan(model, max_tokens)
+
+        if self._oversized(input_tokens, context_window, requested):
+            self._overflow(model, input_tokens, context_window)
+            # 裁剪后给输出留出完整的请求额度
+            max_input = context_window - requested
+            system_tokens = input_tokens - self.count(prompt, model)
+            prompt = self.truncate(prompt, max_input - system_tokens, model)
+            input_tokens = (
+                self.count_messages([{"content": prompt}], system_prompt, model) + prefix_tokens
+            )
+
+        return prompt, self._finish(model, context_window, requested, input_tokens, original)
+
+    def budget_messages(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, str]], PromptBudget]:
+        """为对话调用计算预算，必要时丢弃最早的消息.
+
+        裁剪后的历史以用户消息开头；只剩最后一条消息仍然超长时裁剪其内容。
+
+        Args:
+            model: 实际调用的模型
+            messages: 消息历史
+            system_prompt: 系统提示词
+            max_tokens: 调用方请求的最大输出token数
+
+        Returns:
+            (可能被裁剪的消息列表, 预算)
+
+        Raises:
+            AIPromptTooLongError: 消息超长且不允许裁剪
+        """
+        input_tokens = self.count_messages(messages, system_prompt, model)
+        original = input_tokens
+        context_window, requested = self._plan(model, max_tokens)
+
+        if self._oversized(input_tokens, context_window, requested):
+            self._overflow(model, input_tokens, context_window)
+            max_input = context_window - requested
+            messages = list(messages)
+            while len(messages) > 1 and input_tokens > max_input:
+                dropped = messages.pop(0)
+                input_tokens -= self.count(dropped.get("content"), model) + MESSAGE_OVERHEAD_TOKENS
+                # Anthropic要求历史以用户消息开头
+                while len(messages) > 1 and messages[0].get("role") == "assistant":
+                    dropped = messages.pop(0)
+                    input_tokens -= (
+                        self.count(dropped.get("content"), model) + MESSAGE_OVERHEAD_TOKENS
+                    )
+
+            if input_tokens > max_input:
+                last = messages[-1]
+                content = last.get("content") or ""
+                budget = max_input - (input_tokens - self.count(content, model))
+                messages[-1] = {**last, "content": self.truncate(content, budget, model)}
+                input_tokens = self.count_messages(messages, system_prompt, model)
+
+        return messages, self._finish(model, context_window, requested, input_tokens, original)
+
+
+def create_token_counter() -> TokenCounter:
+    """根据应用配置创建token计数器."""
+    return TokenCounter(
+        default_context_window=settings.AI_DEFAULT_CONTEXT_WINDOW,
+        min_output_tokens=settings.AI_MIN_OUTPUT_TOKENS,
+        overflow=settings.AI_PROMPT_OVERFLOW,
+        cache_size=settings.AI_TOKEN_COUNT_CACHE_SIZE,
+    )
+
+
+# 全局token计数器实例
+token_counter = create_token_counter()
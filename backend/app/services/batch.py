@@ -0,0 +1,401 @@
+"""批量离线生成（提供商Batch API）.
+
+夜间批量任务（全书逐章重新诊断、导入稿件后重建角色档案等）不走同步调用
+路径，而是按模板构建JSONL请求一次性提交给提供商的批处理接口：费用更低，
+也不与交互请求争用限流额度。任务流程：
+1. 准备：按任务类型读取实体，逐个填充模板生成请求
+2. 提交：提交前在Redis中写入submitting标记，提交后写入批次ID和请求元数据；
+   worker中途退出后接管的worker继续轮询同一批次，不会重复提交；标记仍为
+   submitting（提交结果未知）时任务失败，而不是再提交一个付费批次
+3. 轮询：按poll_interval查询进度并报告任务进度
+4. 写回：结果写回对应实体，状态标记为applied后记入提交用户的token用量；
+   写回之后中断的任务被接管时直接返回写回统计，不会重复写回和记账
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+
+from app.ai.roles import get_ai_role
+from app.ai.templates import PromptTemplateManager
+from app.core.config import settings
+from app.models.entity.chapter import Chapter
+from app.models.entity.character import Character
+from app.models.entity.project import Project
+from app.services.ai.ai_manager import ai_manager
+from app.services.ai.batch import ENDED, BatchItemResult, BatchRequest, LocalBatchService
+from app.services.ai.json_stream import parse_json_lenient
+from app.services.database import database
+from app.core.context import metered_user
+from app.services.metering import token_meter
+from app.services.quality import (
+    QualityAnalyzer,
+    load_quality_input,
+    merge_reports,
+    normalize_quality_report,
+    quality_analyzer,
+    split_manuscript,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 支持的批处理任务类型
+BATCH_KINDS = ("quality_analysis", "character_profile")
+
+# 批次状态：提交中（提交结果未知）、已提交、已写回
+SUBMITTING = "submitting"
+SUBMITTED = "submitted"
+APPLIED = "applied"
+
+BatchItems = List[Tuple[BatchRequest, Dict[str, Any]]]
+
+
+class BatchRunner:
+    """提交批次、轮询并写回结果."""
+
+    def __init__(
+        self,
+        redis_url: str,
+        key_prefix: str = "novelflow:batch:",
+        provider: Optional[str] = None,
+        poll_interval: float = 60.0,
+        max_requests: int = 10000,
+        state_ttl: int = 172800,
+        analyzer: Optional[QualityAnalyzer] = None,
+    ):
+        """初始化批处理执行器.
+
+        Args:
+            redis_url: 保存批次状态的Redis地址
+            key_prefix: Redis键前缀
+            provider: anthropic、openai或local，为空时使用第一个可用的提供商
+            poll_interval: 轮询批次进度的间隔（秒）
+            max_requests: 单个批次的请求数上限
+            state_ttl: 批次状态的保留时间（秒），应覆盖批次的最长执行时间
+            analyzer: 质量诊断器，复用其分块和提示词，写回时预热其缓存
+        """
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+        self.provider = provider
+        self.poll_interval = poll_interval
+        self.max_requests = max_requests
+        self.state_ttl = state_ttl
+        self.analyzer = analyzer or quality_analyzer
+        self.local = LocalBatchService()
+        self.template_manager = PromptTemplateManager()
+        self._redis = None
+
+    async def redis(self):
+        """延迟创建Redis客户端."""
+        if self._redis is None:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def close(self):
+        """关闭Redis连接."""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def service(self, provider: Optional[str] = None):
+        """获取批处理使用的提供商服务."""
+        provider = provider or self.provider
+        if provider == "local":
+            return self.local
+        return ai_manager.get_service(provider or None)
+
+    # ========== 准备请求 ==========
+
+    async def prepare(self, kind: str, params: Dict[str, Any]) -> BatchItems:
+        """按任务类型构建请求和写回所需的元数据.
+
+        Raises:
+            ValueError: 任务类型未知或参数无效
+        """
+        if kind == "quality_analysis":
+            return await self._prepare_quality(params)
+        if kind == "character_profile":
+            return await self._prepare_characters(params)
+        raise ValueError(f"Unknown batch kind: {kind}")
+
+    async def _prepare_quality(self, params: Dict[str, Any]) -> BatchItems:
+        """每个诊断块一个请求，分块和提示词与同步诊断相同."""
+        loaded = await load_quality_input(UUID(params["project_id"]), None)
+        scope = params.get("content_type") or "full"
+        role = get_ai_role("quality_inspector")
+        items: BatchItems = []
+        for chapter, scenes in loaded["chapters"]:
+            for chunk in split_manuscript([(chapter, scenes)], self.analyzer.chunk_tokens):
+                prefix, prompt = self.analyzer.build_prompt(chunk, loaded["project"], scope)
+                request = BatchRequest(
+                    custom_id=f"quality-{len(items)}",
+                    prompt=prompt,
+                    prompt_prefix=prefix,
+                    system_prompt=role.system_prompt,
+                    temperature=role.temperature,
+                    max_tokens=role.max_tokens,
+                    response_format="json",
+                )
+                meta = {
+                    "chapter_id": str(chapter.id),
+                    "location": chunk.location,
+                    "tokens": chunk.token_count,
+                    "cache_key": self.analyzer.cache_key(prefix, prompt),
+                }
+                items.append((request, meta))
+        return items
+
+    async def _prepare_characters(self, params: Dict[str, Any]) -> BatchItems:
+        """每个角色一个character_profile请求，现有档案作为角色需求带入."""
+        project_id = UUID(params["project_id"])
+        async with database.session_factory(readonly=True)() as db:
+            project = await db.get(Project, project_id)
+            if project is None:
+                raise ValueError(f"Project {project_id} not found")
+            query = select(Character).where(Character.project_id == project_id).order_by(Character.created_at)
+            if params.get("character_ids"):
+                query = query.where(Character.id.in_([UUID(value) for value in params["character_ids"]]))
+            characters = (await db.execute(query)).scalars().all()
+
+        core_conflict = params.get("core_conflict") or (project.settings or {}).get("core_conflict") or project.title
+        role = get_ai_role("character_designer")
+        items: BatchItems = []
+        for character in characters:
+            requirement = f"角色：{character.name}"
+            if character.profile:
+                requirement += "\n现有档案：" + json.dumps(character.profile, ensure_ascii=False)
+            prefix, prompt = self.template_manager.fill_template_parts(
+                "character_profile",
+                {
+                    "role_type": character.role_type or "supporting",
+                    "story_requirement": requirement,
+                    "core_conflict": core_conflict,
+                },
+            )
+            request = BatchRequest(
+                custom_id=f"character-{len(items)}",
+                prompt=prompt,
+                prompt_prefix=prefix,
+                system_prompt=role.system_prompt,
+                temperature=role.temperature,
+                max_tokens=role.max_tokens,
+                response_format="json",
+            )
+            items.append((request, {"character_id": str(character.id)}))
+        return items
+
+    def build_lines(self, service, items: BatchItems) -> List[Dict[str, Any]]:
+        """在模型的token预算内构建请求行（超长输入按同步调用的规则裁剪）."""
+        model = service.default_model
+        lines = []
+        for request, _ in items:
+            if model is not None:
+                request.prompt, budget = ai_manager.token_counter.budget_prompt(
+                    model, request.prompt, request.system_prompt, request.max_tokens, request.prompt_prefix
+                )
+                request.max_tokens = budget.max_tokens
+            lines.append(service.batch_line(request, model))
+        return lines
+
+    # ========== 写回 ==========
+
+    async def apply(
+        self, kind: str, metas: Dict[str, Dict[str, Any]], results: Dict[str, BatchItemResult]
+    ) -> Dict[str, int]:
+        """把结果写回实体.
+
+        Returns:
+            写回统计
+        """
+        if kind == "quality_analysis":
+            return await self._apply_quality(metas, results)
+        return await self._apply_characters(metas, results)
+
+    async def _apply_quality(
+        self, metas: Dict[str, Dict[str, Any]], results: Dict[str, BatchItemResult]
+    ) -> Dict[str, int]:
+        """逐章合并块的诊断写入Chapter.quality_report，并预热同步诊断的缓存."""
+        by_chapter: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for custom_id, meta in metas.items():
+            result = results.get(custom_id)
+            data = parse_json_lenient(result.response.text) if result and result.response else None
+            if data is None:
+                continue
+            result.response.structured_data = data
+            if self.analyzer.cache.enabled:
+                await self.analyzer.cache.set(meta["cache_key"], result.response)
+            report = normalize_quality_report(data, meta["location"])
+            by_chapter.setdefault(meta["chapter_id"], []).append((meta["tokens"], report))
+
+        analyzed_at = datetime.utcnow().isoformat()
+        async with database.session_factory()() as db:
+            for chapter_id, reports in by_chapter.items():
+                chapter = await db.get(Chapter, UUID(chapter_id))
+                if chapter is not None:
+                    merged = merge_reports(reports, self.analyzer.max_issues)
+                    chapter.quality_report = {**merged, "analyzed_at": analyzed_at}
+            await db.commit()
+        return {"chapters_updated": len(by_chapter)}
+
+    async def _apply_characters(
+        self, metas: Dict[str, Dict[str, Any]], results: Dict[str, BatchItemResult]
+    ) -> Dict[str, int]:
+        """解析为JSON的档案替换Character.profile，无法解析的保留原档案."""
+        updated = 0
+        async with database.session_factory()() as db:
+            for custom_id, meta in metas.items():
+                result = results.get(custom_id)
+                profile = parse_json_lenient(result.response.text) if result and result.response else None
+                if not isinstance(profile, dict):
+                    continue
+                character = await db.get(Character, UUID(meta["character_id"]))
+                if character is not None:
+                    character.profile = profile
+                    updated += 1
+            await db.commit()
+        return {"characters_updated": updated}
+
+    # ========== 执行 ==========
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.key_prefix}{job_id}"
+
+    async def _submit(self, kind: str, params: Dict[str, Any], job_id: str) -> Optional[Dict[str, Any]]:
+        """准备并提交批次，状态写入Redis；没有可处理的实体时返回None."""
+        items = await self.prepare(kind, params)
+        if not items:
+            return None
+        if len(items) > self.max_requests:
+            raise ValueError(f"Batch has {len(items)} requests, at most {self.max_requests} allowed")
+
+        # 预留输出上限，超出配额时在提交前拒绝
+        await token_meter.check(metered_user.get(), sum(request.max_tokens or 0 for request, _ in items))
+        service = self.service()
+        lines = self.build_lines(service, items)
+        state = {
+            "status": SUBMITTING,
+            "provider": service.provider_name,
+            "batch_id": None,
+            "kind": kind,
+            "metas": {request.custom_id: meta for request, meta in items},
+        }
+        # 先写标记再提交：提交后、写入批次ID前中断时，接管的worker不会重复提交
+        await self._save(job_id, state)
+        try:
+            status = await service.create_batch(lines)
+        except Exception:
+            # 提供商拒绝了提交，重试时可以重新提交
+            redis = await self.redis()
+            await redis.delete(self._key(job_id))
+            raise
+        state.update(status=SUBMITTED, batch_id=status.id, submitted_at=datetime.utcnow().isoformat())
+        await self._save(job_id, state)
+        logger.info("Submitted %s batch %s (%d requests) for job %s", kind, status.id, len(items), job_id)
+        return state
+
+    async def _save(self, job_id: str, state: Dict[str, Any]):
+        """保存批次状态."""
+        redis = await self.redis()
+        await redis.set(self._key(job_id), json.dumps(state, ensure_ascii=False), ex=self.state_ttl)
+
+    async def _cancel_requested(self, context: Any) -> bool:
+        """任务是被用户取消（而不是worker关闭）时返回True."""
+        if context is None or context.queue is None:
+            return True
+        job = await context.queue.get(context.job_id)
+        return job is None or job["cancel_requested"]
+
+    async def run(self, kind: str, params: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        """执行批处理任务：提交（或接管已提交的批次）、轮询、写回.
+
+        Args:
+            kind: 任务类型，见BATCH_KINDS
+            params: 任务参数（project_id等）
+            context: JobContext，任务ID用于定位已提交的批次
+
+        Returns:
+            批次ID、提供商、成功和失败的请求数及写回统计
+        """
+        redis = await self.redis()
+        raw = await redis.get(self._key(context.job_id))
+        state = json.loads(raw) if raw else None
+        if state is None:
+            await context.progress(0.0, "Preparing batch requests")
+            state = await self._submit(kind, params, context.job_id)
+            if state is None:
+                return {"batch_id": None, "provider": None, "requests": 0, "succeeded": 0, "failed": 0}
+        elif state.get("status") == SUBMITTING:
+            raise RuntimeError(
+                "A previous worker was interrupted while submitting this batch; "
+                "not resubmitting to avoid paying twice, check the provider's batches and retry"
+            )
+        elif state.get("status") == APPLIED:
+            logger.info("Job %s: batch %s was already written back", context.job_id, state["batch_id"])
+            await redis.delete(self._key(context.job_id))
+            return state["summary"]
+        else:
+            logger.info("Job %s resumes polling batch %s", context.job_id, state["batch_id"])
+
+        service = self.service(state["provider"])
+        total = len(state["metas"])
+        try:
+            while True:
+                status = await service.get_batch(state["batch_id"])
+                if status.status == ENDED:
+                    break
+                done = status.succeeded + status.failed
+                await context.progress(
+                    0.05 + 0.85 * done / total, f"Batch {status.id}: {done}/{total} done", **status.as_dict()
+                )
+                await asyncio.sleep(self.poll_interval)
+        except asyncio.CancelledError:
+            if await self._cancel_requested(context):
+                await service.cancel_batch(state["batch_id"])
+            raise
+
+        results = {result.custom_id: result for result in await service.batch_results(state["batch_id"])}
+        await context.progress(0.9, "Writing results back")
+        written = await self.apply(state["kind"], state["metas"], results)
+
+        succeeded = sum(1 for custom_id in state["metas"] if results.get(custom_id) and results[custom_id].response)
+        summary = {
+            "batch_id": state["batch_id"],
+            "provider": state["provider"],
+            "requests": total,
+            "succeeded": succeeded,
+            "failed": total - succeeded,
+            **written,
+        }
+        # 先标记已写回再记账：之后中断时接管的worker不会重复写回和记账
+        state.update(status=APPLIED, summary=summary)
+        await self._save(context.job_id, state)
+
+        user_id = metered_user.get()
+        for result in results.values():
+            if result.response is not None:
+                await token_meter.record(user_id, result.response.metadata.get("usage"))
+        await redis.delete(self._key(context.job_id))
+        return summary
+
+
+def create_batch_runner() -> BatchRunner:
+    """根据应用配置创建批处理执行器."""
+    return BatchRunner(
+        redis_url=settings.REDIS_URL,
+        key_prefix=settings.AI_BATCH_KEY_PREFIX,
+        provider=settings.AI_BATCH_PROVIDER or None,
+        poll_interval=settings.AI_BATCH_POLL_INTERVAL,
+        max_requests=settings.AI_BATCH_MAX_REQUESTS,
+        state_ttl=settings.AI_BATCH_STATE_TTL,
+    )
+
+
+# 全局批处理执行器
+batch_runner = create_batch_runner()
@@ -0,0 +1,433 @@
+"""对话存储：逐条追加消息、按token预算滑动窗口、滚动摘要.
+
+每条消息单独一行（conversation_messages），追加一轮对话只需插入两行并
+原子地更新对话上的计数器，写入成本与历史长度无关。构建提示词时只读取
+摘要之后的消息；未摘要部分超出窗口预算时，把较早的消息折叠进滚动摘要，
+长对话的提示词大小因此保持恒定。
+
+模型调用（回复和摘要）期间不持有事务：用户消息先提交，读取窗口后结束
+事务，回复在新的短事务中保存，同一对话的并发请求不会因对话行锁而排队，
+慢的提供商也不会占住连接池。
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai.roles import AIRole
+from app.core.config import settings
+from app.models.entity.conversation import Conversation
+from app.models.entity.conversation_message import ConversationMessage
+from app.models.entity.project import Project
+from app.schemas.ai import AIResponse
+from app.services.ai.ai_manager import ai_manager
+from app.services.ai.tokenizer import MESSAGE_OVERHEAD_TOKENS, token_counter
+
+logger = logging.getLogger(__name__)
+
+
+# 摘要任务说明，作为稳定前缀可被提示词缓存
+SUMMARY_INSTRUCTIONS = """
+# 任务：更新小说创作对话的滚动摘要
+
+你会收到已有摘要和之后新增的对话记录。请把它们合并为一份新的摘要，供后续对话作为背景。
+
+## 要求
+1. 保留已确定的设定、人物、情节决定和用户偏好
+2. 保留尚未解决的问题和用户明确提出的待办
+3. 删除寒暄、重复和已被推翻的方案
+4. 用条目式中文书写，不超过{max_chars}字
+
+## 输出
+直接输出新的摘要，不要解释。
+"""
+
+# 摘要放在窗口第一条用户消息之前
+SUMMARY_HEADER = "【此前对话摘要】\n"
+
+
+def compaction_split(rows: List[ConversationMessage], keep_budget: int) -> int:
+    """折叠点：rows[:split]折叠进摘要，rows[split:]保留在窗口中.
+
+    从最新消息往前保留约keep_budget个token，保留部分从用户消息开始，
+    至少保留最后一条消息。
+
+    Args:
+        rows: 未摘要的消息（按时间顺序）
+        keep_budget: 保留的token数
+
+    Returns:
+        折叠点下标
+    """
+    kept_tokens = 0
+    split = len(rows)
+    while split > 1 and kept_tokens + rows[split - 1].token_count <= keep_budget:
+        split -= 1
+        kept_tokens += rows[split].token_count
+    # 折叠到助手回复为止，保留的窗口从用户消息开始
+    while split < len(rows) - 1 and rows[split].role != "user":
+        split += 1
+    return min(split, max(0, len(rows) - 1))
+
+
+def chunk_messages(rows: List[ConversationMessage], max_tokens: int) -> List[List[ConversationMessage]]:
+    """按token数把待折叠的消息分批，每批至少一条，每次摘要调用的输入大小有上限."""
+    chunks: List[List[ConversationMessage]] = []
+    current: List[ConversationMessage] = []
+    used = 0
+    for row in rows:
+        if current and used + row.token_count > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(row)
+        used += row.token_count
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@dataclass
+class ConversationWindow:
+    """一次调用使用的对话上下文."""
+
+    messages: List[Dict[str, str]]
+    summary: Optional[str]
+    input_tokens: int
+
+
+class ConversationStore:
+    """对话存储与上下文窗口管理."""
+
+    def __init__(
+        self,
+        window_tokens: int = 6000,
+        summary_max_tokens: int = 800,
+        max_window_messages: int = 50,
+    ):
+        """初始化对话存储.
+
+        Args:
+            window_tokens: 摘要+近期消息的token预算
+            summary_max_tokens: 滚动摘要的最大token数
+            max_window_messages: 一次最多读取的近期消息条数
+        """
+        self.window_tokens = window_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.max_window_messages = max_window_messages
+
+    async def create(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        ai_role: Optional[str] = None,
+        context: Optional[dict] = None,
+    ) -> Conversation:
+        """创建对话，归属于项目的所有者.
+
+        Raises:
+            LookupError: 项目不存在
+        """
+        user_id = await db.scalar(select(Project.user_id).where(Project.id == project_id))
+        if user_id is None:
+            raise LookupError(f"Project not found: {project_id}")
+
+        conversation = Conversation(
+            project_id=project_id,
+            user_id=user_id,
+            ai_role=ai_role,
+            context=context,
+            message_count=0,
+            summary_tokens=0,
+            summary_until_seq=0,
+            unsummarized_tokens=0,
+        )
+        db.add(conversation)
+        await db.flush()
+        return conversation
+
+    async def get(self, db: AsyncSession, conversation_id: UUID) -> Optional[Conversation]:
+        """获取对话，不加载消息."""
+        return await db.get(Conversation, conversation_id)
+
+    async def recent_messages(
+        self, db: AsyncSession, conversation_id: UUID, limit: int = 20
+    ) -> List[ConversationMessage]:
+        """按时间顺序返回最近的limit条消息."""
+        result = await db.scalars(
+            select(ConversationMessage)
+            .where(ConversationMessage.conversation_id == conversation_id)
+            .order_by(ConversationMessage.seq.desc())
+            .limit(limit)
+        )
+        return list(reversed(result.all()))
+
+    async def append(
+        self,
+        db: AsyncSession,
+        conversation: Conversation,
+        role: str,
+        content: str,
+        ai_role: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> ConversationMessage:
+        """追加一条消息.
+
+        序号由对话行上的计数器原子递增分配，并发追加也不会冲突。
+
+        Returns:
+            新插入的消息
+        """
+        token_count = token_counter.count(content) + MESSAGE_OVERHEAD_TOKENS
+        seq = await db.scalar(
+            update(Conversation)
+            .where(Conversation.id == conversation.id)
+            .values(
+                message_count=Conversation.message_count + 1,
+                unsummarized_tokens=Conversation.unsummarized_tokens + token_count,
+                updated_at=datetime.utcnow(),
+            )
+            .returning(Conversation.message_count)
+            .execution_options(synchronize_session=False)
+        )
+
+        message = ConversationMessage(
+            conversation_id=conversation.id,
+            seq=seq,
+            role=role,
+            ai_role=ai_role,
+            content=content,
+            token_count=token_count,
+            meta=metadata,
+        )
+        db.add(message)
+        await db.flush()
+
+        conversation.message_count = seq
+        conversation.unsummarized_tokens = (conversation.unsummarized_tokens or 0) + token_count
+        return message
+
+    async def build_window(self, db: AsyncSession, conversation: Conversation) -> ConversationWindow:
+        """构建发送给模型的对话上下文.
+
+        未摘要的消息超出预算时先折叠较早的消息，然后在预算内从最新消息往前
+        取，窗口以用户消息开头，摘要附在第一条消息之前。读取后结束事务，
+        调用方不应有未提交的写入。
+
+        Returns:
+            ConversationWindow对象
+        """
+        if (conversation.unsummarized_tokens or 0) > self._history_budget(conversation):
+            await self.compact(db, conversation)
+
+        budget = self._history_budget(conversation)
+        rows = await self._unsummarized(db, conversation, newest_first=True)
+
+        selected: List[ConversationMessage] = []
+        used = 0
+        for row in rows:
+            if selected and used + row.token_count > budget:
+                break
+            selected.append(row)
+            used += row.token_count
+        selected.reverse()
+
+        # Anthropic要求历史以用户消息开头
+        while len(selected) > 1 and selected[0].role != "user":
+            used -= selected.pop(0).token_count
+        # 只读了消息，结束事务归还连接，之后的模型调用不占用连接
+        await db.commit()
+
+        messages = [{"role": row.role, "content": row.content} for row in selected]
+        if conversation.summary and messages:
+            messages[0] = {
+                **messages[0],
+                "content": f"{SUMMARY_HEADER}{conversation.summary}\n\n{messages[0]['content']}",
+            }
+
+        return ConversationWindow(
+            messages=messages,
+            summary=conversation.summary,
+            input_tokens=used + (conversation.summary_tokens or 0),
+        )
+
+    async def compact(self, db: AsyncSession, conversation: Conversation) -> bool:
+        """把较早的未摘要消息折叠进滚动摘要.
+
+        保留最近约一半预算的消息，其余与已有摘要合并为新摘要；每折叠一次
+        可以承载约半个窗口的新对话，摘要调用的成本被分摊到多轮对话上。
+        积压超过一个窗口时按窗口大小分批摘要，从最早的未摘要消息开始，
+        不会跳过任何消息。摘要调用前结束读取事务，写入摘要后立即提交，
+        调用方不应有未提交的写入。
+
+        Returns:
+            是否更新了摘要（并发请求已先完成折叠时返回False）
+        """
+        rows = await self._unsummarized(db, conversation, newest_first=False)
+        if len(rows) < 2:
+            return False
+
+        folded = rows[: compaction_split(rows, self._history_budget(conversation) // 2)]
+        if not folded:
+            return False
+        # 摘要调用可能很慢，期间不持有连接；写入时靠乐观并发检查防止覆盖
+        await db.commit()
+
+        summary = conversation.summary
+        for chunk in chunk_messages(folded, self.window_tokens):
+            summary = await self._summarize(summary, chunk)
+        summary_tokens = token_counter.count(summary) + MESSAGE_OVERHEAD_TOKENS
+        folded_tokens = sum(row.token_count for row in folded)
+        previous_until = conversation.summary_until_seq or 0
+        summary_until = folded[-1].seq
+
+        # 剩余未摘要的token按消息行重新计算，计数器偏差不会累积
+        remaining = (
+            select(func.coalesce(func.sum(ConversationMessage.token_count), 0))
+            .where(
+                ConversationMessage.conversation_id == conversation.id,
+                ConversationMessage.seq > summary_until,
+            )
+            .scalar_subquery()
+        )
+        # 乐观并发：只有摘要进度未被其他请求推进时才写入
+        result = await db.execute(
+            update(Conversation)
+            .where(
+                Conversation.id == conversation.id,
+                Conversation.summary_until_seq == previous_until,
+            )
+            .values(
+                summary=summary,
+                summary_tokens=summary_tokens,
+                summary_until_seq=summary_until,
+                unsummarized_tokens=remaining,
+            )
+            .returning(Conversation.unsummarized_tokens)
+            .execution_options(synchronize_session=False)
+        )
+        unsummarized_tokens = result.scalar_one_or_none()
+        await db.commit()
+        if unsummarized_tokens is None:
+            await db.refresh(conversation)
+            return False
+
+        conversation.summary = summary
+        conversation.summary_tokens = summary_tokens
+        conversation.summary_until_seq = summary_until
+        conversation.unsummarized_tokens = unsummarized_tokens
+        logger.info(
+            "Conversation %s compacted %d messages (%d tokens) into summary",
+            conversation.id,
+            len(folded),
+            folded_tokens,
+        )
+        return True
+
+    async def chat(
+        self,
+        db: AsyncSession,
+        conversation: Conversation,
+        content: str,
+        ai_role_id: str,
+        ai_role: AIRole,
+    ) -> Tuple[ConversationMessage, ConversationMessage, AIResponse]:
+        """进行一轮对话：保存用户消息，按窗口调用模型，保存回复.
+
+        用户消息、摘要和回复各自在短事务中提交，模型调用期间不持有事务。
+        模型调用失败时用户消息已保存，下一轮对话会带上它。
+
+        Returns:
+            (用户消息, 助手消息, AI响应)
+        """
+        user_message = await self.append(db, conversation, "user", content, ai_role=ai_role_id)
+        # 提交后释放对话行锁，同一对话的其他请求不必等待本轮模型调用
+        await db.commit()
+        window = await self.build_window(db, conversation)
+
+        response = await ai_manager.chat(
+            messages=window.messages,
+            system_prompt=ai_role.system_prompt,
+            temperature=ai_role.temperature,
+            max_tokens=ai_role.max_tokens,
+        )
+        response.metadata["conversation"] = {
+            "window_messages": len(window.messages),
+            "window_tokens": window.input_tokens,
+            "summarized_until": conversation.summary_until_seq or 0,
+        }
+
+        assistant_message = await self.append(
+            db,
+            conversation,
+            "assistant",
+            response.text,
+            ai_role=ai_role_id,
+            metadata=response.metadata,
+        )
+        await db.commit()
+        return user_message, assistant_message, response
+
+    def _history_budget(self, conversation: Conversation) -> int:
+        """窗口中留给近期消息的token数."""
+        return max(0, self.window_tokens - (conversation.summary_tokens or 0))
+
+    async def _unsummarized(
+        self, db: AsyncSession, conversation: Conversation, newest_first: bool
+    ) -> List[ConversationMessage]:
+        """读取摘要之后的消息.
+
+        构建窗口（newest_first）时只读取最新的max_window_messages条；
+        折叠时按时间顺序读取全部，从最早的未摘要消息开始。
+        """
+        return list((await db.scalars(self._unsummarized_query(conversation, newest_first))).all())
+
+    def _unsummarized_query(self, conversation: Conversation, newest_first: bool):
+        query = select(ConversationMessage).where(
+            ConversationMessage.conversation_id == conversation.id,
+            ConversationMessage.seq > (conversation.summary_until_seq or 0),
+        )
+        if newest_first:
+            return query.order_by(ConversationMessage.seq.desc()).limit(self.max_window_messages)
+        return query.order_by(ConversationMessage.seq)
+
+    async def _summarize(
+        self, previous_summary: Optional[str], messages: List[ConversationMessage]
+    ) -> str:
+        """合并已有摘要和新折叠的消息."""
+        role_names = {"user": "用户", "assistant": "助手"}
+        transcript = "\n\n".join(
+            f"{role_names.get(row.role, row.role)}：{row.content}" for row in messages
+        )
+        prompt = (
+            f"## 已有摘要\n{previous_summary or '（无）'}\n\n"
+            f"## 新增对话\n{transcript}\n"
+        )
+
+        response = await ai_manager.complete(
+            prompt=prompt,
+            prompt_prefix=SUMMARY_INSTRUCTIONS.format(max_chars=self.summary_max_tokens),
+            temperature=0.3,
+            max_tokens=self.summary_max_tokens,
+        )
+        summary = response.text.strip()
+        # 模型偶尔超长，按token预算截断，保证窗口大小恒定
+        if token_counter.count(summary) > self.summary_max_tokens:
+            summary = token_counter.truncate(summary, self.summary_max_tokens)
+        return summary
+
+
+def create_conversation_store() -> ConversationStore:
+    """根据应用配置创建对话存储."""
+    return ConversationStore(
+        window_tokens=settings.CONVERSATION_WINDOW_TOKENS,
+        summary_max_tokens=settings.CONVERSATION_SUMMARY_MAX_TOKENS,
+        max_window_messages=settings.CONVERSATION_MAX_WINDOW_MESSAGES,
+    )
+
+
+# 全局对话存储实例
+conversation_store = create_conversation_store()
@@ -0,0 +1,339 @@
+"""数据库引擎与会话.
+
+基于asyncpg的异步SQLAlchemy引擎：连接池预检（pre-ping）、预编译语句缓存、
+定期回收连接，可选的只读副本。每个请求通过get_db获得独立会话，请求结束时
+关闭并归还连接。连接池记录等待连接的时间和连接被占用的时间，连接池耗尽
+通常是负载升高时最先出现的问题。
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.stats import percentile
+# 导入即在会话上注册项目统计、全文索引和重嵌入队列的flush事件
+from app.services import embedding_queue, project_stats, search  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+
+def async_database_url(url: str, statement_cache_size: int = 500) -> str:
+    """把配置中的postgresql://地址转换为asyncpg驱动地址.
+
+    Args:
+        url: 数据库地址
+        statement_cache_size: SQLAlchemy层的预编译语句缓存大小
+
+    Returns:
+        postgresql+asyncpg://地址
+    """
+    parsed = make_url(url)
+    if parsed.drivername in ("postgresql", "postgres", "postgresql+psycopg2"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    if parsed.drivername == "postgresql+asyncpg":
+        parsed = parsed.update_query_dict(
+            {"prepared_statement_cache_size": str(statement_cache_size)}
+        )
+    return parsed.render_as_string(hide_password=False)
+
+
+class PoolMetrics:
+    """连接池的滚动统计：等待连接时间和连接占用时间."""
+
+    def __init__(self, window_size: int = 1000, wait_warning_ms: float = 100.0):
+        """初始化统计.
+
+        Args:
+            window_size: 保留的最近样本数
+            wait_warning_ms: 等待超过该毫秒数时记录警告
+        """
+        self.window_size = window_size
+        self.wait_warning_ms = wait_warning_ms
+        self.wait_times: Deque[float] = deque(maxlen=window_size)
+        self.checkout_times: Deque[float] = deque(maxlen=window_size)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.checked_out = 0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        """记录一次获取连接的等待时间."""
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.checkouts += 1
+        self.wait_times.append(seconds)
+        self.max_wait = max(self.max_wait, seconds)
+        if seconds * 1000 >= self.wait_warning_ms:
+            logger.warning(
+                "Database pool wait %.1f ms (checked out: %d%s)",
+                seconds * 1000,
+                self.checked_out,
+                ", timed out" if timed_out else "",
+            )
+
+    def record_checkout(self):
+        """连接被取出."""
+        self.checked_out += 1
+
+    def record_checkin(self, held: Optional[float]):
+        """连接被归还，held为占用时长（秒）."""
+        self.checked_out = max(0, self.checked_out - 1)
+        if held is not None:
+            self.checkout_times.append(held)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取统计数据（时间单位毫秒）."""
+        waits = sorted(self.wait_times)
+        held = sorted(self.checkout_times)
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "checked_out": self.checked_out,
+            "wait_ms": {
+                "p50": round(percentile(waits, 0.5) * 1000, 3),
+                "p95": round(percentile(waits, 0.95) * 1000, 3),
+                "p99": round(percentile(waits, 0.99) * 1000, 3),
+                "max": round(self.max_wait * 1000, 3),
+            },
+            "checkout_ms": {
+                "p50": round(percentile(held, 0.5) * 1000, 3),
+                "p95": round(percentile(held, 0.95) * 1000, 3),
+                "p99": round(percentile(held, 0.99) * 1000, 3),
+            },
+        }
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的连接池."""
+
+    def __init__(self, *args, metrics: Optional[PoolMetrics] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics or PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def _instrument(engine: AsyncEngine, metrics: PoolMetrics):
+    """注册连接取出/归还事件，统计连接占用时间."""
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        metrics.record_checkout()
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("checked_out_at", None)
+        metrics.record_checkin(time.perf_counter() - started if started is not None else None)
+
+
+class Database:
+    """主库与只读副本的引擎和会话工厂.
+
+    引擎在首次使用时创建，导入本模块不会连接数据库。
+    """
+
+    def __init__(
+        self,
+        url: str,
+        read_replica_url: Optional[str] = None,
+        pool_size: int = 20,
+        max_overflow: int = 10,
+        pool_timeout: float = 30.0,
+        pool_recycle: int = 1800,
+        statement_cache_size: int = 500,
+        wait_warning_ms: float = 100.0,
+        echo: bool = False,
+    ):
+        """初始化数据库配置.
+
+        Args:
+            url: 主库地址
+            read_replica_url: 只读副本地址，为空时只读查询也走主库
+            pool_size: 每个引擎的常驻连接数
+            max_overflow: 允许超出pool_size的临时连接数
+            pool_timeout: 等待空闲连接的超时（秒）
+            pool_recycle: 连接最长使用时间（秒），超过后重建
+            statement_cache_size: 每个连接的预编译语句缓存大小
+            wait_warning_ms: 等待连接超过该毫秒数时记录警告
+            echo: 是否输出SQL日志
+        """
+        self.url = url
+        self.read_replica_url = read_replica_url or None
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_timeout = pool_timeout
+        self.pool_recycle = pool_recycle
+        self.statement_cache_size = statement_cache_size
+        self.wait_warning_ms = wait_warning_ms
+        self.echo = echo
+        self._engines: Dict[str, AsyncEngine] = {}
+        self._metrics: Dict[str, PoolMetrics] = {}
+        self._session_factories: Dict[str, async_sessionmaker] = {}
+
+    def _create_engine(self, name: str, url: str) -> AsyncEngine:
+        """创建带连接池统计的引擎."""
+        metrics = PoolMetrics(wait_warning_ms=self.wait_warning_ms)
+        engine = create_async_engine(
+            async_database_url(url, self.statement_cache_size),
+            echo=self.echo,
+            poolclass=MeteredQueuePool,
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+            pool_pre_ping=True,
+            connect_args={
+                # asyncpg连接级语句缓存
+                "statement_cache_size": self.statement_cache_size,
+                "server_settings": {"application_name": f"novelflow-{name}"},
+            },
+        )
+        engine.pool.metrics = metrics
+        _instrument(engine, metrics)
+        self._metrics[name] = metrics
+        return engine
+
+    def engine(self, readonly: bool = False) -> AsyncEngine:
+        """获取引擎，readonly且配置了副本时返回副本引擎."""
+        name = "replica" if readonly and self.read_replica_url else "primary"
+        engine = self._engines.get(name)
+        if engine is None:
+            url = self.read_replica_url if name == "replica" else self.url
+            engine = self._create_engine(name, url)
+            self._engines[name] = engine
+        return engine
+
+    def session_factory(self, readonly: bool = False) -> async_sessionmaker:
+        """获取会话工厂."""
+        name = "replica" if readonly and self.read_replica_url else "primary"
+        factory = self._session_factories.get(name)
+        if factory is None:
+            factory = async_sessionmaker(
+                self.engine(readonly),
+                class_=AsyncSession,
+                expire_on_commit=False,
+                autoflush=False,
+            )
+            self._session_factories[name] = factory
+        return factory
+
+    async def session(self, readonly: bool = False) -> AsyncIterator[AsyncSession]:
+        """创建一次请求使用的会话，异常时回滚，结束时关闭."""
+        async with self.session_factory(readonly)() as session:
+            try:
+                yield session
+            except Exception:
+                await session.rollback()
+                raise
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取各引擎的连接池状态和统计."""
+        metrics = {}
+        for name, engine in self._engines.items():
+            pool = engine.pool
+            metrics[name] = {
+                "pool_size": pool.size(),
+                "max_overflow": self.max_overflow,
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                **self._metrics[name].stats(),
+            }
+        return metrics
+
+    async def dispose(self):
+        """关闭所有连接池."""
+        for engine in self._engines.values():
+            await engine.dispose()
+        self._engines.clear()
+        self._session_factories.clear()
+
+
+def create_database() -> Database:
+    """根据应用配置创建数据库实例."""
+    return Database(
+        url=settings.DATABASE_URL,
+        read_replica_url=settings.DATABASE_READ_REPLICA_URL,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        statement_cache_size=settings.DATABASE_STATEMENT_CACHE_SIZE,
+        wait_warning_ms=settings.DATABASE_POOL_WAIT_WARNING_MS,
+        echo=settings.DATABASE_ECHO,
+    )
+
+
+def create_vector_database() -> Database:
+    """创建向量库（pgvector）实例，连接池比主库小."""
+    return Database(
+        url=settings.VECTOR_DB_URL,
+        pool_size=settings.VECTOR_DB_POOL_SIZE,
+        max_overflow=settings.VECTOR_DB_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        statement_cache_size=settings.DATABASE_STATEMENT_CACHE_SIZE,
+        wait_warning_ms=settings.DATABASE_POOL_WAIT_WARNING_MS,
+        echo=settings.DATABASE_ECHO,
+    )
+
+
+# 全局数据库实例
+database = create_database()
+vector_database = create_vector_database()
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI依赖：每个请求一个主库会话.
+
+    Yields:
+        数据库会话
+    """
+    async for session in database.session():
+        yield session
+
+
+async def get_read_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI依赖：每个请求一个只读会话，配置了副本时走副本.
+
+    Yields:
+        数据库会话
+    """
+    async for session in database.session(readonly=True):
+        yield session
+
+
+async def get_vector_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI依赖：每个请求一个向量库会话.
+
+    Yields:
+        数据库会话
+    """
+    async for session in vector_database.session():
+        yield session
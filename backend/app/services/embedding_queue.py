@@ -0,0 +1,281 @@
+"""向量索引的增量更新队列.
+
+灵感、场景、角色中参与嵌入的字段有变化（或实体被删除）时，在同一事务里
+向embedding_jobs写入一条任务，主键(source_type, source_id)使同一实体的
+多次保存合并为一条。任务在最后一次编辑后静置debounce_seconds才被领取，
+连续编辑最多推迟max_delay_seconds。worker用FOR UPDATE SKIP LOCKED批量
+领取，多个进程可以并行消费；领取后超过lease_seconds未完成的任务可被重新领取。
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import and_, bindparam, delete, event, func, inspect, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.entity.character import Character
+from app.models.entity.embedding_job import EmbeddingJob
+from app.models.entity.inspiration import Inspiration
+from app.models.entity.scene import Scene
+from app.services.project_stats import load_chapter_projects
+
+logger = logging.getLogger(__name__)
+
+
+# 实体 -> (源类型, 影响嵌入文本的属性)，与embeddings._to_document保持一致
+EMBEDDED_ENTITIES: Dict[type, Tuple[str, Tuple[str, ...]]] = {
+    Inspiration: ("inspiration", ("content", "tags", "project_id")),
+    Scene: ("scene", ("title", "location", "content", "scene_number", "chapter_id")),
+    Character: ("character", ("name", "role_type", "profile", "project_id")),
+}
+
+
+class EmbeddingQueue:
+    """embedding_jobs的写入、领取与完成."""
+
+    def __init__(
+        self,
+        debounce_seconds: float = 5.0,
+        max_delay_seconds: float = 60.0,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 5,
+        retry_backoff_seconds: float = 10.0,
+    ):
+        """初始化队列.
+
+        Args:
+            debounce_seconds: 最后一次编辑后静置多久才处理
+            max_delay_seconds: 持续编辑时最长推迟多久
+            lease_seconds: 领取后多久未完成视为worker失联
+            max_attempts: 连续失败多少次后放弃
+            retry_backoff_seconds: 失败重试的初始等待，按次数翻倍
+        """
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+    def register(self, target=Session):
+        """在会话上注册flush事件，写入时同步入队."""
+        if not event.contains(target, "after_flush", self._after_flush):
+            event.listen(target, "after_flush", self._after_flush)
+
+    def _upsert(self, rows: List[Dict[str, Any]]):
+        """入队语句：已有任务只推后enqueued_at，保留first_enqueued_at."""
+        statement = pg_insert(EmbeddingJob).values(rows)
+        return statement.on_conflict_do_update(
+            index_elements=["source_type", "source_id"],
+            set_={
+                "enqueued_at": statement.excluded.enqueued_at,
+                "project_id": statement.excluded.project_id,
+                "attempts": 0,
+                "last_error": None,
+            },
+        )
+
+    def _after_flush(self, session: Session, flush_context):
+        """收集本次flush中影响嵌入文本的写入."""
+        changed = []
+        for obj in list(session.new) + list(session.deleted):
+            if type(obj) in EMBEDDED_ENTITIES:
+                changed.append(obj)
+        for obj in session.dirty:
+            spec = EMBEDDED_ENTITIES.get(type(obj))
+            if spec is None:
+                continue
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in spec[1]):
+                changed.append(obj)
+        if not changed:
+            return
+
+        chapter_projects = load_chapter_projects(session, changed)
+        now = datetime.utcnow()
+        rows = {}
+        for obj in changed:
+            source_type = EMBEDDED_ENTITIES[type(obj)][0]
+            project_id = chapter_projects.get(obj.chapter_id) if isinstance(obj, Scene) else obj.project_id
+            rows[(source_type, obj.id)] = {
+                "source_type": source_type,
+                "source_id": obj.id,
+                "project_id": project_id,
+                "first_enqueued_at": now,
+                "enqueued_at": now,
+                "attempts": 0,
+            }
+        session.connection().execute(self._upsert(list(rows.values())))
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        source_type: str,
+        source_ids: Sequence[UUID],
+        project_id: Optional[UUID] = None,
+    ):
+        """手动入队（不提交），如批量导入后补建索引."""
+        if not source_ids:
+            return
+        now = datetime.utcnow()
+        await db.execute(
+            self._upsert(
+                [
+                    {
+                        "source_type": source_type,
+                        "source_id": source_id,
+                        "project_id": project_id,
+                        "first_enqueued_at": now,
+                        "enqueued_at": now,
+                        "attempts": 0,
+                    }
+                    for source_id in source_ids
+                ]
+            )
+        )
+
+    async def claim(self, db: AsyncSession, limit: int) -> List[Any]:
+        """领取一批可处理的任务（不提交），最早等待的优先.
+
+        Returns:
+            任务行（source_type, source_id, project_id, enqueued_at, first_enqueued_at, attempts）
+        """
+        now = datetime.utcnow()
+        table = EmbeddingJob.__table__
+        ready = (
+            select(table.c.source_type, table.c.source_id)
+            .where(
+                or_(
+                    table.c.enqueued_at <= now - timedelta(seconds=self.debounce_seconds),
+                    table.c.first_enqueued_at <= now - timedelta(seconds=self.max_delay_seconds),
+                ),
+                or_(
+                    table.c.claimed_at.is_(None),
+                    table.c.claimed_at <= now - timedelta(seconds=self.lease_seconds),
+                ),
+            )
+            .order_by(table.c.first_enqueued_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.execute(
+            update(table)
+            .where(tuple_(table.c.source_type, table.c.source_id).in_(ready))
+            .values(claimed_at=now, attempts=table.c.attempts + 1)
+            .returning(
+                table.c.source_type,
+                table.c.source_id,
+                table.c.project_id,
+                table.c.enqueued_at,
+                table.c.first_enqueued_at,
+                table.c.attempts,
+            )
+        )
+        return result.all()
+
+    async def complete(self, db: AsyncSession, jobs: Sequence[Any]):
+        """完成任务（不提交）.
+
+        处理期间又有新编辑的任务（enqueued_at已变化）不删除，释放后等待下次领取。
+        """
+        if not jobs:
+            return
+        table = EmbeddingJob.__table__
+        key = and_(
+            table.c.source_type == bindparam("b_source_type"),
+            table.c.source_id == bindparam("b_source_id"),
+        )
+        params = [
+            {"b_source_type": job.source_type, "b_source_id": job.source_id, "b_enqueued_at": job.enqueued_at}
+            for job in jobs
+        ]
+        await db.execute(delete(table).where(key, table.c.enqueued_at == bindparam("b_enqueued_at")), params)
+        await db.execute(
+            update(table).where(key).values(claimed_at=None, attempts=0, last_error=None),
+            [{k: v for k, v in p.items() if k != "b_enqueued_at"} for p in params],
+        )
+
+    async def fail(self, db: AsyncSession, jobs: Sequence[Any], error: str):
+        """记录失败（不提交）：按次数退避重试，超过max_attempts后放弃."""
+        table = EmbeddingJob.__table__
+        now = datetime.utcnow()
+        retry, give_up = [], []
+        for job in jobs:
+            if job.attempts >= self.max_attempts:
+                give_up.append(job)
+                continue
+            backoff = min(self.lease_seconds, self.retry_backoff_seconds * 2 ** (job.attempts - 1))
+            retry.append(
+                {
+                    "b_source_type": job.source_type,
+                    "b_source_id": job.source_id,
+                    # 把领取时间前移，使租约在backoff秒后到期
+                    "b_claimed_at": now - timedelta(seconds=self.lease_seconds - backoff),
+                }
+            )
+
+        key = and_(
+            table.c.source_type == bindparam("b_source_type"),
+            table.c.source_id == bindparam("b_source_id"),
+        )
+        if retry:
+            await db.execute(
+                update(table).where(key).values(claimed_at=bindparam("b_claimed_at"), last_error=error[:2000]),
+                retry,
+            )
+        if give_up:
+            logger.error(
+                "Giving up re-embedding %d source(s) after %d attempts: %s",
+                len(give_up),
+                self.max_attempts,
+                error,
+            )
+            await db.execute(
+                delete(table).where(key, table.c.enqueued_at == bindparam("b_enqueued_at")),
+                [
+                    {"b_source_type": j.source_type, "b_source_id": j.source_id, "b_enqueued_at": j.enqueued_at}
+                    for j in give_up
+                ],
+            )
+
+    async def status(self, db: AsyncSession, project_id: Optional[UUID] = None) -> Dict[str, Any]:
+        """队列状态：待处理、处理中、重试中的任务数和最久等待时间."""
+        table = EmbeddingJob.__table__
+        now = datetime.utcnow()
+        claimed = and_(
+            table.c.claimed_at.is_not(None),
+            table.c.claimed_at > now - timedelta(seconds=self.lease_seconds),
+        )
+        query = select(
+            func.count().label("queued"),
+            func.count().filter(claimed).label("in_progress"),
+            func.count().filter(table.c.last_error.is_not(None)).label("retrying"),
+            func.min(table.c.first_enqueued_at).label("oldest"),
+        )
+        if project_id is not None:
+            query = query.where(table.c.project_id == project_id)
+        row = (await db.execute(query)).one()
+        return {
+            "queued": row.queued,
+            "in_progress": row.in_progress,
+            "retrying": row.retrying,
+            "oldest_wait_seconds": round((now - row.oldest).total_seconds(), 1) if row.oldest else 0.0,
+        }
+
+
+def create_embedding_queue() -> EmbeddingQueue:
+    """根据应用配置创建队列."""
+    return EmbeddingQueue(
+        debounce_seconds=settings.EMBEDDING_QUEUE_DEBOUNCE_SECONDS,
+        max_delay_seconds=settings.EMBEDDING_QUEUE_MAX_DELAY_SECONDS,
+        lease_seconds=settings.EMBEDDING_QUEUE_LEASE_SECONDS,
+        max_attempts=settings.EMBEDDING_QUEUE_MAX_ATTEMPTS,
+    )
+
+
+# 全局队列实例，导入时注册flush事件
+embedding_queue = create_embedding_queue()
+embedding_queue.register()
@@ -0,0 +1,175 @@
+"""重嵌入worker：消费embedding_jobs，增量同步向量索引.
+
+每批从队列领取最多batch_size个源实体（不区分用户和项目），从主库读取
+最新内容，交给EmbeddingIndex按块哈希比对：未变化的块沿用原向量，变化的
+块合并为批量嵌入请求。源实体已删除时删除其全部块。
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from app.core.config import settings
+from app.services.database import database, vector_database
+from app.services.embedding_queue import EmbeddingQueue, embedding_queue
+from app.services.embeddings import EmbeddingIndex, IndexStats, embedding_index, iter_documents
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingWorker:
+    """后台重嵌入worker."""
+
+    # 批处理出错（如数据库不可用）后的最长等待（秒）
+    MAX_ERROR_BACKOFF = 60.0
+
+    def __init__(
+        self,
+        queue: EmbeddingQueue,
+        index: EmbeddingIndex,
+        batch_size: int = 100,
+        poll_interval: float = 2.0,
+    ):
+        """初始化worker.
+
+        Args:
+            queue: 任务队列
+            index: 向量索引
+            batch_size: 每批领取的源实体数
+            poll_interval: 队列为空时的轮询间隔（秒）
+        """
+        self.queue = queue
+        self.index = index
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+        self._totals = IndexStats()
+        self._stats: Dict[str, Any] = {
+            "batches": 0,
+            "failed_batches": 0,
+            "removed_sources": 0,
+            "last_batch_at": None,
+            "last_batch_ms": 0.0,
+            "last_lag_seconds": 0.0,
+        }
+
+    async def run_once(self) -> Optional[IndexStats]:
+        """处理一批任务.
+
+        Returns:
+            本批的同步统计，队列中没有可处理的任务时返回None
+        """
+        async with database.session_factory()() as db:
+            jobs = await self.queue.claim(db, self.batch_size)
+            await db.commit()
+        if not jobs:
+            return None
+
+        started = time.perf_counter()
+        try:
+            stats, removed = await self._process(jobs)
+        except Exception as e:
+            self._stats["failed_batches"] += 1
+            async with database.session_factory()() as db:
+                await self.queue.fail(db, jobs, f"{type(e).__name__}: {e}")
+                await db.commit()
+            raise
+
+        async with database.session_factory()() as db:
+            await self.queue.complete(db, jobs)
+            await db.commit()
+
+        now = datetime.utcnow()
+        self._totals.add(stats)
+        self._stats["batches"] += 1
+        self._stats["removed_sources"] += removed
+        self._stats["last_batch_at"] = now.isoformat()
+        self._stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        self._stats["last_lag_seconds"] = round(
+            max((now - job.first_enqueued_at).total_seconds() for job in jobs), 1
+        )
+        logger.debug("Re-embedded batch: %s", stats.as_dict())
+        return stats
+
+    async def _process(self, jobs) -> Tuple[IndexStats, int]:
+        """读取最新内容并同步索引；返回(统计, 已删除的源实体数)."""
+        by_type: Dict[str, List[UUID]] = defaultdict(list)
+        for job in jobs:
+            by_type[job.source_type].append(job.source_id)
+
+        # 读主库：刚提交的编辑可能还没有同步到只读副本
+        async with database.session_factory()() as db, vector_database.session_factory()() as vdb:
+            documents = []
+            for source_type, source_ids in by_type.items():
+                async for batch in iter_documents(db, source_type, source_ids=source_ids):
+                    documents.extend(batch)
+
+            stats = await self.index.index_documents(vdb, documents)
+
+            found: Set[Tuple[str, UUID]] = {(d.source_type, d.source_id) for d in documents}
+            removed = 0
+            for source_type, source_ids in by_type.items():
+                missing = [source_id for source_id in source_ids if (source_type, source_id) not in found]
+                if missing:
+                    stats.deleted += await self.index.remove(vdb, source_type, missing)
+                    removed += len(missing)
+            await vdb.commit()
+        return stats, removed
+
+    async def run(self):
+        """持续处理直到stop()；队列为空时按poll_interval轮询."""
+        backoff = self.poll_interval
+        while not self._stop.is_set():
+            try:
+                stats = await self.run_once()
+                backoff = self.poll_interval
+            except Exception as e:
+                stats = None
+                backoff = min(self.MAX_ERROR_BACKOFF, backoff * 2)
+                logger.warning("Embedding worker batch failed, retrying in %.0fs: %s", backoff, e)
+            if stats is not None:
+                # 还有积压时立即处理下一批
+                continue
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """在当前事件循环中启动后台任务."""
+        if self._task is None or self._task.done():
+            self._stop.clear()
+            self._task = asyncio.create_task(self.run(), name="embedding-worker")
+
+    async def stop(self):
+        """停止后台任务，等待当前批处理完成."""
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取worker运行统计."""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            **self._stats,
+            **self._totals.as_dict(),
+        }
+
+
+def create_embedding_worker() -> EmbeddingWorker:
+    """根据应用配置创建worker."""
+    return EmbeddingWorker(
+        queue=embedding_queue,
+        index=embedding_index,
+        batch_size=settings.EMBEDDING_WORKER_BATCH_SIZE,
+        poll_interval=settings.EMBEDDING_WORKER_POLL_INTERVAL,
+    )
+
+
+# 全局worker实例
+embedding_worker = create_embedding_worker()
@@ -0,0 +1,691 @@
+"""项目语义检索：分块、批量嵌入、pgvector索引与top-k召回.
+
+灵感、场景、角色按句子边界切成约EMBEDDING_CHUNK_TOKENS的块（相邻块有少量
+重叠，边界由内容决定），批量调用嵌入器后写入向量库（VECTOR_DB_URL）的
+embedding_chunks表，该表带HNSW余弦索引。每块记录内容哈希，重新索引时
+只嵌入哈希变化的块。生成时用任务输入作为查询召回项目内最相关的块，
+由PromptTemplateManager.add_project_context在token预算内拼入提示词。
+
+嵌入器可插拔：默认的hash嵌入器在本地对中文单字/二字组和英文词做特征哈希，
+确定、免费、无需网络，适合开发和离线部署；openai嵌入器调用Embeddings API。
+换用维度不同的嵌入器需要重建表并重新索引。
+"""
+import abc
+import asyncio
+import hashlib
+import logging
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Text, bindparam, cast, delete, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.entity.chapter import Chapter
+from app.models.entity.character import Character
+from app.models.entity.embedding_chunk import EmbeddingChunk
+from app.models.entity.inspiration import Inspiration
+from app.models.entity.scene import Scene
+from app.services.ai.http_client import create_http_timeout, get_http_client
+from app.services.ai.tokenizer import token_counter
+from app.services.search import flatten_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+
+SOURCE_TYPES = ("inspiration", "scene", "character")
+
+# 句子结束标点（含换行），切块只在这些位置断开
+SENTENCE_BOUNDARY = re.compile(r"(?<=[。！？!?；;…\n])")
+
+# 内容定义边界的平均间隔（句数）
+ANCHOR_DIVISOR = 4
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """文本块."""
+
+    index: int
+    text: str
+    token_count: int
+
+
+@dataclass
+class IndexStats:
+    """一次索引同步的统计."""
+
+    sources: int = 0
+    chunks: int = 0  # 切块后的总块数
+    embedded: int = 0  # 新嵌入的块
+    reused: int = 0  # 哈希未变、沿用原向量的块
+    deleted: int = 0  # 删除的旧块
+
+    def add(self, other: "IndexStats"):
+        for name in ("sources", "chunks", "embedded", "reused", "deleted"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "sources": self.sources,
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "reused": self.reused,
+            "deleted": self.deleted,
+        }
+
+
+@dataclass(frozen=True)
+class SourceDocument:
+    """待索引的源实体."""
+
+    source_type: str
+    source_id: UUID
+    project_id: UUID
+    title: str
+    text: str
+
+
+def split_sentences(text: str) -> List[str]:
+    """按句末标点和换行切分句子，保留标点."""
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def _is_anchor(sentence: str) -> bool:
+    """句子哈希命中时作为候选边界，约每ANCHOR_DIVISOR句一个."""
+    digest = hashlib.blake2b(sentence.strip().encode(), digest_size=2).digest()
+    return int.from_bytes(digest, "big") % ANCHOR_DIVISOR == 0
+
+
+def chunk_text(
+    text: Optional[str],
+    max_tokens: int,
+    overlap_tokens: int = 0,
+    min_tokens: Optional[int] = None,
+) -> List[Chunk]:
+    """把文本切成不超过max_tokens的块，边界由内容决定.
+
+    当前块达到min_tokens（默认max_tokens的一半）后，在段落结尾或哈希命中的
+    句子之后断开；再装一句会超过max_tokens时强制断开。边界只取决于附近的
+    句子，编辑一处只改变所在及相邻的块，其余块的文本和哈希不变，增量更新
+    时可以沿用原有向量。下一块以上一块末尾不超过overlap_tokens的句子开头；
+    单句超长时按字符硬切。
+
+    Args:
+        text: 文本
+        max_tokens: 每块最多token数
+        overlap_tokens: 相邻块重叠的token数
+        min_tokens: 在内容边界断开前的最少token数
+
+    Returns:
+        文本块列表
+    """
+    if not text or not text.strip():
+        return []
+    if min_tokens is None:
+        min_tokens = max_tokens // 2
+
+    pieces: List[Tuple[str, int]] = []
+    for sentence in split_sentences(text):
+        tokens = token_counter.count(sentence)
+        if tokens <= max_tokens:
+            pieces.append((sentence, tokens))
+            continue
+        # 中文约每字一个token，按max_tokens个字符切开超长句
+        for start in range(0, len(sentence), max_tokens):
+            part = sentence[start:start + max_tokens]
+            pieces.append((part, token_counter.count(part)))
+
+    chunks: List[Chunk] = []
+    current: List[Tuple[str, int]] = []
+    current_tokens = 0
+
+    def emit(next_tokens: int = 0):
+        nonlocal current, current_tokens
+        body = "".join(p for p, _ in current)
+        chunks.append(Chunk(len(chunks), body, token_counter.count(body)))
+        # 保留末尾的句子作为重叠
+        overlap: List[Tuple[str, int]] = []
+        overlap_size = 0
+        for previous in reversed(current):
+            if overlap_size + previous[1] > overlap_tokens or overlap_size + previous[1] + next_tokens > max_tokens:
+                break
+            overlap.insert(0, previous)
+            overlap_size += previous[1]
+        current, current_tokens = overlap, overlap_size
+
+    pending = False  # 当前块是否含有上一块之外的新句子
+    for piece, tokens in pieces:
+        if current_tokens + tokens > max_tokens:
+            if pending:
+                emit(tokens)
+            if current_tokens + tokens > max_tokens:
+                # 重叠部分装不下这一句时放弃重叠
+                current, current_tokens = [], 0
+        current.append((piece, tokens))
+        current_tokens += tokens
+        pending = True
+        if current_tokens >= min_tokens and (piece.endswith("\n") or _is_anchor(piece)):
+            emit()
+            pending = False
+    if pending:
+        body = "".join(p for p, _ in current)
+        chunks.append(Chunk(len(chunks), body, token_counter.count(body)))
+    return chunks
+
+
+# ========== 嵌入器 ==========
+
+class Embedder(abc.ABC):
+    """嵌入器接口：把一批文本转换为等长向量."""
+
+    name: str = "embedder"
+    dimensions: int = 0
+
+    @abc.abstractmethod
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """嵌入一批文本.
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            与texts一一对应的向量
+        """
+
+
+class HashingEmbedder(Embedder):
+    """本地确定性嵌入器：对tokenize()的词项做带符号特征哈希.
+
+    中文二字组带有词序信息，相当于词袋上的随机投影；没有语义泛化能力，
+    但对人名、地名、物件等字面重合的召回稳定，且同一文本总是得到同一向量。
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.name = f"hash-{dimensions}"
+
+    def embed_one(self, text: str) -> List[float]:
+        """嵌入单条文本，结果做L2归一化."""
+        vector = [0.0] * self.dimensions
+        for term, count in Counter(tokenize(text)).items():
+            digest = int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "big")
+            sign = 1.0 if digest >> 63 else -1.0
+            # 二字组和英文词比单字更有区分度
+            weight = 1.0 if len(term) == 1 else 2.0
+            vector[digest % self.dimensions] += sign * weight * (1.0 + math.log(count))
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm == 0:
+            return vector
+        return [v / norm for v in vector]
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        # 纯Python计算，放到线程中执行，避免阻塞事件循环上的请求
+        return await asyncio.to_thread(lambda: [self.embed_one(t) for t in texts])
+
+
+class OpenAIEmbedder(Embedder):
+    """OpenAI Embeddings API嵌入器."""
+
+    def __init__(self, model: str, dimensions: int):
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY not configured")
+
+        from openai import AsyncOpenAI
+
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=get_http_client(),
+            timeout=create_http_timeout(),
+        )
+        self.model = model
+        self.dimensions = dimensions
+        self.name = f"openai:{model}:{dimensions}"
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        # text-embedding-3系列支持缩短维度
+        extra_body = {"dimensions": self.dimensions} if self.model.startswith("text-embedding-3") else None
+        response = await self.client.embeddings.create(model=self.model, input=list(texts), extra_body=extra_body)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        for vector in vectors:
+            if len(vector) != self.dimensions:
+                raise ValueError(
+                    f"Embedding model {self.model} returned {len(vector)} dimensions, "
+                    f"expected {self.dimensions}"
+                )
+        return vectors
+
+
+# 嵌入器注册表：名称 -> 工厂(维度)
+EMBEDDERS: Dict[str, Callable[[int], Embedder]] = {
+    "hash": HashingEmbedder,
+    "openai": lambda dimensions: OpenAIEmbedder(settings.EMBEDDING_MODEL, dimensions),
+}
+
+
+def register_embedder(name: str, factory: Callable[[int], Embedder]):
+    """注册自定义嵌入器，之后可通过EMBEDDING_PROVIDER选用."""
+    EMBEDDERS[name] = factory
+
+
+def create_embedder(name: str, dimensions: int) -> Embedder:
+    """按名称创建嵌入器.
+
+    Raises:
+        ValueError: 未知的嵌入器
+    """
+    factory = EMBEDDERS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown embedding provider: {name}; available: {', '.join(EMBEDDERS)}")
+    return factory(dimensions)
+
+
+def vector_literal(vector: Iterable[float]) -> str:
+    """把向量格式化为pgvector的文本表示."""
+    return "[" + ",".join(f"{v:.7g}" for v in vector) + "]"
+
+
+# ========== 源实体 ==========
+
+def _source_query(source_type: str):
+    """各类源实体的查询（只取生成文本需要的列）."""
+    if source_type == "inspiration":
+        return select(
+            Inspiration.id, Inspiration.project_id, Inspiration.content, Inspiration.tags
+        ), Inspiration.id, Inspiration.project_id
+    if source_type == "scene":
+        return (
+            select(
+                Scene.id,
+                Chapter.project_id,
+                Chapter.chapter_number,
+                Scene.scene_number,
+                Scene.title,
+                Scene.location,
+                Scene.content,
+            ).join(Chapter, Chapter.id == Scene.chapter_id),
+            Scene.id,
+            Chapter.project_id,
+        )
+    if source_type == "character":
+        return select(
+            Character.id, Character.project_id, Character.name, Character.role_type, Character.profile
+        ), Character.id, Character.project_id
+    raise ValueError(f"Unknown source type: {source_type}")
+
+
+def _to_document(source_type: str, row) -> SourceDocument:
+    """把查询行转换为待索引文本."""
+    if source_type == "inspiration":
+        body = row.content or ""
+        if row.tags:
+            body += "\n标签：" + "、".join(row.tags)
+        # 灵感没有标题，取正文开头
+        title = (row.content or "").strip().split("\n", 1)[0][:20] or "灵感"
+    elif source_type == "scene":
+        title = row.title or f"第{row.chapter_number}章 场景{row.scene_number}"
+        body = (f"地点：{row.location}\n" if row.location else "") + (row.content or "")
+    else:
+        title = row.name
+        body = f"{row.name}（{row.role_type or '角色'}）\n{flatten_text(row.profile)}"
+    return SourceDocument(source_type, row.id, row.project_id, title, body)
+
+
+async def iter_documents(
+    db: AsyncSession,
+    source_type: str,
+    project_id: Optional[UUID] = None,
+    source_ids: Optional[Sequence[UUID]] = None,
+    batch_size: int = 200,
+) -> AsyncIterator[List[SourceDocument]]:
+    """按主键分批读取源实体.
+
+    Args:
+        db: 主库会话
+        source_type: inspiration、scene或character
+        project_id: 只读取该项目
+        source_ids: 只读取这些实体
+        batch_size: 每批实体数
+
+    Yields:
+        一批SourceDocument
+    """
+    query, id_column, project_column = _source_query(source_type)
+    if project_id is not None:
+        query = query.where(project_column == project_id)
+    if source_ids is not None:
+        query = query.where(id_column.in_(list(source_ids)))
+    last_id = None
+    while True:
+        page = query.order_by(id_column).limit(batch_size)
+        if last_id is not None:
+            page = page.where(id_column > last_id)
+        rows = (await db.execute(page)).all()
+        if not rows:
+            return
+        yield [_to_document(source_type, row) for row in rows]
+        last_id = rows[-1].id
+
+
+# ========== 索引与检索 ==========
+
+class EmbeddingIndex:
+    """embedding_chunks的写入与top-k检索."""
+
+    def __init__(
+        self,
+        provider: str = "hash",
+        dimensions: int = 256,
+        chunk_tokens: int = 300,
+        chunk_overlap_tokens: int = 40,
+        batch_size: int = 64,
+        ef_search: int = 100,
+        top_k: int = 8,
+        min_score: float = 0.1,
+    ):
+        """初始化索引.
+
+        Args:
+            provider: 嵌入器名称（见EMBEDDERS）
+            dimensions: 向量维度，须与embedding_chunks.embedding一致
+            chunk_tokens: 每块最多token数
+            chunk_overlap_tokens: 相邻块重叠的token数
+            batch_size: 每次嵌入请求的块数
+            ef_search: HNSW查询时扫描的候选数，需不小于top_k
+            top_k: 默认召回条数
+            min_score: 最低余弦相似度
+        """
+        self.provider = provider
+        self.dimensions = dimensions
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.batch_size = batch_size
+        self.ef_search = ef_search
+        self.top_k = top_k
+        self.min_score = min_score
+        self._embedder: Optional[Embedder] = None
+        self._vector_type = Vector(dimensions)
+
+    @property
+    def embedder(self) -> Embedder:
+        """嵌入器在首次使用时创建（openai嵌入器需要API密钥）."""
+        if self._embedder is None:
+            self._embedder = create_embedder(self.provider, self.dimensions)
+        return self._embedder
+
+    def _vector_param(self, name: str, value: Optional[str] = None) -> Any:
+        """向量以文本绑定后显式转换，不依赖驱动注册vector类型."""
+        return cast(bindparam(name, value, type_=Text), self._vector_type)
+
+    def chunk(self, document: SourceDocument) -> List[Chunk]:
+        """切分源实体文本."""
+        return chunk_text(document.text, self.chunk_tokens, self.chunk_overlap_tokens)
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """按batch_size分批嵌入."""
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(await self.embedder.embed(texts[start:start + self.batch_size]))
+        return vectors
+
+    def chunk_hash(self, embed_text: str) -> str:
+        """块的内容哈希，包含嵌入器名称，换嵌入器后所有块都会重新嵌入."""
+        return hashlib.sha256(f"{self.embedder.name}\n{embed_text}".encode()).hexdigest()
+
+    async def index_documents(
+        self, vdb: AsyncSession, documents: Sequence[SourceDocument], force: bool = False
+    ) -> IndexStats:
+        """按内容哈希增量同步这些源实体的块（不提交）.
+
+        重新切块后，哈希与已有块相同的块沿用原向量，只更新位置；其余块
+        批量嵌入后写入，不再出现的旧块删除。force为True时全部重新嵌入。
+
+        Returns:
+            本次同步的统计
+        """
+        stats = IndexStats(sources=len(documents))
+        if not documents:
+            return stats
+
+        # 已有块：(类型, 源ID) -> 哈希 -> [块ID]
+        existing: Dict[Tuple[str, UUID], Dict[str, List[UUID]]] = {}
+        by_type: Dict[str, List[UUID]] = {}
+        for document in documents:
+            by_type.setdefault(document.source_type, []).append(document.source_id)
+        for source_type, source_ids in by_type.items():
+            rows = await vdb.execute(
+                select(EmbeddingChunk.id, EmbeddingChunk.source_id, EmbeddingChunk.content_hash).where(
+                    EmbeddingChunk.source_type == source_type,
+                    EmbeddingChunk.source_id.in_(source_ids),
+                )
+            )
+            for row in rows:
+                existing.setdefault((source_type, row.source_id), {}).setdefault(row.content_hash, []).append(row.id)
+
+        inserts: List[Dict[str, Any]] = []
+        texts: List[str] = []
+        moves: List[Dict[str, Any]] = []
+        stale: List[UUID] = []
+        for document in documents:
+            pool = existing.pop((document.source_type, document.source_id), {})
+            if force:
+                stale.extend(chunk_id for ids in pool.values() for chunk_id in ids)
+                pool = {}
+            for chunk in self.chunk(document):
+                stats.chunks += 1
+                # 标题参与嵌入，让不含名字的段落也能按所属实体召回
+                embed_text = f"{document.title}\n{chunk.text}"
+                content_hash = self.chunk_hash(embed_text)
+                reusable = pool.get(content_hash)
+                if reusable:
+                    moves.append(
+                        {"row_id": reusable.pop(), "b_chunk_index": chunk.index, "b_project_id": document.project_id}
+                    )
+                    continue
+                inserts.append(
+                    {
+                        "b_project_id": document.project_id,
+                        "b_source_type": document.source_type,
+                        "b_source_id": document.source_id,
+                        "b_chunk_index": chunk.index,
+                        "b_title": document.title[:200],
+                        "b_content": chunk.text,
+                        "b_token_count": chunk.token_count,
+                        "b_content_hash": content_hash,
+                    }
+                )
+                texts.append(embed_text)
+            stale.extend(chunk_id for ids in pool.values() for chunk_id in ids)
+
+        vectors = await self.embed(texts)
+        for row, vector in zip(inserts, vectors):
+            row["b_embedding"] = vector_literal(vector)
+        # 没有任何词项的块（如纯标点）得到零向量，余弦距离无定义，不写入
+        inserts = [row for row, vector in zip(inserts, vectors) if any(vector)]
+
+        table = EmbeddingChunk.__table__
+        if stale:
+            await vdb.execute(delete(table).where(table.c.id.in_(stale)))
+        if moves:
+            await vdb.execute(
+                update(table)
+                .where(table.c.id == bindparam("row_id"))
+                .values(chunk_index=bindparam("b_chunk_index"), project_id=bindparam("b_project_id")),
+                moves,
+            )
+        if inserts:
+            await vdb.execute(
+                insert(table).values(
+                    project_id=bindparam("b_project_id"),
+                    source_type=bindparam("b_source_type"),
+                    source_id=bindparam("b_source_id"),
+                    chunk_index=bindparam("b_chunk_index"),
+                    title=bindparam("b_title"),
+                    content=bindparam("b_content"),
+                    token_count=bindparam("b_token_count"),
+                    content_hash=bindparam("b_content_hash"),
+                    embedder=self.embedder.name,
+                    embedding=self._vector_param("b_embedding"),
+                ),
+                inserts,
+            )
+
+        stats.embedded = len(texts)
+        stats.reused = len(moves)
+        stats.deleted = len(stale)
+        return stats
+
+    async def remove(self, vdb: AsyncSession, source_type: str, source_ids: Sequence[UUID]) -> int:
+        """删除源实体的全部块（不提交）.
+
+        Returns:
+            删除的块数
+        """
+        result = await vdb.execute(
+            delete(EmbeddingChunk).where(
+                EmbeddingChunk.source_type == source_type,
+                EmbeddingChunk.source_id.in_(list(source_ids)),
+            )
+        )
+        return result.rowcount
+
+    async def reindex(
+        self,
+        db: AsyncSession,
+        vdb: AsyncSession,
+        source_type: str,
+        project_id: Optional[UUID] = None,
+        batch_size: int = 200,
+        force: bool = False,
+    ) -> IndexStats:
+        """同步一类源实体的全部块，每批提交一次.
+
+        未变化的块不会重新嵌入，force为True时全部重新嵌入。指定project_id时
+        同时删除该项目中源实体已不存在的块。
+
+        Returns:
+            汇总统计
+        """
+        total = IndexStats()
+        seen: List[UUID] = []
+        async for documents in iter_documents(db, source_type, project_id, batch_size=batch_size):
+            total.add(await self.index_documents(vdb, documents, force=force))
+            await vdb.commit()
+            if project_id is not None:
+                seen.extend(document.source_id for document in documents)
+
+        if project_id is not None:
+            orphans = delete(EmbeddingChunk).where(
+                EmbeddingChunk.project_id == project_id, EmbeddingChunk.source_type == source_type
+            )
+            if seen:
+                orphans = orphans.where(EmbeddingChunk.source_id.not_in(seen))
+            total.deleted += (await vdb.execute(orphans)).rowcount
+            await vdb.commit()
+
+        logger.info("Synced %s embeddings: %s", source_type, total.as_dict())
+        return total
+
+    async def chunk_counts(self, vdb: AsyncSession, project_id: UUID) -> Dict[str, int]:
+        """项目各类源实体的已索引块数."""
+        rows = await vdb.execute(
+            select(EmbeddingChunk.source_type, func.count())
+            .where(EmbeddingChunk.project_id == project_id)
+            .group_by(EmbeddingChunk.source_type)
+        )
+        counts = {source_type: 0 for source_type in SOURCE_TYPES}
+        counts.update({source_type: count for source_type, count in rows.all()})
+        return counts
+
+    async def retrieve(
+        self,
+        vdb: AsyncSession,
+        project_id: UUID,
+        query: str,
+        k: Optional[int] = None,
+        types: Optional[Iterable[str]] = None,
+        exclude_ids: Optional[Sequence[UUID]] = None,
+    ) -> List[Dict[str, Any]]:
+        """召回项目内与查询最相关的块.
+
+        HNSW索引先按距离取ef_search个候选再按项目过滤，ef_search需明显大于k，
+        否则大库中的小项目可能召回不足k条。
+
+        Args:
+            vdb: 向量库会话
+            project_id: 项目ID
+            query: 查询文本
+            k: 召回条数，默认top_k
+            types: 源实体类型，默认全部
+            exclude_ids: 排除的源实体（如正在编辑的灵感本身）
+
+        Returns:
+            按相似度降序的块：{"type", "id", "title", "content", "tokens", "score"}
+        """
+        if not query or not query.strip():
+            return []
+        k = k or self.top_k
+        vector = (await self.embedder.embed([query]))[0]
+        if not any(vector):
+            return []
+        distance = EmbeddingChunk.embedding.cosine_distance(
+            self._vector_param("query_vector", vector_literal(vector))
+        )
+
+        statement = (
+            select(
+                EmbeddingChunk.source_type,
+                EmbeddingChunk.source_id,
+                EmbeddingChunk.title,
+                EmbeddingChunk.content,
+                EmbeddingChunk.token_count,
+                distance.label("distance"),
+            )
+            .where(
+                EmbeddingChunk.project_id == project_id,
+                EmbeddingChunk.source_type.in_(list(types or SOURCE_TYPES)),
+            )
+            .order_by(distance)
+            .limit(k)
+        )
+        if exclude_ids:
+            statement = statement.where(EmbeddingChunk.source_id.not_in(list(exclude_ids)))
+
+        # SET LOCAL只作用于当前事务，不影响连接池中的其他会话
+        await vdb.execute(text(f"SET LOCAL hnsw.ef_search = {int(max(self.ef_search, k))}"))
+        rows = (await vdb.execute(statement)).all()
+        return [
+            {
+                "type": row.source_type,
+                "id": row.source_id,
+                "title": row.title,
+                "content": row.content,
+                "tokens": row.token_count,
+                "score": round(1.0 - float(row.distance), 4),
+            }
+            for row in rows
+            if 1.0 - float(row.distance) >= self.min_score
+        ]
+
+
+def create_embedding_index() -> EmbeddingIndex:
+    """根据应用配置创建向量索引."""
+    return EmbeddingIndex(
+        provider=settings.EMBEDDING_PROVIDER,
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+        chunk_tokens=settings.EMBEDDING_CHUNK_TOKENS,
+        chunk_overlap_tokens=settings.EMBEDDING_CHUNK_OVERLAP_TOKENS,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        ef_search=settings.EMBEDDING_HNSW_EF_SEARCH,
+        top_k=settings.RETRIEVAL_TOP_K,
+        min_score=settings.RETRIEVAL_MIN_SCORE,
+    )
+
+
+# 全局向量索引实例
+embedding_index = create_embedding_index()
@@ -0,0 +1,182 @@
+"""多角色并行回应（fan-out）.
+
+同一段输入同时交给多个AI角色处理，总耗时约为最慢角色的耗时而不是各角色
+耗时之和：
+1. 每个角色一个任务，同时运行的角色不超过concurrency个
+2. 每个角色从开始生成起计时，超时后停止生成并保留已输出的部分
+3. 各角色的片段按到达顺序汇入同一个事件流，事件带role字段区分
+"""
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from app.ai.roles import AI_ROLES
+from app.core.config import settings
+from app.services.ai.ai_manager import ai_manager
+
+logger = logging.getLogger(__name__)
+
+
+COMPLETED = "completed"
+TIMEOUT = "timeout"
+FAILED = "failed"
+
+
+@dataclass
+class RoleResult:
+    """单个角色的回应."""
+
+    role: str
+    status: str = COMPLETED
+    text: str = ""
+    error: Optional[str] = None
+    usage: Dict[str, Any] = field(default_factory=dict)
+    elapsed: float = 0.0  # 从开始生成起计（秒），不含排队等待
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RoleFanout:
+    """把一个输入分发给多个角色并合并它们的输出流."""
+
+    def __init__(self, concurrency: int = 4, role_timeout: float = 60.0, queue_size: int = 64):
+        """初始化fan-out.
+
+        Args:
+            concurrency: 每次请求同时生成的角色数上限
+            role_timeout: 默认的单角色超时（秒）
+            queue_size: 合并队列长度；客户端读取慢时角色的生成随之放慢
+        """
+        self.concurrency = concurrency
+        self.role_timeout = role_timeout
+        self.queue_size = queue_size
+        self._stats = {"requests": 0, "roles": 0, COMPLETED: 0, TIMEOUT: 0, FAILED: 0}
+
+    async def _run_role(
+        self,
+        role_id: str,
+        messages: List[Dict[str, str]],
+        timeout: float,
+        semaphore: asyncio.Semaphore,
+        queue: asyncio.Queue,
+    ):
+        """生成一个角色的回应，片段和最终结果写入合并队列.
+
+        无论成功、超时还是出错都会写入role_end事件，合并方据此判断何时结束。
+        """
+        role = AI_ROLES[role_id]
+        result = RoleResult(role=role_id)
+        parts: List[str] = []
+        async with semaphore:
+            started = time.monotonic()
+            await queue.put({"type": "role_start", "role": role_id, "name": role.name})
+            try:
+                chunks = ai_manager.stream_chat(
+                    messages=messages,
+                    system_prompt=role.system_prompt,
+                    temperature=role.temperature,
+                    max_tokens=role.max_tokens,
+                    usage=result.usage,
+                )
+                # 超时或出错时关闭生成器，及时释放提供商的流式连接
+                async with aclosing(chunks):
+                    async with asyncio.timeout(timeout):
+                        async for chunk in chunks:
+                            parts.append(chunk)
+                            await queue.put({"type": "delta", "role": role_id, "text": chunk})
+            except TimeoutError:
+                result.status = TIMEOUT
+            except Exception as e:
+                logger.warning("Fan-out role %s failed: %s", role_id, e)
+                result.status = FAILED
+                result.error = str(e)
+
+            result.text = "".join(parts)
+            result.elapsed = round(time.monotonic() - started, 3)
+            self._stats[result.status] += 1
+            await queue.put({"type": "role_end", **result.as_dict()})
+
+    async def stream(
+        self,
+        roles: Sequence[str],
+        message: str,
+        timeout: Optional[float] = None,
+        heartbeat: Optional[float] = None,
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """并行运行各角色，按到达顺序产出事件.
+
+        事件类型：role_start → delta（可多次）→ role_end（各角色交错），
+        最后是done（各状态的角色数和总耗时）。提前关闭生成器（如客户端断开）
+        会取消仍在运行的角色。
+
+        Args:
+            roles: 角色ID列表（调用方已校验）
+            message: 用户输入
+            timeout: 单角色超时（秒），默认role_timeout
+            heartbeat: 超过该秒数没有事件时产出None，供调用方发送心跳
+
+        Yields:
+            事件字典或None
+        """
+        self._stats["requests"] += 1
+        self._stats["roles"] += len(roles)
+        started = time.monotonic()
+        messages = [{"role": "user", "content": message}]
+        semaphore = asyncio.Semaphore(self.concurrency)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        tasks = [
+            asyncio.create_task(
+                self._run_role(role_id, messages, timeout or self.role_timeout, semaphore, queue)
+            )
+            for role_id in roles
+        ]
+
+        counts = {COMPLETED: 0, TIMEOUT: 0, FAILED: 0}
+        try:
+            remaining = len(tasks)
+            while remaining:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["type"] == "role_end":
+                    remaining -= 1
+                    counts[event["status"]] += 1
+                yield event
+            yield {"type": "done", **counts, "elapsed": round(time.monotonic() - started, 3)}
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(
+        self, roles: Sequence[str], message: str, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """并行运行各角色并等待全部结束.
+
+        Returns:
+            {"results": 按roles顺序的角色结果, "elapsed": 总耗时}
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        elapsed = 0.0
+        async for event in self.stream(roles, message, timeout):
+            if event["type"] == "role_end":
+                results[event["role"]] = {k: v for k, v in event.items() if k != "type"}
+            elif event["type"] == "done":
+                elapsed = event["elapsed"]
+        return {"results": [results[role_id] for role_id in roles], "elapsed": elapsed}
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+# 全局fan-out实例
+role_fanout = RoleFanout(
+    concurrency=settings.AI_FANOUT_CONCURRENCY,
+    role_timeout=settings.AI_FANOUT_ROLE_TIMEOUT,
+)
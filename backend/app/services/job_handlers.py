@@ -0,0 +1,172 @@
+"""后台任务处理函数.
+
+导入本模块即注册任务类型（API进程入队时校验类型，worker进程执行）：
+- ai.template：按提示词模板调用一次AI
+- ai.quality_analysis：项目或章节的质量诊断
+- ai.chapter_generation：按场景顺序生成整章正文
+- ai.pipeline：按依赖关系执行多步模板流水线
+- ai.batch：通过提供商的批处理接口批量生成并写回实体
+"""
+import logging
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.ai.roles import get_ai_role
+from app.ai.templates import PromptTemplateManager
+from app.models.entity.chapter import Chapter
+from app.models.entity.scene import Scene
+from app.services.ai.ai_manager import ai_manager
+from app.services.batch import batch_runner
+from app.services.database import database
+from app.services.jobs import JobContext, job_handler
+from app.services.pipeline import pipeline_runner
+from app.services.quality import load_quality_input, quality_analyzer
+
+logger = logging.getLogger(__name__)
+
+template_manager = PromptTemplateManager()
+
+
+def _role_options(role_id: Optional[str]) -> Dict[str, Any]:
+    """AI角色对应的complete参数."""
+    if not role_id:
+        return {}
+    role = get_ai_role(role_id)
+    if role is None:
+        raise ValueError(f"AI role '{role_id}' not found")
+    return {"system_prompt": role.system_prompt, "temperature": role.temperature, "max_tokens": role.max_tokens}
+
+
+@job_handler("ai.template")
+async def run_template(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """按模板调用一次AI.
+
+    参数：template_id、variables、role_id（可选）、response_format（可选）。
+    """
+    prefix, prompt = template_manager.fill_template_parts(params["template_id"], params.get("variables") or {})
+    await context.progress(0.1, "Waiting for the AI provider")
+    response = await ai_manager.complete(
+        prompt=prompt,
+        prompt_prefix=prefix,
+        response_format=params.get("response_format"),
+        **_role_options(params.get("role_id")),
+    )
+    return {"text": response.text, "structured_data": response.structured_data, "metadata": response.metadata}
+
+
+@job_handler("ai.quality_analysis")
+async def run_quality_analysis(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """质量诊断.
+
+    参数：project_id、content_type（full/structure/character/plot/writing）、
+    entity_id（章节ID，可选）。按章节和场景分块并行诊断后合并，结果为
+    QualityAnalysisResponse结构。
+    """
+    project_id = UUID(params["project_id"]) if params.get("project_id") else None
+    entity_id = UUID(params["entity_id"]) if params.get("entity_id") else None
+    await context.progress(0.0, "Loading chapters")
+    loaded = await load_quality_input(project_id, entity_id)
+    return await quality_analyzer.analyze(
+        loaded["project"], loaded["chapters"], scope=params.get("content_type", "full"), context=context
+    )
+
+
+def build_scene_prompt(chapter: Chapter, scene: Scene, previous: Optional[str], instructions: Optional[str]) -> str:
+    """构建单个场景的生成提示词."""
+    lines = [f"# 任务：撰写第{chapter.chapter_number}章 场景{scene.scene_number}的正文", ""]
+    if chapter.synopsis:
+        lines.append(f"- 章节梗概：{chapter.synopsis}")
+    if scene.title:
+        lines.append(f"- 场景标题：{scene.title}")
+    if scene.location:
+        lines.append(f"- 地点：{scene.location}")
+    if scene.mood:
+        lines.append(f"- 基调：{scene.mood}")
+    if scene.beats:
+        lines.append(f"- 节拍：{scene.beats}")
+    if previous:
+        # 只带上一场景的结尾，保证衔接又不让提示词随章节增长
+        lines += ["", "## 上一场景结尾", previous[-500:]]
+    if instructions:
+        lines += ["", "## 额外要求", instructions]
+    lines += ["", "直接输出场景正文，不要标题和解释。"]
+    return "\n".join(lines)
+
+
+@job_handler("ai.chapter_generation")
+async def run_chapter_generation(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """按场景顺序生成整章正文.
+
+    参数：chapter_id、instructions（可选）、save（是否写回场景，默认否）、
+    overwrite（save时是否覆盖已有正文，默认否）。每完成一个场景报告一次进度，
+    取消时已生成的场景不会写回。
+    """
+    chapter_id = UUID(params["chapter_id"])
+    async with database.session_factory(readonly=True)() as db:
+        chapter = (
+            await db.execute(select(Chapter).options(selectinload(Chapter.scenes)).where(Chapter.id == chapter_id))
+        ).scalar_one_or_none()
+    if chapter is None:
+        raise ValueError(f"Chapter {chapter_id} not found")
+
+    scenes = sorted(chapter.scenes, key=lambda s: s.scene_number)
+    pending = scenes if params.get("overwrite") else [s for s in scenes if not s.content]
+    role = _role_options("scene_renderer")
+
+    generated: List[Dict[str, Any]] = []
+    previous: Optional[str] = None
+    for done, scene in enumerate(scenes):
+        if scene not in pending:
+            previous = scene.content
+            continue
+        response = await ai_manager.complete(
+            prompt=build_scene_prompt(chapter, scene, previous, params.get("instructions")), **role
+        )
+        previous = response.text
+        generated.append(
+            {
+                "scene_id": str(scene.id),
+                "scene_number": scene.scene_number,
+                "content": response.text,
+                "tokens": response.metadata.get("usage", {}).get("output_tokens") if response.metadata else None,
+            }
+        )
+        await context.progress(
+            (done + 1) / len(scenes), f"Scene {scene.scene_number} done", scene_id=str(scene.id)
+        )
+
+    if params.get("save") and generated:
+        async with database.session_factory()() as db:
+            for item in generated:
+                scene = await db.get(Scene, UUID(item["scene_id"]))
+                if scene is not None:
+                    scene.content = item["content"]
+            await db.commit()
+
+    return {"chapter_id": str(chapter_id), "scenes": generated, "saved": bool(params.get("save") and generated)}
+
+
+@job_handler("ai.pipeline")
+async def run_pipeline(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """多步模板流水线.
+
+    参数：steps（步骤定义）、inputs（流水线输入）、run_id（可选，续跑时为
+    原任务的run_id，默认为本任务ID）。同一run_id下已完成的步骤从检查点恢复。
+    """
+    inputs = params.get("inputs") or {}
+    steps = pipeline_runner.build(params["steps"], inputs)
+    return await pipeline_runner.run(steps, inputs, run_id=params.get("run_id") or context.job_id, context=context)
+
+
+@job_handler("ai.batch")
+async def run_batch(params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """批量离线生成.
+
+    参数：kind（quality_analysis/character_profile）、project_id，以及
+    content_type（质量诊断范围）、character_ids、core_conflict（可选）。
+    批次可能需要数小时，期间任务保持运行并定期报告进度。
+    """
+    return await batch_runner.run(params["kind"], params, context)
@@ -0,0 +1,670 @@
+"""基于Redis的后台任务.
+
+耗时的AI任务（全书质检、整章生成等）由API入队后立即返回任务ID，独立的
+worker进程（python -m app.cli job-worker）执行。
+
+Redis中的数据（键前缀JOB_KEY_PREFIX）：
+- job:<id>                   任务状态哈希（类型、参数、用户、状态、进度、错误、时间）
+- result:<id>                任务结果JSON，完成后保留result_ttl秒
+- events:<id>                最近的进度事件列表，events:<id>频道实时发布
+- idempotency:<用户>:<key>   幂等键 -> 任务ID，相同的键和参数返回同一任务
+- stream                     待执行任务的Stream，worker以消费组读取
+
+worker以消费组读取任务，完成后确认；运行中的任务定期续租，worker失联后
+超过lease_seconds的任务由其他worker接管，超过max_attempts次不再重试。
+取消请求通过control频道通知正在执行的worker。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.context import metered_user
+
+logger = logging.getLogger(__name__)
+
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+CONSUMER_GROUP = "workers"
+
+# 开始执行：检查是否已结束、已请求取消或超过重试次数，然后标记为running（原子执行）
+# KEYS[1]=任务状态哈希 ARGV[1]=max_attempts ARGV[2]=当前时间
+# 返回{结果, 执行次数}，结果为gone、cancelled、exhausted或running
+START_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 or redis.call('HEXISTS', KEYS[1], 'finished_at') == 1 then
+    return {'gone', 0}
+end
+local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+if redis.call('HGET', KEYS[1], 'cancel_requested') == '1' then
+    return {'cancelled', attempts}
+end
+if attempts > tonumber(ARGV[1]) then
+    return {'exhausted', attempts}
+end
+redis.call('HSET', KEYS[1], 'status', 'running', 'started_at', ARGV[2])
+return {'running', attempts}
+"""
+
+# 请求取消：记录cancel_requested并返回此刻的状态（原子执行，与START_SCRIPT互斥）
+# KEYS[1]=任务状态哈希；任务不存在时返回nil，已结束时返回finished
+CANCEL_SCRIPT = """
+local status = redis.call('HGET', KEYS[1], 'status')
+if not status then
+    return false
+end
+if redis.call('HEXISTS', KEYS[1], 'finished_at') == 1 then
+    return 'finished'
+end
+redis.call('HSET', KEYS[1], 'cancel_requested', '1')
+return status
+"""
+
+
+class JobConflictError(Exception):
+    """幂等键已用于参数不同的任务."""
+
+
+class JobContext:
+    """传给任务处理函数的上下文，用于报告进度."""
+
+    def __init__(self, queue: "JobQueue", job_id: str, attempt: int = 1):
+        self.queue = queue
+        self.job_id = job_id
+        self.attempt = attempt
+
+    async def progress(self, fraction: float, message: Optional[str] = None, **data: Any):
+        """报告进度（0~1），同时发布progress事件."""
+        await self.queue.progress(self.job_id, fraction, message, data or None)
+
+
+class LocalJobContext(JobContext):
+    """在请求内直接执行处理函数时使用，进度只记日志."""
+
+    def __init__(self):
+        super().__init__(queue=None, job_id="inline")
+
+    async def progress(self, fraction: float, message: Optional[str] = None, **data: Any):
+        logger.debug("Inline job progress %.0f%%: %s", fraction * 100, message)
+
+
+JobHandler = Callable[[Dict[str, Any], JobContext], Awaitable[Any]]
+
+# 任务类型 -> 处理函数
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def job_handler(job_type: str):
+    """注册任务处理函数的装饰器.
+
+    处理函数接收(参数, JobContext)，返回可JSON序列化的结果。
+    """
+
+    def decorator(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[job_type] = func
+        return func
+
+    return decorator
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+class JobQueue:
+    """任务的入队、状态、结果、取消和进度事件."""
+
+    def __init__(
+        self,
+        redis_url: str,
+        key_prefix: str = "novelflow:jobs:",
+        result_ttl: int = 86400,
+        idempotency_ttl: int = 86400,
+        lease_seconds: int = 120,
+        max_attempts: int = 3,
+        event_history: int = 100,
+    ):
+        """初始化任务队列.
+
+        Args:
+            redis_url: Redis连接地址
+            key_prefix: Redis键前缀
+            result_ttl: 任务完成后状态、结果和事件保留的秒数
+            idempotency_ttl: 幂等键保留的秒数
+            lease_seconds: worker失联多久后任务可被接管
+            max_attempts: 任务最多被执行的次数（worker失联后重新执行计入）
+            event_history: 每个任务保留的最近事件数，供晚到的订阅者补发
+        """
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+        self.result_ttl = result_ttl
+        self.idempotency_ttl = idempotency_ttl
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.event_history = event_history
+        self._redis = None
+
+    def _key(self, *parts: str) -> str:
+        return self.key_prefix + ":".join(parts)
+
+    async def redis(self):
+        """延迟创建Redis客户端."""
+        if self._redis is None:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def close(self):
+        """关闭Redis连接."""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    @staticmethod
+    def fingerprint(job_type: str, params: Dict[str, Any]) -> str:
+        """任务类型和参数的摘要，用于校验幂等键."""
+        payload = json.dumps({"type": job_type, "params": params}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _decode(data: Dict[str, str]) -> Dict[str, Any]:
+        """把状态哈希转换为任务字典."""
+        return {
+            "id": data["id"],
+            "type": data["type"],
+            "status": data["status"],
+            "params": json.loads(data.get("params") or "{}"),
+            "fingerprint": data.get("fingerprint"),
+            "idempotency_key": data.get("idempotency_key") or None,
+            "user_id": data.get("user_id") or None,
+            "progress": float(data.get("progress") or 0),
+            "message": data.get("message") or None,
+            "error": data.get("error") or None,
+            "attempts": int(data.get("attempts") or 0),
+            "cancel_requested": data.get("cancel_requested") == "1",
+            "created_at": data.get("created_at"),
+            "started_at": data.get("started_at") or None,
+            "finished_at": data.get("finished_at") or None,
+        }
+
+    async def enqueue(
+        self,
+        job_type: str,
+        params: Dict[str, Any],
+        idempotency_key: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """提交任务.
+
+        Args:
+            job_type: 任务类型（须已注册处理函数）
+            params: 任务参数
+            idempotency_key: 幂等键，同一用户相同的键在idempotency_ttl内返回同一任务
+            user_id: 提交任务的用户，任务执行时的AI用量计入该用户
+
+        Returns:
+            (任务, 是否新建)
+
+        Raises:
+            ValueError: 未知的任务类型
+            JobConflictError: 幂等键已用于参数不同的任务
+        """
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job type: {job_type}; available: {', '.join(sorted(JOB_HANDLERS))}")
+
+        redis = await self.redis()
+        job_id = uuid.uuid4().hex
+        job_key = self._key("job", job_id)
+        fingerprint = self.fingerprint(job_type, params)
+        job = {
+            "id": job_id,
+            "type": job_type,
+            "status": QUEUED,
+            "params": json.dumps(params, ensure_ascii=False, default=str),
+            "fingerprint": fingerprint,
+            "idempotency_key": idempotency_key or "",
+            "user_id": user_id or "",
+            "progress": 0,
+            "attempts": 0,
+            "event_seq": 0,
+            "created_at": _now(),
+        }
+        # 先写状态再抢占幂等键，抢占失败的一方总能读到已存在的任务
+        await redis.hset(job_key, mapping=job)
+
+        if idempotency_key:
+            idempotency = self._key("idempotency", user_id or "anonymous", idempotency_key)
+            if not await redis.set(idempotency, job_id, nx=True, ex=self.idempotency_ttl):
+                await redis.delete(job_key)
+                existing_id = await redis.get(idempotency)
+                existing = await self.get(existing_id) if existing_id else None
+                if existing is not None:
+                    if existing["fingerprint"] != fingerprint:
+                        raise JobConflictError(
+                            f"Idempotency key {idempotency_key!r} was used for a different request"
+                        )
+                    return existing, False
+                # 原任务已过期，幂等键改指向新任务
+                await redis.hset(job_key, mapping=job)
+                await redis.set(idempotency, job_id, ex=self.idempotency_ttl)
+
+        await redis.xadd(self._key("stream"), {"job_id": job_id})
+        await self._emit(job_id, QUEUED)
+        return self._decode({k: str(v) for k, v in job.items()}), True
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，不存在或已过期时返回None."""
+        redis = await self.redis()
+        data = await redis.hgetall(self._key("job", job_id))
+        if not data:
+            return None
+        return self._decode(data)
+
+    async def result(self, job_id: str) -> Any:
+        """获取任务结果，没有结果时返回None."""
+        redis = await self.redis()
+        value = await redis.get(self._key("result", job_id))
+        return json.loads(value) if value is not None else None
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消任务：排队中的直接取消，运行中的通知worker中断.
+
+        Returns:
+            取消后的任务状态，任务不存在时返回None
+        """
+        redis = await self.redis()
+        # 与start()原子互斥：要么任务仍在排队（直接结束，之后的start会看到
+        # cancel_requested），要么已标记为running（通知执行它的worker）
+        status = await redis.eval(CANCEL_SCRIPT, 1, self._key("job", job_id))
+        if status is None:
+            return None
+        if status == QUEUED:
+            await self.finish(job_id, CANCELLED)
+        elif status == RUNNING:
+            await redis.publish(self._key("control"), job_id)
+        return await self.get(job_id)
+
+    async def progress(self, job_id: str, fraction: float, message: Optional[str] = None, data: Any = None):
+        """更新进度并发布progress事件."""
+        redis = await self.redis()
+        fraction = max(0.0, min(1.0, fraction))
+        mapping = {"progress": round(fraction, 4)}
+        if message is not None:
+            mapping["message"] = message
+        await redis.hset(self._key("job", job_id), mapping=mapping)
+        payload: Dict[str, Any] = {"progress": round(fraction, 4), "message": message}
+        if data:
+            payload["data"] = data
+        await self._emit(job_id, "progress", payload)
+
+    async def _emit(self, job_id: str, event_type: str, payload: Optional[Dict[str, Any]] = None):
+        """记录并发布一条事件，seq在任务内递增."""
+        redis = await self.redis()
+        seq = await redis.hincrby(self._key("job", job_id), "event_seq", 1)
+        event = json.dumps(
+            {"seq": seq, "type": event_type, "job_id": job_id, "at": _now(), **(payload or {})},
+            ensure_ascii=False,
+            default=str,
+        )
+        events = self._key("events", job_id)
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(events, event)
+            pipe.ltrim(events, -self.event_history, -1)
+            if event_type in TERMINAL_STATUSES:
+                pipe.expire(events, self.result_ttl)
+            pipe.publish(events, event)
+            await pipe.execute()
+
+    async def events(
+        self, job_id: str, after: int = 0, heartbeat: float = 15.0
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """按顺序读取任务事件，直到任务结束.
+
+        先订阅频道再补发历史事件，按seq去重，订阅前后的事件都不会丢失。
+        超过heartbeat秒没有事件时产出None，供调用方发送心跳。
+
+        Args:
+            job_id: 任务ID
+            after: 只返回seq大于该值的事件（断线重连时传入Last-Event-ID）
+            heartbeat: 心跳间隔（秒）
+
+        Yields:
+            事件字典或None
+        """
+        redis = await self.redis()
+        pubsub = redis.pubsub()
+        await pubsub.subscribe(self._key("events", job_id))
+        try:
+            last = after
+            for raw in await redis.lrange(self._key("events", job_id), 0, -1):
+                event = json.loads(raw)
+                if event["seq"] <= last:
+                    continue
+                last = event["seq"]
+                yield event
+                if event["type"] in TERMINAL_STATUSES:
+                    return
+
+            job = await self.get(job_id)
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                return
+
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat)
+                if message is None:
+                    yield None
+                    continue
+                event = json.loads(message["data"])
+                if event["seq"] <= last:
+                    continue
+                last = event["seq"]
+                yield event
+                if event["type"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.close()
+
+    # ========== worker侧 ==========
+
+    async def ensure_group(self):
+        """创建消费组（已存在时忽略）."""
+        import redis.exceptions
+
+        redis_client = await self.redis()
+        try:
+            await redis_client.xgroup_create(self._key("stream"), CONSUMER_GROUP, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def claim(self, consumer: str, count: int, block_ms: int = 1000) -> List[Tuple[str, str]]:
+        """读取新任务.
+
+        Returns:
+            [(消息ID, 任务ID), ...]
+        """
+        redis = await self.redis()
+        response = await redis.xreadgroup(
+            CONSUMER_GROUP, consumer, {self._key("stream"): ">"}, count=count, block=block_ms
+        )
+        return [
+            (message_id, fields["job_id"])
+            for _, messages in response or []
+            for message_id, fields in messages
+        ]
+
+    async def reclaim(self, consumer: str, count: int) -> List[Tuple[str, str]]:
+        """接管超过lease_seconds未续租的任务（原worker已失联）."""
+        redis = await self.redis()
+        response = await redis.xautoclaim(
+            self._key("stream"), CONSUMER_GROUP, consumer, self.lease_seconds * 1000, "0-0", count=count
+        )
+        messages = response[1]
+        return [(message_id, fields["job_id"]) for message_id, fields in messages if fields]
+
+    async def renew(self, consumer: str, message_ids: List[str]):
+        """为运行中的任务续租（重置空闲时间）."""
+        if not message_ids:
+            return
+        redis = await self.redis()
+        await redis.xclaim(
+            self._key("stream"), CONSUMER_GROUP, consumer, 0, message_ids, justid=True
+        )
+
+    async def ack(self, message_id: str):
+        """确认并删除消息."""
+        redis = await self.redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self._key("stream"), CONSUMER_GROUP, message_id)
+            pipe.xdel(self._key("stream"), message_id)
+            await pipe.execute()
+
+    async def start(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """标记任务开始执行.
+
+        Returns:
+            任务；任务已结束、已取消、已过期或超过重试次数时返回None
+        """
+        redis = await self.redis()
+        state, attempts = await redis.eval(
+            START_SCRIPT, 1, self._key("job", job_id), self.max_attempts, _now()
+        )
+        if state == "gone":
+            return None
+        if state == "cancelled":
+            await self.finish(job_id, CANCELLED)
+            return None
+        if state == "exhausted":
+            await self.finish(job_id, FAILED, error=f"Worker lost {self.max_attempts} times, giving up")
+            return None
+
+        await self._emit(job_id, RUNNING, {"attempt": attempts})
+        return await self.get(job_id)
+
+    async def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> bool:
+        """结束任务，保存结果并设置过期时间.
+
+        Returns:
+            是否由本次调用结束（任务已结束时返回False）
+        """
+        redis = await self.redis()
+        job_key = self._key("job", job_id)
+        # finished_at只能写入一次，避免取消与完成并发时重复结束
+        if not await redis.hsetnx(job_key, "finished_at", _now()):
+            return False
+
+        mapping: Dict[str, Any] = {"status": status}
+        if status == SUCCEEDED:
+            mapping["progress"] = 1
+        if error:
+            mapping["error"] = error[:2000]
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(job_key, mapping=mapping)
+            pipe.expire(job_key, self.result_ttl)
+            if result is not None:
+                pipe.set(
+                    self._key("result", job_id),
+                    json.dumps(result, ensure_ascii=False, default=str),
+                    ex=self.result_ttl,
+                )
+            await pipe.execute()
+        await self._emit(job_id, status, {"error": error} if error else None)
+        return True
+
+
+class JobWorker:
+    """在一个进程中以有限并发执行任务."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        concurrency: int = 4,
+        name: Optional[str] = None,
+        shutdown_grace: float = 30.0,
+    ):
+        """初始化worker.
+
+        Args:
+            queue: 任务队列
+            concurrency: 同时执行的任务数上限
+            name: 消费者名称，默认为主机名-进程号
+            shutdown_grace: 停止时等待运行中任务的秒数，超时的任务交给其他worker
+        """
+        self.queue = queue
+        self.concurrency = concurrency
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.shutdown_grace = shutdown_grace
+        self._running: Dict[str, Tuple[str, asyncio.Task]] = {}  # 任务ID -> (消息ID, Task)
+        self._interrupted: Set[str] = set()  # 因worker停止而中断、留给其他worker的任务
+        self._stop = asyncio.Event()
+        self._stats = {"started": 0, "succeeded": 0, "failed": 0, "cancelled": 0}
+
+    async def run(self):
+        """持续领取并执行任务，直到stop()."""
+        await self.queue.ensure_group()
+        control = asyncio.create_task(self._listen_control())
+        renewal = asyncio.create_task(self._renew_leases())
+        last_reclaim = 0.0
+        backoff = 1.0
+        logger.info("Job worker %s started (concurrency %d)", self.name, self.concurrency)
+        try:
+            while not self._stop.is_set():
+                free = self.concurrency - len(self._running)
+                if free <= 0:
+                    await asyncio.wait(
+                        [task for _, task in self._running.values()],
+                        timeout=1.0,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                    continue
+                try:
+                    messages: List[Tuple[str, str]] = []
+                    if time.monotonic() - last_reclaim > self.queue.lease_seconds / 2:
+                        last_reclaim = time.monotonic()
+                        messages = await self.queue.reclaim(self.name, free)
+                    if not messages:
+                        messages = await self.queue.claim(self.name, free)
+                    backoff = 1.0
+                except Exception as e:
+                    logger.warning("Job worker cannot read the queue, retrying in %.0fs: %s", backoff, e)
+                    await asyncio.sleep(backoff)
+                    backoff = min(30.0, backoff * 2)
+                    continue
+                for message_id, job_id in messages:
+                    if job_id in self._running:
+                        continue
+                    task = asyncio.create_task(self._execute(message_id, job_id))
+                    self._running[job_id] = (message_id, task)
+                    task.add_done_callback(lambda _, job_id=job_id: self._running.pop(job_id, None))
+        finally:
+            control.cancel()
+            renewal.cancel()
+            await self._drain()
+            logger.info("Job worker %s stopped: %s", self.name, self._stats)
+
+    def stop(self):
+        """停止领取新任务."""
+        self._stop.set()
+
+    async def _drain(self):
+        """等待运行中的任务，超时后中断，未确认的消息由其他worker接管."""
+        tasks = [task for _, task in self._running.values()]
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=self.shutdown_grace)
+        for job_id, (_, task) in list(self._running.items()):
+            if task in pending:
+                self._interrupted.add(job_id)
+                task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _execute(self, message_id: str, job_id: str):
+        """执行单个任务并记录结果."""
+        try:
+            job = await self.queue.start(job_id)
+        except asyncio.CancelledError:
+            # 标记为running后、开始执行前收到取消通知
+            if job_id not in self._interrupted:
+                await self.queue.finish(job_id, CANCELLED)
+            raise
+        except Exception as e:
+            logger.warning("Cannot start job %s: %s", job_id, e)
+            return
+        if job is None:
+            await self.queue.ack(message_id)
+            return
+
+        self._stats["started"] += 1
+        # 每个任务在独立的Task中执行，只影响本任务的计量用户
+        metered_user.set(job["user_id"])
+        handler = JOB_HANDLERS.get(job["type"])
+        context = JobContext(self.queue, job_id, attempt=job["attempts"])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job type {job['type']}")
+            result = await handler(job["params"], context)
+        except asyncio.CancelledError:
+            if job_id in self._interrupted:
+                return
+            await self.queue.finish(job_id, CANCELLED)
+            self._stats["cancelled"] += 1
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, job["type"])
+            await self.queue.finish(job_id, FAILED, error=f"{type(e).__name__}: {e}")
+            self._stats["failed"] += 1
+        else:
+            await self.queue.finish(job_id, SUCCEEDED, result=result)
+            self._stats["succeeded"] += 1
+        await self.queue.ack(message_id)
+
+    async def _listen_control(self):
+        """接收取消通知，中断本worker上运行的任务."""
+        while True:
+            try:
+                redis = await self.queue.redis()
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(self.queue._key("control"))
+                try:
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        running = self._running.get(message["data"])
+                        if running is not None:
+                            logger.info("Cancelling job %s on request", message["data"])
+                            running[1].cancel()
+                finally:
+                    await pubsub.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Job control channel lost, resubscribing: %s", e)
+                await asyncio.sleep(1.0)
+
+    async def _renew_leases(self):
+        """定期为运行中的任务续租."""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                await self.queue.renew(self.name, [message_id for message_id, _ in self._running.values()])
+            except Exception as e:
+                logger.warning("Cannot renew job leases: %s", e)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取worker运行统计."""
+        return {"name": self.name, "running": len(self._running), **self._stats}
+
+
+def create_job_queue() -> JobQueue:
+    """根据应用配置创建任务队列."""
+    return JobQueue(
+        redis_url=settings.JOB_REDIS_URL or settings.REDIS_URL,
+        key_prefix=settings.JOB_KEY_PREFIX,
+        result_ttl=settings.JOB_RESULT_TTL,
+        idempotency_ttl=settings.JOB_IDEMPOTENCY_TTL,
+        lease_seconds=settings.JOB_LEASE_SECONDS,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        event_history=settings.JOB_EVENT_HISTORY,
+    )
+
+
+# 全局任务队列实例
+job_queue = create_job_queue()
+
+
+def create_job_worker(concurrency: Optional[int] = None) -> JobWorker:
+    """根据应用配置创建worker."""
+    return JobWorker(queue=job_queue, concurrency=concurrency or settings.JOB_WORKER_CONCURRENCY)
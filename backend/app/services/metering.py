@@ -0,0 +1,441 @@
+"""按用户计量AI token用量并执行月度配额.
+
+请求路径上只访问Redis（键前缀METERING_KEY_PREFIX）：
+- usage:<月份>:<用户>     本月累计：used（输入+输出）、input、output、requests
+- pending:<月份>:<用户>   尚未写入Postgres的增量
+- dirty                   有待写入增量的"<月份>:<用户>"集合
+- reservations:<用户>     流式调用的预留（有序集合，分数为过期时间）
+- limit:<用户>            按订阅等级换算的月度配额，缓存limit_cache_ttl秒
+
+调用前检查"已用+预留+本次预估"是否超出配额（一次Lua脚本往返，脚本遍历该
+用户未过期的预留，通常只有几个）；普通调用结束后按实际用量记账，流式调用先
+预留预估token，结束后按实际用量结算并释放预留。flusher定期把增量批量写入token_usage表。配额缓存未命中（新用户、新
+月份、Redis重启）时才读一次数据库，同时用表中的累计值补齐Redis计数。
+
+Redis不可用时放行请求（只记录日志），计量不应成为AI功能的单点故障。
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.entity.token_usage import TokenUsage
+from app.models.entity.user import User
+from app.services.ai.exceptions import AIQuotaExceededError
+from app.services.database import database
+
+logger = logging.getLogger(__name__)
+
+
+# 月度计数在Redis中保留的时间，覆盖跨月后仍需写入的增量
+USAGE_TTL = 40 * 86400
+
+# 检查并预留：清理过期预留，已用+预留+本次超出配额时拒绝
+# KEYS: usage, reservations  ARGV: now, limit(0不限), amount, member, expires_at
+RESERVE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+local used = tonumber(redis.call('HGET', KEYS[1], 'used') or '0')
+local reserved = 0
+for _, member in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+    reserved = reserved + tonumber(string.match(member, ':(%d+)$'))
+end
+local limit = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+if limit > 0 and used + reserved + amount > limit then
+    return {0, used, reserved}
+end
+if ARGV[4] ~= '' then
+    redis.call('ZADD', KEYS[2], ARGV[5], ARGV[4])
+    redis.call('EXPIRE', KEYS[2], math.ceil(tonumber(ARGV[5]) - tonumber(ARGV[1])) + 60)
+end
+return {1, used, reserved + amount}
+"""
+
+
+@dataclass
+class Reservation:
+    """一次流式调用的预留."""
+
+    user_id: str
+    member: str  # reservations有序集合中的成员
+    tokens: int
+
+
+def period_of(moment: Optional[datetime] = None) -> str:
+    """计量周期（UTC自然月），如2024-05."""
+    return (moment or datetime.utcnow()).strftime("%Y-%m")
+
+
+def usage_tokens(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """从AI响应的usage中提取输入、输出token数."""
+    usage = usage or {}
+    return {"input": int(usage.get("input_tokens") or 0), "output": int(usage.get("output_tokens") or 0)}
+
+
+class TokenMeter:
+    """token计量与配额."""
+
+    def __init__(
+        self,
+        redis_url: str,
+        key_prefix: str = "novelflow:metering:",
+        tier_limits: Optional[Dict[str, int]] = None,
+        enabled: bool = True,
+        limit_cache_ttl: int = 300,
+        reservation_ttl: int = 600,
+        flush_interval: float = 10.0,
+        flush_batch_size: int = 500,
+    ):
+        """初始化计量器.
+
+        Args:
+            redis_url: Redis连接地址
+            key_prefix: Redis键前缀
+            tier_limits: 订阅等级 -> 月度token配额，0或缺失表示不限
+            enabled: 是否计量和执行配额
+            limit_cache_ttl: 用户配额在Redis中的缓存时间（秒），订阅变更在此之后生效
+            reservation_ttl: 流式预留的最长存活时间（秒），进程崩溃时遗留的预留到期释放
+            flush_interval: 增量写入Postgres的间隔（秒）
+            flush_batch_size: 每批写入的用户数
+        """
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+        self.tier_limits = tier_limits or {}
+        self.enabled = enabled
+        self.limit_cache_ttl = limit_cache_ttl
+        self.reservation_ttl = reservation_ttl
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._redis = None
+        self._reserve_script = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+        self._stats = {
+            "checks": 0,
+            "rejected": 0,
+            "recorded_tokens": 0,
+            "reservations": 0,
+            "flushed_rows": 0,
+            "flush_errors": 0,
+            "limit_loads": 0,
+            "redis_errors": 0,
+        }
+
+    def _key(self, *parts: str) -> str:
+        return self.key_prefix + ":".join(parts)
+
+    async def redis(self):
+        """延迟创建Redis客户端."""
+        if self._redis is None:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+            self._reserve_script = self._redis.register_script(RESERVE_SCRIPT)
+        return self._redis
+
+    async def close(self):
+        """关闭Redis连接."""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    # ========== 配额 ==========
+
+    async def _load_limit(self, user_id: str, period: str) -> int:
+        """从数据库读取用户的订阅等级和本月累计，写入Redis缓存."""
+        self._stats["limit_loads"] += 1
+        async with database.session_factory(readonly=True)() as db:
+            row = (
+                await db.execute(
+                    select(User.subscription_tier, TokenUsage.total_tokens)
+                    .outerjoin(TokenUsage, (TokenUsage.user_id == User.id) & (TokenUsage.period == period))
+                    .where(User.id == uuid.UUID(user_id))
+                )
+            ).first()
+        tier = (row.subscription_tier if row else None) or "free"
+        limit = self.tier_limits.get(tier, 0)
+        redis = await self.redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key("limit", user_id), limit, ex=self.limit_cache_ttl)
+            # Redis中没有本月计数时用数据库中已写入的累计值补齐
+            pipe.hsetnx(self._key("usage", period, user_id), "used", int(row.total_tokens or 0) if row else 0)
+            pipe.expire(self._key("usage", period, user_id), USAGE_TTL)
+            await pipe.execute()
+        return limit
+
+    async def limit_for(self, user_id: str, period: Optional[str] = None) -> int:
+        """用户的月度配额（0表示不限）."""
+        redis = await self.redis()
+        cached = await redis.get(self._key("limit", user_id))
+        if cached is not None:
+            return int(cached)
+        return await self._load_limit(user_id, period or period_of())
+
+    async def _reserve(self, user_id: str, amount: int, member: str = "") -> None:
+        """检查配额并可选地登记预留，超出时抛出AIQuotaExceededError."""
+        period = period_of()
+        limit = await self.limit_for(user_id, period)
+        now = time.time()
+        allowed, used, reserved = await self._reserve_script(
+            keys=[self._key("usage", period, user_id), self._key("reservations", user_id)],
+            args=[now, limit, amount, member, now + self.reservation_ttl],
+        )
+        self._stats["checks"] += 1
+        if not allowed:
+            self._stats["rejected"] += 1
+            raise AIQuotaExceededError(
+                f"Monthly token quota exceeded: {int(used) + int(reserved)} of {limit} tokens used",
+                used=int(used) + int(reserved),
+                limit=limit,
+            )
+
+    async def check(self, user_id: Optional[str], estimated_tokens: int = 0):
+        """调用前检查配额（一次Redis往返）.
+
+        Args:
+            user_id: 用户ID，为None时不检查
+            estimated_tokens: 本次调用的预估token数
+
+        Raises:
+            AIQuotaExceededError: 已用+预留+预估超出配额
+        """
+        if not self.enabled or user_id is None:
+            return
+        try:
+            await self._reserve(user_id, estimated_tokens)
+        except AIQuotaExceededError:
+            raise
+        except Exception as e:
+            self._on_redis_error(e)
+
+    async def reserve(self, user_id: Optional[str], tokens: int) -> Optional[Reservation]:
+        """为流式调用预留token，结束后必须调用settle.
+
+        Returns:
+            预留；不计量时返回None
+
+        Raises:
+            AIQuotaExceededError: 已用+预留+本次超出配额
+        """
+        if not self.enabled or user_id is None:
+            return None
+        member = f"{uuid.uuid4().hex}:{max(0, int(tokens))}"
+        try:
+            await self._reserve(user_id, max(0, int(tokens)), member)
+        except AIQuotaExceededError:
+            raise
+        except Exception as e:
+            self._on_redis_error(e)
+            return None
+        self._stats["reservations"] += 1
+        return Reservation(user_id=user_id, member=member, tokens=tokens)
+
+    async def settle(self, reservation: Optional[Reservation], usage: Optional[Dict[str, Any]]):
+        """按实际用量结算流式调用并释放预留."""
+        if reservation is None:
+            return
+        try:
+            redis = await self.redis()
+            await redis.zrem(self._key("reservations", reservation.user_id), reservation.member)
+        except Exception as e:
+            self._on_redis_error(e)
+        await self.record(reservation.user_id, usage)
+
+    # ========== 记账 ==========
+
+    async def record(self, user_id: Optional[str], usage: Optional[Dict[str, Any]]):
+        """记录一次调用的实际用量（一次Redis往返）."""
+        if not self.enabled or user_id is None:
+            return
+        tokens = usage_tokens(usage)
+        total = tokens["input"] + tokens["output"]
+        period = period_of()
+        counters = self._key("usage", period, user_id)
+        pending = self._key("pending", period, user_id)
+        try:
+            redis = await self.redis()
+            async with redis.pipeline(transaction=True) as pipe:
+                for target in (counters, pending):
+                    pipe.hincrby(target, "used", total)
+                    pipe.hincrby(target, "input", tokens["input"])
+                    pipe.hincrby(target, "output", tokens["output"])
+                    pipe.hincrby(target, "requests", 1)
+                    pipe.expire(target, USAGE_TTL)
+                pipe.sadd(self._key("dirty"), f"{period}:{user_id}")
+                await pipe.execute()
+        except Exception as e:
+            self._on_redis_error(e)
+            return
+        self._stats["recorded_tokens"] += total
+
+    async def usage(self, user_id: str) -> Dict[str, Any]:
+        """用户本月的用量和配额."""
+        period = period_of()
+        limit = await self.limit_for(user_id, period)
+        redis = await self.redis()
+        counters = await redis.hgetall(self._key("usage", period, user_id))
+        now = time.time()
+        reserved = sum(
+            int(member.rsplit(":", 1)[1])
+            for member in await redis.zrangebyscore(self._key("reservations", user_id), now, "+inf")
+        )
+        used = int(counters.get("used") or 0)
+        return {
+            "period": period,
+            "used": used,
+            "reserved": reserved,
+            "input_tokens": int(counters.get("input") or 0),
+            "output_tokens": int(counters.get("output") or 0),
+            "requests": int(counters.get("requests") or 0),
+            "limit": limit or None,
+            "remaining": max(0, limit - used - reserved) if limit else None,
+        }
+
+    # ========== 批量写入 ==========
+
+    async def flush(self, db: AsyncSession) -> int:
+        """把一批待写入的增量累加到token_usage表（提交由本方法完成）.
+
+        增量先从Redis取出再写库，写库失败时加回Redis，下次重试。
+
+        Returns:
+            写入的行数
+        """
+        redis = await self.redis()
+        members: List[str] = await redis.spop(self._key("dirty"), self.flush_batch_size) or []
+        if not members:
+            return 0
+
+        deltas = []
+        for member in members:
+            period, user_id = member.split(":", 1)
+            try:
+                uuid.UUID(user_id)
+            except ValueError:
+                # 无法写入token_usage的用户ID，丢弃而不是反复阻塞整批写入
+                logger.warning("Dropping token usage for invalid user id %r", user_id)
+                await redis.delete(self._key("pending", period, user_id))
+                continue
+            pending = self._key("pending", period, user_id)
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hgetall(pending)
+                pipe.delete(pending)
+                values, _ = await pipe.execute()
+            if values:
+                deltas.append((member, period, user_id, {k: int(v) for k, v in values.items()}))
+        if not deltas:
+            return 0
+
+        # 增量已从Redis取出：从这里起任何失败都要加回Redis
+        try:
+            rows = [
+                {
+                    "user_id": uuid.UUID(user_id),
+                    "period": period,
+                    "input_tokens": values.get("input", 0),
+                    "output_tokens": values.get("output", 0),
+                    "total_tokens": values.get("used", 0),
+                    "requests": values.get("requests", 0),
+                    "updated_at": datetime.utcnow(),
+                }
+                for _, period, user_id, values in deltas
+            ]
+            statement = pg_insert(TokenUsage).values(rows)
+            table = TokenUsage.__table__
+            statement = statement.on_conflict_do_update(
+                index_elements=["user_id", "period"],
+                set_={
+                    name: table.c[name] + statement.excluded[name]
+                    for name in ("input_tokens", "output_tokens", "total_tokens", "requests")
+                }
+                | {"updated_at": statement.excluded.updated_at},
+            )
+            await db.execute(statement)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await self._restore(deltas)
+            raise
+        self._stats["flushed_rows"] += len(rows)
+        return len(rows)
+
+    async def _restore(self, deltas):
+        """写库失败后把取出的增量加回Redis."""
+        redis = await self.redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            for member, period, user_id, values in deltas:
+                pending = self._key("pending", period, user_id)
+                for field, value in values.items():
+                    pipe.hincrby(pending, field, value)
+                pipe.expire(pending, USAGE_TTL)
+                pipe.sadd(self._key("dirty"), member)
+            await pipe.execute()
+
+    async def run(self):
+        """按flush_interval持续写入，直到stop()；停止前再写入一次."""
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                # 积压超过一批时连续写入
+                while True:
+                    async with database.session_factory()() as db:
+                        if await self.flush(db) < self.flush_batch_size:
+                            break
+            except Exception as e:
+                self._stats["flush_errors"] += 1
+                logger.warning("Token usage flush failed, will retry: %s", e)
+
+    def start(self):
+        """在当前事件循环中启动后台写入."""
+        if self.enabled and (self._task is None or self._task.done()):
+            self._stop.clear()
+            self._task = asyncio.create_task(self.run(), name="token-usage-flusher")
+
+    async def stop(self):
+        """停止后台写入（会先写入剩余增量）."""
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def _on_redis_error(self, error: Exception):
+        """Redis不可用时放行请求."""
+        self._stats["redis_errors"] += 1
+        logger.warning("Token metering unavailable, allowing request: %s", error)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取计量统计."""
+        return {"enabled": self.enabled, "flushing": self._task is not None and not self._task.done(), **self._stats}
+
+
+def create_token_meter() -> TokenMeter:
+    """根据应用配置创建计量器."""
+    return TokenMeter(
+        redis_url=settings.METERING_REDIS_URL or settings.REDIS_URL,
+        key_prefix=settings.METERING_KEY_PREFIX,
+        tier_limits={
+            "free": settings.FREE_TIER_TOKENS_PER_MONTH,
+            "pro": settings.PRO_TIER_TOKENS_PER_MONTH,
+            "team": settings.TEAM_TIER_TOKENS_PER_MONTH,
+        },
+        enabled=settings.METERING_ENABLED,
+        limit_cache_ttl=settings.METERING_LIMIT_CACHE_TTL,
+        reservation_ttl=settings.METERING_RESERVATION_TTL,
+        flush_interval=settings.METERING_FLUSH_INTERVAL,
+        flush_batch_size=settings.METERING_FLUSH_BATCH_SIZE,
+    )
+
+
+# 全局计量器实例
+token_meter = create_token_meter()
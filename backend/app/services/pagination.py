@@ -0,0 +1,134 @@
+"""列表查询：(created_at, id)键集分页和轻量字段投影.
+
+游标记录上一页最后一行的(created_at, id)，下一页用行值比较
+(created_at, id) < (游标)从索引位置继续扫描，翻页成本与页码无关。
+列表默认只查询轻量列，大的JSONB/文本列通过fields=按需选择。
+"""
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import Select, inspect, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# 键集分页必须返回的字段
+CURSOR_FIELDS = ("id", "created_at")
+
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """把(created_at, id)编码为不透明的游标字符串."""
+    payload = json.dumps({"t": created_at.isoformat(), "id": str(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """解析游标.
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), UUID(payload["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+@dataclass(frozen=True)
+class ListProjection:
+    """实体列表的字段投影.
+
+    字段名使用数据库列名（如Inspiration的metadata列映射为meta属性）；
+    延迟加载的内部列（如search_vector）不可选。
+    """
+
+    model: type
+    default_fields: Tuple[str, ...]
+    _columns: Dict[str, Any] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        columns = {
+            attr.columns[0].name: attr.class_attribute
+            for attr in inspect(self.model).column_attrs
+            if not attr.deferred
+        }
+        object.__setattr__(self, "_columns", columns)
+
+    @property
+    def allowed_fields(self) -> List[str]:
+        return list(self._columns)
+
+    def resolve(self, fields: Optional[str]) -> List[str]:
+        """解析fields=参数（逗号分隔），为空时使用默认字段.
+
+        Raises:
+            ValueError: 包含未知字段
+        """
+        if not fields:
+            requested = list(self.default_fields)
+        else:
+            requested = [name.strip() for name in fields.split(",") if name.strip()]
+            unknown = [name for name in requested if name not in self._columns]
+            if unknown:
+                raise ValueError(
+                    f"Unknown fields: {', '.join(unknown)}; allowed: {', '.join(self.allowed_fields)}"
+                )
+        for name in reversed(CURSOR_FIELDS):
+            if name not in requested:
+                requested.insert(0, name)
+        return requested
+
+    def select(self, fields: Sequence[str]) -> Select:
+        """只查询指定的列."""
+        return select(*[self._columns[name].label(name) for name in fields])
+
+
+async def keyset_page(
+    db: AsyncSession,
+    projection: ListProjection,
+    *criteria,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Dict[str, Any]:
+    """按(created_at, id)倒序查询一页.
+
+    Args:
+        db: 数据库会话
+        projection: 实体的字段投影
+        *criteria: 过滤条件（如project_id == ...）
+        fields: 逗号分隔的字段列表
+        cursor: 上一页返回的next_cursor
+        limit: 每页条数
+
+    Returns:
+        {"items": [...], "next_cursor": str或None, "limit": int}
+
+    Raises:
+        ValueError: 字段或游标无效
+    """
+    model = projection.model
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    names = projection.resolve(fields)
+
+    query = projection.select(names).where(*criteria)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    # 多取一行判断是否还有下一页
+    query = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(query)).mappings().all()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+
+    return {"items": items, "next_cursor": next_cursor, "limit": limit}
@@ -0,0 +1,407 @@
+"""多阶段写作流水线（按依赖关系执行的模板DAG）.
+
+每一步按PROMPT_TEMPLATES中的一个模板调用AI，变量来自三处：
+- variables：字面量
+- inputs：引用流水线输入（"input.genre"）或上游步骤的输出（"structure"
+  为整个输出，"structure.acts.0"为结构化输出中的字段）；引用列表时各项
+  依次拼接
+
+没有依赖关系的步骤并行执行（不超过concurrency个）。每一步的结果按
+(run_id, 步骤, 实际提示词)保存为检查点，同一run_id重新执行时已完成的步骤
+直接读取检查点，失败的步骤续跑时不会重复调用上游。
+"""
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from app.ai.roles import get_ai_role
+from app.ai.templates import PromptTemplateManager
+from app.core.config import settings
+from app.schemas.ai import AIResponse
+from app.services.ai.ai_manager import ai_manager
+from app.services.ai.cache import ResponseCache
+from app.services.ai.json_stream import parse_json_lenient
+
+logger = logging.getLogger(__name__)
+
+
+COMPLETED = "completed"
+CACHED = "cached"  # 从检查点恢复
+FAILED = "failed"
+SKIPPED = "skipped"  # 上游步骤失败
+
+# 引用流水线输入的前缀，不能用作步骤ID
+INPUT_REFERENCE = "input"
+
+Reference = Union[str, List[str]]
+
+
+# 内置流水线：灵感 → 结构 → 主角/反派（并行）→ 开篇场景 → 对话 → 质检
+# 输入：inspiration、genre、target_words、ultimate_goal
+PIPELINE_PRESETS: Dict[str, List[Dict[str, Any]]] = {
+    "creative_flow": [
+        {
+            "id": "inspiration",
+            "template_id": "inspiration_development",
+            "role_id": "inspiration_collector",
+            "inputs": {"inspiration_content": "input.inspiration", "preferred_genre": "input.genre"},
+        },
+        {
+            "id": "structure",
+            "template_id": "structure_design",
+            "role_id": "structure_architect",
+            "inputs": {
+                "core_conflict": "inspiration",
+                "genre": "input.genre",
+                "target_words": "input.target_words",
+                "ultimate_goal": "input.ultimate_goal",
+            },
+        },
+        {
+            "id": "protagonist",
+            "template_id": "character_profile",
+            "role_id": "character_designer",
+            "variables": {"role_type": "protagonist"},
+            "inputs": {"story_requirement": "structure", "core_conflict": "inspiration"},
+        },
+        {
+            "id": "antagonist",
+            "template_id": "character_profile",
+            "role_id": "character_designer",
+            "variables": {"role_type": "antagonist"},
+            "inputs": {"story_requirement": "structure", "core_conflict": "inspiration"},
+        },
+        {
+            "id": "opening_scene",
+            "template_id": "scene_blueprint",
+            "role_id": "scene_renderer",
+            "variables": {
+                "chapter_number": 1,
+                "previous_context": "故事开篇",
+                "future_setup": "为第一幕的转折点铺垫",
+            },
+            "inputs": {"chapter_goal": "structure", "characters": ["protagonist", "antagonist"]},
+        },
+        {
+            "id": "dialogue",
+            "template_id": "dialogue_optimize",
+            "role_id": "dialogue_generator",
+            "variables": {"scene_goal": "开篇场景"},
+            "inputs": {"original_dialogue": "opening_scene", "character_info": ["protagonist", "antagonist"]},
+        },
+        {
+            "id": "quality",
+            "template_id": "quality_diagnosis",
+            "role_id": "quality_inspector",
+            "variables": {"check_scope": "full"},
+            "inputs": {"project_info": ["structure", "protagonist", "antagonist", "opening_scene", "dialogue"]},
+        },
+    ],
+}
+
+
+@dataclass
+class PipelineStep:
+    """流水线中的一步."""
+
+    id: str
+    template_id: str
+    variables: Dict[str, Any] = field(default_factory=dict)
+    inputs: Dict[str, Reference] = field(default_factory=dict)
+    role_id: Optional[str] = None
+    response_format: Optional[str] = None  # 默认按模板是否要求JSON输出
+    depends_on: Tuple[str, ...] = ()
+
+    def references(self) -> List[str]:
+        """本步引用的所有路径."""
+        refs: List[str] = []
+        for value in self.inputs.values():
+            refs.extend([value] if isinstance(value, str) else value)
+        return refs
+
+
+def _reference_step(reference: str) -> str:
+    """引用路径中的步骤ID（或input）."""
+    return reference.split(".", 1)[0]
+
+
+def build_pipeline(
+    specs: List[Dict[str, Any]],
+    inputs: Dict[str, Any],
+    template_manager: PromptTemplateManager,
+    max_steps: Optional[int] = None,
+) -> List[PipelineStep]:
+    """校验流水线定义并按拓扑顺序排列步骤.
+
+    Args:
+        specs: 步骤定义列表
+        inputs: 流水线输入
+        template_manager: 用于校验模板和必填变量
+        max_steps: 步骤数上限
+
+    Returns:
+        拓扑排序后的步骤（依赖总在被依赖者之后）
+
+    Raises:
+        ValueError: 步骤重复、模板或角色不存在、引用无效、缺少必填变量或存在环
+    """
+    if not specs:
+        raise ValueError("Pipeline has no steps")
+    if max_steps is not None and len(specs) > max_steps:
+        raise ValueError(f"Pipeline has {len(specs)} steps, at most {max_steps} allowed")
+
+    steps: Dict[str, PipelineStep] = {}
+    for spec in specs:
+        step = PipelineStep(
+            id=spec["id"],
+            template_id=spec["template_id"],
+            variables=dict(spec.get("variables") or {}),
+            inputs=dict(spec.get("inputs") or {}),
+            role_id=spec.get("role_id"),
+            response_format=spec.get("response_format"),
+        )
+        if step.id == INPUT_REFERENCE or "." in step.id:
+            raise ValueError(f"Invalid step id: {step.id}")
+        if step.id in steps:
+            raise ValueError(f"Duplicate step id: {step.id}")
+        template = template_manager.get_template(step.template_id)
+        if template is None:
+            raise ValueError(f"Template not found: {step.template_id}")
+        if step.role_id and get_ai_role(step.role_id) is None:
+            raise ValueError(f"AI role '{step.role_id}' not found")
+        missing = [
+            var.name for var in template.variables
+            if var.required and var.name not in step.variables and var.name not in step.inputs
+        ]
+        if missing:
+            raise ValueError(f"Step {step.id} is missing required variable(s): {', '.join(missing)}")
+        steps[step.id] = step
+
+    for step in steps.values():
+        depends_on: List[str] = []
+        for reference in step.references():
+            target = _reference_step(reference)
+            if target == INPUT_REFERENCE:
+                key = reference.partition(".")[2]
+                if key not in inputs:
+                    raise ValueError(f"Step {step.id} references missing pipeline input: {key}")
+            elif target not in steps:
+                raise ValueError(f"Step {step.id} references unknown step: {target}")
+            elif target == step.id:
+                raise ValueError(f"Step {step.id} references itself")
+            elif target not in depends_on:
+                depends_on.append(target)
+        step.depends_on = tuple(depends_on)
+
+    # Kahn拓扑排序，保持定义中的先后顺序
+    ordered: List[PipelineStep] = []
+    placed = set()
+    pending = list(steps.values())
+    while pending:
+        ready = [step for step in pending if all(dep in placed for dep in step.depends_on)]
+        if not ready:
+            raise ValueError(f"Pipeline has a dependency cycle among: {', '.join(s.id for s in pending)}")
+        for step in ready:
+            ordered.append(step)
+            placed.add(step.id)
+        pending = [step for step in pending if step.id not in placed]
+    return ordered
+
+
+def step_output(response: AIResponse) -> Any:
+    """步骤的输出：有结构化数据时取结构化数据，否则取文本."""
+    return response.structured_data if response.structured_data is not None else response.text
+
+
+def resolve_reference(reference: str, inputs: Dict[str, Any], outputs: Dict[str, Any]) -> Any:
+    """按路径取出流水线输入或上游输出中的值.
+
+    Raises:
+        ValueError: 路径不存在
+    """
+    head, *path = reference.split(".")
+    if head == INPUT_REFERENCE:
+        value: Any = inputs
+    else:
+        value = outputs[head]
+    for part in path:
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            raise ValueError(f"Reference {reference} not found in the upstream output")
+    return value
+
+
+def format_variable(value: Any) -> Any:
+    """把结构化的值转换为可放入提示词的文本."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, indent=2)
+    return value
+
+
+class PipelineRunner:
+    """执行流水线，步骤结果写入检查点."""
+
+    def __init__(self, checkpoints: ResponseCache, concurrency: int = 4, max_steps: int = 20):
+        """初始化执行器.
+
+        Args:
+            checkpoints: 步骤结果的检查点存储
+            concurrency: 同时执行的步骤数上限
+            max_steps: 每条流水线的步骤数上限
+        """
+        self.checkpoints = checkpoints
+        self.concurrency = concurrency
+        self.max_steps = max_steps
+        self.template_manager = PromptTemplateManager()
+
+    def build(self, specs: List[Dict[str, Any]], inputs: Dict[str, Any]) -> List[PipelineStep]:
+        """校验并排序流水线定义，见build_pipeline."""
+        return build_pipeline(specs, inputs, self.template_manager, self.max_steps)
+
+    def resolve_variables(
+        self, step: PipelineStep, inputs: Dict[str, Any], outputs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """合并字面量变量和引用的上游输出."""
+        variables = {name: format_variable(value) for name, value in step.variables.items()}
+        for name, reference in step.inputs.items():
+            if isinstance(reference, str):
+                variables[name] = format_variable(resolve_reference(reference, inputs, outputs))
+            else:
+                variables[name] = "\n\n".join(
+                    str(format_variable(resolve_reference(item, inputs, outputs))) for item in reference
+                )
+        return variables
+
+    def step_call(self, step: PipelineStep, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """一步对应的ai_manager.complete参数（填充后的模板和角色设置）."""
+        prefix, prompt = self.template_manager.fill_template_parts(step.template_id, variables)
+        response_format = step.response_format
+        if response_format is None:
+            template = self.template_manager.get_template(step.template_id)
+            response_format = "json" if "JSON格式" in template.template else None
+        call: Dict[str, Any] = {"prompt": prompt, "prompt_prefix": prefix, "response_format": response_format}
+        role = get_ai_role(step.role_id) if step.role_id else None
+        if role is not None:
+            call.update(system_prompt=role.system_prompt, temperature=role.temperature, max_tokens=role.max_tokens)
+        return call
+
+    async def run_step(
+        self, step: PipelineStep, variables: Dict[str, Any], run_id: str
+    ) -> Tuple[AIResponse, bool]:
+        """执行一步，同一run_id下提示词相同的步骤直接读取检查点.
+
+        Returns:
+            (AI响应, 是否来自检查点)
+        """
+        call = self.step_call(step, variables)
+        key = ResponseCache.make_key(run_id=run_id, step=step.id, **call)
+        cached = await self.checkpoints.get(key) if self.checkpoints.enabled else None
+        if cached is not None:
+            return cached, True
+
+        response = await ai_manager.complete(use_cache=False, **call)
+        if call["response_format"] == "json" and response.structured_data is None:
+            response.structured_data = parse_json_lenient(response.text)
+        if self.checkpoints.enabled:
+            await self.checkpoints.set(key, response)
+        return response, False
+
+    async def run(
+        self,
+        steps: List[PipelineStep],
+        inputs: Dict[str, Any],
+        run_id: str,
+        context: Any = None,
+    ) -> Dict[str, Any]:
+        """按依赖关系执行流水线.
+
+        某一步失败时依赖它的步骤跳过，不相关的分支继续执行。
+
+        Args:
+            steps: build返回的步骤
+            inputs: 流水线输入
+            run_id: 检查点的作用域，续跑时传入原来的run_id
+            context: 可选的JobContext，每结束一步报告一次进度
+
+        Returns:
+            {"run_id", "steps": 按拓扑顺序的步骤状态和输出, "stats"}
+
+        Raises:
+            ValueError: 有步骤失败（已完成步骤的检查点保留，可用同一run_id续跑）
+        """
+        outputs: Dict[str, Any] = {}
+        states: Dict[str, Dict[str, Any]] = {}
+        stats = {"steps": len(steps), COMPLETED: 0, CACHED: 0, FAILED: 0, SKIPPED: 0}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def execute(step: PipelineStep):
+            # 步骤按拓扑顺序创建，依赖的任务总是已经存在
+            await asyncio.gather(*(tasks[dep] for dep in step.depends_on))
+            state: Dict[str, Any] = {"id": step.id, "template_id": step.template_id, "error": None}
+            blocked = [dep for dep in step.depends_on if dep not in outputs]
+            started = time.monotonic()
+            if blocked:
+                state.update(status=SKIPPED, error=f"Upstream step(s) failed: {', '.join(blocked)}")
+            else:
+                try:
+                    variables = self.resolve_variables(step, inputs, outputs)
+                    async with semaphore:
+                        response, hit = await self.run_step(step, variables, run_id)
+                except Exception as e:
+                    logger.warning("Pipeline %s step %s failed: %s", run_id, step.id, e)
+                    state.update(status=FAILED, error=str(e))
+                else:
+                    outputs[step.id] = step_output(response)
+                    state.update(
+                        status=CACHED if hit else COMPLETED,
+                        text=response.text,
+                        structured_data=response.structured_data,
+                        usage=response.metadata.get("usage"),
+                    )
+            state["elapsed"] = round(time.monotonic() - started, 3)
+            states[step.id] = state
+            stats[state["status"]] += 1
+            if context is not None:
+                await context.progress(
+                    len(states) / len(steps), f"Step {step.id} {state['status']}", step=step.id, **stats
+                )
+
+        for step in steps:
+            tasks[step.id] = asyncio.create_task(execute(step))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+        if stats[FAILED]:
+            failed = [f"{s['id']}: {s['error']}" for s in states.values() if s["status"] == FAILED]
+            raise ValueError(f"Pipeline {run_id} failed at {'; '.join(failed)}")
+        return {"run_id": run_id, "steps": [states[step.id] for step in steps], "stats": stats}
+
+
+def create_pipeline_runner() -> PipelineRunner:
+    """根据应用配置创建执行器."""
+    checkpoints = ResponseCache(
+        enabled=settings.PIPELINE_CHECKPOINT_ENABLED,
+        max_entries=settings.PIPELINE_CHECKPOINT_MAX_ENTRIES,
+        ttl=settings.PIPELINE_CHECKPOINT_TTL,
+        redis_url=settings.REDIS_URL if settings.AI_CACHE_REDIS_ENABLED else None,
+        key_prefix=settings.PIPELINE_CHECKPOINT_KEY_PREFIX,
+    )
+    return PipelineRunner(
+        checkpoints=checkpoints,
+        concurrency=settings.PIPELINE_CONCURRENCY,
+        max_steps=settings.PIPELINE_MAX_STEPS,
+    )
+
+
+# 全局流水线执行器
+pipeline_runner = create_pipeline_runner()
@@ -0,0 +1,470 @@
+"""推测式预生成（预取）下一步.
+
+用户完成一步模板生成后，通常会按固定顺序继续（灵感扩展 → 结构设计 →
+角色设计……）。预取器在返回当前结果的同时预测下一步的调用，在出站负载
+较低时以低优先级提前生成，结果写入响应缓存；用户点击建议的下一步时
+ai_manager.complete直接返回缓存结果：
+1. 候选下一步及其变量按内置流水线的依赖关系推导（与流水线使用相同的变量映射）
+2. 候选按该用户的历史转移频率打分，模型在输出中推荐的下一步加分
+3. 每个用户每天的预取token有上限，预取调用不计入用户配额，命中时才按实际用量记账
+4. 用户的任何AI调用（对话、生成、优化、流式接口等）都经过ai_manager，
+   与预测不同时取消该用户未完成的预取，未生成的预取退还预算
+"""
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.schemas.ai import AIResponse
+from app.services.ai.ai_manager import ai_manager
+from app.services.ai.exceptions import AIQuotaExceededError
+from app.core.context import metered_user
+from app.services.pipeline import (
+    INPUT_REFERENCE,
+    PIPELINE_PRESETS,
+    PipelineStep,
+    pipeline_runner,
+    step_output,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# 推导下一步变量时流水线输入的默认值（用户提供的值优先）
+PREDICTION_DEFAULTS: Dict[str, Any] = {
+    "genre": "未指定",
+    "target_words": 100000,
+    "ultimate_goal": "由核心冲突推导",
+}
+
+# 模型输出中“推荐下一步”使用的名称
+NEXT_STEP_LABELS = {
+    "structure_design": "结构设计",
+    "character_profile": "角色设计",
+    "scene_blueprint": "场景设计",
+}
+
+# 历史转移频率的平滑权重：历史越少越接近先验
+PRIOR_WEIGHT = 2.0
+# 模型推荐的下一步的加分
+SUGGESTED_BONUS = 0.2
+
+
+def predict_follow_ups(
+    template_id: str, variables: Dict[str, Any], output: Any
+) -> List[Tuple[PipelineStep, Dict[str, Any]]]:
+    """按内置流水线推导某个模板之后的下一步.
+
+    从当前步骤的变量反推流水线输入和更早步骤的输出，再解析引用了当前
+    步骤的下游步骤的变量；缺少引用值的下游步骤跳过。
+
+    Args:
+        template_id: 刚完成的模板
+        variables: 刚完成的模板使用的变量
+        output: 刚完成的模板的输出（结构化数据或文本）
+
+    Returns:
+        [(下一步, 下一步的变量)]，按流水线中的顺序
+    """
+    follow_ups: List[Tuple[PipelineStep, Dict[str, Any]]] = []
+    seen = set()
+    for preset in PIPELINE_PRESETS.values():
+        for source in preset:
+            if source["template_id"] != template_id:
+                continue
+            if any(str(variables.get(name)) != str(value) for name, value in source.get("variables", {}).items()):
+                continue
+
+            inputs = dict(PREDICTION_DEFAULTS)
+            outputs: Dict[str, Any] = {source["id"]: output}
+            for name, reference in source.get("inputs", {}).items():
+                if not isinstance(reference, str) or variables.get(name) in (None, ""):
+                    continue
+                head, *path = reference.split(".")
+                if head == INPUT_REFERENCE and len(path) == 1:
+                    inputs[path[0]] = variables[name]
+                elif not path:
+                    outputs[head] = variables[name]
+
+            for spec in preset:
+                step = PipelineStep(
+                    id=spec["id"],
+                    template_id=spec["template_id"],
+                    variables=dict(spec.get("variables", {})),
+                    inputs=dict(spec.get("inputs", {})),
+                    role_id=spec.get("role_id"),
+                )
+                if spec["id"] in seen or source["id"] not in {ref.split(".")[0] for ref in step.references()}:
+                    continue
+                try:
+                    resolved = pipeline_runner.resolve_variables(step, inputs, outputs)
+                except (KeyError, ValueError):
+                    continue
+                seen.add(spec["id"])
+                follow_ups.append((step, resolved))
+    return follow_ups
+
+
+def recommended_templates(response: AIResponse) -> set:
+    """模型在输出中推荐的下一步模板（suggested_actions或“推荐下一步”）."""
+    templates = {
+        action["template_id"]
+        for action in response.suggested_actions or []
+        if isinstance(action, dict) and action.get("template_id")
+    }
+    text = (
+        json.dumps(response.structured_data, ensure_ascii=False)
+        if response.structured_data is not None
+        else response.text
+    )
+    index = text.rfind("下一步")
+    if index >= 0:
+        recommendation = text[index : index + 80]
+        templates.update(
+            template_id for template_id, label in NEXT_STEP_LABELS.items() if label in recommendation
+        )
+    return templates
+
+
+@dataclass
+class Speculation:
+    """一次预取."""
+
+    user_id: str
+    template_id: str
+    request_key: str
+    call: Dict[str, Any]
+    tokens: int
+    budget_key: str
+    task: Optional[asyncio.Task] = None
+    started: bool = False  # 已开始生成（不再等待空闲）
+    claimed: bool = False  # 用户的请求已合并到进行中的预取，结果不再单独写入缓存
+
+
+class PrefetchScheduler:
+    """预测下一步并在空闲时提前生成."""
+
+    def __init__(
+        self,
+        redis_url: str,
+        key_prefix: str = "novelflow:prefetch:",
+        enabled: bool = True,
+        concurrency: int = 2,
+        max_per_step: int = 2,
+        min_score: float = 0.35,
+        max_load: float = 0.5,
+        max_wait: float = 30.0,
+        max_pending: int = 100,
+        user_daily_tokens: int = 50000,
+        result_ttl: int = 600,
+        history_ttl: int = 2592000,
+    ):
+        """初始化预取器.
+
+        Args:
+            redis_url: 保存用户历史和预取预算的Redis地址
+            key_prefix: Redis键前缀
+            enabled: 是否执行预取（关闭时仍返回建议的下一步）
+            concurrency: 同时执行的预取数
+            max_per_step: 每完成一步最多预取的下一步数
+            min_score: 预取所需的最低得分（0~1，约为用户接着执行该步的概率）
+            max_load: 出站负载（见RateLimiter.utilization）低于该值时才开始预取
+            max_wait: 等待空闲的最长时间（秒），超时放弃
+            max_pending: 所有用户未完成的预取总数上限
+            user_daily_tokens: 每个用户每天预取的预估token上限
+            result_ttl: 预取结果在缓存中的保留时间（秒）
+            history_ttl: 用户转移历史的保留时间（秒）
+        """
+        self.redis_url = redis_url
+        self.key_prefix = key_prefix
+        self.enabled = enabled
+        self.max_per_step = max_per_step
+        self.min_score = min_score
+        self.max_load = max_load
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.user_daily_tokens = user_daily_tokens
+        self.result_ttl = result_ttl
+        self.history_ttl = history_ttl
+        self._slots = asyncio.Semaphore(concurrency)
+        self._active: Dict[str, Dict[str, Speculation]] = {}
+        self._redis = None
+        self._stats = {
+            "scheduled": 0,
+            "completed": 0,
+            "claimed": 0,
+            "cancelled": 0,
+            "failed": 0,
+            "dropped": 0,  # 等待空闲超时
+            "budget_exceeded": 0,
+            "redis_errors": 0,
+        }
+
+    async def redis(self):
+        """延迟创建Redis客户端."""
+        if self._redis is None:
+            import redis.asyncio as aioredis
+
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def close(self):
+        """取消未完成的预取并关闭Redis连接."""
+        tasks = [spec.task for specs in self._active.values() for spec in specs.values() if spec.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def _key(self, *parts: str) -> str:
+        return self.key_prefix + ":".join(parts)
+
+    def _on_redis_error(self, error: Exception):
+        self._stats["redis_errors"] += 1
+        logger.warning("Prefetch history unavailable: %s", error)
+
+    # ========== 历史 ==========
+
+    async def _record_transition(self, user_id: str, template_id: str) -> Dict[str, int]:
+        """记录用户从上一步到当前模板的转移，返回当前模板之后各模板的历史次数."""
+        try:
+            redis = await self.redis()
+            last_key = self._key("last", user_id)
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.set(last_key, template_id, ex=self.history_ttl, get=True)
+                pipe.hgetall(self._key("transitions", user_id, template_id))
+                previous, counts = await pipe.execute()
+            if previous:
+                transitions = self._key("transitions", user_id, previous)
+                async with redis.pipeline(transaction=True) as pipe:
+                    pipe.hincrby(transitions, template_id, 1)
+                    pipe.expire(transitions, self.history_ttl)
+                    await pipe.execute()
+        except Exception as e:
+            self._on_redis_error(e)
+            return {}
+        return {name: int(count) for name, count in counts.items()}
+
+    @staticmethod
+    def score(template_id: str, candidates: int, history: Dict[str, int], recommended: set) -> float:
+        """下一步的得分：平滑后的历史转移频率，模型推荐的加分."""
+        prior = 1.0 / max(1, candidates)
+        total = sum(history.values())
+        probability = (history.get(template_id, 0) + PRIOR_WEIGHT * prior) / (total + PRIOR_WEIGHT)
+        return round(min(1.0, probability + (SUGGESTED_BONUS if template_id in recommended else 0.0)), 3)
+
+    # ========== 预测 ==========
+
+    async def observe(
+        self,
+        user_id: Optional[str],
+        template_id: str,
+        variables: Dict[str, Any],
+        response: AIResponse,
+    ) -> List[Dict[str, Any]]:
+        """一步生成完成后：记录历史、预测下一步并安排预取.
+
+        Args:
+            user_id: 当前用户，匿名时只返回建议不预取
+            template_id: 刚完成的模板
+            variables: 刚完成的模板使用的变量
+            response: 刚完成的生成结果
+
+        Returns:
+            建议的下一步（按得分从高到低），每项含template_id、role_id、
+            variables（原样提交到/ai/generate/template即可命中预取结果）、
+            score和prefetching
+        """
+        follow_ups = predict_follow_ups(template_id, variables, step_output(response))
+        history = await self._record_transition(user_id, template_id) if user_id else {}
+        recommended = recommended_templates(response)
+        candidates = len({step.template_id for step, _ in follow_ups})
+
+        actions = []
+        for step, step_variables in follow_ups:
+            actions.append({
+                "type": "template",
+                "step": step.id,
+                "template_id": step.template_id,
+                "role_id": step.role_id,
+                "variables": step_variables,
+                "score": self.score(step.template_id, candidates, history, recommended),
+                "prefetching": False,
+            })
+        actions.sort(key=lambda action: action["score"], reverse=True)
+
+        if self.enabled and ai_manager.cache.enabled and user_id:
+            for action in actions[: self.max_per_step]:
+                if action["score"] >= self.min_score:
+                    step = PipelineStep(id=action["step"], template_id=action["template_id"], role_id=action["role_id"])
+                    action["prefetching"] = await self.schedule(
+                        user_id, step.template_id, pipeline_runner.step_call(step, action["variables"])
+                    )
+        return actions
+
+    # ========== 执行 ==========
+
+    def _budget_key(self, user_id: str) -> str:
+        """用户当天的预取预算计数."""
+        return self._key("budget", user_id, datetime.now(timezone.utc).strftime("%Y%m%d"))
+
+    async def _charge_budget(self, key: str, tokens: int) -> bool:
+        """从用户当天的预取预算中扣除预估token，超出时不扣除."""
+        try:
+            redis = await self.redis()
+            used = await redis.incrby(key, tokens)
+            if used == tokens:
+                await redis.expire(key, 2 * 86400)
+            if used > self.user_daily_tokens:
+                await redis.decrby(key, tokens)
+                self._stats["budget_exceeded"] += 1
+                return False
+        except Exception as e:
+            # 无法记录预算时不预取
+            self._on_redis_error(e)
+            return False
+        return True
+
+    async def _refund_budget(self, spec: Speculation):
+        """预取被取消、放弃或失败时退还预算（结果没有写入缓存）."""
+        try:
+            redis = await self.redis()
+            await redis.decrby(spec.budget_key, spec.tokens)
+        except Exception as e:
+            self._on_redis_error(e)
+
+    async def schedule(self, user_id: str, template_id: str, call: Dict[str, Any]) -> bool:
+        """安排一次预取.
+
+        Returns:
+            是否已安排（已在预取、超出预算或配额、待处理过多时为False）
+        """
+        request_key = ai_manager.complete_key(**call)
+        specs = self._active.setdefault(user_id, {})
+        if request_key in specs:
+            return True
+        if sum(len(items) for items in self._active.values()) >= self.max_pending:
+            return False
+
+        tokens = ai_manager.token_counter.count_messages(
+            [{"content": call["prompt_prefix"]}, {"content": call["prompt"]}], call.get("system_prompt")
+        ) + (call.get("max_tokens") or settings.DEFAULT_MAX_TOKENS)
+        try:
+            # 剩余配额不足以支付这一步时不预取
+            await ai_manager.meter.check(user_id, tokens)
+        except AIQuotaExceededError:
+            self._stats["budget_exceeded"] += 1
+            return False
+        budget_key = self._budget_key(user_id)
+        if not await self._charge_budget(budget_key, tokens):
+            return False
+
+        spec = Speculation(
+            user_id=user_id,
+            template_id=template_id,
+            request_key=request_key,
+            call=call,
+            tokens=tokens,
+            budget_key=budget_key,
+        )
+        spec.task = asyncio.create_task(self._execute(spec), name=f"prefetch-{template_id}")
+        specs[request_key] = spec
+        self._stats["scheduled"] += 1
+        return True
+
+    async def _wait_for_capacity(self) -> bool:
+        """等待出站负载低于max_load，超过max_wait返回False."""
+        deadline = time.monotonic() + self.max_wait
+        while ai_manager.rate_limiter.utilization() >= self.max_load:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.2)
+        return True
+
+    async def _execute(self, spec: Speculation):
+        """在空闲时执行预取并写入响应缓存."""
+        # 预取不计入用户配额，结果被使用时才记账
+        metered_user.set(None)
+        try:
+            async with self._slots:
+                if not await self._wait_for_capacity():
+                    self._stats["dropped"] += 1
+                    await self._refund_budget(spec)
+                    return
+                spec.started = True
+                response = await ai_manager.complete(use_cache=False, **spec.call)
+            if spec.claimed:
+                # 用户的请求已合并到这次调用并直接拿到结果
+                self._stats["claimed"] += 1
+                return
+            await ai_manager.store_prefetched(spec.request_key, response, self.result_ttl)
+            self._stats["completed"] += 1
+        except asyncio.CancelledError:
+            self._stats["cancelled"] += 1
+            await self._refund_budget(spec)
+            raise
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.warning("Prefetch of %s failed: %s", spec.template_id, e)
+            await self._refund_budget(spec)
+        finally:
+            specs = self._active.get(spec.user_id, {})
+            if specs.get(spec.request_key) is spec:
+                del specs[spec.request_key]
+                if not specs:
+                    self._active.pop(spec.user_id, None)
+
+    def claim(self, user_id: Optional[str], request_key: Optional[str] = None):
+        """用户发起AI调用时（由ai_manager通知）：取消该用户其他未完成的预取.
+
+        与request_key相同的预取如果正在生成则保留，用户的请求会合并到这次
+        调用；还在等待空闲的直接取消，由用户的请求立即执行。
+
+        Args:
+            user_id: 当前用户
+            request_key: 用户这次请求的请求键，为None时取消全部
+        """
+        if not user_id:
+            return
+        for key, spec in list(self._active.get(user_id, {}).items()):
+            if key == request_key and spec.started and ai_manager.coalescer.enabled:
+                spec.claimed = True
+            elif spec.task is not None:
+                spec.task.cancel()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取预取统计."""
+        return {
+            "enabled": self.enabled,
+            "pending": sum(len(specs) for specs in self._active.values()),
+            **self._stats,
+        }
+
+
+def create_prefetch_scheduler() -> PrefetchScheduler:
+    """根据应用配置创建预取器."""
+    return PrefetchScheduler(
+        redis_url=settings.REDIS_URL,
+        key_prefix=settings.PREFETCH_KEY_PREFIX,
+        enabled=settings.PREFETCH_ENABLED,
+        concurrency=settings.PREFETCH_CONCURRENCY,
+        max_per_step=settings.PREFETCH_MAX_PER_STEP,
+        min_score=settings.PREFETCH_MIN_SCORE,
+        max_load=settings.PREFETCH_MAX_LOAD,
+        max_wait=settings.PREFETCH_MAX_WAIT,
+        max_pending=settings.PREFETCH_MAX_PENDING,
+        user_daily_tokens=settings.PREFETCH_USER_DAILY_TOKENS,
+        result_ttl=settings.PREFETCH_RESULT_TTL,
+        history_ttl=settings.PREFETCH_HISTORY_TTL,
+    )
+
+
+# 全局预取器，接收ai_manager的用户调用通知
+prefetch_scheduler = create_prefetch_scheduler()
+ai_manager.request_listeners.append(prefetch_scheduler.claim)
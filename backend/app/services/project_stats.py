@@ -0,0 +1,451 @@
+"""项目统计：按写入增量维护的计数器.
+
+场景、章节、角色、灵感和对话在flush时被换算成每个项目的计数增量，
+随同一事务用一条UPDATE累加到project_stats，项目概览只需按主键读取一行，
+不再加载全部章节和场景正文。场景换章节、章节或角色等换项目时，计数从原
+项目转到新项目（整章移动时按数据库中该章的场景汇总转移）。批量SQL写入等
+绕过ORM的操作会造成偏差，可用rebuild按源表重新统计修复。
+"""
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import event, func, inspect, literal, literal_column, select, update
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.entity.chapter import Chapter
+from app.models.entity.character import Character
+from app.models.entity.conversation import Conversation
+from app.models.entity.inspiration import Inspiration
+from app.models.entity.project import Project
+from app.models.entity.project_stats import ProjectStats
+from app.models.entity.scene import Scene
+
+logger = logging.getLogger(__name__)
+
+
+# 中文按字计数，英文和数字按词计数
+WORD_PATTERN = re.compile(
+    r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]|[A-Za-z0-9]+(?:['\u2019\-][A-Za-z0-9]+)*"
+)
+
+# 只按数量统计的实体：实体类 -> 计数列
+COUNTED_ENTITIES = {
+    Character: "character_count",
+    Inspiration: "inspiration_count",
+    Conversation: "conversation_count",
+}
+
+# 会影响统计的实体
+TRACKED_ENTITIES = (Project, Chapter, Scene, *COUNTED_ENTITIES)
+
+COUNTER_COLUMNS = (
+    "word_count",
+    "chapter_count",
+    "completed_chapter_count",
+    "scene_count",
+    "character_count",
+    "inspiration_count",
+    "conversation_count",
+)
+
+
+def count_words(text: Optional[str]) -> int:
+    """统计字数（中文按字，英文按词）."""
+    if not text:
+        return 0
+    return len(WORD_PATTERN.findall(text))
+
+
+@dataclass
+class StatsDelta:
+    """一次flush对单个项目产生的增量."""
+
+    counters: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    events: List[Dict[str, Any]] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not self.events and not any(self.counters.values())
+
+
+def _history(obj, attr: str):
+    """获取属性的(旧值, 新值)，未修改时两者相同."""
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        value = getattr(obj, attr)
+        return value, value
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _committed(obj, attr: str):
+    """获取属性在数据库中的值（删除对象用）."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, attr)
+
+
+def load_chapter_projects(session: Session, objects: List[Any]) -> Dict[UUID, UUID]:
+    """场景所属章节（含换章节前的原章节）到项目ID的映射，会话中没有的章节按需查询（用于flush事件）."""
+    mapping = {obj.id: obj.project_id for obj in objects if isinstance(obj, Chapter)}
+    missing = set()
+    for obj in objects:
+        if not isinstance(obj, Scene):
+            continue
+        for chapter_id in {obj.chapter_id, _committed(obj, "chapter_id")}:
+            if chapter_id in mapping:
+                continue
+            chapter = session.identity_map.get(inspect(Chapter).identity_key_from_primary_key([chapter_id]))
+            if chapter is not None:
+                mapping[chapter_id] = chapter.project_id
+            else:
+                missing.add(chapter_id)
+    missing.discard(None)
+    if missing:
+        rows = session.connection().execute(
+            select(Chapter.id, Chapter.project_id).where(Chapter.id.in_(missing))
+        )
+        mapping.update({row.id: row.project_id for row in rows})
+    return mapping
+
+
+class ProjectStatsService:
+    """项目统计的增量维护与重建."""
+
+    def __init__(self, activity_limit: int = 20):
+        """初始化统计服务.
+
+        Args:
+            activity_limit: 每个项目保留的最近活动条数
+        """
+        self.activity_limit = activity_limit
+
+    def register(self, target=Session):
+        """在会话上注册flush事件.
+
+        Args:
+            target: Session类或sessionmaker，默认对所有会话生效
+        """
+        if not event.contains(target, "before_flush", self._before_flush):
+            event.listen(target, "before_flush", self._before_flush)
+            event.listen(target, "after_flush", self._after_flush)
+
+    # ========== 增量维护 ==========
+
+    def _before_flush(self, session: Session, flush_context, instances):
+        """场景正文变化而未显式设置字数时，按正文计算字数."""
+        for obj in list(session.new) + list(session.dirty):
+            if not isinstance(obj, Scene):
+                continue
+            attrs = inspect(obj).attrs
+            if obj in session.new:
+                if obj.word_count is None:
+                    obj.word_count = count_words(obj.content)
+            elif attrs.content.history.has_changes() and not attrs.word_count.history.has_changes():
+                obj.word_count = count_words(obj.content)
+
+    def _after_flush(self, session: Session, flush_context):
+        """把本次flush的写入换算成计数增量并累加."""
+        tracked = [
+            obj
+            for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+            if isinstance(obj, TRACKED_ENTITIES)
+        ]
+        if not tracked:
+            return
+
+        deltas: Dict[UUID, StatsDelta] = defaultdict(StatsDelta)
+        chapter_projects = load_chapter_projects(session, tracked)
+        # 章节在本次flush之前所属的项目，用于场景、章节移动时从原项目扣减
+        old_chapter_projects = {
+            **chapter_projects,
+            **{obj.id: _committed(obj, "project_id") for obj in tracked if isinstance(obj, Chapter)},
+        }
+        changes = [(obj, "created") for obj in session.new]
+        changes += [(obj, "deleted") for obj in session.deleted]
+        changes += [
+            (obj, "updated") for obj in session.dirty if session.is_modified(obj, include_collections=False)
+        ]
+        connection = session.connection()
+        moved_chapters = self._moved_chapter_scenes(connection, changes)
+        now = datetime.utcnow()
+
+        new_projects = [obj.id for obj in session.new if isinstance(obj, Project)]
+        for obj, action in changes:
+            self._collect(obj, action, deltas, chapter_projects, old_chapter_projects, moved_chapters, now)
+
+        if new_projects:
+            # 新项目从零开始计数，后续增量都能落到已有的统计行上
+            connection.execute(
+                pg_insert(ProjectStats)
+                .values([{**{c: 0 for c in COUNTER_COLUMNS}, "project_id": pid} for pid in new_projects])
+                .on_conflict_do_nothing(index_elements=["project_id"])
+            )
+
+        for project_id, delta in deltas.items():
+            if project_id is not None and not delta.is_empty():
+                self._apply(connection, project_id, delta, now)
+
+    def _moved_chapter_scenes(self, connection, changes: List[Any]) -> Dict[UUID, Dict[str, int]]:
+        """换项目的章节中未在本次flush中写入的场景数和字数（这些场景随章节转移）."""
+        moved = [
+            obj.id
+            for obj, action in changes
+            if action == "updated" and isinstance(obj, Chapter) and _committed(obj, "project_id") != obj.project_id
+        ]
+        if not moved:
+            return {}
+        # 本次写入的场景各自按原/新章节结算，不重复计入
+        written = [obj.id for obj, _ in changes if isinstance(obj, Scene) and obj.id is not None]
+        rows = connection.execute(
+            select(Scene.chapter_id, func.count(Scene.id), func.coalesce(func.sum(Scene.word_count), 0))
+            .where(Scene.chapter_id.in_(moved), Scene.id.not_in(written))
+            .group_by(Scene.chapter_id)
+        )
+        return {row[0]: {"scene_count": row[1], "word_count": int(row[2])} for row in rows}
+
+    def _collect(
+        self,
+        obj,
+        action: str,
+        deltas: Dict[UUID, StatsDelta],
+        chapter_projects: Dict[UUID, UUID],
+        old_chapter_projects: Dict[UUID, UUID],
+        moved_chapters: Dict[UUID, Dict[str, int]],
+        now: datetime,
+    ):
+        """计算单个对象的增量.
+
+        新建的对象按新值计入，删除的对象按数据库中的值扣减；更新的对象所属
+        项目变化时，从原项目扣减旧值并按新值计入新项目。
+        """
+        sign = {"created": 1, "deleted": -1}.get(action, 0)
+
+        if isinstance(obj, Scene):
+            if action == "updated":
+                old_chapter, new_chapter = _history(obj, "chapter_id")
+                old_words, new_words = _history(obj, "word_count")
+                old_project = old_chapter_projects.get(old_chapter)
+                project_id = chapter_projects.get(new_chapter)
+                delta = deltas[project_id]
+                if old_project == project_id:
+                    delta.counters["word_count"] += (new_words or 0) - (old_words or 0)
+                else:
+                    deltas[old_project].counters["scene_count"] -= 1
+                    deltas[old_project].counters["word_count"] -= old_words or 0
+                    delta.counters["scene_count"] += 1
+                    delta.counters["word_count"] += new_words or 0
+            else:
+                if action == "created":
+                    delta = deltas[chapter_projects.get(obj.chapter_id)]
+                    words = obj.word_count
+                else:
+                    delta = deltas[old_chapter_projects.get(_committed(obj, "chapter_id"))]
+                    words = _committed(obj, "word_count")
+                delta.counters["scene_count"] += sign
+                delta.counters["word_count"] += sign * (words or 0)
+            self._event(delta, "scene", action, obj, now)
+
+        elif isinstance(obj, Chapter):
+            if action == "updated":
+                old_project, project_id = _history(obj, "project_id")
+                old, new = _history(obj, "status")
+                delta = deltas[project_id]
+                if old_project == project_id:
+                    delta.counters["completed_chapter_count"] += (new == "completed") - (old == "completed")
+                else:
+                    old_delta = deltas[old_project]
+                    old_delta.counters["chapter_count"] -= 1
+                    old_delta.counters["completed_chapter_count"] -= old == "completed"
+                    delta.counters["chapter_count"] += 1
+                    delta.counters["completed_chapter_count"] += new == "completed"
+                    for column, amount in moved_chapters.get(obj.id, {}).items():
+                        old_delta.counters[column] -= amount
+                        delta.counters[column] += amount
+            else:
+                project_id = obj.project_id if action == "created" else _committed(obj, "project_id")
+                status = obj.status if action == "created" else _committed(obj, "status")
+                delta = deltas[project_id]
+                delta.counters["chapter_count"] += sign
+                delta.counters["completed_chapter_count"] += sign * (status == "completed")
+            self._event(delta, "chapter", action, obj, now)
+
+        else:
+            for entity, column in COUNTED_ENTITIES.items():
+                if isinstance(obj, entity):
+                    if action == "updated":
+                        old_project, project_id = _history(obj, "project_id")
+                        if old_project != project_id:
+                            deltas[old_project].counters[column] -= 1
+                            deltas[project_id].counters[column] += 1
+                    else:
+                        project_id = obj.project_id if action == "created" else _committed(obj, "project_id")
+                        deltas[project_id].counters[column] += sign
+                    self._event(deltas[project_id], entity.__tablename__.rstrip("s"), action, obj, now)
+                    break
+
+    def _event(self, delta: StatsDelta, kind: str, action: str, obj, now: datetime):
+        """记录一条活动（每次flush每个项目最多activity_limit条）."""
+        if len(delta.events) >= self.activity_limit:
+            return
+        title = getattr(obj, "title", None) or getattr(obj, "name", None)
+        delta.events.append(
+            {
+                "type": f"{kind}_{action}",
+                "id": str(obj.id),
+                "title": title,
+                "at": now.isoformat(),
+            }
+        )
+
+    def _apply(self, connection, project_id: UUID, delta: StatsDelta, now: datetime):
+        """把增量累加到统计行；统计行不存在时跳过，等待首次读取时重建."""
+        table = ProjectStats.__table__
+        values: Dict[str, Any] = {
+            column: table.c[column] + amount
+            for column, amount in delta.counters.items()
+            if amount
+        }
+        if delta.events:
+            # 新活动在前，截取最近activity_limit条
+            events = literal(list(reversed(delta.events)), JSONB)
+            values["recent_activity"] = func.jsonb_path_query_array(
+                events.op("||")(func.coalesce(table.c.recent_activity, literal([], JSONB))),
+                literal_column(f"'$[0 to {self.activity_limit - 1}]'::jsonpath"),
+            )
+            values["last_activity_at"] = now
+        values["updated_at"] = now
+
+        result = connection.execute(
+            update(table).where(table.c.project_id == project_id).values(**values)
+        )
+        words = delta.counters.get("word_count", 0)
+        if result.rowcount and words:
+            connection.execute(
+                update(Project.__table__)
+                .where(Project.__table__.c.id == project_id)
+                .values(current_word_count=func.coalesce(Project.__table__.c.current_word_count, 0) + words)
+            )
+
+    # ========== 读取与重建 ==========
+
+    async def get(self, db: AsyncSession, project_id: UUID) -> ProjectStats:
+        """获取项目统计，尚未生成时按源表统计一次."""
+        stats = await db.get(ProjectStats, project_id)
+        if stats is None:
+            await self.rebuild(db, [project_id])
+            stats = await db.get(ProjectStats, project_id, populate_existing=True)
+        return stats
+
+    async def rebuild(self, db: AsyncSession, project_ids: Optional[Iterable[UUID]] = None) -> int:
+        """按源表重新统计，修复计数偏差.
+
+        Args:
+            db: 数据库会话
+            project_ids: 要重建的项目，为None时重建全部项目
+
+        Returns:
+            重建的项目数
+        """
+        query = select(Project.id)
+        if project_ids is not None:
+            project_ids = list(project_ids)
+            query = query.where(Project.id.in_(project_ids))
+        ids = list((await db.scalars(query)).all())
+        if not ids:
+            return 0
+
+        rows: Dict[UUID, Dict[str, Any]] = {
+            pid: {**{c: 0 for c in COUNTER_COLUMNS}, "last_activity_at": None} for pid in ids
+        }
+
+        def merge(project_id, last_activity_at=None, **counters):
+            row = rows[project_id]
+            row.update(counters)
+            if last_activity_at and (row["last_activity_at"] is None or last_activity_at > row["last_activity_at"]):
+                row["last_activity_at"] = last_activity_at
+
+        # 场景字数和数量：只读word_count，不加载正文
+        scene_rows = await db.execute(
+            select(
+                Chapter.project_id,
+                func.count(Scene.id),
+                func.coalesce(func.sum(Scene.word_count), 0),
+                func.max(Scene.updated_at),
+            )
+            .join(Scene, Scene.chapter_id == Chapter.id)
+            .where(Chapter.project_id.in_(ids))
+            .group_by(Chapter.project_id)
+        )
+        for project_id, scenes, words, last in scene_rows:
+            merge(project_id, last, scene_count=scenes, word_count=int(words))
+
+        chapter_rows = await db.execute(
+            select(
+                Chapter.project_id,
+                func.count(Chapter.id),
+                func.count(Chapter.id).filter(Chapter.status == "completed"),
+                func.max(Chapter.updated_at),
+            )
+            .where(Chapter.project_id.in_(ids))
+            .group_by(Chapter.project_id)
+        )
+        for project_id, chapters, completed, last in chapter_rows:
+            merge(project_id, last, chapter_count=chapters, completed_chapter_count=completed)
+
+        for entity, column in COUNTED_ENTITIES.items():
+            timestamp = getattr(entity, "updated_at", entity.created_at)
+            entity_rows = await db.execute(
+                select(entity.project_id, func.count(entity.id), func.max(timestamp))
+                .where(entity.project_id.in_(ids))
+                .group_by(entity.project_id)
+            )
+            for project_id, count, last in entity_rows:
+                merge(project_id, last, **{column: count})
+
+        now = datetime.utcnow()
+        values = [{"project_id": pid, **row, "rebuilt_at": now, "updated_at": now} for pid, row in rows.items()]
+        stmt = pg_insert(ProjectStats).values(values)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["project_id"],
+                set_={
+                    **{c: stmt.excluded[c] for c in COUNTER_COLUMNS},
+                    "last_activity_at": func.coalesce(
+                        stmt.excluded.last_activity_at, ProjectStats.__table__.c.last_activity_at
+                    ),
+                    "rebuilt_at": stmt.excluded.rebuilt_at,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+        )
+        await db.execute(
+            update(Project)
+            .where(Project.id == ProjectStats.project_id, Project.id.in_(ids))
+            .values(current_word_count=ProjectStats.word_count)
+            .execution_options(synchronize_session=False)
+        )
+
+        logger.info("Rebuilt project stats for %d projects", len(ids))
+        return len(ids)
+
+
+def create_project_stats_service() -> ProjectStatsService:
+    """根据应用配置创建统计服务."""
+    return ProjectStatsService(activity_limit=settings.PROJECT_RECENT_ACTIVITY_LIMIT)
+
+
+# 全局项目统计服务实例
+project_stats = create_project_stats_service()
+project_stats.register()
@@ -0,0 +1,378 @@
+"""全书质量诊断（map-reduce）.
+
+整本小说放不进一次提示词，诊断分三步：
+1. 切分：每章一块；超过chunk_tokens的章节按场景切分，超长场景再按内容切块
+2. map：各块并行诊断（不超过concurrency个同时进行），结果按块的提示词
+   哈希缓存，修改一处后重新诊断只会重跑内容变化的块
+3. reduce：块 -> 章 -> 幕 -> 全书逐级合并，分数按token数加权平均，问题
+   按类型和描述去重后按严重程度保留前max_issues条
+"""
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.ai.roles import get_ai_role
+from app.ai.templates import PromptTemplateManager
+from app.core.config import settings
+from app.models.entity.chapter import Chapter
+from app.models.entity.project import Project
+from app.schemas.ai import QualityAnalysisResponse
+from app.services.ai.ai_manager import ai_manager
+from app.services.ai.cache import ResponseCache
+from app.services.ai.tokenizer import token_counter
+from app.services.database import database
+from app.services.embeddings import chunk_text
+
+logger = logging.getLogger(__name__)
+
+
+# 每块诊断要求的结构化输出，对应QualityAnalysisResponse
+QUALITY_JSON_INSTRUCTIONS = """
+## 结构化输出
+只诊断上面给出的片段，只输出一个JSON对象，不要输出其他内容：
+{"scores": {"structure": 0-100, "character": 0-100, "plot": 0-100, "writing": 0-100, "total": 0-100},
+ "issues": [{"type": "structure|character|plot|writing", "severity": "critical|important|optional",
+             "location": "第X章/场景", "description": "问题描述", "suggestion": "修改建议"}],
+ "suggestions": ["按优先级排列的整体修改建议"]}
+"""
+
+QUALITY_SCORE_FIELDS = ("structure", "character", "plot", "writing")
+
+# 严重程度排序，未知取值排在最后
+SEVERITY_ORDER = {"critical": 0, "important": 1, "optional": 2}
+
+
+@dataclass
+class QualityChunk:
+    """一个诊断单元."""
+
+    chapter_key: str  # 所属章节
+    act_key: str  # 所属幕
+    location: str  # 如"第3章 场景2"，写入没有位置的问题
+    text: str
+    token_count: int
+
+
+def chapter_header(chapter: Any) -> str:
+    """章节标题和梗概，放在该章每一块的开头."""
+    lines = [f"### 第{chapter.chapter_number}章 {chapter.title or ''}".rstrip()]
+    if chapter.synopsis:
+        lines.append(f"梗概：{chapter.synopsis}")
+    return "\n".join(lines)
+
+
+def split_manuscript(chapters: Sequence[Tuple[Any, Sequence[Any]]], max_tokens: int) -> List[QualityChunk]:
+    """按章节和场景切分正文.
+
+    整章不超过max_tokens时作为一块；否则每个场景一块，超长场景再按内容
+    切块。切分只取决于本章或本场景的内容，编辑一个场景不会改变其他块。
+
+    Args:
+        chapters: [(章节, 按序号排列的场景), ...]
+        max_tokens: 每块正文的token上限
+
+    Returns:
+        诊断单元列表，没有正文的章节被跳过
+    """
+    chunks: List[QualityChunk] = []
+    for chapter, scenes in chapters:
+        scenes = [scene for scene in scenes if scene.content and scene.content.strip()]
+        if not scenes:
+            continue
+        header = chapter_header(chapter)
+        chapter_key = f"第{chapter.chapter_number}章"
+        act_key = f"第{chapter.act_number}幕" if chapter.act_number else ""
+
+        sections = [(scene, f"#### 场景{scene.scene_number} {scene.title or ''}".rstrip()) for scene in scenes]
+        whole = "\n".join([header] + [f"{title}\n{scene.content}" for scene, title in sections])
+        whole_tokens = token_counter.count(whole)
+        if whole_tokens <= max_tokens:
+            chunks.append(QualityChunk(chapter_key, act_key, chapter_key, whole, whole_tokens))
+            continue
+
+        for scene, title in sections:
+            location = f"{chapter_key} 场景{scene.scene_number}"
+            parts = chunk_text(scene.content, max_tokens)
+            for index, part in enumerate(parts):
+                label = title if len(parts) == 1 else f"{title}（{index + 1}/{len(parts)}）"
+                text = f"{header}\n{label}\n{part.text}"
+                chunks.append(QualityChunk(chapter_key, act_key, location, text, token_counter.count(text)))
+    return chunks
+
+
+def normalize_quality_report(data: Any, default_location: Optional[str] = None) -> Dict[str, Any]:
+    """把模型输出整理为QualityAnalysisResponse结构，缺失或越界的分数取合法值."""
+    data = data if isinstance(data, dict) else {}
+    raw_scores = data.get("scores") if isinstance(data.get("scores"), dict) else {}
+    scores = {}
+    for field in QUALITY_SCORE_FIELDS + ("total",):
+        try:
+            scores[field] = max(0, min(100, int(raw_scores.get(field, 0))))
+        except (TypeError, ValueError):
+            scores[field] = 0
+    if not raw_scores.get("total"):
+        scores["total"] = round(sum(scores[f] for f in QUALITY_SCORE_FIELDS) / len(QUALITY_SCORE_FIELDS))
+
+    issues = []
+    for issue in data.get("issues") or []:
+        if isinstance(issue, dict) and issue.get("description"):
+            issues.append(
+                {
+                    "type": str(issue.get("type") or "writing"),
+                    "severity": str(issue.get("severity") or "optional"),
+                    "location": issue.get("location") or default_location,
+                    "description": str(issue["description"]),
+                    "suggestion": str(issue.get("suggestion") or ""),
+                }
+            )
+    report = {
+        "scores": scores,
+        "issues": issues,
+        "suggestions": [str(s) for s in data.get("suggestions") or [] if s],
+        "analyzed_at": datetime.utcnow().isoformat(),
+    }
+    return QualityAnalysisResponse(**report).model_dump()
+
+
+def merge_reports(reports: Sequence[Tuple[int, Dict[str, Any]]], max_issues: int) -> Dict[str, Any]:
+    """合并同一层级的诊断结果.
+
+    Args:
+        reports: [(权重即token数, 诊断结果), ...]
+        max_issues: 合并后最多保留的问题数
+
+    Returns:
+        合并后的诊断结果（scores、issues、suggestions）
+    """
+    total_weight = sum(weight for weight, _ in reports) or 1
+    scores = {
+        field: round(sum(weight * report["scores"][field] for weight, report in reports) / total_weight)
+        for field in QUALITY_SCORE_FIELDS + ("total",)
+    }
+
+    # 相同类型和描述的问题只保留最严重的一条
+    issues: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+    for _, report in reports:
+        for issue in report["issues"]:
+            key = (issue["type"], "".join(issue["description"].split()))
+            kept = issues.get(key)
+            if kept is None or SEVERITY_ORDER.get(issue["severity"], 3) < SEVERITY_ORDER.get(kept["severity"], 3):
+                issues[key] = issue
+    ranked = sorted(issues.values(), key=lambda issue: SEVERITY_ORDER.get(issue["severity"], 3))
+
+    # 多个片段都提到的建议排在前面
+    suggestions = Counter()
+    for _, report in reports:
+        for suggestion in dict.fromkeys(report["suggestions"]):
+            suggestions[suggestion] += 1
+    return {
+        "scores": scores,
+        "issues": ranked[:max_issues],
+        "suggestions": [suggestion for suggestion, _ in suggestions.most_common(max_issues)],
+    }
+
+
+class QualityAnalyzer:
+    """分块并行诊断并逐级合并."""
+
+    def __init__(
+        self,
+        cache: ResponseCache,
+        chunk_tokens: int = 6000,
+        concurrency: int = 4,
+        max_issues: int = 50,
+    ):
+        """初始化诊断器.
+
+        Args:
+            cache: 按块缓存诊断结果
+            chunk_tokens: 每块正文的token上限
+            concurrency: 同时诊断的块数上限
+            max_issues: 每一级合并后最多保留的问题数
+        """
+        self.cache = cache
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = concurrency
+        self.max_issues = max_issues
+        self.template_manager = PromptTemplateManager()
+
+    def build_prompt(self, chunk: QualityChunk, project: Dict[str, Any], scope: str) -> Tuple[str, str]:
+        """构建单块的诊断提示词，返回(稳定前缀, 输入信息).
+
+        只带入项目名称和类型，字数、进度等随编辑变化的信息不进入提示词，
+        否则任何修改都会使所有块的缓存失效。
+        """
+        project_info = f"《{project.get('title') or 'Untitled'}》（{project.get('genre') or 'N/A'}）\n\n{chunk.text}"
+        prefix, prompt = self.template_manager.fill_template_parts(
+            "quality_diagnosis", {"project_info": project_info, "check_scope": scope}
+        )
+        return prefix, prompt + QUALITY_JSON_INSTRUCTIONS
+
+    @staticmethod
+    def cache_key(prefix: str, prompt: str) -> str:
+        """单块诊断结果的缓存键（批处理写回时用同一个键预热缓存）."""
+        role = get_ai_role("quality_inspector")
+        return ResponseCache.make_key(prefix=prefix, prompt=prompt, system_prompt=role.system_prompt)
+
+    async def diagnose(self, chunk: QualityChunk, project: Dict[str, Any], scope: str) -> Tuple[Dict[str, Any], bool]:
+        """诊断一块，命中缓存时不调用AI.
+
+        Returns:
+            (诊断结果, 是否命中缓存)
+        """
+        role = get_ai_role("quality_inspector")
+        prefix, prompt = self.build_prompt(chunk, project, scope)
+        key = self.cache_key(prefix, prompt)
+
+        cached = await self.cache.get(key) if self.cache.enabled else None
+        if cached is not None:
+            return normalize_quality_report(cached.structured_data, chunk.location), True
+
+        response = await ai_manager.complete(
+            prompt=prompt,
+            prompt_prefix=prefix,
+            system_prompt=role.system_prompt,
+            temperature=role.temperature,
+            max_tokens=role.max_tokens,
+            response_format="json",
+            use_cache=False,
+        )
+        report = normalize_quality_report(response.structured_data, chunk.location)
+        if response.structured_data is not None and self.cache.enabled:
+            await self.cache.set(key, response)
+        return report, False
+
+    async def analyze(
+        self,
+        project: Dict[str, Any],
+        chapters: Sequence[Tuple[Any, Sequence[Any]]],
+        scope: str = "full",
+        context: Any = None,
+    ) -> Dict[str, Any]:
+        """诊断项目或章节.
+
+        Args:
+            project: 项目信息
+            chapters: [(章节, 按序号排列的场景), ...]
+            scope: 检查范围（full/structure/character/plot/writing）
+            context: 可选的JobContext，每完成一块报告一次进度
+
+        Returns:
+            QualityAnalysisResponse结构，附带各章结果和分块统计
+
+        Raises:
+            ValueError: 没有可诊断的正文，或所有块都诊断失败
+        """
+        chunks = split_manuscript(chapters, self.chunk_tokens)
+        if not chunks:
+            raise ValueError("No chapter content to analyze")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        stats = {"chunks": len(chunks), "cached": 0, "analyzed": 0, "failed": 0}
+
+        async def run(chunk: QualityChunk) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    report, hit = await self.diagnose(chunk, project, scope)
+                except Exception as e:
+                    logger.warning("Quality diagnosis failed for %s: %s", chunk.location, e)
+                    stats["failed"] += 1
+                    report = None
+                else:
+                    stats["cached" if hit else "analyzed"] += 1
+            if context is not None:
+                done = stats["cached"] + stats["analyzed"] + stats["failed"]
+                await context.progress(done / len(chunks), f"Diagnosed {chunk.location}", **stats)
+            return report
+
+        results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+        if stats["failed"] == len(chunks):
+            raise ValueError("Quality diagnosis failed for every chunk")
+
+        # 块 -> 章
+        chapter_reports: "OrderedDict[str, List[Tuple[int, Dict[str, Any]]]]" = OrderedDict()
+        chapter_acts: Dict[str, str] = {}
+        for chunk, report in zip(chunks, results):
+            if report is not None:
+                chapter_reports.setdefault(chunk.chapter_key, []).append((chunk.token_count, report))
+                chapter_acts[chunk.chapter_key] = chunk.act_key
+
+        sections = []
+        act_reports: "OrderedDict[str, List[Tuple[int, Dict[str, Any]]]]" = OrderedDict()
+        for chapter_key, reports in chapter_reports.items():
+            merged = merge_reports(reports, self.max_issues)
+            weight = sum(weight for weight, _ in reports)
+            sections.append({"location": chapter_key, "scores": merged["scores"], "issue_count": len(merged["issues"])})
+            act_reports.setdefault(chapter_acts[chapter_key], []).append((weight, merged))
+
+        # 章 -> 幕 -> 全书
+        book = merge_reports(
+            [
+                (sum(weight for weight, _ in reports), merge_reports(reports, self.max_issues))
+                for reports in act_reports.values()
+            ],
+            self.max_issues,
+        )
+        return QualityAnalysisResponse(
+            **book,
+            sections=sections,
+            stats=stats,
+            analyzed_at=datetime.utcnow().isoformat(),
+        ).model_dump()
+
+
+async def load_quality_input(project_id: Optional[UUID], entity_id: Optional[UUID]) -> Dict[str, Any]:
+    """读取待诊断的项目和章节.
+
+    entity_id为章节ID时只诊断该章，否则诊断项目全部章节。
+
+    Returns:
+        {"project": 项目字典, "chapters": [(章节, 按序号排列的场景), ...]}
+    """
+    async with database.session_factory(readonly=True)() as db:
+        query = select(Chapter).options(selectinload(Chapter.scenes)).order_by(Chapter.chapter_number)
+        if entity_id is not None:
+            query = query.where(Chapter.id == entity_id)
+        elif project_id is not None:
+            query = query.where(Chapter.project_id == project_id)
+        else:
+            raise ValueError("project_id or entity_id is required")
+        chapters = (await db.execute(query)).scalars().all()
+        if not chapters and entity_id is not None:
+            raise ValueError(f"Chapter {entity_id} not found")
+
+        project = await db.get(Project, project_id or chapters[0].project_id)
+        if project is None:
+            raise ValueError(f"Project {project_id} not found")
+        return {
+            "project": project.to_dict(),
+            "chapters": [(c, sorted(c.scenes, key=lambda s: s.scene_number)) for c in chapters],
+        }
+
+
+def create_quality_analyzer() -> QualityAnalyzer:
+    """根据应用配置创建诊断器."""
+    cache = ResponseCache(
+        enabled=settings.QUALITY_CHUNK_CACHE_ENABLED,
+        max_entries=settings.QUALITY_CHUNK_CACHE_MAX_ENTRIES,
+        ttl=settings.QUALITY_CHUNK_CACHE_TTL,
+        redis_url=settings.REDIS_URL if settings.AI_CACHE_REDIS_ENABLED else None,
+        key_prefix=settings.QUALITY_CHUNK_CACHE_KEY_PREFIX,
+    )
+    return QualityAnalyzer(
+        cache=cache,
+        chunk_tokens=settings.QUALITY_CHUNK_TOKENS,
+        concurrency=settings.QUALITY_MAP_CONCURRENCY,
+        max_issues=settings.QUALITY_MAX_ISSUES,
+    )
+
+
+# 全局诊断器实例
+quality_analyzer = create_quality_analyzer()
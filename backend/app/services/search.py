@@ -0,0 +1,403 @@
+"""项目内全文检索.
+
+PostgreSQL自带的分词器不切分中文（连续汉字被当作一个词），这里在应用侧
+把中文切成单字和相邻二字组（bigram），英文和数字按词小写，用空格连接后以
+simple配置生成tsvector。查询用同样的方式切分：两个字以上的中文取二字组，
+单字取单字，各词项取AND。这种方式不依赖zhparser等扩展，召回率高、词典
+无关，代价是索引约为正文的两倍。
+
+灵感、场景、角色的search_vector在flush时随写入一同更新，带GIN索引；
+灵感的tags另有GIN索引用于标签过滤。
+"""
+import base64
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import (
+    REAL,
+    String,
+    Text,
+    and_,
+    bindparam,
+    cast,
+    event,
+    func,
+    inspect,
+    literal,
+    literal_column,
+    null,
+    or_,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.entity.chapter import Chapter
+from app.models.entity.character import Character
+from app.models.entity.inspiration import Inspiration
+from app.models.entity.scene import Scene
+from app.schemas.search import SearchHit
+
+logger = logging.getLogger(__name__)
+
+
+# 中文字符区间（扩展A、基本区、兼容区）
+CJK_RANGES = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+TOKEN_PATTERN = re.compile(f"([{CJK_RANGES}]+)|([A-Za-z0-9]+)")
+
+# 所有索引使用simple配置，不做词干化和停用词处理；以regconfig字面量给出，
+# 绑定参数在asyncpg下是varchar，不能隐式转换为regconfig
+TS_CONFIG = literal_column("'simple'::regconfig")
+
+SEARCH_TYPES = ("inspiration", "scene", "character")
+
+MAX_PAGE_SIZE = 100
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """把文本切分为索引词项：中文单字+二字组，英文/数字按词小写."""
+    if not text:
+        return []
+    tokens: List[str] = []
+    for cjk, word in TOKEN_PATTERN.findall(text):
+        if cjk:
+            tokens.extend(cjk)
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+
+def query_terms(query: str) -> List[str]:
+    """把查询切分为词项：两个字以上的中文取二字组，单字取单字."""
+    terms: List[str] = []
+    for cjk, word in TOKEN_PATTERN.findall(query):
+        if cjk:
+            if len(cjk) == 1:
+                terms.append(cjk)
+            else:
+                terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            terms.append(word.lower())
+    # 去重并保持顺序
+    return list(dict.fromkeys(terms))
+
+
+def flatten_text(value: Any) -> str:
+    """提取JSON结构中的所有字符串（用于角色档案）."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return " ".join(flatten_text(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(flatten_text(v) for v in value)
+    return str(value)
+
+
+@dataclass(frozen=True)
+class SearchField:
+    """参与索引的属性及权重（A最高）."""
+
+    attr: str
+    weight: str
+    flatten: bool = False
+
+
+# 各实体的索引字段
+INDEXED_FIELDS: Dict[type, Tuple[SearchField, ...]] = {
+    Inspiration: (SearchField("tags", "A", flatten=True), SearchField("content", "C")),
+    Scene: (
+        SearchField("title", "A"),
+        SearchField("location", "B"),
+        SearchField("content", "C"),
+    ),
+    Character: (SearchField("name", "A"), SearchField("profile", "B", flatten=True)),
+}
+
+
+def _encode_cursor(rank: float, hit_type: str, hit_id: UUID) -> str:
+    payload = json.dumps([rank, hit_type, str(hit_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, str, UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, hit_type, hit_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rank), str(hit_type), UUID(hit_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class SearchService:
+    """全文索引的维护与查询."""
+
+    def __init__(self, max_index_chars: int = 200000, snippet_chars: int = 120):
+        """初始化检索服务.
+
+        Args:
+            max_index_chars: 每个字段最多索引的字符数（tsvector上限为1MB）
+            snippet_chars: 结果摘要的长度
+        """
+        self.max_index_chars = max_index_chars
+        self.snippet_chars = snippet_chars
+
+    def register(self, target=Session):
+        """在会话上注册flush事件，写入时同步更新search_vector."""
+        if not event.contains(target, "before_flush", self._before_flush):
+            event.listen(target, "before_flush", self._before_flush)
+
+    def field_tokens(self, field: SearchField, value: Any) -> str:
+        """生成字段的索引词项串."""
+        text = flatten_text(value) if field.flatten else value
+        return " ".join(tokenize(text[:self.max_index_chars] if text else text))
+
+    def vector_expression(self, entity: type, tokens: Optional[Dict[str, str]] = None) -> Any:
+        """生成search_vector表达式.
+
+        Args:
+            entity: 实体类
+            tokens: 各字段的词项串；为None时使用名为"<字段>_tokens"的绑定参数，供批量更新
+
+        Returns:
+            tsvector SQL表达式
+        """
+        vector = None
+        for field in INDEXED_FIELDS[entity]:
+            if tokens is None:
+                value = bindparam(f"{field.attr}_tokens", type_=Text)
+            else:
+                value = cast(tokens[field.attr], Text)
+            weight = literal_column(f"'{field.weight}'")
+            part = func.setweight(func.to_tsvector(TS_CONFIG, value), weight)
+            vector = part if vector is None else vector.op("||")(part)
+        return vector
+
+    def vector_for(self, obj) -> Any:
+        """按实体当前的字段值生成search_vector表达式."""
+        entity = type(obj)
+        return self.vector_expression(
+            entity,
+            {field.attr: self.field_tokens(field, getattr(obj, field.attr)) for field in INDEXED_FIELDS[entity]},
+        )
+
+    def _before_flush(self, session: Session, flush_context, instances):
+        """新增或索引字段有变化的实体重新生成search_vector."""
+        for obj in list(session.new) + list(session.dirty):
+            fields = INDEXED_FIELDS.get(type(obj))
+            if fields is None:
+                continue
+            if obj not in session.new:
+                attrs = inspect(obj).attrs
+                if not any(attrs[field.attr].history.has_changes() for field in fields):
+                    continue
+            obj.search_vector = self.vector_for(obj)
+
+    async def reindex(self, db: AsyncSession, entity: type, batch_size: int = 500) -> int:
+        """为已有数据（重新）生成search_vector，按主键分批批量更新.
+
+        Returns:
+            处理的行数
+        """
+        fields = INDEXED_FIELDS[entity]
+        attrs = [getattr(entity, field.attr) for field in fields]
+        table = entity.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("row_id"))
+            .values(search_vector=self.vector_expression(entity))
+        )
+        total = 0
+        last_id = None
+        while True:
+            query = select(entity.id, *attrs).order_by(entity.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(entity.id > last_id)
+            rows = (await db.execute(query)).all()
+            if not rows:
+                break
+            params = [
+                {
+                    "row_id": row.id,
+                    **{
+                        f"{field.attr}_tokens": self.field_tokens(field, row._mapping[field.attr])
+                        for field in fields
+                    },
+                }
+                for row in rows
+            ]
+            await db.execute(statement, params)
+            await db.commit()
+            total += len(rows)
+            last_id = rows[-1].id
+        logger.info("Reindexed %d %s rows", total, entity.__tablename__)
+        return total
+
+    # ========== 查询 ==========
+
+    def _sources(self, project_id: UUID, tsquery, types: Sequence[str], tags: Optional[List[str]]):
+        """各实体的候选结果子查询."""
+        sources = []
+        if "inspiration" in types:
+            criteria = [Inspiration.project_id == project_id, Inspiration.search_vector.op("@@")(tsquery)]
+            if tags:
+                criteria.append(Inspiration.tags.contains(tags))
+            sources.append(
+                select(
+                    literal("inspiration").label("type"),
+                    Inspiration.id.label("id"),
+                    cast(null(), String).label("title"),
+                    func.ts_rank_cd(Inspiration.search_vector, tsquery).label("rank"),
+                ).where(*criteria)
+            )
+        if "scene" in types and not tags:
+            sources.append(
+                select(
+                    literal("scene").label("type"),
+                    Scene.id.label("id"),
+                    Scene.title.label("title"),
+                    func.ts_rank_cd(Scene.search_vector, tsquery).label("rank"),
+                )
+                .join(Chapter, Chapter.id == Scene.chapter_id)
+                .where(Chapter.project_id == project_id, Scene.search_vector.op("@@")(tsquery))
+            )
+        if "character" in types and not tags:
+            sources.append(
+                select(
+                    literal("character").label("type"),
+                    Character.id.label("id"),
+                    Character.name.label("title"),
+                    func.ts_rank_cd(Character.search_vector, tsquery).label("rank"),
+                ).where(Character.project_id == project_id, Character.search_vector.op("@@")(tsquery))
+            )
+        return sources
+
+    async def search(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        query: str,
+        types: Optional[Iterable[str]] = None,
+        tags: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        """在项目内检索，按相关度排序，游标分页.
+
+        Args:
+            db: 数据库会话
+            project_id: 项目ID
+            query: 查询文本
+            types: 检索的实体类型，默认全部
+            tags: 只检索包含全部这些标签的灵感
+            cursor: 上一页返回的next_cursor
+            limit: 每页条数
+
+        Returns:
+            {"items": [SearchHit, ...], "next_cursor": str或None, "terms": [...]}
+
+        Raises:
+            ValueError: 类型或游标无效
+        """
+        types = list(types or SEARCH_TYPES)
+        unknown = [t for t in types if t not in SEARCH_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown search types: {', '.join(unknown)}")
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        terms = query_terms(query)
+        if not terms:
+            return {"items": [], "next_cursor": None, "terms": []}
+
+        # 词项只含汉字和字母数字，plainto_tsquery按AND组合
+        tsquery = func.plainto_tsquery(TS_CONFIG, " ".join(terms))
+        sources = self._sources(project_id, tsquery, types, tags)
+        if not sources:
+            return {"items": [], "next_cursor": None, "terms": terms}
+
+        hits = union_all(*sources).subquery("hits")
+        page_query = select(hits)
+        if cursor:
+            rank, hit_type, hit_id = _decode_cursor(cursor)
+            rank = cast(rank, REAL)
+            page_query = page_query.where(
+                or_(
+                    hits.c.rank < rank,
+                    and_(hits.c.rank == rank, hits.c.type > hit_type),
+                    and_(hits.c.rank == rank, hits.c.type == hit_type, hits.c.id > hit_id),
+                )
+            )
+        page_query = page_query.order_by(hits.c.rank.desc(), hits.c.type, hits.c.id).limit(limit + 1)
+
+        rows = (await db.execute(page_query)).all()
+        page = rows[:limit]
+        snippets = await self._snippets(db, page, terms)
+        items = [
+            SearchHit(
+                type=row.type,
+                id=row.id,
+                title=row.title,
+                snippet=snippets.get((row.type, row.id), ""),
+                rank=float(row.rank),
+            )
+            for row in page
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1]
+            next_cursor = _encode_cursor(float(last.rank), last.type, last.id)
+        return {"items": items, "next_cursor": next_cursor, "terms": terms}
+
+    async def _snippets(self, db: AsyncSession, rows, terms: List[str]) -> Dict[Tuple[str, UUID], str]:
+        """只为当前页读取正文并截取命中位置附近的片段."""
+        ids: Dict[str, List[UUID]] = {}
+        for row in rows:
+            ids.setdefault(row.type, []).append(row.id)
+
+        texts: Dict[Tuple[str, UUID], str] = {}
+        if ids.get("inspiration"):
+            result = await db.execute(
+                select(Inspiration.id, Inspiration.content).where(Inspiration.id.in_(ids["inspiration"]))
+            )
+            texts.update({("inspiration", r.id): r.content or "" for r in result})
+        if ids.get("scene"):
+            result = await db.execute(select(Scene.id, Scene.content).where(Scene.id.in_(ids["scene"])))
+            texts.update({("scene", r.id): r.content or "" for r in result})
+        if ids.get("character"):
+            result = await db.execute(
+                select(Character.id, Character.profile).where(Character.id.in_(ids["character"]))
+            )
+            texts.update({("character", r.id): flatten_text(r.profile) for r in result})
+
+        return {key: self.snippet(text, terms) for key, text in texts.items()}
+
+    def snippet(self, text: str, terms: List[str]) -> str:
+        """截取第一个命中词项附近的片段."""
+        lowered = text.lower()
+        positions = [p for p in (lowered.find(term) for term in terms) if p >= 0]
+        start = max(0, min(positions) - self.snippet_chars // 3) if positions else 0
+        end = start + self.snippet_chars
+        snippet = text[start:end].replace("\n", " ")
+        return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+def create_search_service() -> SearchService:
+    """根据应用配置创建检索服务."""
+    return SearchService(
+        max_index_chars=settings.SEARCH_MAX_INDEX_CHARS,
+        snippet_chars=settings.SEARCH_SNIPPET_CHARS,
+    )
+
+
+# 全局检索服务实例
+search_service = create_search_service()
+search_service.register()
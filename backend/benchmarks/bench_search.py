@@ -0,0 +1,211 @@
+"""全文检索基准：在合成的10万条灵感片段上对比tsvector检索与ILIKE扫描.
+
+在DATABASE_URL指向的PostgreSQL中创建一个临时用户和项目，批量写入合成的
+中文灵感片段（带search_vector和tags），然后对随机抽取的查询词分别测量：
+
+- search: SearchService.search，GIN索引+ts_rank_cd排序，取第一页
+- search_p2: 用第一页的next_cursor取第二页
+- tags: 查询词+标签过滤（tags上的GIN索引）
+- ilike: content ILIKE '%词%'按创建时间取20条（无索引可用的基线）
+
+    python benchmarks/bench_search.py --create-tables
+    python benchmarks/bench_search.py --fragments 100000 --queries 200
+
+在 backend/ 目录下运行；默认结束时删除合成数据，--keep保留。
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, delete, insert, select  # noqa: E402
+
+from app.models.entity import Base, Inspiration, Project, User  # noqa: E402
+from app.services.database import database  # noqa: E402
+from app.services.search import INDEXED_FIELDS, search_service  # noqa: E402
+
+# 合成语料用的词表：常见的人物、场景、动作、物件
+NAMES = ["林渊", "苏晚", "陆沉", "白芷", "顾北", "沈青", "叶寒", "秦朗", "温言", "萧瑟"]
+PLACES = ["雨夜", "古寺", "江南小镇", "废弃车站", "雪山", "书院", "码头", "地下城", "皇城", "荒漠"]
+ACTIONS = ["重逢", "背叛", "逃亡", "对峙", "告白", "失忆", "复仇", "结盟", "离别", "觉醒"]
+OBJECTS = ["一封旧信", "断剑", "铜镜", "古琴", "地图", "玉佩", "怀表", "钥匙", "日记", "面具"]
+FILLER = "他没有回头，只是把伞往她那边偏了偏。风很大，灯火在水面上碎成一片。"
+TAGS = ["悬疑", "爱情", "武侠", "科幻", "成长", "复仇", "群像", "奇幻"]
+
+
+def synthetic_fragment(rng: random.Random) -> str:
+    """生成一条约80~200字的灵感片段."""
+    parts = [
+        f"{rng.choice(NAMES)}在{rng.choice(PLACES)}{rng.choice(ACTIONS)}，",
+        f"手里握着{rng.choice(OBJECTS)}。",
+        FILLER[: rng.randint(10, len(FILLER))],
+        f"后来{rng.choice(NAMES)}才知道，{rng.choice(OBJECTS)}藏着{rng.choice(ACTIONS)}的秘密。",
+    ]
+    rng.shuffle(parts)
+    return "".join(parts) * rng.randint(1, 2)
+
+
+async def populate(project_id, user_id, fragments: int, batch_size: int, seed: int):
+    """批量写入合成灵感，search_vector在同一条INSERT中生成."""
+    rng = random.Random(seed)
+    fields = INDEXED_FIELDS[Inspiration]
+    table = Inspiration.__table__
+    statement = insert(table).values(
+        id=bindparam("row_id"),
+        project_id=bindparam("b_project_id"),
+        user_id=bindparam("b_user_id"),
+        content=bindparam("b_content"),
+        tags=bindparam("b_tags"),
+        created_at=bindparam("b_created_at"),
+        search_vector=search_service.vector_expression(Inspiration),
+    )
+    start = datetime.utcnow() - timedelta(days=365)
+
+    async with database.session_factory()() as db:
+        for offset in range(0, fragments, batch_size):
+            rows = []
+            for i in range(offset, min(offset + batch_size, fragments)):
+                content = synthetic_fragment(rng)
+                tags = rng.sample(TAGS, rng.randint(1, 3))
+                rows.append(
+                    {
+                        "row_id": uuid.uuid4(),
+                        "b_project_id": project_id,
+                        "b_user_id": user_id,
+                        "b_content": content,
+                        "b_tags": tags,
+                        "b_created_at": start + timedelta(seconds=i * 300),
+                        **{
+                            f"{field.attr}_tokens": search_service.field_tokens(
+                                field, tags if field.attr == "tags" else content
+                            )
+                            for field in fields
+                        },
+                    }
+                )
+            await db.execute(statement, rows)
+            await db.commit()
+            print(f"\rinserted {min(offset + batch_size, fragments)}/{fragments}", end="", flush=True)
+    print()
+
+
+async def measure(label: str, queries: List[str], run: Callable[..., Awaitable[int]]):
+    """逐条执行查询并报告延迟分布."""
+    timings = []
+    hits = 0
+    async with database.session_factory(readonly=True)() as db:
+        for query in queries:
+            started = time.perf_counter()
+            hits += await run(db, query)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(
+        f"{label:<10} p50={statistics.median(timings) * 1000:8.2f}ms "
+        f"p95={p95 * 1000:8.2f}ms max={timings[-1] * 1000:8.2f}ms "
+        f"avg_hits={hits / len(queries):6.1f}"
+    )
+
+
+async def run_benchmark(args):
+    if args.create_tables:
+        async with database.engine().begin() as conn:
+            await conn.run_sync(
+                lambda sync_conn: Base.metadata.create_all(
+                    sync_conn,
+                    tables=[Base.metadata.tables[name] for name in ("users", "projects", "project_stats", "inspirations")],
+                )
+            )
+
+    user_id, project_id = uuid.uuid4(), uuid.uuid4()
+    async with database.session_factory()() as db:
+        db.add(
+            User(
+                id=user_id,
+                email=f"bench-{user_id}@example.com",
+                username=f"bench-{user_id.hex[:12]}",
+                hashed_password="x",
+            )
+        )
+        await db.flush()
+        db.add(Project(id=project_id, user_id=user_id, title="search benchmark"))
+        await db.commit()
+
+    try:
+        started = time.perf_counter()
+        await populate(project_id, user_id, args.fragments, args.batch_size, args.seed)
+        print(f"populate   {time.perf_counter() - started:8.1f}s for {args.fragments} fragments")
+
+        async with database.engine().begin() as conn:
+            await conn.exec_driver_sql("ANALYZE inspirations")
+
+        rng = random.Random(args.seed + 1)
+        vocabulary = NAMES + PLACES + ACTIONS + OBJECTS
+        queries = [
+            rng.choice(vocabulary) if rng.random() < 0.6 else rng.choice(NAMES) + rng.choice(PLACES)
+            for _ in range(args.queries)
+        ]
+
+        async def search_first(db, query):
+            page = await search_service.search(db, project_id, query, types=["inspiration"], limit=20)
+            return len(page["items"])
+
+        async def search_second(db, query):
+            page = await search_service.search(db, project_id, query, types=["inspiration"], limit=20)
+            if not page["next_cursor"]:
+                return 0
+            page = await search_service.search(
+                db, project_id, query, types=["inspiration"], cursor=page["next_cursor"], limit=20
+            )
+            return len(page["items"])
+
+        async def search_tags(db, query):
+            page = await search_service.search(
+                db, project_id, query, types=["inspiration"], tags=[rng.choice(TAGS)], limit=20
+            )
+            return len(page["items"])
+
+        async def ilike(db, query):
+            rows = await db.execute(
+                select(Inspiration.id)
+                .where(Inspiration.project_id == project_id, Inspiration.content.ilike(f"%{query}%"))
+                .order_by(Inspiration.created_at.desc())
+                .limit(20)
+            )
+            return len(rows.all())
+
+        await measure("search", queries, search_first)
+        await measure("search_p2", queries, search_second)
+        await measure("tags", queries, search_tags)
+        await measure("ilike", queries, ilike)
+    finally:
+        if not args.keep:
+            async with database.session_factory()() as db:
+                await db.execute(delete(Inspiration).where(Inspiration.project_id == project_id))
+                await db.execute(delete(Project).where(Project.id == project_id))
+                await db.execute(delete(User).where(User.id == user_id))
+                await db.commit()
+        await database.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark project full-text search")
+    parser.add_argument("--fragments", type=int, default=100000, help="synthetic inspirations to insert")
+    parser.add_argument("--queries", type=int, default=200, help="queries per measurement")
+    parser.add_argument("--batch-size", type=int, default=2000, help="rows per INSERT batch")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--create-tables", action="store_true", help="create missing tables first")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic data")
+    asyncio.run(run_benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""启动耗时基准：测量 `import app.main` 的墙钟时间.
+
+每次测量都在新的Python子进程中进行，避免模块缓存影响结果。
+
+    python benchmarks/bench_startup.py              # 惰性初始化（当前行为）
+    python benchmarks/bench_startup.py --eager      # 导入后立即预热，模拟旧的导入期初始化
+    python benchmarks/bench_startup.py --compare    # 两种方式对比
+
+在 backend/ 目录下运行。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+LAZY_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+EAGER_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+from app.services.ai.ai_manager import ai_manager
+ai_manager.warm_up()
+print(time.perf_counter() - start)
+"""
+
+
+def measure(snippet: str, module: str, runs: int) -> list:
+    """在子进程中重复测量导入耗时.
+
+    Args:
+        snippet: 测量代码模板
+        module: 要导入的模块
+        runs: 测量次数
+
+    Returns:
+        每次测量的耗时（秒）
+    """
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = backend_dir + os.pathsep + env.get("PYTHONPATH", "")
+    # 预热时需要密钥才会创建客户端，不会发起网络请求
+    env.setdefault("ANTHROPIC_API_KEY", "bench-placeholder")
+    env.setdefault("OPENAI_API_KEY", "bench-placeholder")
+    env.setdefault("AI_PROVIDER", "both")
+
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", snippet.format(module=module)],
+            cwd=backend_dir,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def report(label: str, timings: list):
+    """输出统计结果."""
+    print(
+        f"{label:<8} median={statistics.median(timings) * 1000:8.1f}ms "
+        f"min={min(timings) * 1000:8.1f}ms max={max(timings) * 1000:8.1f}ms "
+        f"runs={len(timings)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API import/startup time")
+    parser.add_argument("--module", default="app.main", help="module to import")
+    parser.add_argument("--runs", type=int, default=10, help="number of runs")
+    parser.add_argument("--eager", action="store_true", help="warm up AI services after import")
+    parser.add_argument("--compare", action="store_true", help="measure lazy and eager")
+    args = parser.parse_args()
+
+    modes = []
+    if args.compare or not args.eager:
+        modes.append(("lazy", LAZY_SNIPPET))
+    if args.compare or args.eager:
+        modes.append(("eager", EAGER_SNIPPET))
+
+    for label, snippet in modes:
+        try:
+            report(label, measure(snippet, args.module, args.runs))
+        except RuntimeError as e:
+            print(f"{label:<8} failed: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""提示词模板填充基准：逐变量str.replace与预编译模板的对比.
+
+对PROMPT_TEMPLATES中的每个模板，用相同的变量分别以旧实现（每个变量整体
+扫描一次模板）和预编译模板渲染，先校验两者输出一致，再比较单次渲染耗时。
+
+    python benchmarks/bench_templates.py
+    python benchmarks/bench_templates.py --number 20000 --repeat 7
+
+在 backend/ 目录下运行。
+"""
+import argparse
+import os
+import sys
+import timeit
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ai.templates import PROMPT_TEMPLATES, PromptTemplate, PromptTemplateManager  # noqa: E402
+
+
+def legacy_fill(template: PromptTemplate, variables: Dict[str, Any]) -> str:
+    """旧的填充实现：校验后对每个声明的变量执行一次str.replace."""
+    for var in template.variables:
+        if var.required and var.name not in variables:
+            raise ValueError(f"Required variable missing: {var.name}")
+
+    result = template.template
+    for var in template.variables:
+        placeholder = f"{{{{{var.name}}}}}"
+        value = variables.get(var.name, var.default_value or "")
+        result = result.replace(placeholder, str(value))
+    return result
+
+
+def sample_variables(template: PromptTemplate) -> Dict[str, Any]:
+    """为模板的必需变量生成示例值，可选变量使用默认值."""
+    return {
+        var.name: f"示例{var.description}" * 3
+        for var in template.variables
+        if var.required
+    }
+
+
+def best_per_call(func, number: int, repeat: int) -> float:
+    """多轮测量中最快一轮的单次耗时（秒）."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt template filling")
+    parser.add_argument("--number", type=int, default=5000, help="calls per round")
+    parser.add_argument("--repeat", type=int, default=5, help="number of rounds")
+    args = parser.parse_args()
+
+    manager = PromptTemplateManager()
+    print(f"{'template':<26}{'chars':>7}{'vars':>6}{'legacy':>12}{'compiled':>12}{'speedup':>9}")
+
+    total_legacy = total_compiled = 0.0
+    for template_id, template in PROMPT_TEMPLATES.items():
+        variables = sample_variables(template)
+        expected = legacy_fill(template, variables)
+        if manager.fill_template(template_id, variables) != expected:
+            raise SystemExit(f"{template_id}: compiled output differs from legacy output")
+
+        legacy = best_per_call(lambda: legacy_fill(template, variables), args.number, args.repeat)
+        compiled = best_per_call(
+            lambda: manager.fill_template(template_id, variables), args.number, args.repeat
+        )
+        total_legacy += legacy
+        total_compiled += compiled
+        print(
+            f"{template_id:<26}{len(template.template):>7}{len(template.variables):>6}"
+            f"{legacy * 1e6:>10.2f}us{compiled * 1e6:>10.2f}us{legacy / compiled:>8.2f}x"
+        )
+
+    print(
+        f"{'total':<39}{total_legacy * 1e6:>10.2f}us{total_compiled * 1e6:>10.2f}us"
+        f"{total_legacy / total_compiled:>8.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""批量离线生成测试：本地批处理替身 + fakeredis上的提交、轮询、接管、取消和写回."""
+import asyncio
+import json
+import uuid
+
+import fakeredis.aioredis
+import pytest
+
+from app.core.context import metered_user
+from app.schemas.ai import AIResponse
+from app.services import batch
+from app.services.ai.batch import ENDED, IN_PROGRESS, BatchRequest, LocalBatchService
+from app.services.batch import APPLIED, SUBMITTING, BatchRunner
+from app.services.jobs import JOB_HANDLERS, JobContext, JobQueue, job_handler
+
+TEST_JOB = "test.batch"
+
+
+async def _noop(params, context):
+    return None
+
+
+@pytest.fixture(autouse=True)
+def registered_job_type():
+    """注册测试用的任务类型，结束后从全局注册表移除."""
+    job_handler(TEST_JOB)(_noop)
+    yield TEST_JOB
+    JOB_HANDLERS.pop(TEST_JOB, None)
+
+
+async def respond(request: BatchRequest) -> AIResponse:
+    if "失败" in request.prompt:
+        raise RuntimeError("provider error")
+    return AIResponse(text=f'{{"echo": "{request.prompt}"}}', metadata={"usage": {"input_tokens": 1}})
+
+
+class Recorder:
+    """替代数据库读写的prepare/apply."""
+
+    def __init__(self, prompts):
+        self.prompts = prompts
+        self.prepared = 0
+        self.applied = None
+
+    async def prepare(self, kind, params):
+        self.prepared += 1
+        return [
+            (BatchRequest(custom_id=f"item-{i}", prompt=prompt, max_tokens=100), {"index": i})
+            for i, prompt in enumerate(self.prompts)
+        ]
+
+    async def apply(self, kind, metas, results):
+        self.applied = {custom_id: result.response is not None for custom_id, result in results.items()}
+        return {"items_updated": sum(self.applied.values())}
+
+
+@pytest.fixture
+async def redis():
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    yield redis
+    await redis.aclose()
+
+
+@pytest.fixture
+async def queue(redis):
+    queue = JobQueue("redis://test", key_prefix="test:jobs:")
+    queue._redis = redis
+    return queue
+
+
+def make_runner(redis, recorder, responder=respond):
+    runner = BatchRunner("redis://test", key_prefix="test:batch:", provider="local", poll_interval=0.01)
+    runner._redis = redis
+    runner.local = LocalBatchService(responder)
+    runner.prepare = recorder.prepare
+    runner.apply = recorder.apply
+    return runner
+
+
+async def make_context(queue):
+    job, _ = await queue.enqueue(TEST_JOB, {})
+    await queue.start(job["id"])
+    return JobContext(queue, job["id"])
+
+
+async def test_batch_lifecycle(redis, queue):
+    recorder = Recorder(["第一章", "失败的章节", "第三章"])
+    runner = make_runner(redis, recorder)
+    context = await make_context(queue)
+
+    summary = await runner.run("quality_analysis", {}, context)
+
+    assert summary["provider"] == "local"
+    assert (summary["requests"], summary["succeeded"], summary["failed"]) == (3, 2, 1)
+    assert summary["items_updated"] == 2
+    assert recorder.applied == {"item-0": True, "item-1": False, "item-2": True}
+    # 写回后清除批次状态
+    assert await redis.get(runner._key(context.job_id)) is None
+    assert (await queue.get(context.job_id))["progress"] == pytest.approx(0.9)
+
+
+async def test_resumed_job_polls_existing_batch(redis, queue):
+    recorder = Recorder(["第一章", "第二章"])
+    runner = make_runner(redis, recorder)
+    context = await make_context(queue)
+
+    # 上一个worker已提交批次后退出
+    state = await runner._submit("quality_analysis", {}, context.job_id)
+    assert await redis.get(runner._key(context.job_id)) is not None
+
+    summary = await runner.run("quality_analysis", {}, context)
+    assert summary["batch_id"] == state["batch_id"]
+    assert summary["succeeded"] == 2
+    assert recorder.prepared == 1
+
+
+async def test_empty_batch_is_not_submitted(redis, queue):
+    runner = make_runner(redis, Recorder([]))
+    summary = await runner.run("quality_analysis", {}, await make_context(queue))
+    assert summary == {"batch_id": None, "provider": None, "requests": 0, "succeeded": 0, "failed": 0}
+
+
+async def test_oversized_batch_is_rejected(redis, queue):
+    runner = make_runner(redis, Recorder(["甲", "乙", "丙"]))
+    runner.max_requests = 2
+    with pytest.raises(ValueError, match="at most 2"):
+        await runner.run("quality_analysis", {}, await make_context(queue))
+
+
+@pytest.mark.parametrize("user_cancelled", [True, False])
+async def test_cancellation_while_polling(redis, queue, user_cancelled):
+    async def slow(request):
+        await asyncio.sleep(10)
+
+    runner = make_runner(redis, Recorder(["第一章"]), responder=slow)
+    context = await make_context(queue)
+    task = asyncio.create_task(runner.run("quality_analysis", {}, context))
+    while await redis.get(runner._key(context.job_id)) is None:
+        await asyncio.sleep(0.01)
+
+    (batch_id,) = runner.local._batches
+    assert (await runner.local.get_batch(batch_id)).status == IN_PROGRESS
+    if user_cancelled:
+        await queue.cancel(context.job_id)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.sleep(0)
+
+    # 用户取消时取消提供商批次；worker关闭时保留批次，由接管的worker继续轮询
+    assert ((await runner.local.get_batch(batch_id)).status == ENDED) is user_cancelled
+    assert await redis.get(runner._key(context.job_id)) is not None
+    runner.local._batches[batch_id]["task"].cancel()
+
+
+async def test_local_batch_does_not_meter_each_request(redis, queue):
+    users = []
+
+    async def record_user(request):
+        users.append(metered_user.get())
+        return await respond(request)
+
+    runner = make_runner(redis, Recorder(["第一章"]), responder=record_user)
+    token = metered_user.set(str(uuid.uuid4()))
+    try:
+        await runner.run("quality_analysis", {}, await make_context(queue))
+    finally:
+        metered_user.reset(token)
+    # 逐个调用不计量，用量只由BatchRunner按结果记一次
+    assert users == [None]
+
+
+async def test_interrupted_submission_is_not_resubmitted(redis, queue):
+    recorder = Recorder(["第一章"])
+    runner = make_runner(redis, recorder)
+    context = await make_context(queue)
+    await runner._save(context.job_id, {"status": SUBMITTING, "provider": "local", "batch_id": None})
+
+    with pytest.raises(RuntimeError, match="not resubmitting"):
+        await runner.run("quality_analysis", {}, context)
+    assert recorder.prepared == 0
+    assert runner.local._batches == {}
+
+
+async def test_rejected_submission_can_be_retried(redis, queue):
+    runner = make_runner(redis, Recorder(["第一章"]))
+    context = await make_context(queue)
+
+    async def reject(lines):
+        raise RuntimeError("provider rejected the batch")
+
+    create_batch, runner.local.create_batch = runner.local.create_batch, reject
+    with pytest.raises(RuntimeError, match="rejected"):
+        await runner.run("quality_analysis", {}, context)
+    assert await redis.get(runner._key(context.job_id)) is None
+
+    runner.local.create_batch = create_batch
+    assert (await runner.run("quality_analysis", {}, context))["succeeded"] == 1
+
+
+async def test_applied_batch_is_not_written_back_twice(redis, queue, monkeypatch):
+    recorder = Recorder(["第一章", "第二章"])
+    runner = make_runner(redis, recorder)
+    context = await make_context(queue)
+    recorded = []
+
+    async def record(user_id, usage):
+        recorded.append(usage)
+        raise asyncio.CancelledError  # worker在记账时被终止
+
+    monkeypatch.setattr(batch.token_meter, "record", record)
+    with pytest.raises(asyncio.CancelledError):
+        await runner.run("quality_analysis", {}, context)
+    assert len(recorded) == 1
+    state = json.loads(await redis.get(runner._key(context.job_id)))
+    assert state["status"] == APPLIED
+
+    # 接管的worker直接返回写回统计
+    recorder.applied = None
+    summary = await runner.run("quality_analysis", {}, context)
+    assert summary == state["summary"]
+    assert recorder.applied is None
+    assert len(recorded) == 1
+    assert await redis.get(runner._key(context.job_id)) is None
@@ -0,0 +1,48 @@
+"""AI响应缓存测试：Redis出错后关闭旧客户端."""
+import asyncio
+import time
+
+from app.services.ai.cache import ResponseCache
+
+
+class FakeClient:
+    def __init__(self, fail_ping=False):
+        self.fail_ping = fail_ping
+        self.closed = False
+
+    async def ping(self):
+        if self.fail_ping:
+            raise ConnectionError("connection refused")
+
+    async def get(self, key):
+        raise ConnectionError("connection reset")
+
+    async def close(self):
+        self.closed = True
+
+
+async def test_client_is_closed_after_redis_error():
+    response_cache = ResponseCache(redis_url="redis://test")
+    client = FakeClient()
+    response_cache._redis = client
+
+    assert await response_cache.get("key") is None
+    for _ in range(2):
+        await asyncio.sleep(0)
+    assert client.closed
+    assert response_cache._redis is None
+    assert response_cache._closing == set()
+
+
+async def test_client_is_closed_when_ping_fails(monkeypatch):
+    import redis.asyncio as aioredis
+
+    client = FakeClient(fail_ping=True)
+    monkeypatch.setattr(aioredis, "from_url", lambda url: client)
+    response_cache = ResponseCache(redis_url="redis://test")
+
+    assert await response_cache._get_redis() is None
+    await asyncio.sleep(0)
+    assert client.closed
+    assert response_cache.stats()["redis_errors"] == 1
+    assert time.monotonic() < response_cache._redis_retry_at
@@ -0,0 +1,212 @@
+"""对话压缩（滚动摘要）测试."""
+import uuid
+
+from app.models.entity.conversation import Conversation
+from app.models.entity.conversation_message import ConversationMessage
+from app.schemas.ai import AIResponse
+from app.services import conversation_store
+from app.services.conversation_store import ConversationStore, chunk_messages, compaction_split
+
+
+def make_rows(count, tokens=10, start_seq=1):
+    return [
+        ConversationMessage(
+            seq=start_seq + i,
+            role="user" if i % 2 == 0 else "assistant",
+            content=f"消息{start_seq + i}",
+            token_count=tokens,
+        )
+        for i in range(count)
+    ]
+
+
+class FakeResult:
+    def __init__(self, value=None, rows=None):
+        self.value = value
+        self.rows = rows or []
+
+    def all(self):
+        return self.rows
+
+    def scalar_one_or_none(self):
+        return self.value
+
+
+class FakeSession:
+    """按顺序返回预设消息行，记录执行的UPDATE语句."""
+
+    def __init__(self, rows, remaining_tokens=0):
+        self.rows = rows
+        self.remaining_tokens = remaining_tokens
+        self.queries = []
+        self.updates = []
+        self.log = []  # 按顺序记录的操作，检查事务边界
+
+    async def scalars(self, query):
+        self.queries.append(query)
+        self.log.append("select")
+        return FakeResult(rows=list(self.rows))
+
+    async def execute(self, statement):
+        self.updates.append(statement)
+        self.log.append("update")
+        return FakeResult(value=self.remaining_tokens)
+
+    async def scalar(self, statement):
+        self.log.append("append")
+        return len(self.rows) + 1
+
+    def add(self, instance):
+        self.rows.append(instance)
+
+    async def flush(self):
+        pass
+
+    async def commit(self):
+        self.log.append("commit")
+
+    async def refresh(self, instance):
+        pass
+
+
+def make_conversation(**values):
+    defaults = dict(
+        id=uuid.uuid4(),
+        summary=None,
+        summary_tokens=0,
+        summary_until_seq=0,
+        unsummarized_tokens=0,
+    )
+    defaults.update(values)
+    return Conversation(**defaults)
+
+
+def test_compaction_split_keeps_recent_half_starting_with_user():
+    rows = make_rows(10)  # user/assistant交替，每条10个token
+    split = compaction_split(rows, keep_budget=35)
+    assert rows[split].role == "user"
+    assert sum(row.token_count for row in rows[split:]) <= 40
+    assert split > 0
+
+
+def test_compaction_split_keeps_last_message():
+    rows = make_rows(3, tokens=1000)
+    assert compaction_split(rows, keep_budget=10) == 2
+
+
+def test_chunk_messages_respects_token_budget():
+    rows = make_rows(7, tokens=30)
+    chunks = chunk_messages(rows, max_tokens=100)
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert [row for chunk in chunks for row in chunk] == rows
+
+
+def test_chunk_messages_oversized_message_gets_own_chunk():
+    rows = make_rows(2, tokens=500)
+    assert [len(chunk) for chunk in chunk_messages(rows, max_tokens=100)] == [1, 1]
+
+
+def test_fold_query_reads_all_unsummarized_messages_oldest_first():
+    store = ConversationStore(max_window_messages=50)
+    conversation = make_conversation(summary_until_seq=7)
+    fold_sql = str(store._unsummarized_query(conversation, newest_first=False))
+    window_sql = str(store._unsummarized_query(conversation, newest_first=True))
+    assert "LIMIT" not in fold_sql
+    assert "ORDER BY conversation_messages.seq" in fold_sql
+    assert "LIMIT" in window_sql
+
+
+async def test_compact_folds_backlog_beyond_window_message_limit():
+    # 120条短消息超过max_window_messages：最早的消息也必须被摘要
+    rows = make_rows(120, tokens=10)
+    store = ConversationStore(window_tokens=400, summary_max_tokens=50, max_window_messages=50)
+    conversation = make_conversation(unsummarized_tokens=1200)
+    db = FakeSession(rows, remaining_tokens=190)
+
+    summarized = []
+
+    async def summarize(previous, messages):
+        summarized.extend(messages)
+        return f"摘要{len(summarized)}"
+
+    store._summarize = summarize
+    assert await store.compact(db, conversation)
+
+    # 从seq=1开始连续折叠，不跳过窗口之前的消息
+    assert [row.seq for row in summarized] == list(range(1, len(summarized) + 1))
+    assert conversation.summary_until_seq == summarized[-1].seq
+    assert sum(row.token_count for row in rows[len(summarized):]) <= 200
+    # 剩余token按消息行重新计算，而不是从计数器中扣除
+    assert conversation.unsummarized_tokens == 190
+    assert "sum(conversation_messages.token_count)" in str(db.updates[0])
+
+
+async def test_compact_summarizes_large_backlog_in_batches():
+    rows = make_rows(60, tokens=50)
+    store = ConversationStore(window_tokens=500, summary_max_tokens=50)
+    conversation = make_conversation(unsummarized_tokens=3000)
+    db = FakeSession(rows, remaining_tokens=250)
+
+    batches = []
+
+    async def summarize(previous, messages):
+        batches.append((previous, len(messages)))
+        return f"摘要{len(batches)}"
+
+    store._summarize = summarize
+    assert await store.compact(db, conversation)
+    assert len(batches) > 1
+    assert all(size * 50 <= 500 for _, size in batches)
+    # 每批都在上一批的摘要之上继续合并
+    assert [previous for previous, _ in batches[1:]] == [f"摘要{i}" for i in range(1, len(batches))]
+    assert conversation.summary == f"摘要{len(batches)}"
+
+
+async def test_compact_loses_race_without_writing():
+    rows = make_rows(20, tokens=50)
+    store = ConversationStore(window_tokens=500)
+    conversation = make_conversation(unsummarized_tokens=1000)
+    db = FakeSession(rows, remaining_tokens=None)
+
+    async def summarize(previous, messages):
+        return "摘要"
+
+    store._summarize = summarize
+    assert not await store.compact(db, conversation)
+    assert conversation.summary is None
+
+
+async def test_compact_holds_no_transaction_while_summarizing():
+    rows = make_rows(20, tokens=50)
+    store = ConversationStore(window_tokens=500)
+    conversation = make_conversation(unsummarized_tokens=1000)
+    db = FakeSession(rows, remaining_tokens=250)
+
+    async def summarize(previous, messages):
+        db.log.append("summarize")
+        return "摘要"
+
+    store._summarize = summarize
+    assert await store.compact(db, conversation)
+    # 读取后先结束事务，摘要调用之间没有数据库操作，写入后立即提交
+    assert db.log[:2] == ["select", "commit"]
+    assert set(db.log[2:-2]) == {"summarize"}
+    assert db.log[-2:] == ["update", "commit"]
+
+
+async def test_chat_commits_around_model_call(monkeypatch):
+    store = ConversationStore(window_tokens=500)
+    conversation = make_conversation(message_count=2, unsummarized_tokens=20)
+    db = FakeSession(make_rows(2))
+
+    async def chat(**kwargs):
+        db.log.append("model")
+        return AIResponse(text="回复", metadata={})
+
+    monkeypatch.setattr(conversation_store.ai_manager, "chat", chat)
+    role = type("Role", (), {"system_prompt": "", "temperature": 0.7, "max_tokens": 100})()
+    user_message, assistant_message, _ = await store.chat(db, conversation, "你好", "inspiration_collector", role)
+
+    # 用户消息提交后才读窗口、调用模型；回复在单独的事务中保存
+    assert db.log == ["append", "commit", "select", "commit", "model", "append", "commit"]
+    assert (user_message.seq, assistant_message.seq) == (3, 4)
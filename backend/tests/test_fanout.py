@@ -0,0 +1,33 @@
+"""多角色fan-out测试：超时的角色会关闭提供商的流."""
+import asyncio
+
+from app.ai.roles import AI_ROLES
+from app.services import fanout
+from app.services.fanout import TIMEOUT, RoleFanout
+
+
+async def test_timed_out_role_closes_stream(monkeypatch):
+    tasks = {}
+
+    async def stream_chat(**kwargs):
+        tasks["role"] = asyncio.current_task()
+        try:
+            while True:
+                yield "片段"
+        finally:
+            tasks["closed_by"] = asyncio.current_task()
+
+    monkeypatch.setattr(fanout.ai_manager, "stream_chat", stream_chat)
+    role_id = next(iter(AI_ROLES))
+
+    # 客户端读得慢，超时发生在角色等待写入合并队列时，此时流停在yield处
+    statuses = []
+    async for event in RoleFanout(queue_size=1).stream([role_id], "你好", timeout=0.05):
+        if event["type"] == "delta":
+            await asyncio.sleep(0.02)
+        elif event["type"] == "role_end":
+            statuses.append(event["status"])
+
+    assert statuses == [TIMEOUT]
+    # 流由角色自己关闭，而不是等生成器被垃圾回收时由事件循环关闭
+    assert tasks["closed_by"] is tasks["role"]
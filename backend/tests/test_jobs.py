@@ -0,0 +1,118 @@
+"""后台任务队列测试（fakeredis）：取消与开始的互斥、任务归属检查."""
+import uuid
+
+import fakeredis.aioredis
+import httpx
+import pytest
+
+from app.core.security import create_access_token
+from app.main import app
+from app.services.jobs import CANCELLED, JOB_HANDLERS, QUEUED, RUNNING, SUCCEEDED, JobQueue, job_handler, job_queue
+
+TEST_JOB = "test.noop"
+OWNER, INTRUDER = str(uuid.uuid4()), str(uuid.uuid4())
+
+
+async def _noop(params, context):
+    return params
+
+
+@pytest.fixture(autouse=True)
+def registered_job_type():
+    """注册测试用的任务类型，结束后从全局注册表移除."""
+    job_handler(TEST_JOB)(_noop)
+    yield TEST_JOB
+    JOB_HANDLERS.pop(TEST_JOB, None)
+
+
+@pytest.fixture
+async def queue():
+    queue = JobQueue("redis://test", key_prefix="test:jobs:", max_attempts=2)
+    queue._redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    yield queue
+    await queue._redis.aclose()
+
+
+async def test_cancel_queued_job_wins_over_later_start(queue):
+    job, _ = await queue.enqueue(TEST_JOB, {})
+    cancelled = await queue.cancel(job["id"])
+    assert cancelled["status"] == CANCELLED
+
+    assert await queue.start(job["id"]) is None
+    assert (await queue.get(job["id"]))["status"] == CANCELLED
+
+
+async def test_cancel_after_start_keeps_job_running(queue):
+    job, _ = await queue.enqueue(TEST_JOB, {})
+    started = await queue.start(job["id"])
+    assert started["status"] == RUNNING
+
+    # 运行中的任务只记录取消请求，由执行它的worker中断
+    cancelled = await queue.cancel(job["id"])
+    assert cancelled["status"] == RUNNING
+    assert cancelled["cancel_requested"]
+
+    await queue.finish(job["id"], CANCELLED)
+    assert (await queue.get(job["id"]))["status"] == CANCELLED
+
+
+async def test_cancel_finished_job_is_unchanged(queue):
+    job, _ = await queue.enqueue(TEST_JOB, {})
+    await queue.start(job["id"])
+    await queue.finish(job["id"], SUCCEEDED, result={"ok": True})
+
+    finished = await queue.cancel(job["id"])
+    assert finished["status"] == SUCCEEDED
+    assert not finished["cancel_requested"]
+
+
+async def test_start_gives_up_after_max_attempts(queue):
+    job, _ = await queue.enqueue(TEST_JOB, {})
+    assert (await queue.start(job["id"]))["status"] == RUNNING
+    assert (await queue.start(job["id"]))["attempts"] == 2
+    assert await queue.start(job["id"]) is None
+    assert (await queue.get(job["id"]))["status"] == "failed"
+
+
+async def test_cancel_unknown_job(queue):
+    assert await queue.cancel("missing") is None
+
+
+@pytest.fixture
+async def client(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "_redis", queue._redis)
+    monkeypatch.setattr(job_queue, "key_prefix", queue.key_prefix)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def _auth(user_id: str):
+    return {"Authorization": f"Bearer {create_access_token(user_id)}"}
+
+
+async def test_other_users_job_is_not_found(client):
+    job, _ = await job_queue.enqueue(TEST_JOB, {}, user_id=OWNER)
+    job_id = job["id"]
+
+    response = await client.get(f"/api/v1/jobs/{job_id}", headers=_auth(OWNER))
+    assert response.status_code == 200
+    assert response.json()["status"] == QUEUED
+
+    for method, path in (
+        ("GET", f"/api/v1/jobs/{job_id}"),
+        ("GET", f"/api/v1/jobs/{job_id}/result"),
+        ("POST", f"/api/v1/jobs/{job_id}/cancel"),
+        ("GET", f"/api/v1/jobs/{job_id}/events"),
+    ):
+        response = await client.request(method, path, headers=_auth(INTRUDER))
+        assert response.status_code == 404, path
+        response = await client.request(method, path)
+        assert response.status_code == 404, path
+
+    assert (await job_queue.get(job_id))["status"] == QUEUED
+
+
+async def test_token_subject_must_be_a_user_id(client):
+    response = await client.get("/api/v1/jobs/missing", headers=_auth("not-a-uuid"))
+    assert response.status_code == 401
@@ -0,0 +1,109 @@
+"""流式JSON解析与修复测试."""
+import json
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+
+from app.services.ai.json_stream import IncrementalJSONParser, StructuredStreamParser, parse_json_lenient
+
+DOCUMENT = {
+    "title": "雨夜来客",
+    "tags": ["悬疑", "都市"],
+    "options": [{"name": "方案A", "score": 8}, {"name": "方案B", "score": 6.5}],
+    "draft": False,
+    "note": None,
+}
+
+
+def feed_in_chunks(parser, text, size):
+    events = []
+    for start in range(0, len(text), size):
+        events.extend(parser.feed(text[start:start + size]))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_events_do_not_depend_on_chunking(size):
+    text = "好的，结果如下：\n```json\n" + json.dumps(DOCUMENT, ensure_ascii=False) + "\n```"
+    parser = IncrementalJSONParser(max_depth=2)
+    events = feed_in_chunks(parser, text, size)
+
+    assert (["title"], "雨夜来客") in events
+    assert (["tags", 1], "都市") in events
+    assert (["options", 0], {"name": "方案A", "score": 8}) in events
+    assert (["draft"], False) in events
+    assert (["note"], None) in events
+    # 超过max_depth的字段不单独报告
+    assert not any(path == ["options", 0, "name"] for path, _ in events)
+    assert parser.done
+    assert parser.result() == DOCUMENT
+
+
+def test_string_escapes_do_not_end_values_early():
+    parser = IncrementalJSONParser()
+    events = feed_in_chunks(parser, r'{"quote": "他说：\"走}\"", "n": 1}', 2)
+    assert events == [(["quote"], '他说："走}"'), (["n"], 1)]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"title": "雨夜", "tags": ["悬疑", "都', {"title": "雨夜", "tags": ["悬疑", "都"]}),
+        ('{"title": "雨夜", "score": 12', {"title": "雨夜", "score": 12}),
+        ('{"title": "雨夜", "options": [{"name": "A"}, {"na', {"title": "雨夜", "options": [{"name": "A"}, {}]}),
+        ('{"title": "雨夜", "draft": tr', {"title": "雨夜"}),
+        ('{"quote": "未完\\', {"quote": "未完"}),
+    ],
+)
+def test_repair_truncated_tail(text, expected):
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    assert parser.result() is None
+    assert parser.repair() == expected
+
+
+def test_repair_without_json_returns_none():
+    parser = IncrementalJSONParser()
+    parser.feed("抱歉，我无法完成这个请求。")
+    assert parser.repair() is None
+
+
+def test_parse_json_lenient():
+    assert parse_json_lenient('{"a": 1}') == {"a": 1}
+    assert parse_json_lenient('前言 {"a": [1, 2') == {"a": [1, 2]}
+    assert parse_json_lenient("没有JSON") is None
+
+
+class Option(BaseModel):
+    name: str
+    score: float
+
+
+class Plan(BaseModel):
+    title: str
+    options: List[Option]
+
+
+def test_structured_parser_validates_list_items():
+    parser = StructuredStreamParser(Plan)
+    events = feed_in_chunks(parser, '{"title": "雨夜", "options": [{"name": "A", "score": 8}, {"name": "B"}]}', 5)
+    items = {tuple(event["path"]): event for event in events}
+
+    assert items[("title",)]["valid"] is True
+    assert items[("options", 0)]["valid"] is True
+    assert items[("options", 0)]["value"] == {"name": "A", "score": 8.0}
+    assert items[("options", 1)]["valid"] is False
+
+    result = parser.finish()
+    assert result["repaired"] is False
+    assert result["valid"] is False
+
+
+def test_structured_parser_reports_repair():
+    parser = StructuredStreamParser(Plan)
+    parser.feed('{"title": "雨夜", "options": [{"name": "A", "score": 8}')
+    result = parser.finish()
+    assert result["repaired"] is True
+    assert result["valid"] is True
+    assert result["structured_data"] == {"title": "雨夜", "options": [{"name": "A", "score": 8}]}
@@ -0,0 +1,113 @@
+"""token计量测试（fakeredis）：配额检查、流式预留与结算."""
+import fakeredis.aioredis
+import pytest
+
+from app.services.ai.exceptions import AIQuotaExceededError
+from app.services.metering import RESERVE_SCRIPT, TokenMeter, period_of
+
+USER = "00000000-0000-0000-0000-000000000001"
+
+
+@pytest.fixture
+async def meter():
+    meter = TokenMeter("redis://test", key_prefix="test:metering:")
+    meter._redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    meter._reserve_script = meter._redis.register_script(RESERVE_SCRIPT)
+    # 配额已缓存，不读数据库
+    await meter._redis.set(meter._key("limit", USER), 1000)
+    yield meter
+    await meter._redis.aclose()
+
+
+async def test_record_counts_towards_quota(meter):
+    await meter.check(USER, 500)
+    await meter.record(USER, {"input_tokens": 300, "output_tokens": 500})
+
+    usage = await meter.usage(USER)
+    assert (usage["used"], usage["input_tokens"], usage["output_tokens"]) == (800, 300, 500)
+    assert usage["requests"] == 1
+    assert usage["remaining"] == 200
+
+    await meter.check(USER, 200)
+    with pytest.raises(AIQuotaExceededError) as excinfo:
+        await meter.check(USER, 201)
+    assert (excinfo.value.used, excinfo.value.limit) == (800, 1000)
+
+
+async def test_reservation_holds_quota_until_settled(meter):
+    reservation = await meter.reserve(USER, 600)
+    assert (await meter.usage(USER))["reserved"] == 600
+
+    # 并发的流式调用不能越过已预留的部分
+    with pytest.raises(AIQuotaExceededError):
+        await meter.reserve(USER, 500)
+    second = await meter.reserve(USER, 400)
+
+    # 结算按实际用量记账并释放预留
+    await meter.settle(reservation, {"input_tokens": 100, "output_tokens": 150})
+    usage = await meter.usage(USER)
+    assert (usage["used"], usage["reserved"]) == (250, 400)
+    assert usage["remaining"] == 350
+
+    await meter.settle(second, {"input_tokens": 50, "output_tokens": 50})
+    usage = await meter.usage(USER)
+    assert (usage["used"], usage["reserved"], usage["remaining"]) == (350, 0, 650)
+
+
+async def test_expired_reservation_is_released(meter):
+    meter.reservation_ttl = -1
+    await meter.reserve(USER, 900)
+    # 进程崩溃遗留的预留到期后不再占用配额
+    await meter.check(USER, 1000)
+
+
+async def test_unmetered_calls_skip_redis():
+    meter = TokenMeter("redis://unreachable")
+    assert await meter.reserve(None, 100) is None
+    await meter.check(None, 10**9)
+    await meter.record(None, {"input_tokens": 1})
+    assert meter.get_metrics()["redis_errors"] == 0
+
+
+class FakeSession:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.statements = []
+        self.committed = False
+        self.rolled_back = False
+
+    async def execute(self, statement):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.statements.append(statement)
+
+    async def commit(self):
+        self.committed = True
+
+    async def rollback(self):
+        self.rolled_back = True
+
+
+async def test_flush_drops_invalid_user_and_writes_the_rest(meter):
+    await meter.record(USER, {"input_tokens": 10, "output_tokens": 5})
+    await meter.record("not-a-uuid", {"input_tokens": 1})
+
+    db = FakeSession()
+    assert await meter.flush(db) == 1
+    assert db.committed
+    assert await meter._redis.smembers(meter._key("dirty")) == set()
+
+
+async def test_flush_restores_deltas_when_write_fails(meter):
+    await meter.record(USER, {"input_tokens": 10, "output_tokens": 5})
+
+    db = FakeSession(fail=True)
+    with pytest.raises(RuntimeError):
+        await meter.flush(db)
+    assert db.rolled_back
+
+    # 增量加回Redis，下次写入时不丢失
+    period = period_of()
+    assert await meter._redis.smembers(meter._key("dirty")) == {f"{period}:{USER}"}
+    pending = await meter._redis.hgetall(meter._key("pending", period, USER))
+    assert (pending["used"], pending["requests"]) == ("15", "1")
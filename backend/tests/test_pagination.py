@@ -0,0 +1,94 @@
+"""键集分页测试：游标编码、字段投影和逐页遍历."""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.models.entity.character import Character
+from app.services.pagination import ListProjection, decode_cursor, encode_cursor, keyset_page
+
+PROJECTION = ListProjection(Character, ("id", "name", "created_at"))
+
+
+def test_cursor_round_trip():
+    created_at, row_id = datetime(2024, 5, 1, 12, 30, 15, 123456), uuid.uuid4()
+    cursor = encode_cursor(created_at, row_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, row_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", encode_cursor(datetime(2024, 1, 1), uuid.uuid4())[:-4]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_resolve_always_includes_cursor_fields():
+    assert PROJECTION.resolve(None) == ["id", "name", "created_at"]
+    assert PROJECTION.resolve("name, role_type") == ["id", "created_at", "name", "role_type"]
+    with pytest.raises(ValueError, match="search_vector"):
+        PROJECTION.resolve("name,search_vector")
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    """按(created_at, id)倒序返回游标之后的行，模拟数据库执行分页查询."""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: (row["created_at"], row["id"]), reverse=True)
+        self.after = None
+        self.statements = []
+
+    async def execute(self, query):
+        self.statements.append(str(query.compile(dialect=postgresql.dialect())))
+        rows = self.rows
+        if self.after is not None:
+            rows = [row for row in rows if (row["created_at"], row["id"]) < self.after]
+        return FakeResult(rows[: query._limit])
+
+
+async def test_pages_cover_every_row_once():
+    started = datetime(2024, 5, 1)
+    # 每三行共用一个created_at，翻页必须靠id区分同一时刻的行
+    rows = [
+        {"id": uuid.uuid4(), "name": f"角色{i}", "created_at": started + timedelta(seconds=i // 3)}
+        for i in range(11)
+    ]
+    db = FakeSession(rows)
+
+    seen, cursor = [], None
+    while True:
+        db.after = decode_cursor(cursor) if cursor else None
+        page = await keyset_page(db, PROJECTION, Character.project_id == uuid.uuid4(), cursor=cursor, limit=4)
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert [row["id"] for row in seen] == [row["id"] for row in db.rows]
+    assert len(db.statements) == 3
+    assert "(characters.created_at, characters.id) < (" in db.statements[1]
+    assert "ORDER BY characters.created_at DESC, characters.id DESC" in db.statements[0]
+
+
+async def test_last_full_page_has_no_next_cursor():
+    rows = [{"id": uuid.uuid4(), "name": "甲", "created_at": datetime(2024, 5, 1)} for _ in range(4)]
+    page = await keyset_page(FakeSession(rows), PROJECTION, limit=4)
+    assert len(page["items"]) == 4
+    assert page["next_cursor"] is None
+
+
+async def test_limit_is_clamped():
+    page = await keyset_page(FakeSession([]), PROJECTION, limit=10_000)
+    assert page["limit"] == 200
@@ -0,0 +1,88 @@
+"""项目统计增量测试：对象换章节、换项目时计数随之转移."""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.models.entity.chapter import Chapter
+from app.models.entity.character import Character
+from app.models.entity.scene import Scene
+from app.services.project_stats import ProjectStatsService, StatsDelta
+
+OLD_PROJECT, NEW_PROJECT = uuid.uuid4(), uuid.uuid4()
+OLD_CHAPTER, NEW_CHAPTER = uuid.uuid4(), uuid.uuid4()
+
+
+def _loaded(obj):
+    """模拟从数据库加载的对象，之后的赋值产生修改历史."""
+    make_transient_to_detached(obj)
+    return obj
+
+
+def _collect(obj, action="updated", moved_chapters=None, chapter_projects=None, old_chapter_projects=None):
+    deltas = defaultdict(StatsDelta)
+    chapter_projects = chapter_projects or {OLD_CHAPTER: OLD_PROJECT, NEW_CHAPTER: NEW_PROJECT}
+    ProjectStatsService()._collect(
+        obj,
+        action,
+        deltas,
+        chapter_projects,
+        old_chapter_projects or chapter_projects,
+        moved_chapters or {},
+        datetime.utcnow(),
+    )
+    return {project_id: dict(delta.counters) for project_id, delta in deltas.items()}
+
+
+def test_scene_word_count_change_stays_in_project():
+    scene = _loaded(Scene(id=uuid.uuid4(), title="场景", chapter_id=OLD_CHAPTER, word_count=100))
+    scene.word_count = 130
+    assert _collect(scene) == {OLD_PROJECT: {"word_count": 30}}
+
+
+def test_scene_moved_to_chapter_in_another_project():
+    scene = _loaded(Scene(id=uuid.uuid4(), title="场景", chapter_id=OLD_CHAPTER, word_count=100))
+    scene.chapter_id = NEW_CHAPTER
+    scene.word_count = 120
+    assert _collect(scene) == {
+        OLD_PROJECT: {"scene_count": -1, "word_count": -100},
+        NEW_PROJECT: {"scene_count": 1, "word_count": 120},
+    }
+
+
+def test_chapter_moved_to_another_project_takes_its_scenes():
+    chapter = _loaded(Chapter(id=OLD_CHAPTER, title="第一章", project_id=OLD_PROJECT, status="completed"))
+    chapter.project_id = NEW_PROJECT
+    moved = {OLD_CHAPTER: {"scene_count": 3, "word_count": 900}}
+    assert _collect(chapter, moved_chapters=moved) == {
+        OLD_PROJECT: {"chapter_count": -1, "completed_chapter_count": -1, "scene_count": -3, "word_count": -900},
+        NEW_PROJECT: {"chapter_count": 1, "completed_chapter_count": 1, "scene_count": 3, "word_count": 900},
+    }
+
+
+def test_scene_written_in_moved_chapter_is_settled_against_both_projects():
+    scene = _loaded(Scene(id=uuid.uuid4(), title="场景", chapter_id=OLD_CHAPTER, word_count=100))
+    scene.word_count = 150
+    assert _collect(
+        scene,
+        chapter_projects={OLD_CHAPTER: NEW_PROJECT},
+        old_chapter_projects={OLD_CHAPTER: OLD_PROJECT},
+    ) == {
+        OLD_PROJECT: {"scene_count": -1, "word_count": -100},
+        NEW_PROJECT: {"scene_count": 1, "word_count": 150},
+    }
+
+
+def test_character_moved_to_another_project():
+    character = _loaded(Character(id=uuid.uuid4(), project_id=OLD_PROJECT, name="甲"))
+    character.project_id = NEW_PROJECT
+    assert _collect(character) == {
+        OLD_PROJECT: {"character_count": -1},
+        NEW_PROJECT: {"character_count": 1},
+    }
+
+
+def test_deleted_scene_uses_committed_chapter():
+    scene = _loaded(Scene(id=uuid.uuid4(), title="场景", chapter_id=OLD_CHAPTER, word_count=80))
+    assert _collect(scene, action="deleted") == {OLD_PROJECT: {"scene_count": -1, "word_count": -80}}
@@ -0,0 +1,28 @@
+"""分位数（最近秩法）测试."""
+import pytest
+
+from app.core.stats import percentile
+
+
+@pytest.mark.parametrize(
+    "count, q, expected",
+    [
+        (10, 0.5, 5),
+        (10, 0.95, 10),
+        (20, 0.5, 10),
+        (20, 0.95, 19),
+        (100, 0.5, 50),
+        (100, 0.95, 95),
+        (100, 0.99, 99),
+        (100, 0.07, 7),
+    ],
+)
+def test_nearest_rank(count, q, expected):
+    assert percentile(list(range(1, count + 1)), q) == expected
+
+
+def test_bounds():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([3.0], 0.99) == 3.0
+    assert percentile([1, 2, 3], 0) == 1
+    assert percentile([1, 2, 3], 1) == 3
@@ -0,0 +1,53 @@
+"""提示词模板编译测试."""
+import pytest
+
+from app.ai.templates import (
+    PROMPT_TEMPLATES,
+    PromptCategory,
+    PromptTemplate,
+    PromptTemplateManager,
+    TemplateVariable,
+    compile_template,
+)
+
+
+@pytest.mark.parametrize("template_id", sorted(PROMPT_TEMPLATES))
+def test_builtin_templates_declare_every_placeholder(template_id):
+    compiled = compile_template(PROMPT_TEMPLATES[template_id], strict=True)
+    assert compiled.unknown_placeholders == ()
+
+
+def test_output_placeholders_are_kept_literally():
+    prompt = PromptTemplateManager().fill_template(
+        "dialogue_optimize",
+        {"original_dialogue": "你好", "character_info": "甲", "scene_goal": "告别"},
+    )
+    assert "{{optimized_dialogue}}" in prompt
+    assert "{{original_dialogue}}" not in prompt
+
+
+def test_optional_variables_render_empty_by_default():
+    prompt = PromptTemplateManager().fill_template("inspiration_development", {"inspiration_content": "雨夜"})
+    assert "{{" not in prompt
+
+
+def _template(text: str) -> PromptTemplate:
+    return PromptTemplate(
+        id="typo",
+        name="拼写错误",
+        category=PromptCategory.EDITING,
+        template=text,
+        variables=[TemplateVariable("content", "string", True, "内容")],
+    )
+
+
+def test_undeclared_placeholder_fails_in_strict_mode():
+    with pytest.raises(ValueError, match="contnet"):
+        compile_template(_template("{{content}} {{contnet}}"), strict=True)
+
+
+def test_undeclared_placeholder_warns_otherwise(caplog):
+    compiled = compile_template(_template("{{content}} {{contnet}}"))
+    assert compiled.unknown_placeholders == ("contnet",)
+    assert compiled.render({"content": "正文"}) == "正文 {{contnet}}"
+    assert "contnet" in caplog.text
@@ -0,0 +1,109 @@
+"""token预算测试（离线时按字符数计数，测试与编码器无关）."""
+import pytest
+
+from app.services.ai.exceptions import AIPromptTooLongError
+from app.services.ai.tokenizer import TokenCounter
+
+
+@pytest.fixture
+def counter():
+    counter = TokenCounter(default_context_window=0, min_output_tokens=256)
+    # 固定按字符计数，结果不依赖能否下载tiktoken编码
+    counter._encodings = {"cl100k_base": None, "o200k_base": None}
+    counter._encoding_names = {}
+    counter.encoding_name = lambda model: "cl100k_base"
+    return counter
+
+
+@pytest.mark.parametrize(
+    "model, limits",
+    [
+        ("claude-3-opus-20240229", (200000, 4096)),
+        ("claude-3-5-sonnet-20241022", (200000, 8192)),
+        ("claude-3-7-sonnet-20250219", (200000, 64000)),
+        ("claude-sonnet-4-20250514", (200000, 64000)),
+        ("claude-opus-4-1-20250805", (200000, 32000)),
+        ("gpt-4o", (128000, 16384)),
+        ("gpt-4o-2024-05-13", (128000, 4096)),
+        ("gpt-4", (8192, None)),
+    ],
+)
+def test_known_model_limits(counter, model, limits):
+    assert counter.limits(model) == limits
+
+
+def test_unknown_claude_model_uses_family_window(counter):
+    assert counter.limits("claude-future-9") == (200000, None)
+
+
+def test_long_prompt_not_trimmed_for_new_claude_model(counter):
+    prompt = "字" * 20000
+    budgeted, budget = counter.budget_prompt("claude-sonnet-4-20250514", prompt, max_tokens=2000)
+    assert budgeted == prompt
+    assert not budget.trimmed
+    assert budget.max_tokens == 2000
+
+
+def test_unknown_model_is_not_budgeted(counter):
+    prompt = "字" * 50000
+    budgeted, budget = counter.budget_prompt("some-local-model", prompt, max_tokens=2000)
+    assert budgeted == prompt
+    assert budget.context_window is None
+    assert budget.max_tokens == 2000
+
+
+def test_configured_default_window_applies_to_unknown_models(counter):
+    counter.default_context_window = 8192
+    budgeted, budget = counter.budget_prompt("some-local-model", "字" * 20000, max_tokens=2000)
+    assert budget.trimmed
+    assert budget.input_tokens + budget.max_tokens <= 8192
+
+
+def test_oversized_prompt_is_trimmed_to_fit(counter):
+    prompt = "开头" + "中" * 10000 + "结尾"
+    budgeted, budget = counter.budget_prompt("gpt-4", prompt, max_tokens=1000)
+    assert budget.trimmed
+    assert budget.input_tokens + budget.max_tokens <= 8192
+    assert budgeted.startswith("开头") and budgeted.endswith("结尾")
+
+
+def test_max_tokens_capped_by_model_output_limit(counter):
+    _, budget = counter.budget_prompt("claude-3-opus-20240229", "你好", max_tokens=10000)
+    assert budget.max_tokens == 4096
+
+
+def test_reject_mode_raises(counter):
+    counter.overflow = "reject"
+    with pytest.raises(AIPromptTooLongError):
+        counter.budget_prompt("gpt-4", "字" * 10000, max_tokens=1000)
+
+
+def test_messages_drop_oldest_and_start_with_user(counter):
+    messages = [
+        {"role": "user", "content": "旧" * 6000},
+        {"role": "assistant", "content": "答" * 3000},
+        {"role": "user", "content": "新问题"},
+    ]
+    kept, budget = counter.budget_messages("gpt-4", messages, max_tokens=2000)
+    assert kept == [messages[-1]]
+    assert budget.trimmed
+
+
+def test_count_cache_does_not_keep_text():
+    class FakeEncoding:
+        name = "fake"
+        calls = 0
+
+        def encode(self, text, disallowed_special=()):
+            self.calls += 1
+            return list(text)
+
+    counter = TokenCounter(default_context_window=0)
+    encoding = FakeEncoding()
+    counter.get_encoding = lambda model=None: encoding
+    text = "稿件正文" * 1000
+
+    assert counter.count(text) == 4000
+    assert counter.count(text) == 4000
+    assert encoding.calls == 1
+    assert all(text not in key for key in counter._counts._data)